@@ -10,6 +10,7 @@ import collections
 import concurrent.futures
 import copy
 import datetime as dt
+import itertools
 import json
 import logging
 import os
@@ -35,6 +36,7 @@ from .basicswap_util import (
     AutomationOverrideOptions,
     BidStates,
     canAcceptBidState,
+    canExpireBidState,
     ConnectionRequestTypes,
     DebugTypes,
     describeEventEntry,
@@ -66,9 +68,13 @@ from .chainparams import (
     Fiat,
     ticker_map,
 )
+from .bidcheck import BidCheckScheduler, callLookup, PrefetchedLookups
+from .blockscan import BlockPrefetcher, WatchedIndex
+from .chainnotify import ChainNotifier
+from .ws_topics import WSTopicHub
 from .contrib.websocket_server import WebsocketServer
 from .db_upgrades import upgradeDatabase, upgradeDatabaseData
-from .db_util import remove_expired_data
+from .db_util import NotificationSink, remove_expired_data
 from .http_server import HttpThread
 from .rpc import escape_rpcauth
 from .rpc_xmr import make_xmr_rpc2_func
@@ -95,15 +101,19 @@ from .util.address import (
     toWIF,
     decodeWif,
     decodeAddress,
+    encodeAddress,
     pubkeyToAddress,
 )
 from .util.crypto import sha256
+from .util.extkey import ExtKeyCache, ExtKeyPair
 from .util.logging import LogCategories as LC
 from .util.network import is_private_ip_address
+from .util.scheduler import ExpiryScheduler
 from .util.smsg import smsgGetID
 from .interface.base import Curves
 from .interface.part import PARTInterface, PARTInterfaceAnon, PARTInterfaceBlind
 from .explorers import default_coingecko_api_key
+from .orderbook import OrderBook
 from .script import OpCodes
 from .messages_npb import (
     ADSBidIntentAcceptMessage,
@@ -132,9 +142,12 @@ from .db import (
     DirectMessageRouteLink,
     EventLog,
     getOrderByStr,
+    getPageCursorStr,
+    getSortFromFilters,
+    getTableSchema,
     KnownIdentity,
+    makePageCursor,
     MessageLink,
-    Notification,
     Offer,
     pack_state,
     PooledAddress,
@@ -142,7 +155,6 @@ from .db import (
     SentOffer,
     SmsgAddress,
     SwapTx,
-    Wallets,
     XmrOffer,
     XmrSplitData,
     XmrSwap,
@@ -224,25 +236,56 @@ def checkAndNotifyBalanceChange(
                 "trigger": trigger_source,
             }
             swap_client.ws_server.send_message_to_all(json.dumps(balance_event))
+            if swap_client.ws_topics:
+                swap_client.ws_topics.publish(
+                    "wallets",
+                    {
+                        "coin": ci.ticker(),
+                        "balance": ci.format_amount(current_balance),
+                        "unconfirmed": ci.format_amount(current_unconfirmed),
+                        "height": new_height,
+                    },
+                    int(coin_type),
+                )
     except Exception:
         cc["cached_balance"] = None
         cc["cached_total_balance"] = None
         cc["cached_unconfirmed"] = None
 
 
+def updateXMRChainState(swap_client, coin_type, ci, cc):
+    # Returns the new height if the chain tip changed
+    new_height = ci.getChainHeight()
+    if new_height == cc["chain_height"]:
+        return None
+    swap_client.log.debug(f"New {ci.ticker()} block at height: {new_height}")
+    with swap_client.mxDB:
+        cc["chain_height"] = new_height
+    return new_height
+
+
+def updateChainState(swap_client, coin_type, ci, cc):
+    # Returns the new height if the chain tip changed
+    chain_state = ci.getBlockchainInfo()
+    new_height: int = chain_state["blocks"]
+    if chain_state["bestblockhash"] == cc["chain_best_block"]:
+        return None
+    swap_client.log.debug(f"New {ci.ticker()} block at height: {new_height}")
+    with swap_client.mxDB:
+        cc["chain_height"] = new_height
+        cc["chain_best_block"] = chain_state["bestblockhash"]
+        if "mediantime" in chain_state:
+            cc["chain_median_time"] = chain_state["mediantime"]
+    return new_height
+
+
 def threadPollXMRChainState(swap_client, coin_type):
     ci = swap_client.ci(coin_type)
     cc = swap_client.coin_clients[coin_type]
     while not swap_client.chainstate_delay_event.is_set():
         try:
-            new_height = ci.getChainHeight()
-            if new_height != cc["chain_height"]:
-                swap_client.log.debug(
-                    f"New {ci.ticker()} block at height: {new_height}"
-                )
-                with swap_client.mxDB:
-                    cc["chain_height"] = new_height
-
+            new_height = updateXMRChainState(swap_client, coin_type, ci, cc)
+            if new_height is not None:
                 checkAndNotifyBalanceChange(
                     swap_client, coin_type, ci, cc, new_height, "block"
                 )
@@ -267,18 +310,8 @@ def threadPollChainState(swap_client, coin_type):
 
     while not swap_client.chainstate_delay_event.is_set():
         try:
-            chain_state = ci.getBlockchainInfo()
-            new_height: int = chain_state["blocks"]
-            if chain_state["bestblockhash"] != cc["chain_best_block"]:
-                swap_client.log.debug(
-                    f"New {ci.ticker()} block at height: {new_height}"
-                )
-                with swap_client.mxDB:
-                    cc["chain_height"] = new_height
-                    cc["chain_best_block"] = chain_state["bestblockhash"]
-                    if "mediantime" in chain_state:
-                        cc["chain_median_time"] = chain_state["mediantime"]
-
+            new_height = updateChainState(swap_client, coin_type, ci, cc)
+            if new_height is not None:
                 checkAndNotifyBalanceChange(
                     swap_client, coin_type, ci, cc, new_height, "block"
                 )
@@ -290,6 +323,7 @@ def threadPollChainState(swap_client, coin_type):
 
 class BasicSwap(BaseApp, BSXNetwork, UIApp):
     ws_server = None
+    ws_topics = None
     protocolInterfaces = {
         SwapTypes.SELLER_FIRST: atomic_swap_1.AtomicSwapInterface(),
         SwapTypes.XMR_SWAP: xmr_swap_1.XmrSwapInterface(),
@@ -310,15 +344,9 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         self._version = struct.pack(">HHH", int(v[0]), int(v[1]), int(v[2]))
 
         self._transient_instance = transient_instance
-        self.check_actions_seconds = self.get_int_setting(
-            "check_actions_seconds", 10, 1, 10 * 60
-        )
         self.check_expired_seconds = self.get_int_setting(
             "check_expired_seconds", 5 * 60, 1, 10 * 60
         )  # Expire DB records and smsg messages
-        self.check_expiring_bids_offers_seconds = self.get_int_setting(
-            "check_expiring_bids_offers_seconds", 60, 1, 10 * 60
-        )  # Set offer and bid states to expired
         self.check_progress_seconds = self.get_int_setting(
             "check_progress_seconds", 60, 1, 10 * 60
         )
@@ -337,9 +365,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         )  # Seconds waited for will be (x(1 + x+1) / 2
         self.debug_ui = self.settings.get("debug_ui", False)
         self._debug_cases = []
-        self._last_checked_actions = 0
         self._last_checked_expired = 0
-        self._last_checked_expiring_bids_offers = 0
         self._last_checked_progress = 0
         self._last_checked_watched = 0
         self._last_checked_split_messages = 0
@@ -347,10 +373,32 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         self._possibly_revoked_offers = collections.deque(
             [], maxlen=48
         )  # TODO: improve
-        self._expiring_bids = []  # List of bids expiring soon
-        self._expiring_offers = []  # List of offers expiring soon
+        # Active bids and offers that can expire, keyed by ("bid", bid_id) or ("offer", offer_id)
+        self._expiry_scheduler = ExpiryScheduler()
+        # Pending actions keyed by action_id, checkQueuedActions only reads the db when one is due
+        self._queued_actions = ExpiryScheduler()
+        # Active offers per coin pair sorted by rate, updated through offerChanged
+        self._order_book = OrderBook()
+        # Incremented with mxDB held when offers are added or deactivated
+        self._offers_seq: int = 0
+
+        # Latest wallet and chain info per coin, refreshed in the background and
+        # written to the db by flushWalletsInfo to be available after a restart.
+        # coin_id -> {balance_type: (wallet_data, created_at)}, loaded on first use
+        self._mx_wallets_info = threading.Lock()
+        self._wallets_info = None
+        self._wallets_info_dirty = set()  # (coin_id, balance_type)
+        self._wallets_info_pool = None
         self._updating_wallets_info = {}
-        self._last_updated_wallets_info = 0
+        self._wallets_info_refresh_at = {}
+        self._wallets_info_errors = {}  # coin_id -> last refresh error, not stored
+        self.wallets_info_refresh_seconds = self.get_int_setting(
+            "wallets_info_refresh_seconds", 30, 1, 60 * 60
+        )
+        self.flush_wallets_info_seconds = self.get_int_setting(
+            "flush_wallets_info_seconds", 5 * 60, 1, 24 * 60 * 60
+        )
+        self._last_flushed_wallets_info = 0
 
         self.check_updates_seconds = self.get_int_setting(
             "check_updates_seconds", 24 * 60 * 60, 60 * 60, 7 * 24 * 60 * 60
@@ -382,7 +430,15 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             self._max_logfile_bytes *= 1024 * 1024
         self._max_logfiles = self.get_int_setting("max_logfiles", 10, 1, 100)
 
+        # Notifications are written to the db in batches by update()
+        self._notification_sink = NotificationSink()
+        self.flush_notifications_seconds = self.get_int_setting(
+            "flush_notifications_seconds", 1, 1, 60
+        )
+        self._last_flushed_notifications = 0
+        self._mx_notifications = threading.Lock()
         self._notifications_cache = {}
+        self._notifications_seq = itertools.count()
         self._is_encrypted = None
         self._is_locked = None
 
@@ -390,6 +446,10 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         self._volume_cache = {}
         self._historical_cache = {}
         self._price_cache_lock = threading.Lock()
+
+        self._mx_extkeys = threading.Lock()
+        self._account_extkeys = None
+        self._account_extkey_prefix = None
         self._price_fetch_thread = None
         self._price_fetch_running = False
         self._last_price_fetch = 0
@@ -465,10 +525,33 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             "restrict_unknown_seed_wallets", True
         )
         self._max_check_loop_blocks = self.settings.get("max_check_loop_blocks", 100000)
+        self._block_scan_batch_size = self.get_int_setting(
+            "block_scan_batch_size", 20, 1, 1000
+        )
+        self._block_scan_workers = self.get_int_setting("block_scan_workers", 2, 1, 16)
+        # Number of batches fetched ahead of the block being matched
+        self._block_scan_prefetch = self.get_int_setting(
+            "block_scan_prefetch", 4, 1, 64
+        )
         self._force_db_upgrade = self.settings.get("force_db_upgrade", False)
         self._bid_expired_leeway = 5
 
         self.swaps_in_progress = dict()
+        # Bids in progress are checked in parallel, limited per coin
+        self._bid_check_scheduler = BidCheckScheduler(
+            self.get_int_setting("check_bid_state_workers", 4, 1, 32),
+            self.get_int_setting("check_bid_state_coin_limit", 2, 1, 32),
+        )
+        self._mx_watched = threading.RLock()
+
+        # Block and txn notifications from coin daemons, polling remains the fallback
+        self._chain_notifier = None
+        self._mx_chain_events = threading.Lock()
+        self._chain_events = {}
+        self._chain_tx_wake_seconds = self.get_int_setting(
+            "chain_tx_wake_seconds", 5, 0, 10 * 60
+        )
+        self._chain_event_latencies = collections.deque(maxlen=100)
 
         self.threads = []
         self.thread_pool = concurrent.futures.ThreadPoolExecutor(
@@ -485,6 +568,15 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             bytes.fromhex(self.network_pubkey),
         )
 
+        self._db_num_read_connections = self.get_int_setting(
+            "db_read_connections", 4, 0, 32
+        )
+        self._db_cache_size_kb = self.get_int_setting(
+            "db_cache_size_kb", 16 * 1024, 2 * 1024, 1024 * 1024
+        )
+        self._db_mmap_size = self.get_int_setting(
+            "db_mmap_size", 64 * 1024 * 1024, 0, 4 * 1024 * 1024 * 1024
+        )
         self.sqlite_file: str = os.path.join(
             self.data_dir,
             "db{}.sqlite".format("" if self.chain == "mainnet" else ("_" + self.chain)),
@@ -582,6 +674,8 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
     def finalise(self):
         self.log.info("Finalising")
 
+        if self.ws_topics:
+            self.ws_topics.stop()
         if self.ws_server:
             try:
                 self.log.info("Stopping websocket server.")
@@ -632,8 +726,14 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             self.thread_pool.shutdown(cancel_futures=True)
         else:
             self.thread_pool.shutdown()
+        if self._wallets_info_pool is not None:
+            self._wallets_info_pool.shutdown()
+        self._bid_check_scheduler.shutdown()
+        self.flushNotifications()
+        self.flushWalletsInfo()
 
         self.swaps_in_progress.clear()
+        self.closeDBConnections()
         super().finalise()
 
     def logIDB(self, concept_id: bytes) -> str:
@@ -801,6 +901,9 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                     )
                 else:
                     raise ValueError("Missing XMR wallet rpc credentials.")
+                self.coin_clients[coin]["watch_wallet_rpc_ports"] = (
+                    chain_client_settings.get("watch_wallet_rpc_ports", [])
+                )
 
                 self.coin_clients[coin]["rpcuser"] = chain_client_settings.get(
                     "rpcuser", ""
@@ -1196,6 +1299,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
 
                 self.checkWalletSeed(c)
 
+        self.startChainNotifier()
         self._enable_rpc_pooling()
 
         if "p2p_host" in self.settings:
@@ -1322,6 +1426,12 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             self.ws_server.set_fn_new_client(self.ws_new_client)
             self.ws_server.set_fn_client_left(self.ws_client_left)
             self.ws_server.set_fn_message_received(self.ws_message_received)
+            self.ws_topics = WSTopicHub(
+                self.ws_server,
+                self.log,
+                self.get_int_setting("ws_client_queue_size", 256, 16, 10000),
+            )
+            self.ws_topics.start()
             self.ws_server.run_forever(threaded=True)
 
     def stopDaemon(self, coin) -> None:
@@ -1585,6 +1695,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                         raise e
                 if c == Coins.PART:
                     self._is_locked = False
+                    self._recipient_keys.clear()
 
             self.loadFromDB()
         finally:
@@ -1594,6 +1705,9 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         try:
             self._read_zmq_queue = False
             self.swaps_in_progress.clear()
+            if coin is None or coin == Coins.PART:
+                self.clearAccountExtKeys()
+                self._recipient_keys.clear()
 
             for c in self.getListOfWalletCoins():
                 if coin and c != coin:
@@ -1663,6 +1777,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             cursor.execute(query_str, (coin_id, info_type))
         finally:
             self.closeDB(cursor)
+        self.setCachedWalletInfo(coin_id, info_type, None)
 
     def updateIdentityBidState(self, cursor, address: str, bid) -> None:
         offer = self.getOffer(bid.offer_id, cursor)
@@ -1928,6 +2043,9 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                             self.deactivateBid(cursor, offer, bid)
                         except Exception as ex:
                             self.logException(f"Further error deactivating: {ex}")
+            self.loadExpiringBidsAndOffers(cursor)
+            self.loadOrderBook(cursor)
+            self.loadQueuedActions(cursor)
             self.buildNotificationsCache(cursor)
         finally:
             self.closeDBCursor(bid_cursor)
@@ -2016,32 +2134,21 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 self.log.warning(f"Unknown notification {event_type}")
 
             now: int = self.getTime()
-            use_cursor = self.openDB(None)
-            try:
-                self.add(
-                    Notification(
-                        active_ind=1,
-                        created_at=now,
-                        event_type=int(event_type),
-                        event_data=bytes(json.dumps(event_data), "UTF-8"),
-                    ),
-                    use_cursor,
-                )
-
-                use_cursor.execute(
-                    "DELETE FROM notifications WHERE record_id NOT IN (SELECT record_id FROM notifications WHERE active_ind=1 ORDER BY created_at ASC LIMIT ?)",
-                    (self._keep_notifications,),
-                )
+            self._notification_sink.add(
+                now, int(event_type), bytes(json.dumps(event_data), "UTF-8")
+            )
 
+            with self._mx_notifications:
                 if show_event:
-                    self._notifications_cache[now] = (event_type, event_data)
+                    self._notifications_cache[next(self._notifications_seq)] = (
+                        now,
+                        event_type,
+                        event_data,
+                    )
                 while len(self._notifications_cache) > self._show_notifications:
                     # dicts preserve insertion order in Python 3.7+
                     self._notifications_cache.pop(next(iter(self._notifications_cache)))
 
-            finally:
-                self.closeDB(use_cursor)
-
         except Exception as ex:
             self.log.error(
                 f"Notification processing failed for event_type {event_type}: {ex}"
@@ -2060,23 +2167,37 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             except Exception as ex2:
                 self.log.error(f"Notification fallback also failed: {ex2}")
 
+    def flushNotifications(self) -> None:
+        try:
+            self._notification_sink.flush(self, self._keep_notifications)
+        except Exception as e:
+            self.log.error(f"flushNotifications {e}")
+
     def buildNotificationsCache(self, cursor):
-        self._notifications_cache.clear()
         q = cursor.execute(
-            "SELECT created_at, event_type, event_data FROM notifications WHERE active_ind = 1 ORDER BY created_at ASC LIMIT ?",
-            (self._keep_notifications,),
-        )
-        for entry in q:
-            self._notifications_cache[entry[0]] = (
-                entry[1],
-                json.loads(entry[2].decode("UTF-8")),
-            )
+            "SELECT created_at, event_type, event_data FROM notifications WHERE active_ind = 1 ORDER BY record_id DESC LIMIT ?",
+            (self._show_notifications,),
+        ).fetchall()
+        with self._mx_notifications:
+            self._notifications_cache.clear()
+            for entry in reversed(q):
+                self._notifications_cache[next(self._notifications_seq)] = (
+                    entry[0],
+                    entry[1],
+                    json.loads(entry[2].decode("UTF-8")),
+                )
 
     def getNotifications(self):
         rv = []
-        for k, v in self._notifications_cache.items():
+        with self._mx_notifications:
+            entries = list(self._notifications_cache.values())
+        for created_at, event_type, event_data in entries:
             rv.append(
-                (time.strftime("%d-%m-%y %H:%M:%S", time.localtime(k)), int(v[0]), v[1])
+                (
+                    time.strftime("%d-%m-%y %H:%M:%S", time.localtime(created_at)),
+                    int(event_type),
+                    event_data,
+                )
             )
         return rv
 
@@ -2163,7 +2284,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
 
     def listIdentities(self, filters={}):
         try:
-            cursor = self.openDB()
+            cursor = self.openDBRead()
 
             query_str: str = (
                 "SELECT address, label, num_sent_bids_successful, num_recv_bids_successful, "
@@ -2209,7 +2330,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 rv.append(identity)
             return rv
         finally:
-            self.closeDB(cursor, commit=False)
+            self.closeDBRead(cursor)
 
     def vacuumDB(self):
         try:
@@ -2602,6 +2723,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
 
             self.add(offer, cursor)
             self.add(SentOffer(offer_id=offer_id), cursor)
+            self.offerChanged(offer, "added")
         finally:
             self.closeDB(cursor)
         self.log.info(f"Sent OFFER {self.log.id(offer_id)}")
@@ -2670,6 +2792,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                     "offer_id",
                 ],
             )
+            self.offerChanged(offer, "removed")
         finally:
             self.closeDB(cursor)
 
@@ -2708,19 +2831,34 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         finally:
             self.closeDB(cursor)
 
-    def grindForEd25519Key(self, coin_type, evkey, key_path_base) -> bytes:
+    def getAccountExtKeys(self) -> ExtKeyCache:
+        # Keys are derived locally from the Particl wallet account key, fetched once while unlocked
+        with self._mx_extkeys:
+            if self._account_extkeys is None:
+                evkey = self.callcoinrpc(
+                    Coins.PART, "extkey", ["account", "default", "true"]
+                )["evkey"]
+                ek_data = decodeAddress(evkey)
+                ek = ExtKeyPair()
+                ek.decode(ek_data[4:])
+                self._account_extkey_prefix = int.from_bytes(ek_data[:4], "big")
+                self._account_extkeys = ExtKeyCache(ek)
+            return self._account_extkeys
+
+    def clearAccountExtKeys(self) -> None:
+        with self._mx_extkeys:
+            self._account_extkeys = None
+
+    def getAccountPathKey(self, path: str) -> bytes:
+        return self.getAccountExtKeys().derive_path(path)._key
+
+    def grindForEd25519Key(self, coin_type, key_path_base) -> bytes:
         ci = self.ci(coin_type)
+        extkeys = self.getAccountExtKeys()
         nonce = 1
         while True:
             key_path = key_path_base + "/{}".format(nonce)
-            extkey = self.callcoinrpc(Coins.PART, "extkey", ["info", evkey, key_path])[
-                "key_info"
-            ]["result"]
-            privkey = decodeWif(
-                self.callcoinrpc(Coins.PART, "extkey", ["info", extkey])["key_info"][
-                    "privkey"
-                ]
-            )
+            privkey = extkeys.derive_path(key_path)._key
 
             if ci.verifyKey(privkey):
                 return privkey
@@ -2729,23 +2867,12 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 raise ValueError("grindForEd25519Key failed")
 
     def getWalletKey(self, coin_type, key_num, for_ed25519=False) -> bytes:
-        evkey = self.callcoinrpc(Coins.PART, "extkey", ["account", "default", "true"])[
-            "evkey"
-        ]
-
         key_path_base = "44445555h/1h/{}/{}".format(int(coin_type), key_num)
 
         if not for_ed25519:
-            extkey = self.callcoinrpc(
-                Coins.PART, "extkey", ["info", evkey, key_path_base]
-            )["key_info"]["result"]
-            return decodeWif(
-                self.callcoinrpc(Coins.PART, "extkey", ["info", extkey])["key_info"][
-                    "privkey"
-                ]
-            )
+            return self.getAccountPathKey(key_path_base)
 
-        return self.grindForEd25519Key(coin_type, evkey, key_path_base)
+        return self.grindForEd25519Key(coin_type, key_path_base)
 
     def getPathKey(
         self,
@@ -2756,10 +2883,6 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         key_no: int,
         for_ed25519: bool = False,
     ) -> bytes:
-        evkey = self.callcoinrpc(Coins.PART, "extkey", ["account", "default", "true"])[
-            "evkey"
-        ]
-
         days = bid_created_at // 86400
         secs = bid_created_at - days * 86400
         key_path_base = "44445555h/999999/{}/{}/{}/{}/{}/{}".format(
@@ -2767,89 +2890,46 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         )
 
         if not for_ed25519:
-            extkey = self.callcoinrpc(
-                Coins.PART, "extkey", ["info", evkey, key_path_base]
-            )["key_info"]["result"]
-            return decodeWif(
-                self.callcoinrpc(Coins.PART, "extkey", ["info", extkey])["key_info"][
-                    "privkey"
-                ]
-            )
+            return self.getAccountPathKey(key_path_base)
 
-        return self.grindForEd25519Key(coin_to, evkey, key_path_base)
+        return self.grindForEd25519Key(coin_to, key_path_base)
 
     def getNetworkKey(self, key_num):
-        evkey = self.callcoinrpc(Coins.PART, "extkey", ["account", "default", "true"])[
-            "evkey"
-        ]
-
         key_path = "44445556h/1h/{}".format(int(key_num))
 
-        extkey = self.callcoinrpc(Coins.PART, "extkey", ["info", evkey, key_path])[
-            "key_info"
-        ]["result"]
-        return decodeWif(
-            self.callcoinrpc(Coins.PART, "extkey", ["info", extkey])["key_info"][
-                "privkey"
-            ]
-        )
+        return self.getAccountPathKey(key_path)
 
     def getContractPubkey(self, date, contract_count):
 
         # Derive an address to use for a contract
-        evkey = self.callcoinrpc(Coins.PART, "extkey", ["account", "default", "true"])[
-            "evkey"
-        ]
-
         # Should the coin path be included?
         path = "44445555h"
         path += "/" + str(date.year) + "/" + str(date.month) + "/" + str(date.day)
         path += "/" + str(contract_count)
 
-        extkey = self.callcoinrpc(Coins.PART, "extkey", ["info", evkey, path])[
-            "key_info"
-        ]["result"]
-        pubkey = self.callcoinrpc(Coins.PART, "extkey", ["info", extkey])["key_info"][
-            "pubkey"
-        ]
-        return bytes.fromhex(pubkey)
+        return self.getAccountExtKeys().derive_path(path).get_pubkey()
 
     def getContractPrivkey(self, date: dt.datetime, contract_count: int) -> bytes:
         # Derive an address to use for a contract
-        evkey = self.callcoinrpc(Coins.PART, "extkey", ["account", "default", "true"])[
-            "evkey"
-        ]
-
         path = "44445555h"
         path += "/" + str(date.year) + "/" + str(date.month) + "/" + str(date.day)
         path += "/" + str(contract_count)
 
-        extkey = self.callcoinrpc(Coins.PART, "extkey", ["info", evkey, path])[
-            "key_info"
-        ]["result"]
-        privkey = self.callcoinrpc(Coins.PART, "extkey", ["info", extkey])["key_info"][
-            "privkey"
-        ]
-        raw = decodeAddress(privkey)[1:]
-        if len(raw) > 32:
-            raw = raw[:32]
-        return raw
+        return self.getAccountPathKey(path)
 
     def getContractSecret(self, date: dt.datetime, contract_count: int) -> bytes:
         # Derive a key to use for a contract secret
-        evkey = self.callcoinrpc(Coins.PART, "extkey", ["account", "default", "true"])[
-            "evkey"
-        ]
-
         path = "44445555h/99999"
         path += "/" + str(date.year) + "/" + str(date.month) + "/" + str(date.day)
         path += "/" + str(contract_count)
 
+        # Hash of the derived extkey as encoded by particld
+        extkey = self.getAccountExtKeys().derive_path(path)
         return sha256(
             bytes(
-                self.callcoinrpc(Coins.PART, "extkey", ["info", evkey, path])[
-                    "key_info"
-                ]["result"],
+                encodeAddress(
+                    self._account_extkey_prefix.to_bytes(4, "big") + extkey.encode_v()
+                ),
                 "UTF-8",
             )
         )
@@ -2986,6 +3066,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         key_str = "receive_addr_" + self.ci(coin_type).coin_name().lower()
         addr = self.getReceiveAddressForCoin(coin_type)
         self.setStringKV(key_str, addr, cursor)
+        self.updateCachedWalletAddress(coin_type, "deposit_address", addr)
         return addr
 
     def getCachedMainWalletAddress(self, ci, cursor=None):
@@ -3105,6 +3186,11 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         key_str = "stealth_addr_" + ci.coin_name().lower()
         addr = ci.getNewStealthAddress()
         self.setStringKV(key_str, addr)
+        self.updateCachedWalletAddress(
+            coin_type,
+            "mweb_address" if coin_type == Coins.LTC else "stealth_address",
+            addr,
+        )
         return addr
 
     def getCachedStealthAddressForCoin(self, coin_type, cursor=None):
@@ -3170,10 +3256,89 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
 
         return ci.getProofOfFunds(amount_for, extra_commit_bytes)
 
+    def offerChanged(self, offer, change: str) -> None:
+        # Call with mxDB held where offers are added or deactivated.
+        # Websocket deltas are sent when the transaction commits
+        self._offers_seq += 1
+        if change == "added" and offer.state in (
+            OfferStates.OFFER_RECEIVED,
+            OfferStates.OFFER_SENT,
+        ):
+            self._expiry_scheduler.schedule(("offer", offer.offer_id), offer.expire_at)
+            self.addToOrderBook(offer)
+        elif change != "added":
+            self._expiry_scheduler.cancel(("offer", offer.offer_id))
+            self._order_book.remove(offer.offer_id)
+        if self.ws_topics is None:
+            return
+        coin_from: int = int(offer.coin_from)
+        coin_to: int = int(offer.coin_to)
+        delta = {
+            "change": change,
+            "offer": {
+                "offer_id": offer.offer_id.hex(),
+                "coin_from": coin_from,
+                "coin_to": coin_to,
+                "amount_from": offer.amount_from,
+                "amount_to": offer.amount_to,
+                "rate": offer.rate,
+                "min_bid_amount": offer.min_bid_amount,
+                "amount_negotiable": offer.amount_negotiable,
+                "rate_negotiable": offer.rate_negotiable,
+                "addr_from": offer.addr_from,
+                "created_at": offer.created_at,
+                "expire_at": offer.expire_at,
+                "is_own_offer": bool(offer.was_sent),
+            },
+        }
+        self.publishAfterCommit(
+            ("offers", f"offers:{coin_from}-{coin_to}"), delta, offer.offer_id
+        )
+
+    def bidChanged(self, bid) -> None:
+        if bid.active_ind == 1 and canExpireBidState(bid.state):
+            self._expiry_scheduler.schedule(("bid", bid.bid_id), bid.expire_at)
+        else:
+            self._expiry_scheduler.cancel(("bid", bid.bid_id))
+        if self.ws_topics is None:
+            return
+        swap_topic: str = "swap:" + bid.bid_id.hex()
+        if not (
+            self.ws_topics.hasSubscribers("bids")
+            or self.ws_topics.hasSubscribers(swap_topic)
+        ):
+            return
+        delta = {
+            "bid": {
+                "bid_id": bid.bid_id.hex(),
+                "offer_id": bid.offer_id.hex(),
+                "state": None if bid.state is None else int(bid.state),
+                "state_str": None if bid.state is None else strBidState(bid.state),
+                "amount": bid.amount,
+                "rate": bid.rate,
+                "created_at": bid.created_at,
+                "expire_at": bid.expire_at,
+                "was_sent": bool(bid.was_sent),
+                "was_received": bool(bid.was_received),
+            },
+        }
+        self.publishAfterCommit(("bids", swap_topic), delta, bid.bid_id)
+
+    def publishAfterCommit(self, topics, delta: dict, coalesce_key) -> None:
+        # Call with mxDB held, clients refetching on a delta must read the new rows
+        ws_topics = self.ws_topics
+
+        def publish():
+            for topic in topics:
+                ws_topics.publish(topic, delta, coalesce_key)
+
+        self.afterCommit(publish)
+
     def saveBidInSession(
         self, bid_id: bytes, bid, cursor, xmr_swap=None, save_in_progress=None
     ) -> None:
         self.add(bid, cursor, upsert=True)
+        self.bidChanged(bid)
         if bid.initiate_tx:
             self.add(bid.initiate_tx, cursor, upsert=True)
         if bid.participate_tx:
@@ -3213,7 +3378,8 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             action_type=action_type,
             linked_id=linked_id,
         )
-        self.add(action, cursor)
+        action_id = self.add(action, cursor)
+        self._queued_actions.schedule(action_id, action.trigger_at)
         for debug_case in self._debug_cases:
             bid_id, debug_ind = debug_case
             if bid_id == linked_id and debug_ind == DebugTypes.DUPLICATE_ACTIONS:
@@ -3224,7 +3390,8 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                     action_type=action_type,
                     linked_id=linked_id,
                 )
-                self.add(action, cursor)
+                action_id = self.add(action, cursor)
+                self._queued_actions.schedule(action_id, action.trigger_at)
 
     def createAction(self, delay: int, action_type: int, linked_id: bytes) -> None:
         cursor = self.openDB()
@@ -3276,7 +3443,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
 
     def getEvents(self, linked_type: int, linked_id: bytes):
         events = []
-        cursor = self.openDB()
+        cursor = self.openDBRead()
         try:
             for entry in self.query(
                 EventLog, cursor, {"linked_type": linked_type, "linked_id": linked_id}
@@ -3284,7 +3451,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 events.append(entry)
             return events
         finally:
-            self.closeDB(cursor, commit=False)
+            self.closeDBRead(cursor)
 
     def addMessageLink(
         self,
@@ -3705,11 +3872,11 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
 
     def getIdentity(self, address: str):
         try:
-            cursor = self.openDB()
+            cursor = self.openDBRead()
             identity = self.queryOne(KnownIdentity, cursor, {"address": address})
             return identity
         finally:
-            self.closeDB(cursor, commit=False)
+            self.closeDBRead(cursor)
 
     def list_bid_events(self, bid_id: bytes, cursor):
         query_str = (
@@ -5770,36 +5937,47 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             return sum_unspent
         return None
 
-    def findTxB(self, ci_to, xmr_swap, bid, cursor, bid_sender: bool) -> bool:
-        bid_changed = False
-
-        found_tx = None
+    def lookupTxB(self, ci_to, xmr_swap, bid, bid_sender: bool, call):
+        # call(func, *args, **kwargs) makes the chain or wallet lookup
         if ci_to.watch_blocks_for_scripts():
             if bid.xmr_b_lock_tx is None or bid.xmr_b_lock_tx.txid is None:
                 # Watching chain for dest_address with WatchedScript
-                pass
-            else:
-                dest_address = ci_to.pkh_to_address(ci_to.pkh(xmr_swap.pkbs))
-                found_tx = ci_to.getLockTxHeight(
-                    bid.xmr_b_lock_tx.txid,
-                    dest_address,
-                    bid.amount_to,
-                    bid.chain_b_height_start,
-                    vout=bid.xmr_b_lock_tx.vout,
-                )
-        else:
-            # Have to use findTxB instead of relying on the first seen height to detect chain reorgs
-            found_tx = ci_to.findTxB(
-                xmr_swap.vkbv,
-                xmr_swap.pkbs,
+                return None
+            dest_address = ci_to.pkh_to_address(ci_to.pkh(xmr_swap.pkbs))
+            return call(
+                ci_to.getLockTxHeight,
+                bid.xmr_b_lock_tx.txid,
+                dest_address,
                 bid.amount_to,
-                ci_to.blocks_confirmed,
                 bid.chain_b_height_start,
-                bid_sender,
-                check_amount=(
-                    False if bid.debug_ind == DebugTypes.B_LOCK_TX_MISSED_SEND else True
-                ),
+                vout=bid.xmr_b_lock_tx.vout,
             )
+        # Have to use findTxB instead of relying on the first seen height to detect chain reorgs
+        return call(
+            ci_to.findTxB,
+            xmr_swap.vkbv,
+            xmr_swap.pkbs,
+            bid.amount_to,
+            ci_to.blocks_confirmed,
+            bid.chain_b_height_start,
+            bid_sender,
+            check_amount=(
+                False if bid.debug_ind == DebugTypes.B_LOCK_TX_MISSED_SEND else True
+            ),
+        )
+
+    def findTxB(
+        self, ci_to, xmr_swap, bid, cursor, bid_sender: bool, lookups=None
+    ) -> bool:
+        bid_changed = False
+
+        found_tx = self.lookupTxB(
+            ci_to,
+            xmr_swap,
+            bid,
+            bid_sender,
+            callLookup if lookups is None else lookups.call,
+        )
 
         if isinstance(found_tx, int) and found_tx == -1:
             if self.countBidEvents(bid, EventLogTypes.LOCK_TX_B_INVALID, cursor) < 1:
@@ -5840,6 +6018,50 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             bid_changed = True
         return bid_changed
 
+    def prefetchXmrBidState(
+        self, bid, ci_from, ci_to, was_sent: bool, was_received: bool, lookups
+    ) -> None:
+        # Makes the lookups checkXmrBidState needs for the bid's current state
+        # without mxDB held. Failed lookups are raised again when replayed.
+        cursor = self.openDBRead()
+        try:
+            xmr_swap = self.queryOne(XmrSwap, cursor, {"bid_id": bid.bid_id})
+        finally:
+            self.closeDBRead(cursor)
+        if xmr_swap is None:
+            return
+
+        state = BidStates(bid.state)
+        if state == BidStates.XMR_SWAP_MSG_SCRIPT_LOCK_SPEND_TX:
+            if bid.xmr_a_lock_tx is None or bid.xmr_a_lock_tx.txid is None:
+                return
+            lookups.prefetch(
+                ci_from.getLockTxHeight,
+                bid.xmr_a_lock_tx.txid,
+                ci_from.getSCLockScriptAddress(xmr_swap.a_lock_tx_script),
+                bid.amount,
+                bid.chain_a_height_start,
+                vout=bid.xmr_a_lock_tx.vout,
+            )
+        elif state in (
+            BidStates.XMR_SWAP_SCRIPT_COIN_LOCKED,
+            BidStates.XMR_SWAP_SCRIPT_TX_PREREFUND,
+        ):
+            self.lookupTxB(ci_to, xmr_swap, bid, was_sent, lookups.prefetch)
+            if bid.xmr_b_lock_tx and bid.xmr_b_lock_tx.chain_height:
+                lookups.prefetch(ci_to.getChainHeight)
+        elif state == BidStates.XMR_SWAP_LOCK_RELEASED:
+            if was_received:
+                lookups.prefetch(ci_from.getMempoolTx, xmr_swap.a_lock_spend_tx_id)
+        elif state in (
+            BidStates.XMR_SWAP_NOSCRIPT_TX_REDEEMED,
+            BidStates.XMR_SWAP_NOSCRIPT_TX_RECOVERED,
+        ):
+            if bid.xmr_b_lock_tx and bid.xmr_b_lock_tx.spend_txid:
+                lookups.prefetch(
+                    ci_to.findTxnByHash, bid.xmr_b_lock_tx.spend_txid.hex()
+                )
+
     def checkXmrBidState(self, bid_id: bytes, bid, offer):
         rv = False
 
@@ -5850,6 +6072,11 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         was_sent: bool = bid.was_received if reverse_bid else bid.was_sent
         was_received: bool = bid.was_sent if reverse_bid else bid.was_received
 
+        # Chain and wallet lookups for the current state are made before mxDB is
+        # taken, so checks of other swaps don't wait on them
+        lookups = PrefetchedLookups()
+        self.prefetchXmrBidState(bid, ci_from, ci_to, was_sent, was_received, lookups)
+
         cursor = None
         try:
             cursor = self.openDB()
@@ -6006,7 +6233,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 if BidStates(bid.state) == BidStates.XMR_SWAP_NOSCRIPT_TX_RECOVERED:
                     txid_hex = bid.xmr_b_lock_tx.spend_txid.hex()
 
-                    found_tx = ci_to.findTxnByHash(txid_hex)
+                    found_tx = lookups.call(ci_to.findTxnByHash, txid_hex)
                     if found_tx is not None:
                         self.log.info(
                             f"Found coin b lock recover tx bid {self.log.id(bid_id)}"
@@ -6107,7 +6334,8 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 a_lock_tx_addr = ci_from.getSCLockScriptAddress(
                     xmr_swap.a_lock_tx_script
                 )
-                lock_tx_chain_info = ci_from.getLockTxHeight(
+                lock_tx_chain_info = lookups.call(
+                    ci_from.getLockTxHeight,
                     bid.xmr_a_lock_tx.txid,
                     a_lock_tx_addr,
                     bid.amount,
@@ -6238,14 +6466,16 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 BidStates.XMR_SWAP_SCRIPT_COIN_LOCKED,
                 BidStates.XMR_SWAP_SCRIPT_TX_PREREFUND,
             ):
-                bid_changed = self.findTxB(ci_to, xmr_swap, bid, cursor, was_sent)
+                bid_changed = self.findTxB(
+                    ci_to, xmr_swap, bid, cursor, was_sent, lookups
+                )
 
                 if (
                     bid.xmr_b_lock_tx
                     and bid.xmr_b_lock_tx.chain_height is not None
                     and bid.xmr_b_lock_tx.chain_height > 0
                 ):
-                    chain_height = ci_to.getChainHeight()
+                    chain_height = lookups.call(ci_to.getChainHeight)
 
                     if bid.debug_ind == DebugTypes.BID_STOP_AFTER_COIN_B_LOCK:
                         self.log.debug(
@@ -6295,7 +6525,9 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
 
                 if was_received:
                     try:
-                        txn_hex = ci_from.getMempoolTx(xmr_swap.a_lock_spend_tx_id)
+                        txn_hex = lookups.call(
+                            ci_from.getMempoolTx, xmr_swap.a_lock_spend_tx_id
+                        )
                         self.log.info(
                             f"Found lock spend txn in {ci_from.coin_name()} mempool, {self.logIDT(xmr_swap.a_lock_spend_tx_id)}"
                         )
@@ -6340,7 +6572,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             elif state == BidStates.XMR_SWAP_NOSCRIPT_TX_REDEEMED:
                 txid_hex = bid.xmr_b_lock_tx.spend_txid.hex()
 
-                found_tx = ci_to.findTxnByHash(txid_hex)
+                found_tx = lookups.call(ci_to.findTxnByHash, txid_hex)
                 if found_tx is not None:
                     self.log.info(
                         f"Found coin b lock spend tx bid {self.log.id(bid_id)}"
@@ -6712,31 +6944,35 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             f"Adding watched transaction {Coins(coin_type).name} bid {self.log.id(bid_id)} tx {self.log.id(txid_hex)} type {tx_type}"
         )
 
-        watched = self.coin_clients[coin_type]["watched_transactions"]
+        with self._mx_watched:
+            watched = self.coin_clients[coin_type]["watched_transactions"]
 
-        for wo in watched:
-            if wo.bid_id == bid_id and wo.txid_hex == txid_hex:
-                self.log.debug("Transaction already being watched.")
-                return
+            for wo in watched:
+                if wo.bid_id == bid_id and wo.txid_hex == txid_hex:
+                    self.log.debug("Transaction already being watched.")
+                    return
 
-        watched.append(
-            WatchedTransaction(bid_id, coin_type, txid_hex, tx_type, swap_type)
-        )
+            watched.append(
+                WatchedTransaction(bid_id, coin_type, txid_hex, tx_type, swap_type)
+            )
 
     def removeWatchedTransaction(self, coin_type, bid_id: bytes, txid_hex: str) -> None:
         # Remove all for bid if txid is None
         self.log.debug(
             f"Removing watched transaction {Coins(coin_type).name} {self.log.id(bid_id)} {self.log.id(txid_hex)}"
         )
-        watched = self.coin_clients[coin_type]["watched_transactions"]
-        old_len = len(watched)
-        for i in range(old_len - 1, -1, -1):
-            wo = watched[i]
-            if wo.bid_id == bid_id and (txid_hex is None or wo.txid_hex == txid_hex):
-                del watched[i]
-                self.log.debug(
-                    f"Removed watched transaction {Coins(coin_type).name} {self.log.id(bid_id)} {self.log.id(wo.txid_hex)}"
-                )
+        with self._mx_watched:
+            watched = self.coin_clients[coin_type]["watched_transactions"]
+            old_len = len(watched)
+            for i in range(old_len - 1, -1, -1):
+                wo = watched[i]
+                if wo.bid_id == bid_id and (
+                    txid_hex is None or wo.txid_hex == txid_hex
+                ):
+                    del watched[i]
+                    self.log.debug(
+                        f"Removed watched transaction {Coins(coin_type).name} {self.log.id(bid_id)} {self.log.id(wo.txid_hex)}"
+                    )
 
     def addWatchedOutput(
         self, coin_type, bid_id, txid_hex, vout, tx_type, swap_type=None
@@ -6745,28 +6981,32 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             f"Adding watched output {Coins(coin_type).name} bid {self.log.id(bid_id)} tx {self.log.id(txid_hex)} type {tx_type}"
         )
 
-        watched = self.coin_clients[coin_type]["watched_outputs"]
-        for wo in watched:
-            if wo.bid_id == bid_id and wo.txid_hex == txid_hex and wo.vout == vout:
-                self.log.debug("Output already being watched.")
-                return
+        with self._mx_watched:
+            watched = self.coin_clients[coin_type]["watched_outputs"]
+            for wo in watched:
+                if wo.bid_id == bid_id and wo.txid_hex == txid_hex and wo.vout == vout:
+                    self.log.debug("Output already being watched.")
+                    return
 
-        watched.append(WatchedOutput(bid_id, txid_hex, vout, tx_type, swap_type))
+            watched.append(WatchedOutput(bid_id, txid_hex, vout, tx_type, swap_type))
 
     def removeWatchedOutput(self, coin_type, bid_id: bytes, txid_hex: str) -> None:
         # Remove all for bid if txid is None
         self.log.debug(
             f"Removing watched output {Coins(coin_type).name} {self.log.id(bid_id)} {self.log.id(txid_hex)}"
         )
-        watched = self.coin_clients[coin_type]["watched_outputs"]
-        old_len = len(watched)
-        for i in range(old_len - 1, -1, -1):
-            wo = watched[i]
-            if wo.bid_id == bid_id and (txid_hex is None or wo.txid_hex == txid_hex):
-                del watched[i]
-                self.log.debug(
-                    f"Removed watched output {Coins(coin_type).name} {self.log.id(bid_id)} {self.log.id(wo.txid_hex)}"
-                )
+        with self._mx_watched:
+            watched = self.coin_clients[coin_type]["watched_outputs"]
+            old_len = len(watched)
+            for i in range(old_len - 1, -1, -1):
+                wo = watched[i]
+                if wo.bid_id == bid_id and (
+                    txid_hex is None or wo.txid_hex == txid_hex
+                ):
+                    del watched[i]
+                    self.log.debug(
+                        f"Removed watched output {Coins(coin_type).name} {self.log.id(bid_id)} {self.log.id(wo.txid_hex)}"
+                    )
 
     def addWatchedScript(
         self, coin_type, bid_id, script: bytes, tx_type, swap_type=None
@@ -6775,13 +7015,18 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             f"Adding watched script {Coins(coin_type).name} bid {self.log.id(bid_id)} type {tx_type}."
         )
 
-        watched = self.coin_clients[coin_type]["watched_scripts"]
-        for ws in watched:
-            if ws.bid_id == bid_id and ws.tx_type == tx_type and ws.script == script:
-                self.log.debug("Script already being watched.")
-                return
+        with self._mx_watched:
+            watched = self.coin_clients[coin_type]["watched_scripts"]
+            for ws in watched:
+                if (
+                    ws.bid_id == bid_id
+                    and ws.tx_type == tx_type
+                    and ws.script == script
+                ):
+                    self.log.debug("Script already being watched.")
+                    return
 
-        watched.append(WatchedScript(bid_id, script, tx_type, swap_type))
+            watched.append(WatchedScript(bid_id, script, tx_type, swap_type))
 
     def removeWatchedScript(
         self, coin_type, bid_id: bytes, script: bytes, tx_type: TxTypes = None
@@ -6794,19 +7039,20 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 (" type " + str(tx_type)) if tx_type is not None else "",
             )
         )
-        watched = self.coin_clients[coin_type]["watched_scripts"]
-        old_len = len(watched)
-        for i in range(old_len - 1, -1, -1):
-            ws = watched[i]
-            if (
-                ws.bid_id == bid_id
-                and (script is None or ws.script == script)
-                and (tx_type is None or ws.tx_type == tx_type)
-            ):
-                del watched[i]
-                self.log.debug(
-                    f"Removed watched script {Coins(coin_type).name} {self.log.id(bid_id)}"
-                )
+        with self._mx_watched:
+            watched = self.coin_clients[coin_type]["watched_scripts"]
+            old_len = len(watched)
+            for i in range(old_len - 1, -1, -1):
+                ws = watched[i]
+                if (
+                    ws.bid_id == bid_id
+                    and (script is None or ws.script == script)
+                    and (tx_type is None or ws.tx_type == tx_type)
+                ):
+                    del watched[i]
+                    self.log.debug(
+                        f"Removed watched script {Coins(coin_type).name} {self.log.id(bid_id)}"
+                    )
 
     def initiateTxnSpent(
         self, bid_id: bytes, spend_txid: str, spend_n: int, spend_txn
@@ -7340,11 +7586,16 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         return False
 
     def updateCheckedBlock(self, ci, cc, block, cursor=None) -> None:
+        self.updateCheckedBlocks(ci, cc, [block], cursor)
+
+    def updateCheckedBlocks(self, ci, cc, blocks, cursor=None) -> None:
+        if len(blocks) < 1:
+            return
         now: int = self.getTime()
         try:
             use_cursor = self.openDB(cursor)
 
-            block_height = int(block["height"])
+            block_height = int(blocks[-1]["height"])
             if cc["last_height_checked"] != block_height:
                 cc["last_height_checked"] = block_height
                 self.setIntKV(
@@ -7353,53 +7604,97 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                     cursor=use_cursor,
                 )
 
+            coin_type: int = int(ci.coin_type())
             query = """INSERT INTO checkedblocks (created_at, coin_type, block_height, block_hash, block_time)
                        VALUES (:now, :coin_type, :block_height, :block_hash, :block_time)"""
-            use_cursor.execute(
+            use_cursor.executemany(
                 query,
-                {
-                    "now": now,
-                    "coin_type": int(ci.coin_type()),
-                    "block_height": block_height,
-                    "block_hash": bytes.fromhex(block["hash"]),
-                    "block_time": int(block["time"]),
-                },
+                [
+                    {
+                        "now": now,
+                        "coin_type": coin_type,
+                        "block_height": int(block["height"]),
+                        "block_hash": bytes.fromhex(block["hash"]),
+                        "block_time": int(block["time"]),
+                    }
+                    for block in blocks
+                ],
             )
 
         finally:
             if cursor is None:
                 self.closeDB(use_cursor)
 
+    def processBlockForWatched(self, coin_type, c, block, chain_blocks: int) -> None:
+        watched = WatchedIndex(c)
+        if watched.empty():
+            return
+        block_hash = block["hash"]
+        for tx in block["tx"]:
+            found = watched.matchTx(tx)
+            if len(found) < 1:
+                continue
+            for match_type, w, n in found:
+                if match_type == "tx":
+                    self.processFoundTransaction(
+                        w, block_hash, block["height"], chain_blocks
+                    )
+                elif match_type == "script":
+                    txid_bytes = bytes.fromhex(tx["txid"])
+                    self.log.debug(
+                        f"Found script from search for bid {self.log.id(w.bid_id)}: {self.logIDT(txid_bytes)} {n}."
+                    )
+                    if w.tx_type == TxTypes.BCH_MERCY:
+                        self.processMercyTx(coin_type, w, txid_bytes, n, tx)
+                    else:
+                        self.processFoundScript(coin_type, w, txid_bytes, n)
+                else:
+                    txid = tx["txid"]
+                    self.log.debug(
+                        f"Found spend from search {self.logIDT(w.txid_hex)} {w.vout} in {self.logIDT(txid)} {n}."
+                    )
+                    self.processSpentOutput(coin_type, w, txid, n, tx)
+            # Processing may add or remove watched entries
+            watched = WatchedIndex(c)
+
     def checkForSpends(self, coin_type, c):
         # assert (self.mxDB.locked())
         self.log.debug(f"checkForSpends {Coins(coin_type).name}.")
 
         # TODO: Check for spends on watchonly txns where possible
         if self.coin_clients[coin_type].get("have_spent_index", False):
-            # TODO: batch getspentinfo
-            for o in c["watched_outputs"]:
-                found_spend = None
-                try:
-                    found_spend = self.callcoinrpc(
-                        Coins.PART,
-                        "getspentinfo",
-                        [{"txid": o.txid_hex, "index": o.vout}],
-                    )
-                except Exception as ex:
-                    if "Unable to get spent info" not in str(ex):
-                        self.log.warning(f"getspentinfo {ex}")
+            ci_part = self.ci(Coins.PART)
+            watched_outputs = list(c["watched_outputs"])
+            spent_infos = ci_part.rpc_batch(
+                [
+                    ("getspentinfo", [{"txid": o.txid_hex, "index": o.vout}])
+                    for o in watched_outputs
+                ],
+                raise_errors=False,
+            )
+            found_spends = []
+            for o, found_spend in zip(watched_outputs, spent_infos):
+                if isinstance(found_spend, Exception):
+                    if "Unable to get spent info" not in str(found_spend):
+                        self.log.warning(f"getspentinfo {found_spend}")
+                    continue
                 if found_spend is not None:
-                    spend_txid = found_spend["txid"]
-                    spend_n = found_spend["index"]
-                    self.log.debug(
-                        f"Found spend in spentindex {self.logIDT(o.txid_hex)} {o.vout} in {self.logIDT(spend_txid)} {spend_n}"
-                    )
-                    spend_txn = self.callcoinrpc(
-                        Coins.PART, "getrawtransaction", [spend_txid, True]
-                    )
-                    self.processSpentOutput(
-                        coin_type, o, spend_txid, spend_n, spend_txn
-                    )
+                    found_spends.append((o, found_spend))
+            if len(found_spends) < 1:
+                return
+            spend_txns = ci_part.rpc_batch(
+                [
+                    ("getrawtransaction", [found_spend["txid"], True])
+                    for _, found_spend in found_spends
+                ]
+            )
+            for (o, found_spend), spend_txn in zip(found_spends, spend_txns):
+                spend_txid = found_spend["txid"]
+                spend_n = found_spend["index"]
+                self.log.debug(
+                    f"Found spend in spentindex {self.logIDT(o.txid_hex)} {o.vout} in {self.logIDT(spend_txid)} {spend_n}"
+                )
+                self.processSpentOutput(coin_type, o, spend_txid, spend_n, spend_txn)
             return
 
         ci = self.ci(coin_type)
@@ -7411,84 +7706,117 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         )
 
         blocks_checked: int = 0
+        prev_block_hash = None
         while last_height_checked < chain_blocks:
             if self.delay_event.is_set():
                 break
-            blocks_checked += 1
-            if blocks_checked % 10000 == 0:
-                self.log.debug(
-                    f"{ci.ticker()} chain_blocks, last_height_checked, blocks_checked {chain_blocks} {last_height_checked} {blocks_checked}."
-                )
-            if blocks_checked > self._max_check_loop_blocks:
+            if blocks_checked >= self._max_check_loop_blocks:
                 self.log.debug(
                     f"Hit max_check_loop_blocks for {ci.ticker()} chain_blocks, last_height_checked {chain_blocks} {last_height_checked}"
                 )
                 break
 
-            block_hash = ci.rpc("getblockhash", [last_height_checked + 1])
-            try:
-                block = ci.getBlockWithTxns(block_hash)
-            except Exception as e:
-                if "Block not available (pruned data)" in str(e):
-                    # TODO: Better solution?
-                    bci = ci.getBlockchainInfo()
-                    pruneheight = bci["pruneheight"]
-                    self.log.error(
-                        f"Coin {ci.coin_name()} last_height_checked {last_height_checked} set to pruneheight {pruneheight}."
-                    )
-                    last_height_checked = pruneheight
-                    continue
-                else:
-                    self.logException(f"getblock error {e}")
-                    break
-
-            if block_check_min_time > block["time"] or last_height_checked < 1:
-                pass
-            elif not self.haveCheckedPrevBlock(ci, c, block):
-                last_height_checked -= 1
-                self.log.debug(
-                    "Have not seen previousblockhash {} for block {}".format(
-                        block["previousblockhash"], block["hash"]
-                    )
-                )
-                continue
+            height_to: int = min(
+                chain_blocks,
+                last_height_checked + self._max_check_loop_blocks - blocks_checked,
+            )
+            rescan: bool = False
+            fetch_error = None
+            with BlockPrefetcher(
+                ci,
+                last_height_checked + 1,
+                height_to,
+                self._block_scan_batch_size,
+                self._block_scan_workers,
+                self._block_scan_prefetch,
+            ) as prefetcher:
+                batches = prefetcher.batches()
+                while not rescan and not self.delay_event.is_set():
+                    try:
+                        blocks = next(batches)
+                    except StopIteration:
+                        break
+                    except Exception as e:
+                        fetch_error = e
+                        break
 
-            for tx in block["tx"]:
-                for t in c["watched_transactions"]:
-                    if t.block_hash is not None:
-                        continue
-                    if tx["txid"] == t.txid_hex:
-                        self.processFoundTransaction(
-                            t, block_hash, block["height"], chain_blocks
-                        )
-                for s in c["watched_scripts"]:
-                    for i, txo in enumerate(tx["vout"]):
-                        if "scriptPubKey" in txo and "hex" in txo["scriptPubKey"]:
-                            # TODO: Optimise by loading rawtx in CTransaction
-                            if bytes.fromhex(txo["scriptPubKey"]["hex"]) == s.script:
-                                txid_bytes = bytes.fromhex(tx["txid"])
-                                self.log.debug(
-                                    f"Found script from search for bid {self.log.id(s.bid_id)}: {self.logIDT(txid_bytes)} {i}."
+                    checked_blocks = []
+                    for block in blocks:
+                        if prev_block_hash is not None:
+                            rescan = block["previousblockhash"] != prev_block_hash
+                        elif (
+                            block_check_min_time > block["time"]
+                            or last_height_checked < 1
+                        ):
+                            pass
+                        elif not self.haveCheckedPrevBlock(ci, c, block):
+                            rescan = True
+                        if rescan:
+                            self.log.debug(
+                                "Have not seen previousblockhash {} for block {}".format(
+                                    block["previousblockhash"], block["hash"]
                                 )
-                                if s.tx_type == TxTypes.BCH_MERCY:
-                                    self.processMercyTx(coin_type, s, txid_bytes, i, tx)
-                                else:
-                                    self.processFoundScript(coin_type, s, txid_bytes, i)
-
-                for o in c["watched_outputs"]:
-                    for i, inp in enumerate(tx["vin"]):
-                        inp_txid = inp.get("txid", None)
-                        if inp_txid is None:  # Coinbase
-                            continue
-                        if inp_txid == o.txid_hex and inp["vout"] == o.vout:
-                            txid = tx["txid"]
+                            )
+                            break
+
+                        self.processBlockForWatched(coin_type, c, block, chain_blocks)
+                        prev_block_hash = block["hash"]
+                        last_height_checked += 1
+                        blocks_checked += 1
+                        checked_blocks.append(block)
+                        if blocks_checked % 10000 == 0:
                             self.log.debug(
-                                f"Found spend from search {self.logIDT(o.txid_hex)} {o.vout} in {self.logIDT(txid)} {i}."
+                                f"{ci.ticker()} chain_blocks, last_height_checked, blocks_checked {chain_blocks} {last_height_checked} {blocks_checked}."
                             )
-                            self.processSpentOutput(coin_type, o, txid, i, tx)
 
-            last_height_checked += 1
-            self.updateCheckedBlock(ci, c, block)
+                    self.updateCheckedBlocks(ci, c, checked_blocks)
+
+            if rescan:
+                # Step back one block at a time until a previously checked block
+                # is found, prefetching resumes from the fork point
+                prev_block_hash = None
+                while not self.delay_event.is_set():
+                    last_height_checked -= 1
+                    blocks_checked += 1
+                    if blocks_checked >= self._max_check_loop_blocks:
+                        break
+                    try:
+                        block_hash = ci.rpc("getblockhash", [last_height_checked + 1])
+                        block = ci.getBlockWithTxns(block_hash)
+                    except Exception as e:
+                        fetch_error = e
+                        break
+                    if (
+                        block_check_min_time <= block["time"]
+                        and last_height_checked >= 1
+                        and not self.haveCheckedPrevBlock(ci, c, block)
+                    ):
+                        self.log.debug(
+                            "Have not seen previousblockhash {} for block {}".format(
+                                block["previousblockhash"], block["hash"]
+                            )
+                        )
+                        continue
+
+                    self.processBlockForWatched(coin_type, c, block, chain_blocks)
+                    self.updateCheckedBlocks(ci, c, [block])
+                    prev_block_hash = block["hash"]
+                    last_height_checked += 1
+                    blocks_checked += 1
+                    break
+
+            if fetch_error is not None:
+                if "Block not available (pruned data)" not in str(fetch_error):
+                    self.logException(f"getblock error {fetch_error}")
+                    break
+                # TODO: Better solution?
+                bci = ci.getBlockchainInfo()
+                pruneheight = bci["pruneheight"]
+                self.log.error(
+                    f"Coin {ci.coin_name()} last_height_checked {last_height_checked} set to pruneheight {pruneheight}."
+                )
+                last_height_checked = pruneheight
+                prev_block_hash = None
 
     def expireMessageRoutes(self) -> None:
         if self._is_locked is True:
@@ -7682,17 +8010,26 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         ).fetchone()
         return q[0]
 
+    def loadQueuedActions(self, cursor) -> None:
+        self._queued_actions.clear()
+        query = "SELECT action_id, trigger_at FROM actions WHERE active_ind = 1"
+        for action_id, trigger_at in cursor.execute(query):
+            self._queued_actions.schedule(action_id, trigger_at)
+
     def checkQueuedActions(self) -> None:
         now: int = self.getTime()
+        # Rows due at the same time are all run below
+        if len(self._queued_actions.popExpired(now)) == 0:
+            return
         reload_in_progress: bool = False
         try:
             cursor = self.openDB()
 
-            query = "SELECT action_type, linked_id FROM actions WHERE active_ind = 1 AND trigger_at <= :now"
+            query = "SELECT action_id, action_type, linked_id FROM actions WHERE active_ind = 1 AND trigger_at <= :now"
             rows = cursor.execute(query, {"now": now}).fetchall()
 
             for row in rows:
-                action_type, linked_id = row
+                _, action_type, linked_id = row
                 accepting_bid: bool = False
                 try:
                     if action_type == ActionTypes.ACCEPT_BID:
@@ -7757,10 +8094,11 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                             bid.setState(BidStates.BID_ERROR, err_msg)
                             self.saveBidInSession(bid_id, bid, cursor)
 
-            query: str = "DELETE FROM actions WHERE trigger_at <= :now"
+            # Actions created while running the above are kept
+            query: str = "DELETE FROM actions WHERE action_id = :action_id"
             if self.debug:
-                query = "UPDATE actions SET active_ind = 2 WHERE trigger_at <= :now"
-            cursor.execute(query, {"now": now})
+                query = "UPDATE actions SET active_ind = 2 WHERE action_id = :action_id"
+            cursor.executemany(query, [{"action_id": row[0]} for row in rows])
 
         except Exception as ex:
             self.handleSessionErrors(ex, cursor, "checkQueuedActions")
@@ -8041,6 +8379,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 )
                 offer.setState(OfferStates.OFFER_RECEIVED)
                 self.add(offer, cursor)
+                self.offerChanged(offer, "added")
 
                 if offer.swap_type == SwapTypes.XMR_SWAP:
                     xmr_offer = XmrOffer()
@@ -8078,6 +8417,11 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 existing_offer.setState(OfferStates.OFFER_RECEIVED)
                 existing_offer.pk_from = pk_from
                 self.add(existing_offer, cursor, upsert=True)
+                if existing_offer.active_ind == 1:
+                    self._expiry_scheduler.schedule(
+                        ("offer", offer_id), existing_offer.expire_at
+                    )
+                    self.addToOrderBook(existing_offer)
             received_on_net: str = networkTypeToID(msg.get("type", "smsg"))
             self.addMessageNetworkLink(
                 Concepts.OFFER,
@@ -8138,6 +8482,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                     "offer_id",
                 ],
             )
+            self.offerChanged(offer, "removed")
         finally:
             self.closeDB(cursor)
 
@@ -10265,7 +10610,8 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         now: int = self.getTime()
         msg_bytes = self.getSmsgMsgBytes(msg)
         msg_data = XmrSplitMessage(init_all=False)
-        msg_data.from_bytes(msg_bytes)
+        # dleag is written to the db as is, no need to copy it out
+        msg_data.from_bytes(msg_bytes, zero_copy=True)
 
         # Validate data
         ensure(len(msg_data.msg_id) == 28, "Bad msg_id length")
@@ -10830,32 +11176,61 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             if self.debug:
                 self.log.error(traceback.format_exc())
 
-    def expireBidsAndOffers(self, now) -> None:
-        bids_to_expire = set()
-        offers_to_expire = set()
-        check_records: bool = False
-
-        for i, (bid_id, expired_at) in enumerate(self._expiring_bids):
-            if expired_at <= now:
-                bids_to_expire.add(bid_id)
-                self._expiring_bids.pop(i)
-        for i, (offer_id, expired_at) in enumerate(self._expiring_offers):
-            if expired_at <= now:
-                offers_to_expire.add(offer_id)
-                self._expiring_offers.pop(i)
+    def loadExpiringBidsAndOffers(self, cursor) -> None:
+        self._expiry_scheduler.clear()
+        query = """SELECT 1, b.bid_id, b.expire_at FROM bids AS b, bidstates AS s WHERE b.active_ind = 1 AND s.state_id = b.state AND s.can_expire
+                   UNION ALL
+                   SELECT 2, offer_id, expire_at FROM offers WHERE active_ind = 1 AND state IN (:offer_received, :offer_sent)
+        """
+        q = cursor.execute(
+            query,
+            {
+                "offer_received": int(OfferStates.OFFER_RECEIVED),
+                "offer_sent": int(OfferStates.OFFER_SENT),
+            },
+        )
+        for entry in q:
+            key = ("bid" if entry[0] == 1 else "offer", entry[1])
+            self._expiry_scheduler.schedule(key, entry[2])
 
-        if (
-            now - self._last_checked_expiring_bids_offers
-            >= self.check_expiring_bids_offers_seconds
-        ):
-            check_records = True
-            self._last_checked_expiring_bids_offers = now
+    def addToOrderBook(self, offer) -> None:
+        # Offers for disabled coins are skipped, as in listOffers
+        try:
+            _ = self.ci(offer.coin_from)
+            _ = self.ci(offer.coin_to)
+        except Exception as e:  # noqa: F841
+            return
+        self._order_book.add(offer)
 
-        if (
-            len(bids_to_expire) == 0
-            and len(offers_to_expire) == 0
-            and check_records is False
+    def loadOrderBook(self, cursor) -> None:
+        self._order_book.clear()
+        for offer in self.query(
+            Offer,
+            cursor,
+            {
+                "active_ind": 1,
+                "state": [
+                    int(OfferStates.OFFER_RECEIVED),
+                    int(OfferStates.OFFER_SENT),
+                ],
+            },
+            query_suffix=" AND expire_at > :now",
+            extra_query_data={"now": self.getTime()},
         ):
+            self.addToOrderBook(offer)
+
+    def expireBidsAndOffers(self, now) -> None:
+        # Records which changed state since being scheduled are skipped by the queries below
+        bids_to_expire = []
+        offers_to_expire = []
+        for record_type, record_id in self._expiry_scheduler.popExpired(now):
+            if record_type == "bid":
+                bids_to_expire.append(record_id)
+            else:
+                offers_to_expire.append(record_id)
+                self._order_book.remove(record_id)
+
+        if len(bids_to_expire) == 0 and len(offers_to_expire) == 0:
             return
 
         bids_expired: int = 0
@@ -10863,39 +11238,13 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         try:
             cursor = self.openDB()
 
-            if check_records:
-                query = """SELECT 1, b.bid_id, b.expire_at FROM bids AS b, bidstates AS s WHERE b.active_ind = 1 AND b.expire_at <= :check_time AND s.state_id = b.state AND s.can_expire
-                           UNION ALL
-                           SELECT 2, offer_id, expire_at FROM offers WHERE active_ind = 1 AND state IN (:offer_received, :offer_sent) AND expire_at <= :check_time
-                """
-                q = cursor.execute(
-                    query,
-                    {
-                        "offer_received": int(OfferStates.OFFER_RECEIVED),
-                        "offer_sent": int(OfferStates.OFFER_SENT),
-                        "check_time": now + self.check_expiring_bids_offers_seconds,
-                    },
-                )
-                for entry in q:
-                    record_id = entry[1]
-                    expire_at = entry[2]
-                    if entry[0] == 1:
-                        if expire_at > now:
-                            self._expiring_bids.append((record_id, expire_at))
-                        else:
-                            bids_to_expire.add(record_id)
-                    elif entry[0] == 2:
-                        if expire_at > now:
-                            self._expiring_offers.append((record_id, expire_at))
-                        else:
-                            offers_to_expire.add(record_id)
-
             for bid_id in bids_to_expire:
-                query = "SELECT b.states FROM bids AS b, bidstates AS s WHERE b.bid_id = :bid_id AND b.active_ind = 1 AND s.state_id = b.state AND s.can_expire"
+                query = "SELECT b.states FROM bids AS b, bidstates AS s WHERE b.bid_id = :bid_id AND b.active_ind = 1 AND b.expire_at <= :now AND s.state_id = b.state AND s.can_expire"
                 rows = cursor.execute(
                     query,
                     {
                         "bid_id": bid_id,
+                        "now": now,
                     },
                 ).fetchall()
                 if len(rows) > 0:
@@ -10910,11 +11259,12 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                     )
                     bids_expired += 1
             for offer_id in offers_to_expire:
-                query = "SELECT states FROM offers WHERE offer_id = :offer_id AND active_ind = 1 AND state IN (:offer_received, :offer_sent)"
+                query = "SELECT states FROM offers WHERE offer_id = :offer_id AND active_ind = 1 AND expire_at <= :now AND state IN (:offer_received, :offer_sent)"
                 rows = cursor.execute(
                     query,
                     {
                         "offer_id": offer_id,
+                        "now": now,
                         "offer_received": int(OfferStates.OFFER_RECEIVED),
                         "offer_sent": int(OfferStates.OFFER_SENT),
                     },
@@ -10944,6 +11294,76 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 f"Expired {bids_expired} bid{mb} and {offers_expired} offer{mo}"
             )
 
+    def startChainNotifier(self) -> None:
+        notifier = None
+        for c in self.activeCoins():
+            chain_client_settings = self.getChainClientSettings(c)
+            address = chain_client_settings.get("zmq_notify_address", None)
+            if address is None or address == "":
+                continue
+            if notifier is None:
+                notifier = ChainNotifier(self.onChainEvent, self.log)
+            if c in (Coins.XMR, Coins.WOW):
+                notifier.addMoneroSubscriber(
+                    c, address, chain_client_settings.get("zmq_notify_txpool", False)
+                )
+            else:
+                notifier.addBitcoinSubscriber(
+                    c,
+                    address,
+                    chain_client_settings.get("zmq_notify_topics", ["hashblock"]),
+                )
+            self.log.info(
+                f"Subscribed to {getCoinName(c)} chain notifications at {address}."
+            )
+        if notifier is not None:
+            self._chain_notifier = notifier
+            self.threads.append(notifier)
+            notifier.start()
+
+    def onChainEvent(self, coin_type, kind: str, data, received_at: float) -> None:
+        # Called from the notifier thread, processed in update()
+        with self._mx_chain_events:
+            self._chain_events.setdefault(coin_type, {}).setdefault(kind, received_at)
+
+    def takeChainEvents(self):
+        with self._mx_chain_events:
+            rv = self._chain_events
+            self._chain_events = {}
+        return rv
+
+    def refreshChainState(self, coin_type) -> None:
+        ci = self.ci(coin_type)
+        cc = self.coin_clients[coin_type]
+        if coin_type in (Coins.XMR, Coins.WOW):
+            new_height = updateXMRChainState(self, coin_type, ci, cc)
+        else:
+            new_height = updateChainState(self, coin_type, ci, cc)
+        if new_height is not None:
+            self.thread_pool.submit(
+                checkAndNotifyBalanceChange, self, coin_type, ci, cc, new_height, "zmq"
+            )
+
+    def logChainEventLatencies(self, chain_events, swaps, states_before) -> None:
+        # Time from a block or txn notification to the bid state changing
+        now: float = time.time()
+        for bid_id, bid, offer in swaps:
+            if bid.state == states_before[bid_id]:
+                continue
+            received = []
+            for c in (offer.coin_from, offer.coin_to):
+                c = self.ci(c).coin_type()
+                for kind, received_at in chain_events.get(c, {}).items():
+                    received.append((received_at, c, kind))
+            if len(received) < 1:
+                continue
+            received_at, c, kind = min(received)
+            latency: float = now - received_at
+            self._chain_event_latencies.append(latency)
+            self.log.info(
+                f"Bid {self.log.id(bid_id)} state changed {latency:.3f}s after {Coins(c).name} {kind} notification."
+            )
+
     def update(self) -> None:
         if self._zmq_queue_enabled and self.zmqSubscriber:
             try:
@@ -10965,17 +11385,57 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         try:
             # TODO: Wait for blocks / txns, would need to check multiple coins
             now: int = self.getTime()
+            if (
+                now - self._last_flushed_notifications
+                >= self.flush_notifications_seconds
+            ):
+                self.flushNotifications()
+                self._last_flushed_notifications = now
+            if now - self._last_flushed_wallets_info >= self.flush_wallets_info_seconds:
+                self.flushWalletsInfo()
+                self._last_flushed_wallets_info = now
             self.expireBidsAndOffers(now)
+            self.checkQueuedActions()
+
+            chain_events = self.takeChainEvents()
+            for c in chain_events:
+                # Refresh wallet info on the next read
+                self._wallets_info_refresh_at.pop(int(c), None)
+            block_coins = [c for c, e in chain_events.items() if "block" in e]
+            for c in block_coins:
+                try:
+                    self.refreshChainState(c)
+                except Exception as e:
+                    self.log.warning(f"refreshChainState {Coins(c).name} {e}")
+            check_progress: bool = (
+                now - self._last_checked_progress >= self.check_progress_seconds
+                or len(block_coins) > 0
+                or (
+                    len(chain_events) > 0
+                    and now - self._last_checked_progress >= self._chain_tx_wake_seconds
+                )
+            )
 
             to_remove = []
-            if now - self._last_checked_progress >= self.check_progress_seconds:
-                for bid_id, v in self.swaps_in_progress.items():
-                    try:
-                        if self.checkBidState(bid_id, v[0], v[1]) is True:
-                            to_remove.append((bid_id, v[0], v[1]))
-                    except Exception as ex:
+            if check_progress:
+                swaps = [(k, v[0], v[1]) for k, v in self.swaps_in_progress.items()]
+                states_before = {bid_id: bid.state for bid_id, bid, _ in swaps}
+                for bid_id, bid, offer, rv in self._bid_check_scheduler.run(
+                    swaps, self.checkBidState
+                ):
+                    if rv is True:
+                        to_remove.append((bid_id, bid, offer))
+                    elif isinstance(rv, Exception):
+                        ex = rv
                         if self.debug:
-                            self.log.error("checkBidState %s", traceback.format_exc())
+                            self.log.error(
+                                "checkBidState %s",
+                                "".join(
+                                    traceback.format_exception(
+                                        type(ex), ex, ex.__traceback__
+                                    )
+                                ),
+                            )
                         if self.is_transient_error(ex):
                             self.log.warning(
                                 f"checkBidState {self.log.id(bid_id)} {ex}."
@@ -10988,13 +11448,18 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                             )
                         else:
                             self.log.error(f"checkBidState {self.log.id(bid_id)} {ex}.")
-                            self.setBidError(bid_id, v[0], str(ex))
+                            self.setBidError(bid_id, bid, str(ex))
 
+                if len(chain_events) > 0:
+                    self.logChainEventLatencies(chain_events, swaps, states_before)
                 for bid_id, bid, offer in to_remove:
                     self.deactivateBid(None, offer, bid)
                 self._last_checked_progress = now
 
-            if now - self._last_checked_watched >= self.check_watched_seconds:
+            check_watched: bool = (
+                now - self._last_checked_watched >= self.check_watched_seconds
+            )
+            if check_watched or len(block_coins) > 0:
                 for k, c in self.coin_clients.items():
                     if (
                         k == Coins.PART_ANON
@@ -11002,9 +11467,12 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                         or k == Coins.LTC_MWEB
                     ):
                         continue
+                    if not check_watched and k not in block_coins:
+                        continue
                     if len(c["watched_outputs"]) > 0 or len(c["watched_scripts"]):
                         self.checkForSpends(k, c)
-                self._last_checked_watched = now
+                if check_watched:
+                    self._last_checked_watched = now
 
             if now - self._last_checked_expired >= self.check_expired_seconds:
                 self.expireMessages()
@@ -11058,10 +11526,6 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                         self.log.addHandler(stream_fp)
                         self.log.info("Log file rotated.")
 
-            if now - self._last_checked_actions >= self.check_actions_seconds:
-                self.checkQueuedActions()
-                self._last_checked_actions = now
-
             if (
                 now - self._last_checked_split_messages
                 >= self.check_split_messages_seconds
@@ -11587,6 +12051,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             return rv
         except Exception as e:
             self.log.warning(f"getWalletInfo failed with: {e}.")
+            raise
 
     def getWalletInfo(self, coin):
         ci = self.ci(coin)
@@ -11644,42 +12109,124 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             return rv
         except Exception as e:
             self.log.warning(f"getWalletInfo for {ci.coin_name()} failed with: {e}.")
+            raise
+
+    def loadWalletsInfo(self) -> dict:
+        # Returns the wallets info snapshot, read from the db on first use
+        wallets_info = self._wallets_info
+        if wallets_info is not None:
+            return wallets_info
+        wallets_info = {}
+        cursor = self.openDBRead()
+        try:
+            inner_str = "SELECT coin_id, balance_type, MAX(created_at) as max_created_at FROM wallets GROUP BY coin_id, balance_type"
+            query_str = f"SELECT a.coin_id, a.balance_type, wallet_data, created_at FROM wallets a, ({inner_str}) b WHERE a.coin_id = b.coin_id AND a.balance_type = b.balance_type AND a.created_at = b.max_created_at"
+            for row in cursor.execute(query_str):
+                wallets_info.setdefault(row[0], {})[row[1]] = (
+                    json.loads(row[2]),
+                    row[3],
+                )
 
-    def addWalletInfoRecord(self, coin, info_type, wi) -> None:
+            # Ensure the latest addresses are displayed
+            coin_names = {}
+            for coin_id in wallets_info:
+                if coin_id in chainparams:
+                    coin_names[chainparams[coin_id]["name"]] = coin_id
+            q = cursor.execute(
+                "SELECT key, value FROM kv_string WHERE key LIKE 'receive_addr_%' OR key LIKE 'stealth_addr_%'"
+            )
+            for row in q:
+                addr_type, coin_name = row[0].split("_addr_", 1)
+                coin_id = coin_names.get(coin_name, None)
+                entry = wallets_info.get(coin_id, {}).get(1, None)
+                if entry is None:
+                    continue
+                if addr_type == "stealth":
+                    name = "mweb_address" if coin_id == Coins.LTC else "stealth_address"
+                else:
+                    name = "deposit_address"
+                entry[0][name] = row[1]
+        finally:
+            self.closeDBRead(cursor)
+
+        with self._mx_wallets_info:
+            if self._wallets_info is None:
+                self._wallets_info = wallets_info
+            return self._wallets_info
+
+    def setCachedWalletInfo(self, coin, info_type: int, wallet_data) -> None:
+        # info_type: 0 chain, 1 wallet. wallet_data: None to remove
         coin_id = int(coin)
-        cursor = self.openDB()
+        wallets_info = self.loadWalletsInfo()
+        with self._mx_wallets_info:
+            if wallet_data is None:
+                wallets_info.get(coin_id, {}).pop(info_type, None)
+            else:
+                wallets_info.setdefault(coin_id, {})[info_type] = (
+                    wallet_data,
+                    self.getTime(),
+                )
+            self._wallets_info_dirty.add((coin_id, info_type))
+
+    def updateCachedWalletAddress(self, coin, name: str, addr: str) -> None:
+        coin_id = int(coin)
+        wallets_info = self.loadWalletsInfo()
+        with self._mx_wallets_info:
+            entry = wallets_info.get(coin_id, {}).get(1, None)
+            if entry is None:
+                return
+            wallets_info[coin_id][1] = (dict(entry[0], **{name: addr}), entry[1])
+            self._wallets_info_dirty.add((coin_id, 1))
+
+    def flushWalletsInfo(self) -> None:
+        # Write changed entries to the db, only read back at startup
+        with self._mx_wallets_info:
+            if len(self._wallets_info_dirty) == 0:
+                return
+            dirty = self._wallets_info_dirty
+            self._wallets_info_dirty = set()
+            remove_rows = []
+            insert_rows = []
+            for coin_id, info_type in dirty:
+                remove_rows.append((coin_id, info_type))
+                entry = self._wallets_info.get(coin_id, {}).get(info_type, None)
+                if entry is not None:
+                    insert_rows.append(
+                        (coin_id, info_type, json.dumps(entry[0]), entry[1])
+                    )
         try:
-            now: int = self.getTime()
-            self.add(
-                Wallets(
-                    coin_id=coin,
-                    balance_type=info_type,
-                    wallet_data=json.dumps(wi),
-                    created_at=now,
-                ),
-                cursor,
-            )
-            query_str = "DELETE FROM wallets WHERE (coin_id = :coin_id AND balance_type = :info_type) AND record_id NOT IN (SELECT record_id FROM wallets WHERE coin_id = :coin_id AND balance_type = :info_type ORDER BY created_at DESC LIMIT 3 )"
-            cursor.execute(query_str, {"coin_id": coin_id, "info_type": info_type})
-            self.commitDB()
+            cursor = self.openDB()
+            try:
+                cursor.executemany(
+                    "DELETE FROM wallets WHERE coin_id = ? AND balance_type = ?",
+                    remove_rows,
+                )
+                cursor.executemany(
+                    "INSERT INTO wallets (coin_id, balance_type, wallet_data, created_at) VALUES (?, ?, ?, ?)",
+                    insert_rows,
+                )
+                self.commitDB()
+            finally:
+                self.closeDB(cursor, commit=False)
         except Exception as e:
-            self.log.error(f"addWalletInfoRecord {e}.")
-        finally:
-            self.closeDB(cursor, commit=False)
+            self.log.error(f"flushWalletsInfo {e}.")
+            with self._mx_wallets_info:
+                self._wallets_info_dirty.update(dirty)
 
     def updateWalletInfo(self, coin) -> None:
-        # Store wallet info to db so it's available after startup
         try:
             bi = self.getBlockchainInfo(coin)
             if bi:
-                self.addWalletInfoRecord(coin, 0, bi)
+                self.setCachedWalletInfo(coin, 0, bi)
 
             # monero-wallet-rpc is slow/unresponsive while syncing
             wi = self.getWalletInfo(coin)
             if wi:
-                self.addWalletInfoRecord(coin, 1, wi)
+                self.setCachedWalletInfo(coin, 1, wi)
+            self._wallets_info_errors.pop(int(coin), None)
         except Exception as e:
             self.log.error(f"updateWalletInfo {e}.")
+            self._wallets_info_errors[int(coin)] = str(e)
         finally:
             self._updating_wallets_info[int(coin)] = False
 
@@ -11689,29 +12236,48 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         only_coin: bool = None,
         wait_for_complete: bool = False,
     ) -> None:
+        # Starts a refresh for each coin past its deadline, readers get the
+        # current snapshot while the refresh runs unless wait_for_complete is set.
+        # Chain events for a coin clear its deadline.
         now: int = self.getTime()
-        if not force_update and now - self._last_updated_wallets_info < 30:
-            return
+        with self._mx_wallets_info:
+            if self._wallets_info_pool is None:
+                # Not shared with thread_pool, one worker per coin so a slow
+                # wallet doesn't delay the others
+                self._wallets_info_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=max(1, len(list(self.activeCoins()))),
+                    thread_name_prefix="bswi",
+                )
+        handles = []
         for c in Coins:
             if only_coin is not None and c != only_coin:
                 continue
             if c not in chainparams:
                 continue
             cc = self.coin_clients[c]
-            if cc["connection_type"] == "rpc":
-                if (
-                    not force_update
-                    and now - cc.get("last_updated_wallet_info", 0) < 30
-                ):
-                    return
-                cc["last_updated_wallet_info"] = self.getTime()
-                self._updating_wallets_info[int(c)] = True
-                handle = self.thread_pool.submit(self.updateWalletInfo, c)
-                if wait_for_complete:
-                    try:
-                        handle.result(timeout=self._wallet_update_timeout)
-                    except Exception as e:
-                        self.log.error(f"updateWalletInfo {e}.")
+            if cc["connection_type"] != "rpc":
+                continue
+            coin_id = int(c)
+            if not force_update and (
+                now < self._wallets_info_refresh_at.get(coin_id, 0)
+                or self._updating_wallets_info.get(coin_id, False)
+            ):
+                continue
+            self._wallets_info_refresh_at[coin_id] = (
+                now + self.wallets_info_refresh_seconds
+            )
+            self._updating_wallets_info[coin_id] = True
+            handle = self._wallets_info_pool.submit(self.updateWalletInfo, c)
+            if wait_for_complete:
+                handles.append(handle)
+        if len(handles) > 0:
+            _, not_done = concurrent.futures.wait(
+                handles, timeout=self._wallet_update_timeout
+            )
+            if len(not_done) > 0:
+                self.log.error(
+                    f"updateWalletsInfo {len(not_done)} coins timed out after {self._wallet_update_timeout}s."
+                )
 
     def getWalletsInfo(self, opts=None):
         rv = {}
@@ -11725,62 +12291,40 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         return rv
 
     def getCachedWalletsInfo(self, opts=None):
+        # with_error: Add the last refresh error, if the latest refresh failed
         rv = {}
-        try:
-            cursor = self.openDB()
-            query_data: dict = {}
-            where_str = ""
-            if opts is not None and "coin_id" in opts:
-                where_str = "WHERE coin_id = :coin_id"
-                query_data["coin_id"] = opts["coin_id"]
-            inner_str = f"SELECT coin_id, balance_type, MAX(created_at) as max_created_at FROM wallets {where_str} GROUP BY coin_id, balance_type"
-            query_str = f"SELECT a.coin_id, a.balance_type, wallet_data, created_at FROM wallets a, ({inner_str}) b WHERE a.coin_id = b.coin_id AND a.balance_type = b.balance_type AND a.created_at = b.max_created_at"
-
-            q = cursor.execute(query_str, query_data)
-            for row in q:
-                coin_id = row[0]
-
-                if self.isCoinActive(coin_id) is False:
+        wallets_info = self.loadWalletsInfo()
+        only_coin_id = None if opts is None else opts.get("coin_id", None)
+        with_error: bool = False if opts is None else opts.get("with_error", False)
+        with self._mx_wallets_info:
+            for coin_id, entries in wallets_info.items():
+                if only_coin_id is not None and coin_id != int(only_coin_id):
+                    continue
+                if len(entries) == 0 or self.isCoinActive(coin_id) is False:
                     # Skip cached info if coin was disabled
                     continue
-
-                wallet_data = json.loads(row[2])
-                if row[1] == 1:
-                    wallet_data["lastupdated"] = row[3]
-                    wallet_data["updating"] = self._updating_wallets_info.get(
-                        coin_id, False
-                    )
-
-                    # Ensure the latest addresses are displayed
-                    coin_name: str = chainparams[coin_id]["name"]
-                    c2 = self.getNewDBCursor()
-                    q2 = c2.execute(
-                        "SELECT key, value FROM kv_string WHERE key = ? OR key = ?",
-                        (f"receive_addr_{coin_name}", f"stealth_addr_{coin_name}"),
-                    )
-                    for row2 in q2:
-                        if row2[0].startswith("stealth"):
-                            if coin_id == Coins.LTC:
-                                wallet_data["mweb_address"] = row2[1]
-                            else:
-                                wallet_data["stealth_address"] = row2[1]
-                        else:
-                            wallet_data["deposit_address"] = row2[1]
-                    c2.close()
-
-                if coin_id in rv:
-                    rv[coin_id].update(wallet_data)
-                else:
-                    rv[coin_id] = wallet_data
-        finally:
-            self.closeDB(cursor)
-
-        if opts is not None and "coin_id" in opts:
-            return rv
+                wallet_data = {}
+                for info_type in sorted(entries.keys()):
+                    data, created_at = entries[info_type]
+                    wallet_data.update(data)
+                    if info_type == 1:
+                        wallet_data["lastupdated"] = created_at
+                        wallet_data["updating"] = self._updating_wallets_info.get(
+                            coin_id, False
+                        )
+                rv[coin_id] = wallet_data
 
         for c in self.activeCoins():
             coin_id = int(c)
-            if coin_id not in rv:
+            if only_coin_id is not None and coin_id != int(only_coin_id):
+                continue
+            error = self._wallets_info_errors.get(coin_id, None) if with_error else None
+            if coin_id in rv:
+                if error is not None:
+                    rv[coin_id]["error"] = error
+            elif error is not None:
+                rv[coin_id] = {"name": getCoinName(c), "error": error}
+            elif only_coin_id is None:
                 rv[coin_id] = {
                     "name": getCoinName(c),
                     "no_data": True,
@@ -11790,7 +12334,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         return rv
 
     def countAcceptedBids(self, offer_id: bytes = None) -> int:
-        cursor = self.openDB()
+        cursor = self.openDBRead()
         try:
             query: str = "SELECT COUNT(*) FROM bids WHERE state >= :state_ind"
             query_data: dict = {"state_ind": int(BidStates.BID_ACCEPTED)}
@@ -11801,10 +12345,43 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             q = cursor.execute(query, query_data).fetchone()
             return q[0]
         finally:
-            self.closeDB(cursor, commit=False)
+            self.closeDBRead(cursor)
 
-    def listOffers(self, sent: bool = False, filters={}):
-        cursor = self.openDB()
+    def getOrderBook(
+        self,
+        coin_from: int,
+        coin_to: int,
+        min_rate: int = None,
+        max_rate: int = None,
+        limit: int = None,
+        include_sent: bool = True,
+    ) -> list:
+        # Unexpired active offers for the pair from memory, lowest rate first
+        return self._order_book.getOffers(
+            coin_from, coin_to, self.getTime(), min_rate, max_rate, limit, include_sent
+        )
+
+    def getOrderBookPairs(self) -> dict:
+        return self._order_book.getPairs()
+
+    def listOffers(self, sent: bool = False, filters={}, with_extra_info: bool = False):
+        # with_extra_info: Returns (offer, xmr_offer, strategy_id) tuples, the
+        # xmr_offers row and the active automation strategy are joined in the query.
+        return self.listOffersPage(sent, filters, with_extra_info)[0]
+
+    def listOffersPage(
+        self, sent: bool = False, filters={}, with_extra_info: bool = False
+    ):
+        # Returns (rows, next_cursor)
+        # If filters["cursor"] is set ("" for the first page) rows start after
+        # the cursor and next_cursor is None on the last page.
+        keyset: bool = filters.get("cursor", None) is not None
+        if keyset:
+            ensure(
+                filters.get("offset", None) is None,
+                "Can't page by both cursor and offset",
+            )
+        cursor = self.openDBRead()
         try:
             rv = []
             now: int = self.getTime()
@@ -11812,42 +12389,57 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             query_suffix: str = ""
             query_data: dict = {"now": now}
 
+            # Unary + keeps sqlite from picking the expire_at indices over the
+            # ones matching the sort order, which would sort every matching row.
             if sent:
-                query_suffix += " AND was_sent = 1"
+                query_suffix += " AND offers.was_sent = 1"
 
                 active_state = filters.get("active", "any")
                 if active_state == "active":
-                    query_suffix += " AND (expire_at > :now AND active_ind = 1)"
+                    query_suffix += (
+                        " AND (+offers.expire_at > :now AND offers.active_ind = 1)"
+                    )
                 elif active_state == "expired":
-                    query_suffix += " AND expire_at <= :now"
+                    query_suffix += " AND +offers.expire_at <= :now"
                 elif active_state == "revoked":
-                    query_suffix += " AND active_ind != 1"
+                    query_suffix += " AND offers.active_ind != 1"
             else:
-                query_suffix += " AND (expire_at > :now AND active_ind = 1)"
+                query_suffix += (
+                    " AND (+offers.expire_at > :now AND offers.active_ind = 1)"
+                )
 
             filter_offer_id = filters.get("offer_id", None)
             if filter_offer_id is not None:
-                query_suffix += " AND offer_id = :filter_offer_id"
+                query_suffix += " AND offers.offer_id = :filter_offer_id"
                 query_data["filter_offer_id"] = filter_offer_id
             filter_coin_from = filters.get("coin_from", None)
             if filter_coin_from and filter_coin_from > -1:
-                query_suffix += " AND coin_from = :filter_coin_from"
+                query_suffix += " AND offers.coin_from = :filter_coin_from"
                 query_data["filter_coin_from"] = int(filter_coin_from)
             filter_coin_to = filters.get("coin_to", None)
             if filter_coin_to and filter_coin_to > -1:
-                query_suffix += " AND coin_to = :filter_coin_to"
+                query_suffix += " AND offers.coin_to = :filter_coin_to"
                 query_data["filter_coin_to"] = int(filter_coin_to)
 
             filter_include_sent = filters.get("include_sent", None)
             if filter_include_sent is not None and filter_include_sent is not True:
-                query_suffix += " AND was_sent = 0"
+                query_suffix += " AND offers.was_sent = 0"
 
             filter_auto_accept_type = filters.get("auto_accept_type", None)
             if filter_auto_accept_type and filter_auto_accept_type != "any":
-                query_suffix += " AND auto_accept_type = :filter_auto_accept_type"
+                query_suffix += (
+                    " AND offers.auto_accept_type = :filter_auto_accept_type"
+                )
                 query_data["filter_auto_accept_type"] = int(filter_auto_accept_type)
 
-            query_suffix += getOrderByStr(filters)
+            cursor_str, cursor_data = getPageCursorStr(
+                filters, "offer_id", table_name="offers"
+            )
+            query_suffix += cursor_str
+            query_data.update(cursor_data)
+            query_suffix += getOrderByStr(
+                filters, table_name="offers", id_column="offer_id"
+            )
 
             limit = filters.get("limit", None)
             if limit is not None:
@@ -11858,21 +12450,64 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 query_suffix += " OFFSET :offset"
                 query_data["offset"] = offset
 
-            q = self.query(
-                Offer, cursor, query_suffix=query_suffix, extra_query_data=query_data
-            )
+            if with_extra_info:
+                q = self.queryOffersWithExtraInfo(cursor, query_suffix, query_data)
+            else:
+                q = self.query(
+                    Offer,
+                    cursor,
+                    query_suffix=query_suffix,
+                    extra_query_data=query_data,
+                )
+            num_rows: int = 0
+            offer = None
             for row in q:
-                offer = row
+                num_rows += 1
+                offer = row[0] if with_extra_info else row
                 # Show offers for enabled coins only
                 try:
                     _ = self.ci(offer.coin_from)
                     _ = self.ci(offer.coin_to)
                 except Exception as e:  # noqa: F841
                     continue
-                rv.append(offer)
-            return rv
+                rv.append(row)
+
+            next_cursor = None
+            if keyset and limit is not None and num_rows >= limit:
+                sort_by, _ = getSortFromFilters(filters)
+                next_cursor = makePageCursor(
+                    filters, getattr(offer, sort_by), offer.offer_id
+                )
+            return rv, next_cursor
         finally:
-            self.closeDB(cursor, commit=False)
+            self.closeDBRead(cursor)
+
+    def queryOffersWithExtraInfo(self, cursor, query_suffix: str, query_data: dict):
+        offer_schema = getTableSchema(Offer)
+        num_offer_cols: int = len(offer_schema.column_names)
+        query: str = (
+            "SELECT "
+            + ", ".join("offers." + c for c in offer_schema.column_names)
+            + ", xmr_offers.swap_id, xmr_offers.a_fee_rate, xmr_offers.b_fee_rate, xmr_offers.lock_time_1, xmr_offers.lock_time_2"
+            + ", (SELECT links.strategy_id FROM automationlinks links WHERE links.linked_type = :offer_type AND links.linked_id = offers.offer_id AND links.active_ind = 1 LIMIT 1)"
+            + " FROM offers LEFT JOIN xmr_offers ON xmr_offers.offer_id = offers.offer_id"
+            + " WHERE 1=1 "
+            + query_suffix
+        )
+        query_data = dict(query_data, offer_type=int(Concepts.OFFER))
+        for row in cursor.execute(query, query_data):
+            offer = offer_schema.fromRow(row)
+            xmr_offer = None
+            if row[num_offer_cols] is not None:
+                xmr_offer = XmrOffer(
+                    swap_id=row[num_offer_cols],
+                    offer_id=offer.offer_id,
+                    a_fee_rate=row[num_offer_cols + 1],
+                    b_fee_rate=row[num_offer_cols + 2],
+                    lock_time_1=row[num_offer_cols + 3],
+                    lock_time_2=row[num_offer_cols + 4],
+                )
+            yield offer, xmr_offer, row[num_offer_cols + 5]
 
     def activeBidsQueryStr(
         self, offer_table: str = "offers", bids_table: str = "bids"
@@ -11891,7 +12526,27 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         for_html: bool = False,
         filters={},
     ):
-        cursor = self.openDB()
+        return self.listBidsPage(sent, offer_id, for_html, filters)[0]
+
+    def listBidsPage(
+        self,
+        sent: bool = False,
+        offer_id: bytes = None,
+        for_html: bool = False,
+        filters={},
+    ):
+        # Returns (rows, next_cursor), see listOffersPage
+        keyset: bool = filters.get("cursor", None) is not None
+        if keyset:
+            ensure(
+                filters.get("sort_by", "created_at") == "created_at",
+                "Can only page by cursor when sorting by created_at",
+            )
+            ensure(
+                filters.get("offset", None) is None,
+                "Can't page by both cursor and offset",
+            )
+        cursor = self.openDBRead()
         try:
             rv = []
             now: int = self.getTime()
@@ -11907,7 +12562,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             query_str: str = (
                 "SELECT "
                 + "bids.created_at, bids.expire_at, bids.bid_id, bids.offer_id, bids.amount, bids.state, bids.was_received, "
-                + "tx1.state, tx2.state, offers.coin_from, bids.rate, bids.bid_addr, offers.bid_reversed, bids.amount_to, offers.coin_to "
+                + "tx1.state, tx2.state, offers.coin_from, bids.rate, bids.bid_addr, offers.bid_reversed, bids.amount_to, offers.coin_to, offers.addr_to "
                 + "FROM bids "
                 + "LEFT JOIN offers ON offers.offer_id = bids.offer_id "
                 + "LEFT JOIN transactions AS tx1 ON tx1.bid_id = bids.bid_id AND tx1.tx_type = CASE WHEN offers.swap_type = :ads_swap THEN :al_type ELSE :itx_type END "
@@ -11941,11 +12596,17 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 query_str += " AND " + self.activeBidsQueryStr()
             else:
                 if with_expired is not True:
+                    # Unary + as in listOffersPage
                     query_str += (
-                        "AND bids.expire_at > :now AND offers.expire_at > :now "
+                        "AND +bids.expire_at > :now AND offers.expire_at > :now "
                     )
 
-            query_str += getOrderByStr(filters, table_name="bids")
+            cursor_str, cursor_data = getPageCursorStr(
+                filters, "bid_id", table_name="bids"
+            )
+            query_str += cursor_str
+            query_data.update(cursor_data)
+            query_str += getOrderByStr(filters, table_name="bids", id_column="bid_id")
 
             limit = filters.get("limit", None)
             if limit is not None:
@@ -11957,7 +12618,10 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 query_data["offset"] = offset
 
             q = cursor.execute(query_str, query_data)
+            num_rows: int = 0
+            row = None
             for row in q:
+                num_rows += 1
                 result = [x for x in row]
                 coin_from = result[9]
                 coin_to = result[14]
@@ -11975,9 +12639,13 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                     result[10] = ci_from.make_int(amount_to / amount_from, r=1)
 
                 rv.append(result)
-            return rv
+
+            next_cursor = None
+            if keyset and limit is not None and num_rows >= limit:
+                next_cursor = makePageCursor(filters, row[0], row[2])
+            return rv, next_cursor
         finally:
-            self.closeDB(cursor, commit=False)
+            self.closeDBRead(cursor)
 
     def listSwapsInProgress(self, for_html=False):
         self.mxDB.acquire()
@@ -12091,7 +12759,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
 
     def listAutomationStrategies(self, filters={}):
         try:
-            cursor = self.openDB()
+            cursor = self.openDBRead()
             rv = []
 
             query_str: str = (
@@ -12121,14 +12789,14 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
                 rv.append(row)
             return rv
         finally:
-            self.closeDB(cursor, commit=False)
+            self.closeDBRead(cursor)
 
     def getAutomationStrategy(self, strategy_id: int):
         try:
-            cursor = self.openDB()
+            cursor = self.openDBRead()
             return self.queryOne(AutomationStrategy, cursor, {"record_id": strategy_id})
         finally:
-            self.closeDB(cursor, commit=False)
+            self.closeDBRead(cursor)
 
     def updateAutomationStrategy(self, strategy_id: int, data: dict) -> None:
         self.log.debug(f"updateAutomationStrategy {strategy_id}.")
@@ -12168,7 +12836,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
 
     def getLinkedStrategy(self, linked_type: int, linked_id):
         try:
-            cursor = self.openDB()
+            cursor = self.openDBRead()
             query_str = (
                 "SELECT links.strategy_id, strats.label FROM automationlinks links"
                 + " LEFT JOIN automationstrategies strats ON strats.record_id = links.strategy_id"
@@ -12178,7 +12846,7 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
             q = cursor.execute(query_str, query_data).fetchone()
             return q
         finally:
-            self.closeDB(cursor, commit=False)
+            self.closeDBRead(cursor)
 
     def newSMSGAddress(
         self, use_type=AddressTypes.RECV_OFFER, addressnote=None, cursor=None
@@ -12278,6 +12946,8 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         use_cursor = self.openDB(cursor)
         try:
             mode = "-" if active_ind == 0 else "+"
+            if active_ind == 0:
+                self._recipient_keys.remove(address)
             rv = self.callrpc("smsglocalkeys", ["recv", mode, address])
             if "not found" in rv["result"]:
                 self.callrpc(
@@ -13002,8 +13672,13 @@ class BasicSwap(BaseApp, BSXNetwork, UIApp):
         if client is None:
             return
         self.log.debug(f'ws_client_left {client["id"]}')
+        if self.ws_topics:
+            self.ws_topics.clientLeft(client["id"])
 
     def ws_message_received(self, client, server, message):
-        if len(message) > 200:
-            message = message[:200] + ".."
-        self.log.debug(f'ws_message_received {client["id"]} {message}')
+        log_message = message
+        if len(log_message) > 200:
+            log_message = log_message[:200] + ".."
+        self.log.debug(f'ws_message_received {client["id"]} {log_message}')
+        if self.ws_topics:
+            self.ws_topics.handleMessage(client, message)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2025 The Basicswap developers
+# Distributed under the MIT software license, see the accompanying
+# file LICENSE or http://www.opensource.org/licenses/mit-license.php.
+
+import concurrent.futures
+import threading
+
+
+class BidCheckScheduler:
+    # Runs the per bid state checks of a progress pass on a worker pool.
+    # A bid is only checked by one worker at a time and at most coin_limit
+    # checks involving the same coin run concurrently.
+
+    def __init__(self, num_workers: int = 4, coin_limit: int = 2):
+        self._num_workers = max(1, num_workers)
+        self._coin_limit = max(1, coin_limit)
+        self._executor = None
+        self._mx = threading.Lock()
+        self._bid_locks = {}
+        self._coin_semaphores = {}
+
+    def shutdown(self) -> None:
+        with self._mx:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _getExecutor(self):
+        with self._mx:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self._num_workers, thread_name_prefix="bidcheck"
+                )
+            return self._executor
+
+    def _getBidLock(self, bid_id: bytes):
+        with self._mx:
+            return self._bid_locks.setdefault(bid_id, threading.Lock())
+
+    def _getCoinSemaphore(self, coin_type):
+        with self._mx:
+            return self._coin_semaphores.setdefault(
+                int(coin_type), threading.BoundedSemaphore(self._coin_limit)
+            )
+
+    def _check(self, check_func, bid_id: bytes, bid, offer):
+        # Acquire in coin order so bids sharing coins can't deadlock
+        coins = sorted({int(offer.coin_from), int(offer.coin_to)})
+        semaphores = [self._getCoinSemaphore(c) for c in coins]
+        with self._getBidLock(bid_id):
+            for s in semaphores:
+                s.acquire()
+            try:
+                return check_func(bid_id, bid, offer)
+            finally:
+                for s in reversed(semaphores):
+                    s.release()
+
+    def run(self, swaps, check_func):
+        # swaps: [(bid_id, bid, offer), ...]
+        # Returns [(bid_id, bid, offer, result), ...] in the same order, result is
+        # the value returned by check_func or the exception it raised.
+        with self._mx:
+            active_ids = {s[0] for s in swaps}
+            for bid_id in [k for k in self._bid_locks if k not in active_ids]:
+                del self._bid_locks[bid_id]
+
+        rv = []
+        if self._num_workers < 2 or len(swaps) < 2:
+            for bid_id, bid, offer in swaps:
+                try:
+                    result = self._check(check_func, bid_id, bid, offer)
+                except Exception as e:
+                    result = e
+                rv.append((bid_id, bid, offer, result))
+            return rv
+
+        executor = self._getExecutor()
+        futures = [(s, executor.submit(self._check, check_func, *s)) for s in swaps]
+        for (bid_id, bid, offer), f in futures:
+            try:
+                result = f.result()
+            except Exception as e:
+                result = e
+            rv.append((bid_id, bid, offer, result))
+        return rv
+
+
+class PrefetchedLookups:
+    # Results of chain and wallet lookups made before a bid check takes mxDB.
+    # call() returns the stored result for a lookup with the same function and
+    # arguments, other lookups are made directly.
+
+    def __init__(self):
+        self._results = {}
+
+    @staticmethod
+    def _key(func, args, kwargs):
+        try:
+            key = (
+                id(getattr(func, "__self__", None)),
+                func.__name__,
+                args,
+                tuple(sorted(kwargs.items())),
+            )
+            hash(key)
+            return key
+        except TypeError:
+            return None
+
+    def prefetch(self, func, *args, **kwargs) -> None:
+        key = self._key(func, args, kwargs)
+        if key is None:
+            return
+        try:
+            self._results[key] = (True, func(*args, **kwargs))
+        except Exception as e:
+            self._results[key] = (False, e)
+
+    def call(self, func, *args, **kwargs):
+        key = self._key(func, args, kwargs)
+        found = None if key is None else self._results.pop(key, None)
+        if found is None:
+            return func(*args, **kwargs)
+        succeeded, result = found
+        if not succeeded:
+            raise result
+        return result
+
+
+def callLookup(func, *args, **kwargs):
+    # Makes a lookup directly, see PrefetchedLookups.call
+    return func(*args, **kwargs)
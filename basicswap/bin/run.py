@@ -219,7 +219,7 @@ def startXmrDaemon(node_dir, bin_dir, daemon_bin, opts=[]):
     )
 
 
-def startXmrWalletDaemon(node_dir, bin_dir, wallet_bin, opts=[]):
+def startXmrWalletDaemon(node_dir, bin_dir, wallet_bin, opts=[], log_prefix="wallet"):
     daemon_path = os.path.expanduser(os.path.join(bin_dir, wallet_bin))
     args = [daemon_path]
 
@@ -268,8 +268,8 @@ def startXmrWalletDaemon(node_dir, bin_dir, wallet_bin, opts=[]):
     logger.debug("Arguments {}".format(" ".join(args)))
 
     # TODO: return subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=data_dir)
-    wallet_stdout = open(os.path.join(data_dir, "wallet_stdout.log"), "w")
-    wallet_stderr = open(os.path.join(data_dir, "wallet_stderr.log"), "w")
+    wallet_stdout = open(os.path.join(data_dir, f"{log_prefix}_stdout.log"), "w")
+    wallet_stderr = open(os.path.join(data_dir, f"{log_prefix}_stderr.log"), "w")
     return Daemon(
         subprocess.Popen(
             args,
@@ -499,6 +499,27 @@ def runClient(
                     pid = daemons[-1].handle.pid
                     swap_client.log.info(f"Started {filename} {pid}")
 
+                    # Extra wallet-rpc processes used to check swap wallets in parallel
+                    for port in v.get("watch_wallet_rpc_ports", []):
+                        log_prefix: str = f"wallet_{port}"
+                        worker_opts = opts + [
+                            "--rpc-bind-port",
+                            str(port),
+                            "--log-file",
+                            os.path.join(v["datadir"], log_prefix + ".log"),
+                        ]
+                        daemons.append(
+                            startXmrWalletDaemon(
+                                v["datadir"],
+                                v["bindir"],
+                                filename,
+                                worker_opts,
+                                log_prefix=log_prefix,
+                            )
+                        )
+                        pid = daemons[-1].handle.pid
+                        swap_client.log.info(f"Started {filename} {pid} port {port}")
+
                 continue  # /monero
 
             if c == "decred":
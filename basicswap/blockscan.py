@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2025 The Basicswap developers
+# Distributed under the MIT software license, see the accompanying
+# file LICENSE or http://www.opensource.org/licenses/mit-license.php.
+
+import collections
+import concurrent.futures
+
+
+class WatchedIndex:
+    # Hash lookups for the watched lists of a coin client, built once per block
+    __slots__ = ("transactions", "scripts", "outputs")
+
+    def __init__(self, cc):
+        self.transactions = {}
+        self.scripts = {}
+        self.outputs = {}
+        for t in cc["watched_transactions"]:
+            if t.block_hash is not None:
+                continue
+            self.transactions.setdefault(t.txid_hex, []).append(t)
+        for s in cc["watched_scripts"]:
+            self.scripts.setdefault(s.script, []).append(s)
+        for o in cc["watched_outputs"]:
+            self.outputs.setdefault((o.txid_hex, o.vout), []).append(o)
+
+    def empty(self) -> bool:
+        return (
+            len(self.transactions) == 0
+            and len(self.scripts) == 0
+            and len(self.outputs) == 0
+        )
+
+    def matchTx(self, tx):
+        # Returns a list of (kind, watched, n) for tx, kind is one of "tx", "script" or "spend"
+        found = []
+        if len(self.transactions) > 0:
+            for t in self.transactions.get(tx["txid"], ()):
+                found.append(("tx", t, None))
+        if len(self.scripts) > 0:
+            for i, txo in enumerate(tx["vout"]):
+                script_hex = txo.get("scriptPubKey", {}).get("hex", None)
+                if script_hex is None:
+                    continue
+                for s in self.scripts.get(bytes.fromhex(script_hex), ()):
+                    found.append(("script", s, i))
+        if len(self.outputs) > 0:
+            for i, inp in enumerate(tx["vin"]):
+                inp_txid = inp.get("txid", None)
+                if inp_txid is None:  # Coinbase
+                    continue
+                for o in self.outputs.get((inp_txid, inp["vout"]), ()):
+                    found.append(("spend", o, i))
+        return found
+
+
+class BlockPrefetcher:
+    # Yields blocks in height order, fetched in batches on a worker pool.
+    # At most max_pending batches are in flight or waiting to be consumed.
+
+    def __init__(
+        self,
+        ci,
+        height_from: int,
+        height_to: int,
+        batch_size: int = 20,
+        num_workers: int = 2,
+        max_pending: int = 4,
+    ):
+        self._ci = ci
+        self._next_height = height_from
+        self._height_to = height_to
+        self._batch_size = max(1, batch_size)
+        self._max_pending = max(1, max_pending)
+        self._pending = collections.deque()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, num_workers), thread_name_prefix="bscan"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self) -> None:
+        for f in self._pending:
+            f.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=True)
+
+    def _fetchBatch(self, heights):
+        block_hashes = self._ci.getBlockHashes(heights)
+        return self._ci.getBlocksWithTxns(block_hashes)
+
+    def _fill(self) -> None:
+        while (
+            len(self._pending) < self._max_pending
+            and self._next_height <= self._height_to
+        ):
+            batch_end = min(self._next_height + self._batch_size, self._height_to + 1)
+            heights = list(range(self._next_height, batch_end))
+            self._pending.append(self._executor.submit(self._fetchBatch, heights))
+            self._next_height = batch_end
+
+    def batches(self):
+        self._fill()
+        while len(self._pending) > 0:
+            f = self._pending.popleft()
+            blocks = f.result()
+            self._fill()
+            yield blocks
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2025 The Basicswap developers
+# Distributed under the MIT software license, see the accompanying
+# file LICENSE or http://www.opensource.org/licenses/mit-license.php.
+
+import json
+import threading
+import time
+import zmq
+
+
+MONERO_BLOCK_TOPIC = "json-minimal-chain_main"
+MONERO_TX_TOPIC = "json-minimal-txpool_add"
+
+
+class ChainNotifier(threading.Thread):
+    # Receives block and transaction announcements from coin daemon zmq publishers.
+    # on_event(coin_type, kind, data, received_at) is called from this thread,
+    # kind is "block" or "tx".
+
+    def __init__(self, on_event, log, poll_timeout_ms: int = 500):
+        super().__init__(name="chainnotify")
+        self._on_event = on_event
+        self._log = log
+        self._poll_timeout_ms = poll_timeout_ms
+        self._stop_event = threading.Event()
+        self._context = zmq.Context()
+        self._poller = zmq.Poller()
+        self._sockets = {}
+
+    def _addSocket(self, coin_type, address: str, topics, is_monero: bool) -> None:
+        socket = self._context.socket(zmq.SUB)
+        for topic in topics:
+            socket.setsockopt_string(zmq.SUBSCRIBE, topic)
+        socket.connect(address)
+        self._poller.register(socket, zmq.POLLIN)
+        self._sockets[socket] = (coin_type, is_monero)
+
+    def addBitcoinSubscriber(self, coin_type, address: str, topics=("hashblock",)):
+        # zmqpubhashblock, zmqpubhashtx or zmqpubrawtx of a bitcoind derived daemon
+        for topic in topics:
+            if topic not in ("hashblock", "hashtx", "rawtx"):
+                raise ValueError(f"Unknown zmq topic {topic}")
+        self._addSocket(coin_type, address, topics, False)
+
+    def addMoneroSubscriber(self, coin_type, address: str, with_txpool=False):
+        # monerod --zmq-pub
+        topics = [MONERO_BLOCK_TOPIC]
+        if with_txpool:
+            topics.append(MONERO_TX_TOPIC)
+        self._addSocket(coin_type, address, topics, True)
+
+    def numSubscribers(self) -> int:
+        return len(self._sockets)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    @staticmethod
+    def parseBitcoinMessage(frames):
+        topic = frames[0]
+        if topic == b"hashblock":
+            return "block", frames[1].hex()
+        if topic == b"hashtx":
+            return "tx", frames[1].hex()
+        if topic == b"rawtx":
+            return "tx", None
+        return None, None
+
+    @staticmethod
+    def parseMoneroMessage(frames):
+        topic, _, body = frames[0].decode("utf-8").partition(":")
+        if topic == MONERO_BLOCK_TOPIC:
+            data = json.loads(body)
+            return "block", data["first_height"] + len(data["ids"]) - 1
+        if topic == MONERO_TX_TOPIC:
+            return "tx", None
+        return None, None
+
+    def run(self) -> None:
+        try:
+            while not self._stop_event.is_set():
+                for socket, _ in self._poller.poll(self._poll_timeout_ms):
+                    received_at = time.time()
+                    coin_type, is_monero = self._sockets[socket]
+                    try:
+                        frames = socket.recv_multipart(flags=zmq.NOBLOCK)
+                        if is_monero:
+                            kind, data = self.parseMoneroMessage(frames)
+                        else:
+                            kind, data = self.parseBitcoinMessage(frames)
+                        if kind is not None:
+                            self._on_event(coin_type, kind, data, received_at)
+                    except zmq.Again:
+                        pass
+                    except Exception as e:
+                        self._log.warning(f"Chain notification {coin_type} {e}")
+        finally:
+            for socket in self._sockets:
+                socket.close(linger=0)
+            self._context.term()
@@ -5,15 +5,20 @@
 # Distributed under the MIT software license, see the accompanying
 # file LICENSE or http://www.opensource.org/licenses/mit-license.php.
 
+import base64
 import inspect
+import json
+import queue
 import sqlite3
+import threading
 import time
+import urllib.request
 
 from enum import IntEnum, auto
 from typing import Optional
 
 
-CURRENT_DB_VERSION = 32
+CURRENT_DB_VERSION = 34
 CURRENT_DB_DATA_VERSION = 7
 
 
@@ -54,18 +59,68 @@ def validColumnName(name: str) -> bool:
     return True
 
 
-def getOrderByStr(
-    filters: dict, default_sort_by: str = "created_at", table_name: str = ""
-):
+def getSortFromFilters(filters: dict, default_sort_by: str = "created_at"):
     sort_by = filters.get("sort_by", default_sort_by)
     if not validColumnName(sort_by):
         raise ValueError("Invalid sort by")
-    if table_name != "":
-        sort_by = table_name + "." + sort_by
     sort_dir = filters.get("sort_dir", "DESC").upper()
     if sort_dir not in ("ASC", "DESC"):
         raise ValueError("Invalid sort dir")
-    return f" ORDER BY {sort_by} {sort_dir}"
+    return sort_by, sort_dir
+
+
+def getOrderByStr(
+    filters: dict,
+    default_sort_by: str = "created_at",
+    table_name: str = "",
+    id_column: str = None,
+):
+    # id_column: Unique column to order rows with the same sort value by
+    sort_by, sort_dir = getSortFromFilters(filters, default_sort_by)
+    prefix: str = "" if table_name == "" else table_name + "."
+    rv: str = f" ORDER BY {prefix}{sort_by} {sort_dir}"
+    if id_column is not None:
+        rv += f", {prefix}{id_column} {sort_dir}"
+    return rv
+
+
+def makePageCursor(
+    filters: dict, sort_value, record_id: bytes, default_sort_by: str = "created_at"
+) -> str:
+    # Returns an opaque token for the position after the row
+    sort_by, sort_dir = getSortFromFilters(filters, default_sort_by)
+    data = json.dumps([sort_by, sort_dir, sort_value, record_id.hex()])
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("utf-8").rstrip("=")
+
+
+def getPageCursorStr(
+    filters: dict,
+    id_column: str,
+    default_sort_by: str = "created_at",
+    table_name: str = "",
+):
+    # Returns the condition selecting rows after filters["cursor"] and its parameters.
+    # Pair with getOrderByStr(filters, ..., id_column=id_column)
+    cursor = filters.get("cursor", None)
+    if cursor is None or cursor == "":
+        return "", {}
+    sort_by, sort_dir = getSortFromFilters(filters, default_sort_by)
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        cursor_sort_by, cursor_sort_dir, sort_value, record_id = data
+        record_id = bytes.fromhex(record_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort_by != sort_by or cursor_sort_dir != sort_dir:
+        raise ValueError("Cursor sort order differs")
+    if not isinstance(sort_value, (int, float, str)) or isinstance(sort_value, bool):
+        raise ValueError("Invalid cursor")
+    prefix: str = "" if table_name == "" else table_name + "."
+    op: str = "<" if sort_dir == "DESC" else ">"
+    return (
+        f" AND ({prefix}{sort_by}, {prefix}{id_column}) {op} (:cursor_sort_value, :cursor_record_id)",
+        {"cursor_sort_value": sort_value, "cursor_record_id": record_id},
+    )
 
 
 def pack_state(new_state: int, now: int) -> bytes:
@@ -81,10 +136,10 @@ class Table:
                 raise ValueError(f"Unknown attribute {name}")
             setattr(self, name, value)
         # Init any unset columns to None
-        for mc in inspect.getmembers(self):
-            mc_name, mc_obj = mc
-            if hasattr(mc_obj, "__sqlite3_column__"):
-                setattr(self, mc_name, None)
+        d = self.__dict__
+        for name in getTableSchema(type(self)).column_names:
+            if name not in d:
+                d[name] = None
 
     def isSet(self, field: str):
         io = getattr(self, field)
@@ -135,6 +190,95 @@ class Index:
         self.column_3 = column_3
 
 
+class TableSchema:
+    # Column metadata and SQL for a Table subclass, built once on first use
+    __slots__ = (
+        "table_class",
+        "table_name",
+        "column_names",
+        "bool_indices",
+        "select_str",
+        "_insert_strs",
+        "_update_strs",
+    )
+
+    def __init__(self, table_class):
+        self.table_class = table_class
+        self.table_name = getattr(table_class, "__tablename__", None)
+        columns = [
+            (mc_name, mc_obj.column_type)
+            for mc_name, mc_obj in inspect.getmembers(table_class)
+            if hasattr(mc_obj, "__sqlite3_column__")
+        ]
+        self.column_names = tuple(c[0] for c in columns)
+        self.bool_indices = tuple(i for i, c in enumerate(columns) if c[1] == "bool")
+        self.select_str = (
+            "SELECT "
+            + ", ".join(self.column_names)
+            + f" FROM {self.table_name} WHERE 1=1 "
+        )
+        self._insert_strs = {}
+        self._update_strs = {}
+
+    def getSetValues(self, obj) -> dict:
+        # Columns set in the instance
+        d = obj.__dict__
+        return {name: d[name] for name in self.column_names if name in d}
+
+    def insertStr(self, keys: tuple, upsert: bool) -> str:
+        cache_key = (keys, upsert)
+        query = self._insert_strs.get(cache_key, None)
+        if query is not None:
+            return query
+
+        query = f"INSERT INTO {self.table_name} ("
+        query += ", ".join(keys)
+        query += ")  VALUES (" + ", ".join(":" + key for key in keys) + ")"
+        if upsert:
+            for key in keys:
+                if not validColumnName(key):
+                    raise ValueError(f"Invalid column: {key}")
+            query += " ON CONFLICT DO UPDATE SET "
+            query += ", ".join(f"{key}=:{key}" for key in keys)
+        self._insert_strs[cache_key] = query
+        return query
+
+    def updateStr(self, keys: tuple, constraints: tuple) -> str:
+        cache_key = (keys, constraints)
+        query = self._update_strs.get(cache_key, None)
+        if query is not None:
+            return query
+
+        query = f"UPDATE {self.table_name} SET "
+        query += ", ".join(f"{key} = :{key}" for key in keys if key not in constraints)
+        query += " WHERE 1=1 "
+        for ck in constraints:
+            query += f" AND {ck} = :{ck} "
+        self._update_strs[cache_key] = query
+        return query
+
+    def fromRow(self, row):
+        obj = self.table_class.__new__(self.table_class)
+        d = obj.__dict__
+        d.update(zip(self.column_names, row))
+        for i in self.bool_indices:
+            value = row[i]
+            if value is not None:
+                d[self.column_names[i]] = False if value == 0 else True
+        return obj
+
+
+_table_schemas = {}
+
+
+def getTableSchema(table_class) -> TableSchema:
+    schema = _table_schemas.get(table_class, None)
+    if schema is None:
+        schema = TableSchema(table_class)
+        _table_schemas[table_class] = schema
+    return schema
+
+
 class DBKVInt(Table):
     __tablename__ = "kv_int"
 
@@ -200,6 +344,19 @@ class Offer(Table):
     state = Column("integer")
     states = Column("blob")  # Packed states and times
 
+    index = Index("offers_active_expire_index", "active_ind", "expire_at")
+    index_expire = Index("offers_expire_index", "expire_at")
+    # Keyset pagination
+    index_active_created = Index(
+        "offers_active_created_index", "active_ind", "created_at", "offer_id"
+    )
+    index_active_rate = Index(
+        "offers_active_rate_index", "active_ind", "rate", "offer_id"
+    )
+    index_sent_created = Index(
+        "offers_sent_created_index", "was_sent", "created_at", "offer_id"
+    )
+
     def setState(self, new_state):
         now = int(time.time())
         self.state = new_state
@@ -269,6 +426,12 @@ class Bid(Table):
 
     txns = {}
 
+    index = Index("bids_offer_index", "offer_id")
+    index_active_expire = Index("bids_active_expire_index", "active_ind", "expire_at")
+    index_active_created = Index(
+        "bids_active_created_index", "active_ind", "created_at", "bid_id"
+    )
+
     def getITxState(self):
         if self.isSet("initiate_tx") is False:
             return None
@@ -356,6 +519,8 @@ class PrefundedTx(Table):
     tx_data = Column("blob")
     used_by = Column("blob")
 
+    index = Index("prefunded_transactions_linked_index", "linked_type", "linked_id")
+
 
 class PooledAddress(Table):
     __tablename__ = "addresspool"
@@ -366,6 +531,8 @@ class PooledAddress(Table):
     bid_id = Column("blob")
     tx_type = Column("integer")
 
+    index = Index("addresspool_bid_index", "bid_id")
+
 
 class SentOffer(Table):
     __tablename__ = "sentoffers"
@@ -398,6 +565,9 @@ class Action(Table):
     action_type = Column("integer")
     action_data = Column("blob")
 
+    index = Index("actions_trigger_index", "trigger_at")
+    index_linked = Index("actions_linked_index", "linked_id")
+
 
 class EventLog(Table):
     __tablename__ = "eventlog"
@@ -428,6 +598,8 @@ class XmrOffer(Table):
     # Delay before the follower can spend from the chain a lock refund tx
     lock_time_2 = Column("integer")
 
+    index = Index("xmr_offers_offer_index", "offer_id")
+
 
 class XmrSwap(Table):
     __tablename__ = "xmr_swaps"
@@ -493,6 +665,8 @@ class XmrSwap(Table):
 
     msg_split_info = Column("string")
 
+    index = Index("xmr_swaps_bid_index", "bid_id")
+
     def getMsgSplitInfo(self):
         if self.msg_split_info is None:
             return 16000, 17000
@@ -536,6 +710,8 @@ class Wallets(Table):
     balance_type = Column("integer")
     created_at = Column("integer")
 
+    index = Index("wallets_coin_index", "coin_id", "balance_type", "created_at")
+
 
 class KnownIdentity(Table):
     __tablename__ = "knownidentities"
@@ -606,6 +782,8 @@ class History(Table):
     changed_data = Column("blob")
     created_at = Column("integer")
 
+    index = Index("history_concept_index", "concept_type", "concept_id")
+
 
 class BidState(Table):
     __tablename__ = "bidstates"
@@ -635,6 +813,8 @@ class Notification(Table):
     event_type = Column("integer")
     event_data = Column("blob")
 
+    index = Index("notifications_active_index", "active_ind", "created_at")
+
 
 class MessageLink(Table):
     __tablename__ = "message_links"
@@ -651,6 +831,8 @@ class MessageLink(Table):
     msg_sequence = Column("integer")
     msg_id = Column("blob")
 
+    index = Index("message_links_linked_index", "linked_type", "linked_id", "msg_type")
+
 
 class CheckedBlock(Table):
     __tablename__ = "checkedblocks"
@@ -662,6 +844,9 @@ class CheckedBlock(Table):
     block_hash = Column("blob")
     block_time = Column("integer")
 
+    index = Index("checkedblocks_hash_index", "block_hash")
+    index_created = Index("checkedblocks_created_index", "created_at")
+
 
 class CoinRates(Table):
     __tablename__ = "coinrates"
@@ -718,6 +903,8 @@ class MessageNetworkLink(Table):
     link_type = Column("integer")  # MessageNetworkLinkTypes
     created_at = Column("integer")
 
+    index = Index("message_network_links_linked_index", "linked_type", "linked_id")
+
 
 class DirectMessageRoute(Table):
     __tablename__ = "direct_message_routes"
@@ -745,6 +932,8 @@ class DirectMessageRouteLink(Table):
     linked_id = Column("blob")
     created_at = Column("integer")
 
+    index = Index("direct_message_route_links_linked_index", "linked_type", "linked_id")
+
 
 class NetworkPortal(Table):
     __tablename__ = "network_portals"
@@ -931,7 +1120,45 @@ def create_db(db_path: str, log) -> None:
             con.close()
 
 
+def set_connection_pragmas(con, cache_size_kb: int, mmap_size: int) -> None:
+    con.execute("PRAGMA synchronous = NORMAL")
+    con.execute(f"PRAGMA cache_size = {-int(cache_size_kb)}")
+    con.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    con.execute("PRAGMA busy_timeout = 10000")
+
+
+_db_read_pool_init_lock = threading.Lock()
+
+
 class DBMethods:
+    # Connections are kept open, writes are serialised behind mxDB.
+    # Read only queries can run concurrently on the pool of reader connections.
+    _db_con = None
+    _db_read_pool = None
+    _db_num_read_connections = 4
+    _db_cache_size_kb = 16 * 1024
+    _db_mmap_size = 64 * 1024 * 1024
+    _after_commit = None  # Callbacks for the open write transaction
+
+    def _usePersistentFile(self) -> bool:
+        return self.sqlite_file != ":memory:" and not self.sqlite_file.startswith(
+            "file:"
+        )
+
+    def _connectDB(self):
+        con = sqlite3.connect(self.sqlite_file, check_same_thread=False)
+        if self._usePersistentFile():
+            con.execute("PRAGMA journal_mode = WAL")
+            set_connection_pragmas(con, self._db_cache_size_kb, self._db_mmap_size)
+        return con
+
+    def _connectDBRead(self):
+        uri: str = "file:" + urllib.request.pathname2url(self.sqlite_file) + "?mode=ro"
+        con = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        set_connection_pragmas(con, self._db_cache_size_kb, self._db_mmap_size)
+        con.execute("PRAGMA query_only = 1")
+        return con
+
     def openDB(self, cursor=None):
         if cursor:
             # assert(self._thread_debug == threading.get_ident())
@@ -939,9 +1166,14 @@ class DBMethods:
             return cursor
 
         self.mxDB.acquire()
-        # self._thread_debug = threading.get_ident()
-        self._db_con = sqlite3.connect(self.sqlite_file)
-        return self._db_con.cursor()
+        try:
+            # self._thread_debug = threading.get_ident()
+            if self._db_con is None:
+                self._db_con = self._connectDB()
+            return self._db_con.cursor()
+        except Exception:
+            self.mxDB.release()
+            raise
 
     def getNewDBCursor(self):
         assert self.mxDB.locked()
@@ -950,10 +1182,33 @@ class DBMethods:
     def commitDB(self):
         assert self.mxDB.locked()
         self._db_con.commit()
+        self._runAfterCommit(self._takeAfterCommit())
 
     def rollbackDB(self):
         assert self.mxDB.locked()
         self._db_con.rollback()
+        self._after_commit = None
+
+    def afterCommit(self, fn) -> None:
+        # Runs fn once the open write transaction is committed, dropped on rollback
+        assert self.mxDB.locked()
+        if self._after_commit is None:
+            self._after_commit = []
+        self._after_commit.append(fn)
+
+    def _takeAfterCommit(self):
+        fns = self._after_commit
+        self._after_commit = None
+        return fns
+
+    def _runAfterCommit(self, fns) -> None:
+        if fns is None:
+            return
+        for fn in fns:
+            try:
+                fn()
+            except Exception as e:
+                self.log.error(f"afterCommit callback failed: {e}")
 
     def closeDBCursor(self, cursor):
         assert self.mxDB.locked()
@@ -963,12 +1218,69 @@ class DBMethods:
     def closeDB(self, cursor, commit=True):
         assert self.mxDB.locked()
 
-        if commit:
-            self._db_con.commit()
-
-        cursor.close()
-        self._db_con.close()
-        self.mxDB.release()
+        after_commit = None
+        try:
+            if commit:
+                self._db_con.commit()
+                after_commit = self._after_commit
+            else:
+                # Uncommitted changes were discarded when the connection was closed
+                self._db_con.rollback()
+            cursor.close()
+        finally:
+            self._after_commit = None
+            self.mxDB.release()
+            # Outside mxDB so callbacks can't block other writers
+            self._runAfterCommit(after_commit)
+
+    def openDBRead(self):
+        # Returns a cursor on a read only connection, does not take mxDB
+        if self._db_num_read_connections < 1 or not self._usePersistentFile():
+            return self.openDB()
+        if self._db_read_pool is None:
+            with _db_read_pool_init_lock:
+                if self._db_read_pool is None:
+                    self._db_read_pool_sem = threading.BoundedSemaphore(
+                        self._db_num_read_connections
+                    )
+                    self._db_read_pool = queue.LifoQueue()
+        self._db_read_pool_sem.acquire()
+        try:
+            try:
+                con = self._db_read_pool.get(block=False)
+            except queue.Empty:
+                con = self._connectDBRead()
+            return con.cursor()
+        except Exception:
+            self._db_read_pool_sem.release()
+            raise
+
+    def closeDBRead(self, cursor):
+        if self._db_read_pool is None or cursor.connection is self._db_con:
+            self.closeDB(cursor, commit=False)
+            return
+        con = cursor.connection
+        try:
+            cursor.close()
+            if con.in_transaction:
+                con.rollback()
+            self._db_read_pool.put(con)
+        except Exception:
+            con.close()
+        finally:
+            self._db_read_pool_sem.release()
+
+    def closeDBConnections(self) -> None:
+        with self.mxDB:
+            if self._db_read_pool is not None:
+                while True:
+                    try:
+                        self._db_read_pool.get(block=False).close()
+                    except queue.Empty:
+                        break
+            if self._db_con is not None:
+                self._db_con.close()
+                self._db_con = None
 
     def setIntKV(self, str_key: str, int_val: int, cursor=None) -> None:
         try:
@@ -1064,43 +1376,10 @@ class DBMethods:
             raise ValueError("Cursor is null")
         if not hasattr(obj, "__tablename__"):
             raise ValueError("Adding invalid object")
-        table_name: str = obj.__tablename__
-
-        values = {}
-        query: str = f"INSERT INTO {table_name} ("
-
-        # See if the instance overwrote any class methods
-        for mc in inspect.getmembers(obj.__class__):
-            mc_name, mc_obj = mc
-
-            if not hasattr(mc_obj, "__sqlite3_column__"):
-                continue
-
-            m_obj = getattr(obj, mc_name)
-
-            # Column is not set in instance
-            if hasattr(m_obj, "__sqlite3_column__"):
-                continue
-
-            values[mc_name] = m_obj
+        schema = getTableSchema(obj.__class__)
 
-        query_values: str = " VALUES ("
-        for i, key in enumerate(values):
-            if i > 0:
-                query += ", "
-                query_values += ", "
-            query += key
-            query_values += ":" + key
-        query += ") " + query_values + ")"
-
-        if upsert:
-            query += " ON CONFLICT DO UPDATE SET "
-            for i, key in enumerate(values):
-                if not validColumnName(key):
-                    raise ValueError(f"Invalid column: {key}")
-                if i > 0:
-                    query += ", "
-                query += f"{key}=:{key}"
+        values = schema.getSetValues(obj)
+        query: str = schema.insertStr(tuple(values.keys()), upsert)
 
         cursor.execute(query, values)
         return cursor.lastrowid
@@ -1118,21 +1397,7 @@ class DBMethods:
             raise ValueError("Cursor is null")
         if not hasattr(table_class, "__tablename__"):
             raise ValueError("Querying invalid class")
-        table_name: str = table_class.__tablename__
-
-        query: str = "SELECT "
-        columns = []
-
-        for mc in inspect.getmembers(table_class):
-            mc_name, mc_obj = mc
-            if not hasattr(mc_obj, "__sqlite3_column__"):
-                continue
-            if len(columns) > 0:
-                query += ", "
-            query += mc_name
-            columns.append((mc_name, mc_obj.column_type))
-
-        query += f" FROM {table_name} WHERE 1=1 "
+        query: str = getTableSchema(table_class).select_str
 
         query_data = {}
         for ck in constraints:
@@ -1174,16 +1439,9 @@ class DBMethods:
 
         query_data.update(extra_query_data)
         rows = cursor.execute(query, query_data)
+        from_row = getTableSchema(table_class).fromRow
         for row in rows:
-            obj = table_class()
-            for i, column_info in enumerate(columns):
-                colname, coltype = column_info
-                value = row[i]
-                if coltype == "bool":
-                    if row[i] is not None:
-                        value = False if row[i] == 0 else True
-                setattr(obj, colname, value)
-            yield obj
+            yield from_row(row)
 
     def queryOne(
         self,
@@ -1210,34 +1468,9 @@ class DBMethods:
             raise ValueError("Cursor is null")
         if not hasattr(obj, "__tablename__"):
             raise ValueError("Updating invalid obj")
-        table_name: str = obj.__tablename__
-
-        query: str = f"UPDATE {table_name} SET "
-
-        values = {}
-        for mc in inspect.getmembers(obj.__class__):
-            mc_name, mc_obj = mc
+        schema = getTableSchema(obj.__class__)
 
-            if not hasattr(mc_obj, "__sqlite3_column__"):
-                continue
-
-            m_obj = getattr(obj, mc_name)
-            # Column is not set in instance
-            if hasattr(m_obj, "__sqlite3_column__"):
-                continue
-
-            if mc_name in constraints:
-                values[mc_name] = m_obj
-                continue
-
-            if len(values) > 0:
-                query += ", "
-            query += f"{mc_name} = :{mc_name}"
-            values[mc_name] = m_obj
-
-        query += " WHERE 1=1 "
-
-        for ck in constraints:
-            query += f" AND {ck} = :{ck} "
+        values = schema.getSetValues(obj)
+        query: str = schema.updateStr(tuple(values.keys()), tuple(constraints))
 
         cursor.execute(query, values)
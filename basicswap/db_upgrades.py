@@ -198,7 +198,7 @@ def upgradeDatabaseFromSchema(self, cursor, expect_schema):
                     else:
                         raise RuntimeError("Add more index columns.")
             if origin == "c":
-                if "indices" not in table:
+                if "indices" not in have_table:
                     have_table["indices"] = []
                 have_table["indices"].append(add_index)
 
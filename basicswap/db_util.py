@@ -4,83 +4,240 @@
 # Distributed under the MIT software license, see the accompanying
 # file LICENSE or http://www.opensource.org/licenses/mit-license.php.
 
+import threading
+import time
+
 from .db import (
     Concepts,
 )
 
 
-def remove_expired_data(self, time_offset: int = 0):
+# table, query, run against the ids in temp.expired_bids
+remove_bid_queries = [
+    (
+        "transactions",
+        "DELETE FROM transactions WHERE bid_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "eventlog",
+        "DELETE FROM eventlog WHERE linked_type = :type_ind AND linked_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "automationlinks",
+        "DELETE FROM automationlinks WHERE linked_type = :type_ind AND linked_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "prefunded_transactions",
+        "DELETE FROM prefunded_transactions WHERE linked_type = :type_ind AND linked_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "history",
+        "DELETE FROM history WHERE concept_type = :type_ind AND concept_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "xmr_swaps",
+        "DELETE FROM xmr_swaps WHERE bid_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "actions",
+        "DELETE FROM actions WHERE linked_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "addresspool",
+        "DELETE FROM addresspool WHERE bid_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "xmr_split_data",
+        "DELETE FROM xmr_split_data WHERE bid_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "bids",
+        "DELETE FROM bids WHERE bid_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "message_links",
+        "DELETE FROM message_links WHERE linked_type = :type_ind AND linked_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "direct_message_route_links",
+        "DELETE FROM direct_message_route_links WHERE linked_type = :type_ind AND linked_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+    (
+        "message_network_links",
+        "DELETE FROM message_network_links WHERE linked_type = :type_ind AND linked_id IN (SELECT bid_id FROM temp.expired_bids)",
+    ),
+]
+
+# table, query, run against the ids in temp.expired_offers
+remove_offer_queries = [
+    (
+        "eventlog",
+        "DELETE FROM eventlog WHERE linked_type = :type_ind AND linked_id IN (SELECT offer_id FROM temp.expired_offers)",
+    ),
+    (
+        "automationlinks",
+        "DELETE FROM automationlinks WHERE linked_type = :type_ind AND linked_id IN (SELECT offer_id FROM temp.expired_offers)",
+    ),
+    (
+        "prefunded_transactions",
+        "DELETE FROM prefunded_transactions WHERE linked_type = :type_ind AND linked_id IN (SELECT offer_id FROM temp.expired_offers)",
+    ),
+    (
+        "history",
+        "DELETE FROM history WHERE concept_type = :type_ind AND concept_id IN (SELECT offer_id FROM temp.expired_offers)",
+    ),
+    (
+        "xmr_offers",
+        "DELETE FROM xmr_offers WHERE offer_id IN (SELECT offer_id FROM temp.expired_offers)",
+    ),
+    (
+        "sentoffers",
+        "DELETE FROM sentoffers WHERE offer_id IN (SELECT offer_id FROM temp.expired_offers)",
+    ),
+    (
+        "actions",
+        "DELETE FROM actions WHERE linked_id IN (SELECT offer_id FROM temp.expired_offers)",
+    ),
+    (
+        "offers",
+        "DELETE FROM offers WHERE offer_id IN (SELECT offer_id FROM temp.expired_offers)",
+    ),
+    (
+        "message_links",
+        "DELETE FROM message_links WHERE linked_type = :type_ind AND linked_id IN (SELECT offer_id FROM temp.expired_offers)",
+    ),
+    (
+        "message_network_links",
+        "DELETE FROM message_network_links WHERE linked_type = :type_ind AND linked_id IN (SELECT offer_id FROM temp.expired_offers)",
+    ),
+]
+
+
+def remove_expired_data(self, time_offset: int = 0, chunk_size: int = 200):
+    # Removes expired offers without active bids, their bids and linked records.
+    # Works through chunk_size offers per transaction, mxDB is released between
+    # chunks so the purge doesn't hold up other threads.
+    # Returns the number of rows removed per table.
     now: int = self.getTime()
-    try:
+    expired_at: int = now - time_offset
+    removed = {}
+
+    def count_removed(table_name: str, num_rows: int) -> None:
+        if num_rows > 0:
+            removed[table_name] = removed.get(table_name, 0) + num_rows
+
+    active_bids_insert: str = self.activeBidsQueryStr("", "b2")
+    select_offers_query: str = f"""
+                INSERT INTO temp.expired_offers (offer_id)
+                SELECT o.offer_id FROM offers o
+                WHERE o.expire_at <= :expired_at AND 0 = (SELECT COUNT(*) FROM bids b2 WHERE b2.offer_id = o.offer_id AND {active_bids_insert})
+                LIMIT :chunk_size
+                """
+    while True:
+        num_blocks: int = 0
         cursor = self.openDB()
+        try:
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS expired_offers (offer_id BLOB PRIMARY KEY)"
+            )
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS expired_bids (bid_id BLOB PRIMARY KEY)"
+            )
+            cursor.execute("DELETE FROM temp.expired_offers")
+            cursor.execute("DELETE FROM temp.expired_bids")
 
-        active_bids_insert: str = self.activeBidsQueryStr("", "b2")
-        query_str = f"""
-                    SELECT o.offer_id FROM offers o
-                    WHERE o.expire_at <= :expired_at AND 0 = (SELECT COUNT(*) FROM bids b2 WHERE b2.offer_id = o.offer_id AND {active_bids_insert})
-                    """
-        num_offers = 0
-        num_bids = 0
-        offer_rows = cursor.execute(
-            query_str, {"now": now, "expired_at": now - time_offset}
-        )
-        for offer_row in offer_rows:
-            num_offers += 1
-            offer_query_data = {
-                "type_ind": int(Concepts.OFFER),
-                "offer_id": offer_row[0],
-            }
-            bid_rows = cursor.execute(
-                "SELECT bids.bid_id FROM bids WHERE bids.offer_id = :offer_id",
-                offer_query_data,
+            cursor.execute(
+                select_offers_query,
+                {"now": now, "expired_at": expired_at, "chunk_size": chunk_size},
             )
-            for bid_row in bid_rows:
-                num_bids += 1
-                bid_query_data = {"type_ind": int(Concepts.BID), "bid_id": bid_row[0]}
-                for query_str in [
-                    "DELETE FROM transactions WHERE transactions.bid_id = :bid_id",
-                    "DELETE FROM eventlog WHERE eventlog.linked_type = :type_ind AND eventlog.linked_id = :bid_id",
-                    "DELETE FROM automationlinks WHERE automationlinks.linked_type = :type_ind AND automationlinks.linked_id = :bid_id",
-                    "DELETE FROM prefunded_transactions WHERE prefunded_transactions.linked_type = :type_ind AND prefunded_transactions.linked_id = :bid_id",
-                    "DELETE FROM history WHERE history.concept_type = :type_ind AND history.concept_id = :bid_id",
-                    "DELETE FROM xmr_swaps WHERE xmr_swaps.bid_id = :bid_id",
-                    "DELETE FROM actions WHERE actions.linked_id = :bid_id",
-                    "DELETE FROM addresspool WHERE addresspool.bid_id = :bid_id",
-                    "DELETE FROM xmr_split_data WHERE xmr_split_data.bid_id = :bid_id",
-                    "DELETE FROM bids WHERE bids.bid_id = :bid_id",
-                    "DELETE FROM message_links WHERE linked_type = :type_ind AND linked_id = :bid_id",
-                    "DELETE FROM direct_message_route_links WHERE linked_type = :type_ind AND linked_id = :bid_id",
-                    "DELETE FROM message_network_links WHERE linked_type = :type_ind AND linked_id = :bid_id",
-                ]:
-                    cursor.execute(query_str, bid_query_data)
-            for query_str in [
-                "DELETE FROM eventlog WHERE eventlog.linked_type = :type_ind AND eventlog.linked_id = :offer_id",
-                "DELETE FROM automationlinks WHERE automationlinks.linked_type = :type_ind AND automationlinks.linked_id = :offer_id",
-                "DELETE FROM prefunded_transactions WHERE prefunded_transactions.linked_type = :type_ind AND prefunded_transactions.linked_id = :offer_id",
-                "DELETE FROM history WHERE history.concept_type = :type_ind AND history.concept_id = :offer_id",
-                "DELETE FROM xmr_offers WHERE xmr_offers.offer_id = :offer_id",
-                "DELETE FROM sentoffers WHERE sentoffers.offer_id = :offer_id",
-                "DELETE FROM actions WHERE actions.linked_id = :offer_id",
-                "DELETE FROM offers WHERE offers.offer_id = :offer_id",
-                "DELETE FROM message_links WHERE linked_type = :type_ind AND linked_id = :offer_id",
-                "DELETE FROM message_network_links WHERE linked_type = :type_ind AND linked_id = :offer_id",
-            ]:
-                cursor.execute(query_str, offer_query_data)
-
-        if num_offers > 0 or num_bids > 0:
-            self.log.info(
-                "Removed data for {} expired offer{} and {} bid{}.".format(
-                    num_offers,
-                    "s" if num_offers != 1 else "",
-                    num_bids,
-                    "s" if num_bids != 1 else "",
+            num_offers: int = cursor.rowcount
+            if num_offers > 0:
+                cursor.execute(
+                    "INSERT INTO temp.expired_bids (bid_id) SELECT bid_id FROM bids WHERE offer_id IN (SELECT offer_id FROM temp.expired_offers)"
                 )
-            )
+                query_data = {"type_ind": int(Concepts.BID)}
+                for table_name, query in remove_bid_queries:
+                    cursor.execute(query, query_data)
+                    count_removed(table_name, cursor.rowcount)
+                query_data = {"type_ind": int(Concepts.OFFER)}
+                for table_name, query in remove_offer_queries:
+                    cursor.execute(query, query_data)
+                    count_removed(table_name, cursor.rowcount)
+            else:
+                cursor.execute(
+                    "DELETE FROM checkedblocks WHERE record_id IN (SELECT record_id FROM checkedblocks WHERE created_at <= :expired_at LIMIT :chunk_size)",
+                    {"expired_at": expired_at, "chunk_size": chunk_size * 10},
+                )
+                num_blocks = cursor.rowcount
+                count_removed("checkedblocks", num_blocks)
+        finally:
+            self.closeDB(cursor)
 
-        cursor.execute(
-            "DELETE FROM checkedblocks WHERE created_at <= :expired_at",
-            {"expired_at": now - time_offset},
+        if num_offers < 1 and num_blocks < chunk_size * 10:
+            break
+        # Let threads waiting on mxDB in
+        time.sleep(0.001)
+
+    num_offers = removed.get("offers", 0)
+    num_bids = removed.get("bids", 0)
+    if num_offers > 0 or num_bids > 0:
+        self.log.info(
+            "Removed data for {} expired offer{} and {} bid{}.".format(
+                num_offers,
+                "s" if num_offers != 1 else "",
+                num_bids,
+                "s" if num_bids != 1 else "",
+            )
+        )
+    if len(removed) > 0:
+        self.log.debug(
+            "Removed rows: "
+            + ", ".join(f"{k}: {v}" for k, v in sorted(removed.items()))
         )
+    return removed
+
+
+class NotificationSink:
+    # Buffers notifications in memory, flush() writes them in one transaction
+    # and trims the table to the newest keep_rows by a record_id watermark.
 
-    finally:
-        self.closeDB(cursor)
+    def __init__(self):
+        self._mx = threading.Lock()
+        self._pending = []
+
+    def add(self, created_at: int, event_type: int, event_data: bytes) -> None:
+        with self._mx:
+            self._pending.append((created_at, event_type, event_data))
+
+    def numPending(self) -> int:
+        with self._mx:
+            return len(self._pending)
+
+    def flush(self, db, keep_rows: int) -> int:
+        # Returns the number of notifications written
+        with self._mx:
+            rows = self._pending
+            self._pending = []
+        if len(rows) < 1:
+            return 0
+        try:
+            cursor = db.openDB()
+            try:
+                cursor.executemany(
+                    "INSERT INTO notifications (active_ind, created_at, event_type, event_data) VALUES (1, ?, ?, ?)",
+                    rows,
+                )
+                cursor.execute(
+                    "DELETE FROM notifications WHERE record_id <= (SELECT MAX(record_id) FROM notifications) - ?",
+                    (keep_rows,),
+                )
+                db.commitDB()
+            finally:
+                # Rolled back on error, the rows are requeued below
+                db.closeDB(cursor, commit=False)
+        except Exception:
+            # Retry with the next flush
+            with self._mx:
+                self._pending = rows + self._pending
+            raise
+        return len(rows)
@@ -35,8 +35,12 @@ from .basicswap_util import (
     strTxState,
     strBidState,
 )
-from .util.rfc2440 import verify_rfc2440_password
+from .util.rfc2440 import (
+    verify_rfc2440_password,
+    VerifiedPasswordCache,
+)
 
+from .static_assets import StaticAssets
 from .js_server import (
     js_error,
     js_url_to_function,
@@ -69,6 +73,8 @@ SESSION_DURATION_MINUTES = 60
 
 env = Environment(loader=PackageLoader("basicswap", "templates"))
 env.filters["formatts"] = format_timestamp
+static_assets = StaticAssets(os.path.join(os.path.dirname(__file__), "static"))
+env.globals["static_url"] = static_assets.url
 
 
 def extractDomain(url):
@@ -166,6 +172,10 @@ class HttpHandler(BaseHTTPRequestHandler):
             return True
 
         session_id = self._get_session_cookie()
+        if not session_id:
+            auth_header = self.headers.get("Authorization", "")
+            if auth_header.startswith("Bearer "):
+                session_id = auth_header[7:].strip()
         if not session_id:
             return False
 
@@ -232,11 +242,11 @@ class HttpHandler(BaseHTTPRequestHandler):
                 except Exception:
                     args_dict["tor_established"] = False
 
-            from .ui.page_amm import get_amm_status, get_amm_active_count
+            from .ui.page_amm import get_amm_status, get_amm_active_count_cached
 
             try:
                 args_dict["current_status"] = get_amm_status()
-                args_dict["amm_active_count"] = get_amm_active_count(swap_client)
+                args_dict["amm_active_count"] = get_amm_active_count_cached(swap_client)
             except Exception:
                 args_dict["current_status"] = "stopped"
                 args_dict["amm_active_count"] = 0
@@ -345,6 +355,15 @@ class HttpHandler(BaseHTTPRequestHandler):
             },
         )
 
+    def _new_session(self):
+        session_id = secrets.token_urlsafe(32)
+        expires = datetime.now(timezone.utc) + timedelta(
+            minutes=SESSION_DURATION_MINUTES
+        )
+        with self.server.session_lock:
+            self.server.active_sessions[session_id] = {"expires": expires}
+        return session_id
+
     def page_login(self, url_split, post_string):
         swap_client = self.server.swap_client
         template = env.get_template("login.html")
@@ -357,6 +376,19 @@ class HttpHandler(BaseHTTPRequestHandler):
             if not is_json_request:
                 err_messages.append(security_warning)
 
+        if is_json_request and getattr(self, "basic_auth_ok", False):
+            # Exchange valid Basic Auth credentials for a session token
+            session_id = self._new_session()
+            response_data = {"success": True, "session_id": session_id}
+            if security_warning:
+                response_data["warning"] = security_warning
+            self.putHeaders(
+                200,
+                "application/json",
+                extra_headers=[self._set_session_cookie(session_id)],
+            )
+            return json.dumps(response_data).encode("utf-8")
+
         if post_string:
             password = None
             if is_json_request:
@@ -379,12 +411,7 @@ class HttpHandler(BaseHTTPRequestHandler):
                 and password is not None
                 and verify_rfc2440_password(client_auth_hash, password)
             ):
-                session_id = secrets.token_urlsafe(32)
-                expires = datetime.now(timezone.utc) + timedelta(
-                    minutes=SESSION_DURATION_MINUTES
-                )
-                with self.server.session_lock:
-                    self.server.active_sessions[session_id] = {"expires": expires}
+                session_id = self._new_session()
                 cookie_header = self._set_session_cookie(session_id)
 
                 if is_json_request:
@@ -732,6 +759,7 @@ class HttpHandler(BaseHTTPRequestHandler):
         exempt_pages = ["login", "static", "error", "info"]
         auth_header = self.headers.get("Authorization")
         basic_auth_ok = False
+        self.basic_auth_ok = False
 
         if auth_header and auth_header.startswith("Basic "):
             try:
@@ -740,10 +768,11 @@ class HttpHandler(BaseHTTPRequestHandler):
                 _, password = decoded_creds.split(":", 1)
 
                 client_auth_hash = swap_client.settings.get("client_auth_hash")
-                if client_auth_hash and verify_rfc2440_password(
-                    client_auth_hash, password
+                if client_auth_hash and self.server.auth_cache.verify(
+                    client_auth_hash, encoded_creds, password
                 ):
                     basic_auth_ok = True
+                    self.basic_auth_ok = True
                 else:
                     self.send_response(401)
                     self.send_header("WWW-Authenticate", 'Basic realm="Basicswap"')
@@ -801,47 +830,19 @@ class HttpHandler(BaseHTTPRequestHandler):
 
         if page == "static":
             try:
-                static_path = os.path.join(os.path.dirname(__file__), "static")
-                content = None
-                mime_type = ""
-                filepath = ""
-                if len(url_split) > 3 and url_split[2] == "sequence_diagrams":
-                    filepath = os.path.join(
-                        static_path, "sequence_diagrams", url_split[3]
-                    )
-                    mime_type = "image/svg+xml"
-                elif len(url_split) > 3 and url_split[2] == "images":
-                    filename = os.path.join(*url_split[3:])
-                    filepath = os.path.join(static_path, "images", filename)
-                    _, extension = os.path.splitext(filename)
-                    mime_type = {
-                        ".svg": "image/svg+xml",
-                        ".png": "image/png",
-                        ".jpg": "image/jpeg",
-                        ".gif": "image/gif",
-                        ".ico": "image/x-icon",
-                    }.get(extension, "")
-                elif len(url_split) > 3 and url_split[2] == "css":
-                    filename = os.path.join(*url_split[3:])
-                    filepath = os.path.join(static_path, "css", filename)
-                    mime_type = "text/css; charset=utf-8"
-                elif len(url_split) > 3 and url_split[2] == "js":
-                    filename = os.path.join(*url_split[3:])
-                    filepath = os.path.join(static_path, "js", filename)
-                    mime_type = "application/javascript"
-                else:
+                rel_path = parse.unquote("/".join(url_split[2:]))
+                version = parse.parse_qs(parsed.query).get("v", [None])[0]
+                response = static_assets.respond(rel_path, self.headers, version)
+                if response is None:
                     return self.page_404(url_split)
-
-                if mime_type == "" or not filepath:
-                    raise ValueError("Unknown file type or path")
-
-                with open(filepath, "rb") as fp:
-                    content = fp.read()
-                self.putHeaders(status_code, mime_type)
+                status_code, headers, content = response
+                self.send_response(status_code)
+                if self.server.allow_cors:
+                    self.send_header("Access-Control-Allow-Origin", "*")
+                for header_tuple in headers:
+                    self.send_header(header_tuple[0], header_tuple[1])
+                self.end_headers()
                 return content
-
-            except FileNotFoundError:
-                return self.page_404(url_split)
             except Exception as ex:
                 if swap_client.debug is True:
                     swap_client.log.error(traceback.format_exc())
@@ -1013,6 +1014,15 @@ class HttpThread(threading.Thread, ThreadingHTTPServer):
         self.form_id_lock = threading.Lock()
         self.msg_id_lock = threading.Lock()
 
+        # Basic Auth credentials verified within the last http_auth_cache_seconds
+        # skip verify_rfc2440_password, 0 disables the cache.
+        self.auth_cache = VerifiedPasswordCache(
+            swap_client.get_int_setting("http_auth_cache_seconds", 300, 0, 3600)
+        )
+
+        static_assets.check_mtime = swap_client.debug_ui
+        static_assets.load()
+
         self.timeout = 60
         ThreadingHTTPServer.__init__(self, (self.host_name, self.port_no), HttpHandler)
 
@@ -177,6 +177,12 @@ class CoinInterface:
     def altruistic(self) -> bool:
         return self._altruistic
 
+    def getBlockHashes(self, heights) -> list:
+        return [self.rpc("getblockhash", [height]) for height in heights]
+
+    def getBlocksWithTxns(self, block_hashes) -> list:
+        return [self.getBlockWithTxns(block_hash) for block_hash in block_hashes]
+
 
 class AdaptorSigInterface:
     def getScriptLockTxDummyWitness(self, script: bytes):
@@ -10,7 +10,7 @@ from basicswap.contrib.test_framework.messages import COutPoint, CTransaction, C
 from basicswap.util import b2i, ensure, i2b
 from basicswap.util.script import decodePushData, decodeScriptNum
 from .btc import BTCInterface, ensure_op, findOutput
-from basicswap.rpc import make_rpc_func
+from basicswap.rpc import make_rpc_batch_func, make_rpc_func
 from basicswap.chainparams import Coins
 from basicswap.interface.contrib.bch_test_framework.cashaddress import Address
 from basicswap.util.crypto import hash160, sha256
@@ -79,6 +79,9 @@ class BCHInterface(BTCInterface):
         self.rpc_wallet = make_rpc_func(
             self._rpcport, self._rpcauth, host=self._rpc_host
         )
+        self.rpc_wallet_batch = make_rpc_batch_func(
+            self._rpcport, self._rpcauth, host=self._rpc_host
+        )
         self.rpc_wallet_watch = self.rpc_wallet
 
     def has_segwit(self) -> bool:
@@ -94,7 +94,7 @@ from basicswap.contrib.test_framework.script import (
 from basicswap.basicswap_util import TxLockTypes
 
 from basicswap.chainparams import Coins
-from basicswap.rpc import make_rpc_func, openrpc
+from basicswap.rpc import make_rpc_batch_func, make_rpc_func, openrpc
 
 
 SEQUENCE_LOCKTIME_GRANULARITY = 9  # 512 seconds
@@ -276,6 +276,9 @@ class BTCInterface(Secp256k1Interface):
         self._rpcport = coin_settings["rpcport"]
         self._rpcauth = coin_settings["rpcauth"]
         self.rpc = make_rpc_func(self._rpcport, self._rpcauth, host=self._rpc_host)
+        self.rpc_batch = make_rpc_batch_func(
+            self._rpcport, self._rpcauth, host=self._rpc_host
+        )
         self._rpc_wallet = coin_settings.get("wallet_name", "wallet.dat")
         self._rpc_wallet_watch = coin_settings.get(
             "watch_wallet_name", self._rpc_wallet
@@ -283,6 +286,9 @@ class BTCInterface(Secp256k1Interface):
         self.rpc_wallet = make_rpc_func(
             self._rpcport, self._rpcauth, host=self._rpc_host, wallet=self._rpc_wallet
         )
+        self.rpc_wallet_batch = make_rpc_batch_func(
+            self._rpcport, self._rpcauth, host=self._rpc_host, wallet=self._rpc_wallet
+        )
         if self._rpc_wallet_watch == self._rpc_wallet:
             self.rpc_wallet_watch = self.rpc_wallet
         else:
@@ -362,6 +368,12 @@ class BTCInterface(Secp256k1Interface):
                     host=self._rpc_host,
                     wallet=self._rpc_wallet,
                 )
+                self.rpc_wallet_batch = make_rpc_batch_func(
+                    self._rpcport,
+                    self._rpcauth,
+                    host=self._rpc_host,
+                    wallet=self._rpc_wallet,
+                )
                 if change_watchonly_wallet:
                     self.rpc_wallet_watch = self.rpc_wallet
                 break
@@ -516,10 +528,12 @@ class BTCInterface(Secp256k1Interface):
         return rv
 
     def getWalletInfo(self):
-        rv = self.rpc_wallet("getwalletinfo")
+        rv, locked_utxos = self.rpc_wallet_batch(
+            [("getwalletinfo", []), ("listlockunspent", [])]
+        )
         rv["encrypted"] = "unlocked_until" in rv
         rv["locked"] = rv.get("unlocked_until", 1) <= 0
-        rv["locked_utxos"] = len(self.rpc_wallet("listlockunspent"))
+        rv["locked_utxos"] = len(locked_utxos)
         return rv
 
     def getWalletRestoreHeight(self) -> int:
@@ -1999,6 +2013,17 @@ class BTCInterface(Secp256k1Interface):
     def getBlockWithTxns(self, block_hash: str):
         return self.rpc("getblock", [block_hash, 2])
 
+    def getBlockHashes(self, heights) -> list:
+        return self.rpc_batch([("getblockhash", [height]) for height in heights])
+
+    def getBlocksWithTxns(self, block_hashes) -> list:
+        if type(self).getBlockWithTxns is not BTCInterface.getBlockWithTxns:
+            # Derived interface decodes blocks itself
+            return super().getBlocksWithTxns(block_hashes)
+        return self.rpc_batch(
+            [("getblock", [block_hash, 2]) for block_hash in block_hashes]
+        )
+
     def listUtxos(self):
         return self.rpc_wallet("listunspent")
 
@@ -2177,6 +2202,9 @@ class BTCInterface(Secp256k1Interface):
         self.rpc_wallet = make_rpc_func(
             self._rpcport, self._rpcauth, host=self._rpc_host, wallet=wallet_name
         )
+        self.rpc_wallet_batch = make_rpc_batch_func(
+            self._rpcport, self._rpcauth, host=self._rpc_host, wallet=wallet_name
+        )
         self._rpc_wallet = wallet_name
 
     def newKeypool(self) -> None:
@@ -14,7 +14,7 @@ from basicswap.util import (
     i2b,
     ensure,
 )
-from basicswap.rpc import make_rpc_func
+from basicswap.rpc import make_rpc_batch_func, make_rpc_func
 from basicswap.util.crypto import hash160
 from basicswap.util.address import decodeAddress
 from basicswap.chainparams import Coins
@@ -44,6 +44,9 @@ class FIROInterface(BTCInterface):
         self.rpc_wallet = make_rpc_func(
             self._rpcport, self._rpcauth, host=self._rpc_host
         )
+        self.rpc_wallet_batch = make_rpc_batch_func(
+            self._rpcport, self._rpcauth, host=self._rpc_host
+        )
         self.rpc_wallet_watch = self.rpc_wallet
 
         if "wallet_name" in coin_settings:
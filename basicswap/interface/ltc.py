@@ -7,7 +7,7 @@
 # file LICENSE or http://www.opensource.org/licenses/mit-license.php.
 
 from .btc import BTCInterface
-from basicswap.rpc import make_rpc_func
+from basicswap.rpc import make_rpc_batch_func, make_rpc_func
 from basicswap.chainparams import Coins, chainparams
 
 
@@ -98,6 +98,9 @@ class LTCInterfaceMWEB(LTCInterface):
         self.rpc_wallet = make_rpc_func(
             self._rpcport, self._rpcauth, host=self._rpc_host, wallet=self._rpc_wallet
         )
+        self.rpc_wallet_batch = make_rpc_batch_func(
+            self._rpcport, self._rpcauth, host=self._rpc_host, wallet=self._rpc_wallet
+        )
         self.rpc_wallet_watch = self.rpc_wallet
 
     def chainparams(self):
@@ -20,7 +20,7 @@ from basicswap.interface.btc import (
     findOutput,
     find_vout_for_address_from_txobj,
 )
-from basicswap.rpc import make_rpc_func
+from basicswap.rpc import make_rpc_batch_func, make_rpc_func
 from basicswap.chainparams import Coins
 from basicswap.contrib.mnemonic import Mnemonic
 from basicswap.interface.contrib.nav_test_framework.mininode import (
@@ -79,6 +79,9 @@ class NAVInterface(BTCInterface):
         self.rpc_wallet = make_rpc_func(
             self._rpcport, self._rpcauth, host=self._rpc_host
         )
+        self.rpc_wallet_batch = make_rpc_batch_func(
+            self._rpcport, self._rpcauth, host=self._rpc_host
+        )
         self.rpc_wallet_watch = self.rpc_wallet
 
         if "wallet_name" in coin_settings:
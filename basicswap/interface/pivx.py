@@ -9,7 +9,7 @@
 from io import BytesIO
 
 from .btc import BTCInterface
-from basicswap.rpc import make_rpc_func
+from basicswap.rpc import make_rpc_batch_func, make_rpc_func
 from basicswap.chainparams import Coins
 from basicswap.util.address import decodeAddress
 from .contrib.pivx_test_framework.messages import CBlock, ToHex, FromHex, CTransaction
@@ -33,6 +33,9 @@ class PIVXInterface(BTCInterface):
         self.rpc_wallet = make_rpc_func(
             self._rpcport, self._rpcauth, host=self._rpc_host
         )
+        self.rpc_wallet_batch = make_rpc_batch_func(
+            self._rpcport, self._rpcauth, host=self._rpc_host
+        )
         self.rpc_wallet_watch = self.rpc_wallet
 
     def encryptWallet(self, password: str, check_seed: bool = True):
@@ -9,8 +9,11 @@
 import logging
 import os
 import secrets
+import threading
 import time
 
+from contextlib import contextmanager
+
 import basicswap.util_xmr as xmr_util
 from coincurve.ed25519 import (
     ed25519_add,
@@ -38,6 +41,86 @@ from basicswap.interface.base import CoinInterface
 ed25519_l = 2**252 + 27742317777372353535851937790883648493
 
 
+class WalletRPCWorker:
+    # A wallet-rpc process which can have one wallet open at a time
+    __slots__ = ("rpc_wallet", "open_filename", "in_use", "last_used")
+
+    def __init__(self, rpc_wallet):
+        self.rpc_wallet = rpc_wallet
+        self.open_filename = None
+        self.in_use = False
+        self.last_used = 0
+
+
+class WalletRPCPool:
+    # Hands out wallet-rpc workers for view-only swap wallets.
+    # A worker which already has the requested wallet open is preferred, else the
+    # least recently used idle worker is taken and its open wallet is replaced.
+    # A wallet is only ever open on one worker.
+
+    def __init__(self, rpc_wallets):
+        self._workers = [WalletRPCWorker(f) for f in rpc_wallets]
+        self._cv = threading.Condition()
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return len(self._workers)
+
+    def _pick(self, filename: str):
+        for w in self._workers:
+            if w.open_filename == filename:
+                return None if w.in_use else w
+        idle = [w for w in self._workers if not w.in_use]
+        if len(idle) == 0:
+            return None
+        return min(idle, key=lambda w: w.last_used)
+
+    @contextmanager
+    def acquire(self, filename: str):
+        with self._cv:
+            while True:
+                worker = self._pick(filename)
+                if worker is not None:
+                    break
+                self._cv.wait()
+            worker.in_use = True
+            if worker.open_filename != filename:
+                worker.open_filename = None
+        try:
+            yield worker
+        except Exception:
+            # Unknown wallet state, open again on next use
+            worker.open_filename = None
+            raise
+        finally:
+            with self._cv:
+                self._counter += 1
+                worker.last_used = self._counter
+                worker.in_use = False
+                self._cv.notify_all()
+
+    def evict(self, filename: str) -> None:
+        # Close filename if open on a worker so another wallet-rpc can open it
+        with self._cv:
+            while True:
+                worker = next(
+                    (w for w in self._workers if w.open_filename == filename), None
+                )
+                if worker is None:
+                    return
+                if not worker.in_use:
+                    break
+                self._cv.wait()
+            worker.in_use = True
+        try:
+            worker.rpc_wallet("close_wallet")
+        finally:
+            with self._cv:
+                worker.open_filename = None
+                worker.in_use = False
+                self._cv.notify_all()
+
+
 class XMRInterface(CoinInterface):
     @staticmethod
     def curve_type():
@@ -186,14 +269,33 @@ class XMRInterface(CoinInterface):
             tag="Wallet ",
         )
 
+        # Optional extra wallet-rpc processes to check swap lock txns concurrently
+        self._watch_wallet_pool = None
+        watch_wallet_ports = coin_settings.get("watch_wallet_rpc_ports", [])
+        if len(watch_wallet_ports) > 0:
+            self._watch_wallet_pool = WalletRPCPool(
+                [
+                    make_xmr_rpc_func(
+                        port,
+                        coin_settings["walletrpcauth"],
+                        host=coin_settings.get("walletrpchost", "127.0.0.1"),
+                        default_timeout=self._walletrpctimeout,
+                        tag=f"Wallet{i} ",
+                    )
+                    for i, port in enumerate(watch_wallet_ports)
+                ]
+            )
+
     def setFeePriority(self, new_priority):
         ensure(new_priority >= 0 and new_priority < 4, "Invalid fee_priority value")
         self._fee_priority = new_priority
 
-    def createWallet(self, params):
+    def createWallet(self, params, rpc_wallet=None):
+        if rpc_wallet is None:
+            rpc_wallet = self.rpc_wallet
         if self._wallet_password is not None:
             params["password"] = self._wallet_password
-        rv = self.rpc_wallet("generate_from_keys", params)
+        rv = rpc_wallet("generate_from_keys", params)
         if "address" in rv:
             new_address: str = rv["address"]
             is_watch_only: bool = "Watch-only" in rv.get("info", "")
@@ -208,13 +310,15 @@ class XMRInterface(CoinInterface):
             self._log.debug("generate_from_keys %s", dumpj(rv))
             raise ValueError("generate_from_keys failed")
 
-    def openWallet(self, filename):
+    def openWallet(self, filename, rpc_wallet=None):
+        if rpc_wallet is None:
+            rpc_wallet = self.rpc_wallet
         params = {"filename": filename}
         if self._wallet_password is not None:
             params["password"] = self._wallet_password
 
         try:
-            self.rpc_wallet("open_wallet", params)
+            rpc_wallet("open_wallet", params)
         except Exception as e:
             if "no connection to daemon" in str(e):
                 self._log.debug(f"{self.coin_name()} {e}")
@@ -259,12 +363,12 @@ class XMRInterface(CoinInterface):
                     raise
             else:
                 try:
-                    self.rpc_wallet("close_wallet")
+                    rpc_wallet("close_wallet")
                     self._log.debug(f"Closing {self.coin_name()} wallet")
                 except Exception as e:  # noqa: F841
                     pass
 
-            self.rpc_wallet("open_wallet", params)
+            rpc_wallet("open_wallet", params)
             self._log.debug(f"Attempting to open {self.coin_name()} wallet")
 
     def initialiseWallet(
@@ -489,74 +593,86 @@ class XMRInterface(CoinInterface):
         bid_sender: bool,
         check_amount: bool = True,
     ):
-        with self._mx_wallet:
-            Kbv = self.getPubkey(kbv)
-            address_b58 = xmr_util.encode_address(Kbv, Kbs, self._addr_prefix)
+        Kbv = self.getPubkey(kbv)
+        address_b58 = xmr_util.encode_address(Kbv, Kbs, self._addr_prefix)
+
+        kbv_le = kbv[::-1]
+        params = {
+            "restore_height": restore_height,
+            "filename": address_b58,
+            "address": address_b58,
+            "viewkey": b2h(kbv_le),
+        }
 
-            kbv_le = kbv[::-1]
-            params = {
-                "restore_height": restore_height,
-                "filename": address_b58,
-                "address": address_b58,
-                "viewkey": b2h(kbv_le),
-            }
+        if self._watch_wallet_pool is None:
+            with self._mx_wallet:
+                self.openOrCreateWallet(address_b58, params, self.rpc_wallet)
+                return self._findTxB(self.rpc_wallet, cb_swap_value, check_amount)
 
-            try:
-                self.openWallet(address_b58)
-            except Exception as e:  # noqa: F841
-                self.createWallet(params)
-                self.openWallet(address_b58)
+        with self._watch_wallet_pool.acquire(address_b58) as worker:
+            if worker.open_filename != address_b58:
+                self.openOrCreateWallet(address_b58, params, worker.rpc_wallet)
+                worker.open_filename = address_b58
+            return self._findTxB(worker.rpc_wallet, cb_swap_value, check_amount)
 
-            self.rpc_wallet("refresh")
-            self._log.debug(f"Refreshing {self.coin_name()} wallet")
+    def openOrCreateWallet(self, filename: str, params, rpc_wallet) -> None:
+        try:
+            self.openWallet(filename, rpc_wallet)
+        except Exception as e:  # noqa: F841
+            self.createWallet(params, rpc_wallet)
+            self.openWallet(filename, rpc_wallet)
 
-            """
-            # Debug
-            try:
-                current_height = self.rpc_wallet('get_height')['height']
-                self._log.info('findTxB XMR current_height %d\nAddress: %s', current_height, address_b58)
-            except Exception as e:
-                self._log.info('rpc failed %s', str(e))
-                current_height = None  # If the transfer is available it will be deep enough
-                #   and (current_height is None or current_height - transfer['block_height'] > cb_block_confirmed):
-            """
-            params = {"transfer_type": "available"}
-            transfers = self.rpc_wallet("incoming_transfers", params)
-            rv = None
-            if "transfers" in transfers:
-                for transfer in transfers["transfers"]:
-                    # unlocked <- wallet->is_transfer_unlocked() checks unlock_time and CRYPTONOTE_DEFAULT_TX_SPENDABLE_AGE
-                    if not transfer["unlocked"]:
-                        full_tx = self.rpc_wallet(
-                            "get_transfer_by_txid", {"txid": transfer["tx_hash"]}
-                        )
-                        unlock_time = full_tx["transfer"]["unlock_time"]
-                        if unlock_time != 0:
-                            self._log.warning(
-                                "Coin b lock txn is locked: {}, unlock_time {}".format(
-                                    transfer["tx_hash"], unlock_time
-                                )
-                            )
-                            rv = -1
-                            continue
-                    if transfer["amount"] == cb_swap_value or check_amount is False:
-                        return {
-                            "txid": transfer["tx_hash"],
-                            "amount": transfer["amount"],
-                            "height": (
-                                0
-                                if "block_height" not in transfer
-                                else transfer["block_height"]
-                            ),
-                        }
-                    else:
+    def _findTxB(self, rpc_wallet, cb_swap_value: int, check_amount: bool):
+        rpc_wallet("refresh")
+        self._log.debug(f"Refreshing {self.coin_name()} wallet")
+
+        """
+        # Debug
+        try:
+            current_height = rpc_wallet('get_height')['height']
+            self._log.info('findTxB XMR current_height %d\nAddress: %s', current_height, address_b58)
+        except Exception as e:
+            self._log.info('rpc failed %s', str(e))
+            current_height = None  # If the transfer is available it will be deep enough
+            #   and (current_height is None or current_height - transfer['block_height'] > cb_block_confirmed):
+        """
+        params = {"transfer_type": "available"}
+        transfers = rpc_wallet("incoming_transfers", params)
+        rv = None
+        if "transfers" in transfers:
+            for transfer in transfers["transfers"]:
+                # unlocked <- wallet->is_transfer_unlocked() checks unlock_time and CRYPTONOTE_DEFAULT_TX_SPENDABLE_AGE
+                if not transfer["unlocked"]:
+                    full_tx = rpc_wallet(
+                        "get_transfer_by_txid", {"txid": transfer["tx_hash"]}
+                    )
+                    unlock_time = full_tx["transfer"]["unlock_time"]
+                    if unlock_time != 0:
                         self._log.warning(
-                            "Incorrect amount detected for coin b lock txn: {}".format(
-                                transfer["tx_hash"]
+                            "Coin b lock txn is locked: {}, unlock_time {}".format(
+                                transfer["tx_hash"], unlock_time
                             )
                         )
                         rv = -1
-            return rv
+                        continue
+                if transfer["amount"] == cb_swap_value or check_amount is False:
+                    return {
+                        "txid": transfer["tx_hash"],
+                        "amount": transfer["amount"],
+                        "height": (
+                            0
+                            if "block_height" not in transfer
+                            else transfer["block_height"]
+                        ),
+                    }
+                else:
+                    self._log.warning(
+                        "Incorrect amount detected for coin b lock txn: {}".format(
+                            transfer["tx_hash"]
+                        )
+                    )
+                    rv = -1
+        return rv
 
     def findTxnByHash(self, txid: str):
         with self._mx_wallet:
@@ -750,6 +866,8 @@ class XMRInterface(CoinInterface):
                     self.openWallet(wallet_file)
                 except Exception:
                     wallet_file = address_b58
+                    if self._watch_wallet_pool is not None:
+                        self._watch_wallet_pool.evict(wallet_file)
                     try:
                         self.openWallet(wallet_file)
                     except Exception:
@@ -42,7 +42,6 @@ from .ui.util import (
 )
 from .ui.page_offers import postNewOffer
 from .protocols.xmr_swap_1 import recoverNoScriptTxnWithKey, getChainBSplitKey
-from .db import Concepts
 
 
 def getFormData(post_string: str, is_json: bool):
@@ -310,15 +309,27 @@ def js_wallets(self, url_split, post_string, is_json):
 
         if coin_type == Coins.LTC_MWEB:
             coin_type = Coins.LTC
-        rv = swap_client.getWalletInfo(coin_type)
-        if not rv:
+        # Read live, wallet state changes from other endpoints must show immediately
+        swap_client.updateWalletsInfo(
+            force_update=True, only_coin=coin_type, wait_for_complete=True
+        )
+        rv = swap_client.getCachedWalletsInfo(
+            {"coin_id": int(coin_type), "with_error": True}
+        ).get(int(coin_type), None)
+        if rv and "error" in rv:
+            raise ValueError(rv["error"])
+        if not rv or "balance" not in rv:
             raise ValueError(f"getWalletInfo failed for coin: {coin_type}")
-        rv.update(swap_client.getBlockchainInfo(coin_type))
         ci = swap_client.ci(coin_type)
         checkAddressesOwned(swap_client, ci, rv)
         return bytes(json.dumps(rv), "UTF-8")
 
-    return bytes(json.dumps(swap_client.getWalletsInfo({"ticker_key": True})), "UTF-8")
+    swap_client.updateWalletsInfo()
+    rv = {}
+    wallets = swap_client.getCachedWalletsInfo({"with_error": True})
+    for coin_id, wallet_data in wallets.items():
+        rv[chainparams[coin_id]["ticker"]] = wallet_data
+    return bytes(json.dumps(rv), "UTF-8")
 
 
 def js_offers(self, url_split, post_string, is_json, sent=False) -> bytes:
@@ -380,6 +391,8 @@ def js_offers(self, url_split, post_string, is_json, sent=False) -> bytes:
 
         if have_data_entry(post_data, "offset"):
             filters["offset"] = int(get_data_entry(post_data, "offset"))
+        if have_data_entry(post_data, "cursor"):
+            filters["cursor"] = get_data_entry(post_data, "cursor")
         if have_data_entry(post_data, "limit"):
             filters["limit"] = int(get_data_entry(post_data, "limit"))
             ensure(filters["limit"] > 0, "Invalid limit")
@@ -391,11 +404,27 @@ def js_offers(self, url_split, post_string, is_json, sent=False) -> bytes:
         if have_data_entry(post_data, "with_extra_info"):
             with_extra_info = toBool(get_data_entry(post_data, "with_extra_info"))
 
-    offers = swap_client.listOffers(sent, filters)
+    offers, next_cursor = swap_client.listOffersPage(
+        sent, filters, with_extra_info=with_extra_info
+    )
+    now: int = swap_client.getTime()
+    network_addr: str = swap_client.network_addr
+    coin_interfaces = {}
+
+    def get_ci(coin_id):
+        ci = coin_interfaces.get(coin_id, None)
+        if ci is None:
+            ci = coin_interfaces[coin_id] = swap_client.ci(coin_id)
+        return ci
+
     rv = []
-    for o in offers:
-        ci_from = swap_client.ci(o.coin_from)
-        ci_to = swap_client.ci(o.coin_to)
+    for row in offers:
+        if with_extra_info:
+            o, xmr_offer, local_strategy_id = row
+        else:
+            o = row
+        ci_from = get_ci(o.coin_from)
+        ci_to = get_ci(o.coin_to)
         offer_data = {
             "swap_type": o.swap_type,
             "addr_from": o.addr_from,
@@ -411,11 +440,10 @@ def js_offers(self, url_split, post_string, is_json, sent=False) -> bytes:
             ),
             "rate": ci_to.format_amount(o.rate),
             "min_bid_amount": ci_from.format_amount(o.min_bid_amount),
-            "is_expired": o.expire_at <= swap_client.getTime(),
+            "is_expired": o.expire_at <= now,
             "is_own_offer": o.was_sent,
             "is_revoked": True if o.active_ind == 2 else False,
-            "is_public": o.addr_to == swap_client.network_addr
-            or o.addr_to.strip() == "",
+            "is_public": o.addr_to == network_addr or o.addr_to.strip() == "",
             "message_nets": o.message_nets,
         }
         offer_data["auto_accept_type"] = getattr(o, "auto_accept_type", 0)
@@ -423,7 +451,6 @@ def js_offers(self, url_split, post_string, is_json, sent=False) -> bytes:
             offer_data["amount_negotiable"] = o.amount_negotiable
             offer_data["rate_negotiable"] = o.rate_negotiable
             if o.swap_type == SwapTypes.XMR_SWAP:
-                _, xmr_offer = swap_client.getXmrOffer(o.offer_id)
                 offer_data["lock_time_1"] = xmr_offer.lock_time_1
                 offer_data["lock_time_2"] = xmr_offer.lock_time_2
 
@@ -436,22 +463,76 @@ def js_offers(self, url_split, post_string, is_json, sent=False) -> bytes:
             offer_data["automation_strat_id"] = getattr(o, "auto_accept_type", 0)
 
             if o.was_sent:
-                try:
-                    strategy = swap_client.getLinkedStrategy(Concepts.OFFER, o.offer_id)
-                    if strategy:
-                        offer_data["local_automation_strat_id"] = strategy[0]
-                        swap_client.log.debug(
-                            f"Found local automation strategy for own offer {o.offer_id.hex()}: {strategy[0]}"
-                        )
-                    else:
-                        offer_data["local_automation_strat_id"] = 0
-                except Exception as e:
-                    swap_client.log.debug(
-                        f"Error getting local automation strategy for offer {o.offer_id.hex()}: {e}"
-                    )
-                    offer_data["local_automation_strat_id"] = 0
+                offer_data["local_automation_strat_id"] = (
+                    local_strategy_id if local_strategy_id else 0
+                )
 
         rv.append(offer_data)
+    if "cursor" in filters:
+        return bytes(json.dumps({"offers": rv, "next_cursor": next_cursor}), "UTF-8")
+    return bytes(json.dumps(rv), "UTF-8")
+
+
+def js_orderbook(self, url_split, post_string, is_json) -> bytes:
+    swap_client = self.server.swap_client
+
+    if len(url_split) < 5:
+        rv = [
+            {"coin_from": pair[0], "coin_to": pair[1], "num_offers": num_offers}
+            for pair, num_offers in sorted(swap_client.getOrderBookPairs().items())
+        ]
+        return bytes(json.dumps(rv), "UTF-8")
+
+    coin_from = getCoinType(url_split[3])
+    coin_to = getCoinType(url_split[4])
+    ci_from = swap_client.ci(coin_from)
+    ci_to = swap_client.ci(coin_to)
+
+    min_rate = None
+    max_rate = None
+    limit = PAGE_LIMIT
+    include_sent: bool = True
+    if post_string != "":
+        post_data = getFormData(post_string, is_json)
+        if have_data_entry(post_data, "include_sent"):
+            include_sent = toBool(get_data_entry(post_data, "include_sent"))
+        if have_data_entry(post_data, "min_rate"):
+            min_rate = inputAmount(get_data_entry(post_data, "min_rate"), ci_to)
+        if have_data_entry(post_data, "max_rate"):
+            max_rate = inputAmount(get_data_entry(post_data, "max_rate"), ci_to)
+        if have_data_entry(post_data, "limit"):
+            limit = int(get_data_entry(post_data, "limit"))
+            ensure(limit > 0, "Invalid limit")
+
+    entries = swap_client.getOrderBook(
+        coin_from, coin_to, min_rate, max_rate, limit, include_sent
+    )
+    offers = []
+    for o in entries:
+        offers.append(
+            {
+                "offer_id": o.offer_id.hex(),
+                "rate": ci_to.format_amount(o.rate),
+                "amount_from": ci_from.format_amount(o.amount_from),
+                "amount_to": ci_to.format_amount(
+                    (o.amount_from * o.rate) // ci_from.COIN()
+                ),
+                "min_bid_amount": ci_from.format_amount(o.min_bid_amount),
+                "amount_negotiable": o.amount_negotiable,
+                "rate_negotiable": o.rate_negotiable,
+                "addr_from": o.addr_from,
+                "created_at": o.created_at,
+                "expire_at": o.expire_at,
+                "is_own_offer": o.was_sent,
+                "automation_strat_id": o.auto_accept_type or 0,
+            }
+        )
+    rv = {
+        "coin_from": ci_from.coin_name(),
+        "coin_to": ci_to.coin_name(),
+        "best_rate": offers[0]["rate"] if len(offers) > 0 else None,
+        "offers": offers,
+    }
     return bytes(json.dumps(rv), "UTF-8")
 
 
@@ -480,6 +561,8 @@ def parseBidFilters(post_data):
 
     if have_data_entry(post_data, "offset"):
         filters["offset"] = int(get_data_entry(post_data, "offset"))
+    if have_data_entry(post_data, "cursor"):
+        filters["cursor"] = get_data_entry(post_data, "cursor")
     if have_data_entry(post_data, "limit"):
         filters["limit"] = int(get_data_entry(post_data, "limit"))
         assert filters["limit"] > 0 and filters["limit"] <= PAGE_LIMIT, "Invalid limit"
@@ -499,19 +582,24 @@ def parseBidFilters(post_data):
     return offer_id, filters
 
 
-def formatBids(swap_client, bids, filters) -> bytes:
+def formatBids(swap_client, bids, filters, next_cursor=None) -> bytes:
     with_extra_info = filters.get("with_extra_info", False)
+    coin_interfaces = {}
+
+    def get_ci(coin_id):
+        ci = coin_interfaces.get(coin_id, None)
+        if ci is None:
+            ci = coin_interfaces[coin_id] = swap_client.ci(coin_id)
+        return ci
+
     rv = []
     for b in bids:
-        ci_from = swap_client.ci(b[9])
-        offer = swap_client.getOffer(b[3])
-        ci_to = swap_client.ci(offer.coin_to) if offer else None
+        # listBids skips bids without an offer
+        ci_from = get_ci(b[9])
+        ci_to = get_ci(b[14])
 
         bid_rate: int = 0 if b[10] is None else b[10]
-        amount_to = None
-        if ci_to:
-            amount_to_int = (b[4] * bid_rate + ci_from.COIN() - 1) // ci_from.COIN()
-            amount_to = ci_to.format_amount(amount_to_int)
+        amount_to_int = (b[4] * bid_rate + ci_from.COIN() - 1) // ci_from.COIN()
 
         bid_data = {
             "bid_id": b[2].hex(),
@@ -519,13 +607,13 @@ def formatBids(swap_client, bids, filters) -> bytes:
             "created_at": b[0],
             "expire_at": b[1],
             "coin_from": ci_from.coin_name(),
-            "coin_to": ci_to.coin_name() if ci_to else "Unknown",
+            "coin_to": ci_to.coin_name(),
             "amount_from": ci_from.format_amount(b[4]),
-            "amount_to": amount_to,
-            "bid_rate": swap_client.ci(b[14]).format_amount(bid_rate),
+            "amount_to": ci_to.format_amount(amount_to_int),
+            "bid_rate": ci_to.format_amount(bid_rate),
             "bid_state": strBidState(b[5]),
             "addr_from": b[11],
-            "addr_to": offer.addr_to if offer else None,
+            "addr_to": b[15],
         }
 
         if with_extra_info:
@@ -533,6 +621,8 @@ def formatBids(swap_client, bids, filters) -> bytes:
                 {"tx_state_a": strTxState(b[7]), "tx_state_b": strTxState(b[8])}
             )
         rv.append(bid_data)
+    if "cursor" in filters:
+        return bytes(json.dumps({"bids": rv, "next_cursor": next_cursor}), "UTF-8")
     return bytes(json.dumps(rv), "UTF-8")
 
 
@@ -687,8 +777,8 @@ def js_bids(self, url_split, post_string: str, is_json: bool) -> bytes:
     post_data = {} if post_string == "" else getFormData(post_string, is_json)
     offer_id, filters = parseBidFilters(post_data)
 
-    bids = swap_client.listBids(offer_id=offer_id, filters=filters)
-    return formatBids(swap_client, bids, filters)
+    bids, next_cursor = swap_client.listBidsPage(offer_id=offer_id, filters=filters)
+    return formatBids(swap_client, bids, filters, next_cursor)
 
 
 def js_sentbids(self, url_split, post_string, is_json) -> bytes:
@@ -709,8 +799,10 @@ def js_sentbids(self, url_split, post_string, is_json) -> bytes:
     post_data = getFormData(post_string, is_json)
     offer_id, filters = parseBidFilters(post_data)
 
-    bids = swap_client.listBids(sent=True, offer_id=offer_id, filters=filters)
-    return formatBids(swap_client, bids, filters)
+    bids, next_cursor = swap_client.listBidsPage(
+        sent=True, offer_id=offer_id, filters=filters
+    )
+    return formatBids(swap_client, bids, filters, next_cursor)
 
 
 def js_network(self, url_split, post_string, is_json) -> bytes:
@@ -1575,6 +1667,7 @@ endpoints = {
     "wallets": js_wallets,
     "offers": js_offers,
     "sentoffers": js_sentoffers,
+    "orderbook": js_orderbook,
     "bids": js_bids,
     "sentbids": js_sentbids,
     "network": js_network,
@@ -31,93 +31,155 @@ NPBF_STR = 1
 NPBF_BOOL = 2
 
 
-class NonProtobufClass:
-    def __init__(self, init_all: bool = True, **kwargs):
-        for key, value in kwargs.items():
-            found_field: bool = False
-            for field_num, v in self._map.items():
-                field_name, wire_type, field_type = v
-                if field_name == key:
-                    setattr(self, field_name, value)
-                    found_field = True
-                    break
-            if found_field is False:
-                raise ValueError(f"Got an unexpected keyword argument '{key}'")
-
-        if init_all:
-            self.init_fields()
-
-    def init_fields(self) -> None:
-        # Set default values for missing fields
-        for field_num, v in self._map.items():
+class NPBCodec:
+    # Encoder and decoder for one message class, built once from _map
+
+    def __init__(self, field_map: dict):
+        self.field_names = frozenset(v[0] for v in field_map.values())
+        self._encode_fields = []
+        self._decode_fields = {}
+        self._defaults = []
+        self._field_map = field_map
+        for field_num, v in field_map.items():
             field_name, wire_type, field_type = v
-            if hasattr(self, field_name):
-                continue
-            if wire_type == 0:
-                setattr(self, field_name, 0)
-            elif wire_type == 2:
-                if field_type == 1:
-                    setattr(self, field_name, str())
-                else:
-                    setattr(self, field_name, bytes())
+            if wire_type == NPBW_INT:
+                default_value = 0
+            elif wire_type == NPBW_BYTES:
+                default_value = str() if field_type == NPBF_STR else bytes()
             else:
                 raise ValueError(f"Unknown wire_type {wire_type}")
-
-    def to_bytes(self) -> bytes:
-        rv = bytes()
-
-        for field_num, v in self._map.items():
-            field_name, wire_type, field_type = v
-            if not hasattr(self, field_name):
+            tag: int = (field_num << 3) | wire_type
+            self._encode_fields.append(
+                (field_name, bytes(encode_varint(tag)), wire_type)
+            )
+            self._decode_fields[tag] = (field_name, wire_type, field_type == NPBF_STR)
+            self._defaults.append((field_name, default_value))
+
+    def init_fields(self, obj) -> None:
+        for field_name, default_value in self._defaults:
+            if not hasattr(obj, field_name):
+                setattr(obj, field_name, default_value)
+
+    def encode(self, obj) -> bytes:
+        rv = bytearray()
+        for field_name, tag_bytes, wire_type in self._encode_fields:
+            try:
+                field_value = getattr(obj, field_name)
+            except AttributeError:
                 continue
-            field_value = getattr(self, field_name)
-            tag = (field_num << 3) | wire_type
-            if wire_type == 0:
+            if wire_type == NPBW_INT:
                 if field_value == 0:
                     continue
-                rv += encode_varint(tag)
-                rv += encode_varint(field_value)
-            elif wire_type == 2:
+                rv += tag_bytes
+                if 0 < field_value < 0x80:
+                    rv.append(field_value)
+                else:
+                    rv += encode_varint(field_value)
+            else:
                 if len(field_value) == 0:
                     continue
-                rv += encode_varint(tag)
+                rv += tag_bytes
                 if isinstance(field_value, str):
                     field_value = field_value.encode("utf-8")
-                rv += encode_varint(len(field_value))
+                field_len: int = len(field_value)
+                if field_len < 0x80:
+                    rv.append(field_len)
+                else:
+                    rv += encode_varint(field_len)
                 rv += field_value
-            else:
-                raise ValueError(f"Unknown wire_type {wire_type}")
-        return rv
+        return bytes(rv)
 
-    def from_bytes(self, b: bytes, init_all: bool = True) -> None:
+    def decode(self, obj, b, zero_copy: bool = False) -> None:
+        # With zero_copy bytes fields are memoryview slices of b
+        if zero_copy and not isinstance(b, memoryview):
+            b = memoryview(b)
+        decode_fields = self._decode_fields
         max_len: int = len(b)
         o: int = 0
         while o < max_len:
-            tag, lv = decode_varint(b, o)
-            o += lv
-            wire_type = tag & 7
-            field_num = tag >> 3
-
-            field_name, wire_type_expect, field_type = self._map[field_num]
-            if wire_type != wire_type_expect:
-                raise ValueError(
-                    f"Unexpected wire_type {wire_type} for field {field_num}"
-                )
-
-            if wire_type == 0:
-                field_value, lv = decode_varint(b, o)
-                o += lv
-            elif wire_type == 2:
-                field_len, lv = decode_varint(b, o)
+            tag = b[o]
+            if tag < 0x80:
+                o += 1
+            else:
+                tag, lv = decode_varint(b, o)
                 o += lv
+
+            field = decode_fields.get(tag)
+            if field is None:
+                self._field_map[tag >> 3]  # Raises KeyError for unknown fields
+                raise ValueError(f"Unexpected wire_type {tag & 7} for field {tag >> 3}")
+            field_name, wire_type, is_str = field
+
+            if wire_type == NPBW_INT:
+                # Inlined decode_varint
+                field_value = b[o]
+                o += 1
+                if field_value >= 0x80:
+                    field_value &= 0x7F
+                    shift: int = 7
+                    while True:
+                        c = b[o]
+                        o += 1
+                        field_value |= (c & 0x7F) << shift
+                        if c < 0x80:
+                            break
+                        shift += 7
+                        if shift > 56:
+                            raise ValueError("Too many bytes")
+            else:
+                field_len = b[o]
+                if field_len < 0x80:
+                    o += 1
+                else:
+                    field_len, lv = decode_varint(b, o)
+                    o += lv
                 field_value = b[o : o + field_len]
                 o += field_len
-                if field_type == 1:
-                    field_value = field_value.decode("utf-8")
-            else:
-                raise ValueError(f"Unknown wire_type {wire_type}")
+                if is_str:
+                    field_value = str(field_value, "utf-8")
+
+            setattr(obj, field_name, field_value)
+
+
+class NonProtobufMeta(type):
+    # Derives __slots__ and the codec of each message class from its _map
+
+    def __new__(mcs, name, bases, namespace):
+        field_map = namespace.get("_map")
+        if field_map is not None and "__slots__" not in namespace:
+            namespace["__slots__"] = tuple(v[0] for v in field_map.values())
+        cls = super().__new__(mcs, name, bases, namespace)
+        if field_map is not None:
+            cls._codec = NPBCodec(field_map)
+        return cls
+
+
+class NonProtobufClass(metaclass=NonProtobufMeta):
+    __slots__ = ()
 
-            setattr(self, field_name, field_value)
+    def __init__(self, init_all: bool = True, **kwargs):
+        field_names = self._codec.field_names
+        for key, value in kwargs.items():
+            if key not in field_names:
+                raise ValueError(f"Got an unexpected keyword argument '{key}'")
+            setattr(self, key, value)
+
+        if init_all:
+            self.init_fields()
+
+    def init_fields(self) -> None:
+        # Set default values for missing fields
+        self._codec.init_fields(self)
+
+    def to_bytes(self) -> bytes:
+        return self._codec.encode(self)
+
+    def from_bytes(
+        self, b: bytes, init_all: bool = True, zero_copy: bool = False
+    ) -> None:
+        # zero_copy: Decode bytes fields to memoryview slices of b,
+        # only where the consumer doesn't need bytes.
+        self._codec.decode(self, b, zero_copy)
 
         if init_all:
             self.init_fields()
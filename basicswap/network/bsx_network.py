@@ -6,6 +6,7 @@
 
 import base64
 import json
+import os
 import zmq
 
 from basicswap.basicswap_util import (
@@ -35,12 +36,13 @@ from basicswap.network.simplex import (
     readSimplexMsgs,
     sendSimplexMsg,
 )
+from basicswap.network.util import KeyNotFoundError, RecipientKeyIndex
 from basicswap.util import ensure
 from basicswap.util.address import (
     b58decode,
 )
 from basicswap.util.logging import LogCategories as LC
-from basicswap.util.smsg import smsgGetID
+from basicswap.util.smsg import smsgGetID, SMSGPowEngine
 
 
 def networkTypeToID(type: str) -> int:
@@ -108,6 +110,11 @@ class BSXNetwork:
 
         self.known_portals = {}
         self.own_portals = {}
+        self._recipient_keys = RecipientKeyIndex()
+        # Proof of work for locally encrypted messages, 1 searches on the calling thread
+        self._smsg_pow = SMSGPowEngine(
+            self.get_int_setting("smsg_pow_workers", min(2, os.cpu_count() or 1), 1, 64)
+        )
 
         super().__init__(data_dir=data_dir, settings=settings, **kwargs)
 
@@ -119,6 +126,8 @@ class BSXNetwork:
         if self.zmqContext:
             self.zmqContext.destroy()
 
+        self._smsg_pow.shutdown()
+
     def startNetworks(self):
         if self._zmq_queue_enabled and self._poll_smsg:
             self.log.warning("SMSG polling and zmq listener enabled.")
@@ -261,10 +270,23 @@ class BSXNetwork:
             return {"Error": "Not Initialised"}
         return self._network.get_info()
 
+    def getSimplexIngestStats(self):
+        rv = []
+        for i, network in enumerate(self.active_networks):
+            if network["type"] != "simplex":
+                continue
+            stats = network["ingest"].getStats()
+            stats["network"] = i
+            rv.append(stats)
+        return rv
+
     def getPrivkeyForAddress(self, cursor, addr: str) -> bytes:
+        privkey = self._recipient_keys.get(addr)
+        if privkey is not None:
+            return privkey
         ci_part = self.ci(Coins.PART)
         try:
-            return ci_part.decodeKey(
+            privkey = ci_part.decodeKey(
                 self.callrpc(
                     "smsgdumpprivkey",
                     [
@@ -274,18 +296,26 @@ class BSXNetwork:
             )
         except Exception as e:  # noqa: F841
             pass
-        try:
-            return ci_part.decodeKey(
-                ci_part.rpc_wallet(
-                    "dumpprivkey",
-                    [
-                        addr,
-                    ],
+        if privkey is None:
+            try:
+                privkey = ci_part.decodeKey(
+                    ci_part.rpc_wallet(
+                        "dumpprivkey",
+                        [
+                            addr,
+                        ],
+                    )
                 )
-            )
-        except Exception as e:  # noqa: F841
-            pass
-        raise ValueError("key not found")
+            except Exception as e:  # noqa: F841
+                pass
+        if privkey is None:
+            # Only a definite answer is cached by the recipient index, the dump
+            # calls also fail while the daemon is unreachable or the wallet locked
+            if ci_part.isAddressMine(addr) is False:
+                raise KeyNotFoundError("key not found")
+            raise ValueError(f"Unable to read key for {addr}")
+        self._recipient_keys.add(addr, privkey)
+        return privkey
 
     def getPubkeyForAddress(self, cursor, addr: str) -> bytes:
         if addr == self.network_addr:
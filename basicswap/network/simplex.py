@@ -6,18 +6,22 @@
 # file LICENSE or http://www.opensource.org/licenses/mit-license.php.
 
 import base64
+import collections
+import concurrent.futures
 import json
 import threading
+import time
 import traceback
 import websocket
 
 
-from queue import Queue, Empty
+from queue import Empty, Full, Queue
 
 from basicswap.util.smsg import (
     smsgEncrypt,
     smsgDecrypt,
     smsgGetID,
+    smsgIsRecipient,
 )
 from basicswap.chainparams import (
     Coins,
@@ -28,6 +32,10 @@ from basicswap.util.address import (
 from basicswap.basicswap_util import AddressTypes
 
 
+# Received message counters are updated from the ingest workers
+_mx_counters = threading.Lock()
+
+
 def encode_base64(data: bytes) -> str:
     return base64.b64encode(data).decode("utf-8")
 
@@ -172,6 +180,120 @@ def waitForConnected(ws_thread, delay_event):
     raise ValueError("waitForConnected timed-out.")
 
 
+class SimplexIngest(threading.Thread):
+    # Decodes and decrypts the messages a WebSocketThread receives on a worker pool.
+    # Results are passed on in arrival order through ready_queue, which the main
+    # loop drains. ready_queue is bounded, when full the workers stall and new
+    # messages wait in the websocket thread's recv_queue.
+
+    def __init__(
+        self,
+        ws_thread,
+        decode_func,
+        logger,
+        num_workers: int = 2,
+        max_ready: int = 1000,
+    ):
+        super().__init__(name="simplex_ingest")
+        self._ws_thread = ws_thread
+        self._decode_func = decode_func
+        self._log = logger
+        self._num_workers = max(1, num_workers)
+        self._max_pending = self._num_workers * 4
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self._num_workers, thread_name_prefix="simplex"
+        )
+        self._stop_event = threading.Event()
+        self._num_pending: int = 0
+
+        self.ready_queue = Queue(maxsize=max(1, max_ready))
+
+        self._mx_stats = threading.Lock()
+        self._num_decoded: int = 0
+        self._num_processed: int = 0
+        self._num_errors: int = 0
+        self._processed_times = collections.deque(maxlen=10000)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def _putReady(self, f) -> bool:
+        try:
+            items = f.result()
+        except Exception as e:
+            with self._mx_stats:
+                self._num_errors += 1
+            self._log.debug(f"SimplexIngest decode error: {e}")
+            return True
+        with self._mx_stats:
+            self._num_decoded += 1
+        for item in items:
+            while True:
+                if self._stop_event.is_set():
+                    return False
+                try:
+                    self.ready_queue.put(item, timeout=0.1)
+                    break
+                except Full:
+                    pass
+        return True
+
+    def run(self) -> None:
+        pending = collections.deque()
+        try:
+            while not self._stop_event.is_set():
+                # Keep the arrival order
+                while len(pending) > 0 and pending[0].done():
+                    if not self._putReady(pending.popleft()):
+                        return
+                self._num_pending = len(pending)
+                if len(pending) >= self._max_pending:
+                    concurrent.futures.wait([pending[0]], timeout=0.1)
+                    continue
+                try:
+                    message = self._ws_thread.recv_queue.get(
+                        timeout=0.005 if len(pending) > 0 else 0.1
+                    )
+                except Empty:
+                    continue
+                pending.append(self._executor.submit(self._decode_func, message))
+        finally:
+            for f in pending:
+                f.cancel()
+            self._executor.shutdown(wait=True)
+
+    def getReady(self):
+        try:
+            return self.ready_queue.get(block=False)
+        except Empty:
+            return None
+
+    def recordProcessed(self) -> None:
+        with self._mx_stats:
+            self._num_processed += 1
+            self._processed_times.append(time.time())
+
+    def getStats(self, window: int = 60) -> dict:
+        now: float = time.time()
+        with self._mx_stats:
+            num_recent: int = 0
+            for t in reversed(self._processed_times):
+                if t < now - window:
+                    break
+                num_recent += 1
+            return {
+                "workers": self._num_workers,
+                "recv_queue": self._ws_thread.recv_queue.qsize(),
+                "in_flight": self._num_pending,
+                "ready_queue": self.ready_queue.qsize(),
+                "max_ready": self.ready_queue.maxsize,
+                "decoded": self._num_decoded,
+                "processed": self._num_processed,
+                "errors": self._num_errors,
+                "processed_per_second": num_recent / window,
+            }
+
+
 def encryptMsg(
     self,
     addr_from: str,
@@ -196,6 +318,7 @@ def encryptMsg(
         deterministic,
         msg_valid,
         difficulty_target=difficulty_target,
+        pow_engine=self._smsg_pow,
     )
 
     return smsg_msg
@@ -277,7 +400,7 @@ def decryptSimplexMsg(self, msg_data):
 
     # Try with the network key first
     network_key: bytes = decodeWif(self.network_key)
-    try:
+    if smsgIsRecipient(network_key, msg_data):
         decrypted = smsgDecrypt(network_key, msg_data, output_dict=True)
         decrypted["from"] = ci_part.pubkey_to_address(
             bytes.fromhex(decrypted["pubkey_from"])
@@ -285,8 +408,6 @@ def decryptSimplexMsg(self, msg_data):
         decrypted["to"] = self.network_addr
         decrypted["msg_net"] = "simplex"
         return decrypted
-    except Exception as e:  # noqa: F841
-        pass
 
     # Try with all active bid/offer addresses
     query: str = """SELECT DISTINCT address FROM (
@@ -303,27 +424,33 @@ def decryptSimplexMsg(self, msg_data):
     now: int = self.getTime()
 
     try:
-        cursor = self.openDB()
-        addr_rows = cursor.execute(
-            query, {"now": now, "local_portal": AddressTypes.PORTAL_LOCAL}
-        ).fetchall()
-        decrypted = None
-        for row in addr_rows:
-            addr = row[0]
-            try:
-                vk_addr = self.getPrivkeyForAddress(cursor, addr)
-                decrypted = smsgDecrypt(vk_addr, msg_data, output_dict=True)
-                decrypted["from"] = ci_part.pubkey_to_address(
-                    bytes.fromhex(decrypted["pubkey_from"])
-                )
-                decrypted["to"] = addr
-                decrypted["msg_net"] = "simplex"
-                return decrypted
-            except Exception as e:  # noqa: F841
-                pass
+        cursor = self.openDBRead()
+        addrs = [
+            row[0]
+            for row in cursor.execute(
+                query, {"now": now, "local_portal": AddressTypes.PORTAL_LOCAL}
+            )
+        ]
     finally:
-        self.closeDB(cursor, commit=False)
+        self.closeDBRead(cursor)
 
+    # Keys are cached, only the mac is checked against each address
+    self._recipient_keys.retain(set(addrs))
+    try:
+        addr, privkey = self._recipient_keys.findRecipient(
+            addrs, msg_data, lambda a: self.getPrivkeyForAddress(None, a)
+        )
+    except Exception as e:
+        self.log.warning(f"decryptSimplexMsg key lookup failed: {e}")
+        return None
+    if addr is None:
+        return None
+    decrypted = smsgDecrypt(privkey, msg_data, output_dict=True)
+    decrypted["from"] = ci_part.pubkey_to_address(
+        bytes.fromhex(decrypted["pubkey_from"])
+    )
+    decrypted["to"] = addr
+    decrypted["msg_net"] = "simplex"
     return decrypted
 
 
@@ -345,11 +472,13 @@ def parseSimplexMsg(self, chat_item):
     if chat_type == "group":
         chat_name = chat_item["chatInfo"]["groupInfo"]["localDisplayName"]
         conn_id = chat_item["chatInfo"]["groupInfo"]["groupId"]
-        self.num_group_simplex_messages_received += 1
+        with _mx_counters:
+            self.num_group_simplex_messages_received += 1
     elif chat_type == "direct":
         chat_name = chat_item["chatInfo"]["contact"]["localDisplayName"]
         conn_id = chat_item["chatInfo"]["contact"]["activeConn"]["connId"]
-        self.num_direct_simplex_messages_received += 1
+        with _mx_counters:
+            self.num_direct_simplex_messages_received += 1
     else:
         return None
 
@@ -386,39 +515,49 @@ def processEvent(self, ws_thread, msg_type: str, data) -> bool:
     return True
 
 
-def readSimplexMsgs(self, network):
+def decodeSimplexMessage(self, message: str):
+    # Runs on the ingest workers.
+    # Returns a list of ("msg", decrypted_msg) and ("event", msg_type, data) items.
+    data = json.loads(message)
+    # self.log.debug(f"Message: {json.dumps(data, indent=4)}")
+    msg_type: str = getResponseData(data, "type")
+    if msg_type in ("chatItemsStatusesUpdated", "newChatItems"):
+        items = []
+        for chat_item in getResponseData(data, "chatItems"):
+            decrypted_msg = parseSimplexMsg(self, chat_item)
+            if decrypted_msg is None:
+                continue
+            items.append(("msg", decrypted_msg))
+        return items
+    elif msg_type == "chatError":
+        # self.log.debug(f"chatError Message: {json.dumps(data, indent=4)}")
+        return []
+    return [("event", msg_type, data)]
+
+
+def readSimplexMsgs(self, network, max_time: float = 0.5):
+    # Process the decoded messages, for at most max_time seconds per call
     ws_thread = network["ws_thread"]
-    for i in range(100):
-        message = ws_thread.queue_get()
-        if message is None:
-            break
+    ingest = network["ingest"]
+    time_end: float = time.time() + max_time
+    while time.time() < time_end:
         if self.delay_event.is_set():
             break
-
-        data = json.loads(message)
-        # self.log.debug(f"Message: {json.dumps(data, indent=4)}")
+        item = ingest.getReady()
+        if item is None:
+            break
         try:
-            msg_type: str = getResponseData(data, "type")
-            if msg_type in ("chatItemsStatusesUpdated", "newChatItems"):
-                for chat_item in getResponseData(data, "chatItems"):
-                    decrypted_msg = parseSimplexMsg(self, chat_item)
-                    if decrypted_msg is None:
-                        continue
-                    self.processMsg(decrypted_msg)
-            elif msg_type == "chatError":
-                # self.log.debug(f"chatError Message: {json.dumps(data, indent=4)}")
-                pass
-            elif processEvent(self, ws_thread, msg_type, data):
+            if item[0] == "msg":
+                self.processMsg(item[1])
+            elif processEvent(self, ws_thread, item[1], item[2]):
                 pass
             else:
-                self.log.debug(f"simplex: Unknown msg_type: {msg_type}")
-                # self.log.debug(f"Message: {json.dumps(data, indent=4)}")
+                self.log.debug(f"simplex: Unknown msg_type: {item[1]}")
         except Exception as e:
             self.log.debug(f"readSimplexMsgs error: {e}")
             if self.debug:
                 self.log.error(traceback.format_exc())
-
-        self.delay_event.wait(0.05)
+        ingest.recordProcessed()
 
 
 def getResponseData(data, tag=None):
@@ -465,9 +604,20 @@ def initialiseSimplexNetwork(self, network_config) -> None:
         response = waitForResponse(ws_thread, sent_id, self.delay_event)
         assert "groupLinkId" in getResponseData(response, "connection")
 
+    ingest = SimplexIngest(
+        ws_thread,
+        lambda message: decodeSimplexMessage(self, message),
+        self.log,
+        self.get_int_setting("simplex_ingest_workers", 2, 1, 32),
+        self.get_int_setting("simplex_ingest_queue_size", 1000, 10, 100000),
+    )
+    self.threads.append(ingest)
+    ingest.start()
+
     add_network = {
         "type": "simplex",
         "ws_thread": ws_thread,
+        "ingest": ingest,
     }
     if "bridged" in network_config:
         add_network["bridged"] = network_config["bridged"]
@@ -5,7 +5,13 @@
 # Distributed under the MIT software license, see the accompanying
 # file LICENSE or http://www.opensource.org/licenses/mit-license.php.
 
+import hmac
+import threading
+
+from coincurve.keys import PrivateKey
+
 from basicswap.util.address import b58decode
+from basicswap.util.smsg import smsgCalcMAC, smsgUnpack
 
 
 def getMsgPubkey(self, msg) -> bytes:
@@ -18,3 +24,77 @@ def getMsgPubkey(self, msg) -> bytes:
         ],
     )
     return b58decode(rv["publickey"])
+
+
+class KeyNotFoundError(ValueError):
+    # The wallet answered that it has no key for the address
+    pass
+
+
+class RecipientKeyIndex:
+    # Privkeys of the local addresses messages can be encrypted to, by address.
+    # Saves the daemon rpc calls to look up the key for every incoming message.
+
+    def __init__(self):
+        self._mx = threading.Lock()
+        self._keys = {}  # Parsed keys, ready for ECDH
+        self._missing = set()  # Addresses the wallet has no key for
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, addr: str):
+        key = self._keys.get(addr, None)
+        return None if key is None else key.secret
+
+    def add(self, addr: str, privkey: bytes) -> None:
+        with self._mx:
+            self._keys[addr] = PrivateKey(privkey)
+
+    def remove(self, addr: str) -> None:
+        with self._mx:
+            self._keys.pop(addr, None)
+            self._missing.discard(addr)
+
+    def retain(self, addrs) -> None:
+        # Forget the addresses that are no longer active
+        with self._mx:
+            self._keys = {k: v for k, v in self._keys.items() if k in addrs}
+            self._missing &= addrs
+
+    def clear(self) -> None:
+        with self._mx:
+            self._keys.clear()
+            self._missing.clear()
+
+    def findRecipient(self, addrs, encrypted_message: bytes, get_privkey=None):
+        # Returns (addr, privkey) for the first address the message is encrypted
+        # to, or (None, None).
+        # get_privkey(addr) is called for addresses without a cached key, only
+        # KeyNotFoundError is remembered. Other lookup errors are raised if no
+        # recipient was found so the address is looked up again for the next message.
+        smsg_timestamp, smsg_iv, R, mac, ciphertext = smsgUnpack(encrypted_message)
+        lookup_error = None
+        for addr in addrs:
+            key = self._keys.get(addr, None)
+            if key is None:
+                if get_privkey is None or addr in self._missing:
+                    continue
+                try:
+                    key = PrivateKey(get_privkey(addr))
+                except KeyNotFoundError:
+                    with self._mx:
+                        self._missing.add(addr)
+                    continue
+                except Exception as e:
+                    if lookup_error is None:
+                        lookup_error = e
+                    continue
+                with self._mx:
+                    self._keys[addr] = key
+            mac_calculated, _ = smsgCalcMAC(key, smsg_timestamp, smsg_iv, R, ciphertext)
+            if hmac.compare_digest(mac, mac_calculated):
+                return addr, key.secret
+        if lookup_error is not None:
+            raise lookup_error
+        return None, None
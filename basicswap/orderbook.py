@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2025 The Basicswap developers
+# Distributed under the MIT software license, see the accompanying
+# file LICENSE or http://www.opensource.org/licenses/mit-license.php.
+
+import bisect
+import threading
+
+
+class OrderBookEntry:
+    __slots__ = (
+        "offer_id",
+        "coin_from",
+        "coin_to",
+        "rate",
+        "amount_from",
+        "min_bid_amount",
+        "amount_negotiable",
+        "rate_negotiable",
+        "addr_from",
+        "created_at",
+        "expire_at",
+        "was_sent",
+        "auto_accept_type",
+    )
+
+    def __init__(self, offer):
+        for name in self.__slots__:
+            setattr(self, name, getattr(offer, name))
+        self.coin_from = int(self.coin_from)
+        self.coin_to = int(self.coin_to)
+
+
+class OrderBook:
+    # Active offers per (coin_from, coin_to) pair kept sorted by (rate, offer_id).
+    # Rate lookups bisect the sorted keys, expired entries are skipped until
+    # removed by the offer expiry.
+
+    def __init__(self):
+        self._mx = threading.Lock()
+        self._offers = {}  # offer_id -> OrderBookEntry
+        self._books = {}  # (coin_from, coin_to) -> sorted list of (rate, offer_id)
+
+    def __len__(self) -> int:
+        with self._mx:
+            return len(self._offers)
+
+    def __contains__(self, offer_id: bytes) -> bool:
+        with self._mx:
+            return offer_id in self._offers
+
+    def clear(self) -> None:
+        with self._mx:
+            self._offers.clear()
+            self._books.clear()
+
+    def _remove(self, offer_id: bytes) -> None:
+        # self._mx must be held
+        entry = self._offers.pop(offer_id, None)
+        if entry is None:
+            return
+        pair = (entry.coin_from, entry.coin_to)
+        keys = self._books[pair]
+        i = bisect.bisect_left(keys, (entry.rate, offer_id))
+        if i < len(keys) and keys[i] == (entry.rate, offer_id):
+            del keys[i]
+        if len(keys) == 0:
+            del self._books[pair]
+
+    def add(self, offer) -> None:
+        entry = OrderBookEntry(offer)
+        with self._mx:
+            self._remove(entry.offer_id)
+            self._offers[entry.offer_id] = entry
+            keys = self._books.setdefault((entry.coin_from, entry.coin_to), [])
+            bisect.insort(keys, (entry.rate, entry.offer_id))
+
+    def remove(self, offer_id: bytes) -> None:
+        with self._mx:
+            self._remove(offer_id)
+
+    def getPairs(self) -> dict:
+        # Returns the number of offers per (coin_from, coin_to), including expired
+        with self._mx:
+            return {pair: len(keys) for pair, keys in self._books.items()}
+
+    def getOffers(
+        self,
+        coin_from: int,
+        coin_to: int,
+        now: int,
+        min_rate: int = None,
+        max_rate: int = None,
+        limit: int = None,
+        include_sent: bool = True,
+    ) -> list:
+        # Returns unexpired entries with min_rate <= rate <= max_rate, lowest rate first
+        rv = []
+        with self._mx:
+            keys = self._books.get((int(coin_from), int(coin_to)), None)
+            if keys is None:
+                return rv
+            i = 0 if min_rate is None else bisect.bisect_left(keys, (min_rate,))
+            while i < len(keys):
+                if limit is not None and len(rv) >= limit:
+                    break
+                rate, offer_id = keys[i]
+                if max_rate is not None and rate > max_rate:
+                    break
+                i += 1
+                entry = self._offers[offer_id]
+                if entry.expire_at <= now:
+                    continue
+                if not include_sent and entry.was_sent:
+                    continue
+                rv.append(entry)
+        return rv
+
+    def bestOffer(self, coin_from: int, coin_to: int, now: int):
+        # Returns the unexpired entry with the lowest rate or None
+        offers = self.getOffers(coin_from, coin_to, now, limit=1)
+        return offers[0] if len(offers) > 0 else None
@@ -7,6 +7,7 @@
 
 import json
 import logging
+import socket
 import traceback
 import urllib
 import http.client
@@ -105,19 +106,40 @@ class Jsonrpc:
         self.__allow_none = allow_none
 
         self.__request_id = 1
+        self.__connection = None
 
     def close(self):
+        if self.__connection is not None:
+            try:
+                self.__connection.close()
+            except Exception:
+                pass
+            self.__connection = None
         if self.__transport is not None:
             self.__transport.close()
 
     def json_request(self, method, params):
-        connection = None
+        request_body = {"method": method, "params": params, "id": self.__request_id}
+        self.__request_id += 1
+        return self._post(request_body)
+
+    def json_batch_request(self, calls):
+        # calls: [(method, params), ...], ids are the list offsets
+        request_body = [
+            {"method": method, "params": params, "id": i}
+            for i, (method, params) in enumerate(calls)
+        ]
+        return self._post(request_body)
+
+    def _post(self, request_body):
+        # The HTTP/1.1 connection is kept open between requests until closed
+        # by either side.
         try:
-            connection = self.__transport.make_connection(self.__host)
+            if self.__connection is None:
+                self.__connection = self.__transport.make_connection(self.__host)
+            connection = self.__connection
             headers = self.__transport._extra_headers[:]
 
-            request_body = {"method": method, "params": params, "id": self.__request_id}
-
             connection.putrequest("POST", self.__handler)
             headers.append(("Content-Type", "application/json"))
             headers.append(("User-Agent", "jsonrpc"))
@@ -130,26 +152,20 @@ class Jsonrpc:
                 connection,
                 json.dumps(request_body, default=jsonDecimal).encode("utf-8"),
             )
-            self.__request_id += 1
 
             resp = connection.getresponse()
             result = resp.read()
 
-            connection.close()
+            if resp.will_close:
+                self.close()
 
             return result
 
         except Fault:
             raise
         except Exception:
-            self.__transport.close()
+            self.close()
             raise
-        finally:
-            if connection is not None:
-                try:
-                    connection.close()
-                except Exception:
-                    pass
 
 
 def callrpc(rpc_port, auth, method, params=[], wallet=None, host="127.0.0.1"):
@@ -174,61 +190,113 @@ def callrpc(rpc_port, auth, method, params=[], wallet=None, host="127.0.0.1"):
     return r["result"]
 
 
-def callrpc_pooled(rpc_port, auth, method, params=[], wallet=None, host="127.0.0.1"):
+def parse_batch_response(calls, r, raise_errors: bool = True):
+    # With raise_errors False failed calls are returned as ValueError instances
+    if not isinstance(r, list):
+        # Whole batch rejected
+        raise ValueError("RPC error " + str(r.get("error", r)))
+    results = [None] * len(calls)
+    for entry in r:
+        if "error" in entry and entry["error"] is not None:
+            method = calls[entry["id"]][0] if entry.get("id") is not None else "batch"
+            error = ValueError(f"RPC error {entry['error']}, method: {method}")
+            if raise_errors or entry.get("id") is None:
+                raise error
+            results[entry["id"]] = error
+            continue
+        results[entry["id"]] = entry["result"]
+    return results
+
+
+def callrpc_batch(
+    rpc_port, auth, calls, wallet=None, host="127.0.0.1", raise_errors: bool = True
+):
+    # Send [(method, params), ...] in one request, results are returned in call order
+    if len(calls) < 1:
+        return []
+    if _use_rpc_pooling:
+        pool = get_pool(rpc_port, auth, wallet, host)
+        pool.record("batch_requests")
+        r = pooled_request(pool, lambda conn: conn.json_batch_request(calls), "batch")
+        return parse_batch_response(calls, r, raise_errors)
+
+    try:
+        url = "http://{}@{}:{}/".format(auth, host, rpc_port)
+        if wallet is not None:
+            url += "wallet/" + urllib.parse.quote(wallet)
+        x = Jsonrpc(url)
+
+        v = x.json_batch_request(calls)
+        x.close()
+        r = json.loads(v.decode("utf-8"))
+    except Exception as ex:
+        raise ValueError(f"RPC server error: {ex}, method: batch")
+
+    return parse_batch_response(calls, r, raise_errors)
+
+
+def get_pool(rpc_port, auth, wallet=None, host="127.0.0.1"):
     from .rpc_pool import get_rpc_pool
-    import http.client
-    import socket
 
     url = "http://{}@{}:{}/".format(auth, host, rpc_port)
     if wallet is not None:
         url += "wallet/" + urllib.parse.quote(wallet)
 
     max_connections = _rpc_pool_settings.get("max_connections_per_daemon", 5)
-    pool = get_rpc_pool(url, max_connections)
+    # Close idle connections before the daemon does, rpcservertimeout defaults to 30s
+    max_idle_time = _rpc_pool_settings.get("max_idle_time", 20)
+    return get_rpc_pool(url, max_connections, max_idle_time)
+
 
+def pooled_request(pool, request_func, method: str):
+    # Returns the decoded response, retries once on a new connection if the
+    # connection failed.
     max_retries = 2
 
     for attempt in range(max_retries):
         conn = pool.get_connection()
 
         try:
-            v = conn.json_request(method, params)
+            v = request_func(conn)
             r = json.loads(v.decode("utf-8"))
-
-            if "error" in r and r["error"] is not None:
-                pool.discard_connection(conn)
-                raise ValueError("RPC error " + str(r["error"]))
-
-            pool.return_connection(conn)
-            return r["result"]
-
         except (
             http.client.RemoteDisconnected,
             http.client.IncompleteRead,
             http.client.BadStatusLine,
             ConnectionError,
-            ConnectionResetError,
-            ConnectionAbortedError,
-            BrokenPipeError,
             TimeoutError,
             socket.timeout,
-            socket.error,
             OSError,
         ) as ex:
             pool.discard_connection(conn)
             if attempt < max_retries - 1:
+                pool.record("reconnects")
                 continue
+            pool.record("errors")
             logging.warning(
                 f"RPC server error after {max_retries} attempts: {ex}, method: {method}"
             )
             raise ValueError(f"RPC server error: {ex}, method: {method}")
-        except ValueError:
-            raise
         except Exception as ex:
             pool.discard_connection(conn)
+            pool.record("errors")
             logging.error(f"Unexpected RPC error: {ex}, method: {method}")
             raise ValueError(f"RPC server error: {ex}, method: {method}")
 
+        pool.return_connection(conn)
+        return r
+
+
+def callrpc_pooled(rpc_port, auth, method, params=[], wallet=None, host="127.0.0.1"):
+    pool = get_pool(rpc_port, auth, wallet, host)
+    pool.record("requests")
+    r = pooled_request(pool, lambda conn: conn.json_request(method, params), method)
+
+    if "error" in r and r["error"] is not None:
+        raise ValueError("RPC error " + str(r["error"]))
+
+    return r["result"]
+
 
 def openrpc(rpc_port, auth, wallet=None, host="127.0.0.1"):
     try:
@@ -260,6 +328,20 @@ def make_rpc_func(port, auth, wallet=None, host="127.0.0.1"):
     return rpc_func
 
 
+def make_rpc_batch_func(port, auth, wallet=None, host="127.0.0.1"):
+    def rpc_batch_func(calls, wallet_override=None, raise_errors: bool = True):
+        return callrpc_batch(
+            port,
+            auth,
+            calls,
+            wallet if wallet_override is None else wallet_override,
+            host,
+            raise_errors,
+        )
+
+    return rpc_batch_func
+
+
 def escape_rpcauth(auth_str: str) -> str:
     username, password = auth_str.split(":", 1)
     username = urllib.parse.quote(username, safe="")
@@ -7,6 +7,7 @@
 import queue
 import threading
 import time
+import urllib.parse
 from basicswap.rpc import Jsonrpc
 
 
@@ -23,6 +24,30 @@ class RPCConnectionPool:
         self._lock = threading.Lock()
         self._created_connections = 0
         self._connection_timestamps = {}
+        self._stats = {
+            "requests": 0,
+            "batch_requests": 0,
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "reconnects": 0,
+            "errors": 0,
+        }
+
+    def record(self, name: str, value=1) -> None:
+        with self._lock:
+            self._stats[name] += value
+
+    def get_stats(self):
+        with self._lock:
+            rv = dict(self._stats)
+            rv["connections"] = self._created_connections
+        rv["idle"] = self._pool.qsize()
+        rv["max_connections"] = self.max_connections
+        return rv
 
     def get_connection(self):
         try:
@@ -38,10 +63,12 @@ class RPCConnectionPool:
                     )
                 conn.close()
                 with self._lock:
+                    self._stats["stale"] += 1
                     if self._created_connections > 0:
                         self._created_connections -= 1
                 return self._create_new_connection()
 
+            self.record("hits")
             return conn
         except queue.Empty:
             return self._create_new_connection()
@@ -50,13 +77,18 @@ class RPCConnectionPool:
         with self._lock:
             if self._created_connections < self.max_connections:
                 self._created_connections += 1
+                self._stats["misses"] += 1
                 return Jsonrpc(self.url)
 
+        wait_start = time.time()
         try:
             conn_data = self._pool.get(block=True, timeout=self.timeout)
             conn, timestamp = (
                 conn_data if isinstance(conn_data, tuple) else (conn_data, time.time())
             )
+            with self._lock:
+                self._stats["waits"] += 1
+                self._stats["wait_time"] += time.time() - wait_start
 
             if time.time() - timestamp > self.max_idle_time:
                 if self.logger:
@@ -65,12 +97,18 @@ class RPCConnectionPool:
                     )
                 conn.close()
                 with self._lock:
-                    if self._created_connections > 0:
-                        self._created_connections -= 1
+                    self._stats["stale"] += 1
+                    self._stats["misses"] += 1
                 return Jsonrpc(self.url)
 
+            self.record("hits")
             return conn
         except queue.Empty:
+            with self._lock:
+                self._stats["waits"] += 1
+                self._stats["wait_time"] += time.time() - wait_start
+                self._stats["timeouts"] += 1
+                self._stats["misses"] += 1
             if self.logger:
                 self.logger.warning(
                     f"RPC pool: timeout waiting for connection, creating temporary connection for {self.url}"
@@ -115,15 +153,28 @@ def set_pool_logger(logger):
     _pool_logger = logger
 
 
-def get_rpc_pool(url, max_connections=5):
+def get_rpc_pool(url, max_connections=5, max_idle_time=300):
     with _pool_lock:
         if url not in _rpc_pools:
             _rpc_pools[url] = RPCConnectionPool(
-                url, max_connections, logger=_pool_logger
+                url, max_connections, logger=_pool_logger, max_idle_time=max_idle_time
             )
         return _rpc_pools[url]
 
 
+def get_pool_stats():
+    # Per daemon url stats, credentials are removed
+    rv = []
+    with _pool_lock:
+        pools = list(_rpc_pools.items())
+    for url, pool in pools:
+        parsed = urllib.parse.urlparse(url)
+        stats = pool.get_stats()
+        stats["url"] = parsed.netloc.rsplit("@", 1)[-1] + parsed.path
+        rv.append(stats)
+    return sorted(rv, key=lambda x: x["url"])
+
+
 def close_all_pools():
     with _pool_lock:
         for pool in _rpc_pools.values():
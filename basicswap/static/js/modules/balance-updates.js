@@ -122,9 +122,13 @@ const BalanceUpdatesManager = (function() {
   }
 
   function setupWebSocketHandler(contextKey, balanceUpdateCallback, swapEventCallback, errorContext) {
+    if (typeof window.WebSocketManager.subscribe === 'function') {
+      window.WebSocketManager.subscribe(['wallets']);
+    }
     const handlerId = window.WebSocketManager.addMessageHandler('message', (data) => {
       if (data && data.event) {
-        if (data.event === 'coin_balance_updated') {
+        const isWalletDelta = data.event === 'delta' && data.topic === 'wallets';
+        if (data.event === 'coin_balance_updated' || isWalletDelta || data.event === 'resync') {
           handleBalanceUpdate(contextKey, balanceUpdateCallback, errorContext);
         }
 
@@ -144,7 +148,11 @@ const BalanceUpdatesManager = (function() {
   function setupPeriodicRefresh(contextKey, updateCallback, errorContext, interval) {
     const refreshInterval = interval || config.periodicRefreshInterval;
 
+    // Balance changes are pushed while the websocket is connected
     setIntervalByKey(`${contextKey}_periodic`, () => {
+      if (window.WebSocketManager && window.WebSocketManager.isConnected()) {
+        return;
+      }
       fetchBalanceData()
         .then(balanceData => {
           updateCallback(balanceData);
@@ -18,7 +18,8 @@ const WebSocketManager = (function() {
         isPageHidden: document.hidden,
         messageHandlers: {},
         listeners: {},
-        reconnectTimeout: null
+        reconnectTimeout: null,
+        subscriptions: new Set()
     };
 
     function log(message, ...args) {
@@ -145,6 +146,22 @@ const WebSocketManager = (function() {
             }
         },
 
+        subscribe: function(topics) {
+            const newTopics = topics.filter(topic => !state.subscriptions.has(topic));
+            newTopics.forEach(topic => state.subscriptions.add(topic));
+            if (newTopics.length > 0 && this.isConnected()) {
+                this.sendMessage({ action: 'subscribe', topics: newTopics });
+            }
+        },
+
+        unsubscribe: function(topics) {
+            const oldTopics = topics.filter(topic => state.subscriptions.has(topic));
+            oldTopics.forEach(topic => state.subscriptions.delete(topic));
+            if (oldTopics.length > 0 && this.isConnected()) {
+                this.sendMessage({ action: 'unsubscribe', topics: oldTopics });
+            }
+        },
+
         addMessageHandler: function(type, handler) {
             if (!state.messageHandlers[type]) {
                 state.messageHandlers[type] = {};
@@ -251,6 +268,10 @@ const WebSocketManager = (function() {
 
             log('WebSocket connection established');
 
+            if (state.subscriptions.size > 0) {
+                ws.send(JSON.stringify({ action: 'subscribe', topics: Array.from(state.subscriptions) }));
+            }
+
             notifyHandlers('connect', { isConnected: true });
 
             if (typeof updateConnectionStatus === 'function') {
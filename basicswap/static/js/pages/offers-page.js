@@ -7,6 +7,7 @@ let currentSortColumn = 0;
 let currentSortDirection = 'desc';
 let isPaginationInProgress = false;
 let autoRefreshInterval = null;
+let pushRefreshPending = false;
 
 const isSentOffers = window.offersTableConfig.isSentOffers;
 const CACHE_DURATION = window.config.cacheConfig.defaultTTL;
@@ -2445,7 +2446,11 @@ function startAutoRefresh() {
         clearInterval(autoRefreshInterval);
     }
 
+    // Offer changes are pushed while the websocket is connected
     autoRefreshInterval = CleanupManager.setInterval(async () => {
+        if (window.WebSocketManager && WebSocketManager.isConnected()) {
+            return;
+        }
         try {
           
             const response = await fetch(isSentOffers ? '/json/sentoffers' : '/json/offers');
@@ -2568,8 +2573,17 @@ document.addEventListener('DOMContentLoaded', async function() {
         }
 
         if (window.WebSocketManager) {
+            WebSocketManager.subscribe(['offers']);
             WebSocketManager.addMessageHandler('message', async (data) => {
-                if (data.event === 'new_offer' || data.event === 'offer_revoked') {
+                const isOfferDelta = data.event === 'delta' && data.topic === 'offers';
+                if (isOfferDelta || data.event === 'resync' || data.event === 'new_offer' || data.event === 'offer_revoked') {
+                    // Refetch once for a burst of changes
+                    if (pushRefreshPending) {
+                        return;
+                    }
+                    pushRefreshPending = true;
+                    await new Promise(resolve => CleanupManager.setTimeout(resolve, 500));
+                    pushRefreshPending = false;
                     try {
                         
                         const fetchWithRetry = async (url, maxRetries = 3) => {
@@ -671,10 +671,30 @@ const setupEventListeners = () => {
 
 document.addEventListener('DOMContentLoaded', async () => {
     WebSocketManager.initialize();
+    WebSocketManager.subscribe(['bids']);
     setupEventListeners();
     await updateSwapsTable({ resetPage: true, refreshData: true });
 
+    let pushRefreshTimeout = null;
+    WebSocketManager.addMessageHandler('message', (data) => {
+        const isBidDelta = data && data.event === 'delta' && data.topic === 'bids';
+        if (!isBidDelta && !(data && data.event === 'resync')) {
+            return;
+        }
+        if (pushRefreshTimeout) {
+            return;
+        }
+        pushRefreshTimeout = CleanupManager.setTimeout(async () => {
+            pushRefreshTimeout = null;
+            await updateSwapsTable({ resetPage: false, refreshData: true });
+        }, 500);
+    });
+
+    // Bid changes are pushed while the websocket is connected
     const autoRefreshInterval = CleanupManager.setInterval(async () => {
+        if (WebSocketManager.isConnected()) {
+            return;
+        }
         await updateSwapsTable({ resetPage: false, refreshData: true });
     }, 10000);
 
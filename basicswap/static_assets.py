@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2025 The Basicswap developers
+# Distributed under the MIT software license, see the accompanying
+# file LICENSE or http://www.opensource.org/licenses/mit-license.php.
+
+import gzip
+import hashlib
+import os
+import threading
+
+
+IMAGE_MIME_TYPES = {
+    ".svg": "image/svg+xml",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".gif": "image/gif",
+    ".ico": "image/x-icon",
+}
+COMPRESSIBLE_MIME_TYPES = (
+    "image/svg+xml",
+    "text/css; charset=utf-8",
+    "application/javascript",
+)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def get_mime_type(rel_path: str) -> str:
+    # Returns "" for files that shouldn't be served
+    top_dir, _, filename = rel_path.partition("/")
+    if filename == "":
+        return ""
+    if top_dir == "sequence_diagrams":
+        return "image/svg+xml"
+    if top_dir == "images":
+        return IMAGE_MIME_TYPES.get(os.path.splitext(filename)[1], "")
+    if top_dir == "css":
+        return "text/css; charset=utf-8"
+    if top_dir == "js":
+        return "application/javascript"
+    return ""
+
+
+class StaticAsset:
+    __slots__ = ("mime_type", "content", "content_gz", "etag", "mtime_ns")
+
+    def __init__(self, mime_type: str, content: bytes, mtime_ns: int):
+        self.mime_type = mime_type
+        self.content = content
+        self.mtime_ns = mtime_ns
+        self.etag = hashlib.sha256(content).hexdigest()[:20]
+        self.content_gz = None
+        if mime_type in COMPRESSIBLE_MIME_TYPES:
+            content_gz = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(content_gz) < len(content):
+                self.content_gz = content_gz
+
+
+class StaticAssets:
+    # Holds the files under basicswap/static in memory with a precompressed gzip
+    # variant and a content hash used as the ETag and in versioned urls.
+    # If check_mtime is set files are reloaded when changed on disk.
+
+    def __init__(self, static_path: str, check_mtime: bool = False):
+        self._static_path = os.path.realpath(static_path)
+        self.check_mtime = check_mtime
+        self._mx = threading.Lock()
+        self._assets = {}
+        self._loaded = False
+
+    def _loadFile(self, rel_path: str):
+        mime_type = get_mime_type(rel_path)
+        if mime_type == "":
+            return None
+        file_path = os.path.realpath(os.path.join(self._static_path, rel_path))
+        if not file_path.startswith(self._static_path + os.sep):
+            return None
+        try:
+            with open(file_path, "rb") as fp:
+                mtime_ns = os.fstat(fp.fileno()).st_mtime_ns
+                content = fp.read()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None
+        return StaticAsset(mime_type, content, mtime_ns)
+
+    def load(self) -> None:
+        assets = {}
+        for root, dirs, files in os.walk(self._static_path):
+            for filename in files:
+                rel_path = os.path.relpath(
+                    os.path.join(root, filename), self._static_path
+                ).replace(os.sep, "/")
+                asset = self._loadFile(rel_path)
+                if asset is not None:
+                    assets[rel_path] = asset
+        with self._mx:
+            self._assets = assets
+            self._loaded = True
+
+    def numBytes(self) -> (int, int):
+        # Returns the total size of the uncompressed and gzip content held
+        with self._mx:
+            assets = list(self._assets.values())
+        return (
+            sum(len(a.content) for a in assets),
+            sum(len(a.content_gz) for a in assets if a.content_gz),
+        )
+
+    def get(self, rel_path: str):
+        with self._mx:
+            asset = self._assets.get(rel_path, None)
+            loaded = self._loaded
+        if asset is not None and not self.check_mtime:
+            return asset
+        if loaded and not self.check_mtime:
+            return None
+
+        # Not preloaded or checking for changes
+        if asset is not None:
+            try:
+                file_path = os.path.join(self._static_path, rel_path)
+                if os.stat(file_path).st_mtime_ns == asset.mtime_ns:
+                    return asset
+            except OSError:
+                pass
+        asset = self._loadFile(rel_path)
+        with self._mx:
+            if asset is None:
+                self._assets.pop(rel_path, None)
+            else:
+                self._assets[rel_path] = asset
+        return asset
+
+    def url(self, rel_path: str) -> str:
+        # Returns a versioned url for rel_path, which can be cached indefinitely
+        asset = self.get(rel_path)
+        if asset is None:
+            return "/static/" + rel_path
+        return f"/static/{rel_path}?v={asset.etag}"
+
+    @staticmethod
+    def etagMatches(asset, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            tag = tag.strip('"')
+            if tag.endswith("-gz"):
+                tag = tag[:-3]
+            if tag == asset.etag:
+                return True
+        return False
+
+    @staticmethod
+    def acceptsGzip(accept_encoding: str) -> bool:
+        for coding in (accept_encoding or "").split(","):
+            name, _, params = coding.strip().partition(";")
+            if name.strip().lower() not in ("gzip", "*"):
+                continue
+            params = params.replace(" ", "")
+            if params in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                return False
+            return True
+        return False
+
+    def respond(self, rel_path: str, request_headers, version: str = None):
+        # Returns (status_code, headers, body) or None if rel_path is not found
+        asset = self.get(rel_path)
+        if asset is None:
+            return None
+
+        headers = [("Content-Type", asset.mime_type)]
+        use_gzip = asset.content_gz is not None and self.acceptsGzip(
+            request_headers.get("Accept-Encoding", "")
+        )
+        if asset.content_gz is not None:
+            headers.append(("Vary", "Accept-Encoding"))
+        headers.append(
+            ("ETag", f'"{asset.etag}-gz"' if use_gzip else f'"{asset.etag}"')
+        )
+        headers.append(
+            (
+                "Cache-Control",
+                (
+                    IMMUTABLE_CACHE_CONTROL
+                    if version == asset.etag
+                    else REVALIDATE_CACHE_CONTROL
+                ),
+            )
+        )
+
+        if self.etagMatches(asset, request_headers.get("If-None-Match", "")):
+            return 304, headers, b""
+
+        body = asset.content_gz if use_gzip else asset.content
+        if use_gzip:
+            headers.append(("Content-Encoding", "gzip"))
+        headers.append(("Content-Length", str(len(body))))
+        return 200, headers, body
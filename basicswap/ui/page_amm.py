@@ -393,7 +393,7 @@ def get_amm_logs():
         return amm_log_buffer.copy()
 
 
-def get_amm_active_count(swap_client, debug_override=False):
+def get_amm_active_count(swap_client, debug_override=False, network_offers=None):
     """Get the count of active AMM offers and bids"""
     amm_count = 0
 
@@ -442,7 +442,8 @@ def get_amm_active_count(swap_client, debug_override=False):
             state_data = json.load(f)
 
         try:
-            network_offers = swap_client.listOffers()
+            if network_offers is None:
+                network_offers = swap_client.listOffers()
 
             for offer in network_offers:
                 try:
@@ -590,6 +591,75 @@ def get_amm_active_count(swap_client, debug_override=False):
     return amm_count
 
 
+def file_stat_key(path):
+    try:
+        st = os.stat(path)
+        return (path, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return (path, None, None)
+
+
+class AMMActiveCountCache:
+    """Caches get_amm_active_count between changes to its inputs
+
+    The count is recomputed when the AMM process status, the config or state
+    files (by mtime and size) or the set of active offers change, or when the
+    earliest expiring active offer expires.
+    """
+
+    def __init__(self):
+        self._mx = threading.Lock()
+        self._key = None
+        self._valid_until = 0
+        self._count = 0
+        self.num_computed = 0
+
+    def clear(self):
+        with self._mx:
+            self._key = None
+
+    def get(self, swap_client):
+        status = get_amm_status()
+        if status != "running":
+            return 0
+
+        key = (
+            id(swap_client),
+            status,
+            file_stat_key(get_amm_config_path(swap_client)),
+            file_stat_key(get_amm_state_path(swap_client)),
+            getattr(swap_client, "_offers_seq", None),
+        )
+        with self._mx:
+            if key == self._key and swap_client.getTime() < self._valid_until:
+                return self._count
+
+            network_offers = None
+            valid_until = 0
+            try:
+                network_offers = swap_client.listOffers()
+                valid_until = min(
+                    (o.expire_at for o in network_offers), default=float("inf")
+                )
+            except Exception as e:
+                swap_client.log.debug(f"AMM active count listOffers: {e}")
+            count = get_amm_active_count(swap_client, network_offers=network_offers)
+
+            self.num_computed += 1
+            self._key = key
+            self._valid_until = valid_until
+            self._count = count
+            return count
+
+
+amm_active_count_cache = AMMActiveCountCache()
+
+
+def get_amm_active_count_cached(swap_client):
+    """Get the count of active AMM offers and bids, recomputed only when changed"""
+    return amm_active_count_cache.get(swap_client)
+
+
 def page_amm(self, _, post_string):
     """Render the AMM page"""
     global amm_host, amm_port, amm_debug, amm_ui_debug
@@ -1308,6 +1378,9 @@ def amm_status_api(swap_client, _, params=None):
     if params and "debug" in params:
         debug_enabled = params["debug"].lower() == "true"
 
-    amm_count = get_amm_active_count(swap_client, debug_enabled)
+    if debug_enabled:
+        amm_count = get_amm_active_count(swap_client, debug_enabled)
+    else:
+        amm_count = get_amm_active_count_cached(swap_client)
 
     return {"status": status, "amm_active_count": amm_count}
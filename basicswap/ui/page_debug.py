@@ -15,6 +15,9 @@ from basicswap.chainparams import (
 from basicswap.db_util import (
     remove_expired_data,
 )
+from basicswap.rpc_pool import (
+    get_pool_stats,
+)
 
 
 def page_debug(self, url_split, post_string):
@@ -41,8 +44,8 @@ def page_debug(self, url_split, post_string):
         if have_data_entry(form_data, "remove_expired"):
             try:
                 swap_client.log.warning("Removing expired data.")
-                remove_expired_data(swap_client)
-                messages.append("Done.")
+                removed = remove_expired_data(swap_client)
+                messages.append(f"Done, removed {sum(removed.values())} rows.")
             except Exception as e:
                 swap_client.log.error(
                     traceback.format_exc()
@@ -105,5 +108,7 @@ def page_debug(self, url_split, post_string):
             "err_messages": err_messages,
             "result": result,
             "summary": summary,
+            "rpc_pool_stats": get_pool_stats(),
+            "simplex_ingest_stats": swap_client.getSimplexIngestStats(),
         },
     )
@@ -5,6 +5,9 @@
 # Distributed under the MIT software license, see the accompanying
 # file LICENSE or http://www.opensource.org/licenses/mit-license.php.
 
+import collections
+import threading
+
 from copy import deepcopy
 from .crypto import blake256, hash160, hmac_sha512, ripemd160
 
@@ -26,6 +29,26 @@ def hardened(i: int) -> int:
     return i | (1 << 31)
 
 
+def path_to_child_numbers(path: str):
+    rv = []
+    for i, level in enumerate(path.split("/")):
+        level = level.lower()
+        if i == 0 and level == "s":
+            continue
+        should_harden: bool = False
+        if len(level) > 1 and level.endswith("h") or level.endswith("'"):
+            level = level[:-1]
+            should_harden = True
+        if level.isdigit():
+            child_no: int = int(level)
+            if should_harden:
+                child_no = hardened(child_no)
+            rv.append(child_no)
+        else:
+            raise ValueError("Invalid path node")
+    return rv
+
+
 class ExtKeyPair:
     __slots__ = (
         "_depth",
@@ -104,23 +127,9 @@ class ExtKeyPair:
         return out
 
     def derive_path(self, path: str):
-        path_entries = path.split("/")
         rv = deepcopy(self)
-        for i, level in enumerate(path_entries):
-            level = level.lower()
-            if i == 0 and level == "s":
-                continue
-            should_harden: bool = False
-            if len(level) > 1 and level.endswith("h") or level.endswith("'"):
-                level = level[:-1]
-                should_harden = True
-            if level.isdigit():
-                child_no: int = int(level)
-                if should_harden:
-                    child_no = hardened(child_no)
-                rv = rv.derive(child_no)
-            else:
-                raise ValueError("Invalid path node")
+        for child_no in path_to_child_numbers(path):
+            rv = rv.derive(child_no)
         return rv
 
     def encode_v(self) -> bytes:
@@ -156,3 +165,36 @@ class ExtKeyPair:
         else:
             self._key = None
             self._pubkey = data[41:]
+
+
+class ExtKeyCache:
+    # Memoised derivations from a root extkey, keyed by path.
+    # Derivation starts from the longest cached parent, returned keys must not be modified.
+
+    def __init__(self, root: ExtKeyPair, max_entries: int = 4096):
+        self._root = root
+        self._max_entries = max_entries
+        self._cache = collections.OrderedDict()
+        self._mx = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def derive_path(self, path: str) -> ExtKeyPair:
+        child_numbers = tuple(path_to_child_numbers(path))
+        with self._mx:
+            rv = self._root
+            depth: int = len(child_numbers)
+            while depth > 0:
+                cached = self._cache.get(child_numbers[:depth], None)
+                if cached is not None:
+                    self._cache.move_to_end(child_numbers[:depth])
+                    rv = cached
+                    break
+                depth -= 1
+            for i in range(depth, len(child_numbers)):
+                rv = rv.derive(child_numbers[i])
+                self._cache[child_numbers[: i + 1]] = rv
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+            return rv
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 
 import hashlib
+import hmac
 import secrets
+import threading
+import time
+
+from collections import OrderedDict
 
 
 def rfc2440_hash_password(password, salt=None):
@@ -48,8 +53,9 @@ def verify_rfc2440_password(stored_hash, provided_password):
             return False
 
         salt_hex_plus_hash_hex = parts[1]
-        separator_index = salt_hex_plus_hash_hex.find("60")
-        if separator_index != 16:
+        # The salt may contain "60", the separator follows the 8 byte salt
+        separator_index = 16
+        if salt_hex_plus_hash_hex[separator_index : separator_index + 2] != "60":
             return False
 
         salt_hex = salt_hex_plus_hash_hex[:separator_index]
@@ -77,3 +83,62 @@ def verify_rfc2440_password(stored_hash, provided_password):
 
     calculated_hash_hex = h.hexdigest().upper()
     return secrets.compare_digest(calculated_hash_hex, expected_hash_hex)
+
+
+class VerifiedPasswordCache:
+    # Remembers recently verified credentials so verify_rfc2440_password doesn't
+    # run for every request.
+    # Entries are keyed by an hmac of the stored hash and the credential under a
+    # random per process key, the plaintext isn't kept.
+    # All entries are dropped when the stored hash changes.
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 64):
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._key = secrets.token_bytes(32)
+        self._mx = threading.Lock()
+        self._stored_hash = None
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        with self._mx:
+            return len(self._entries)
+
+    def clear(self) -> None:
+        with self._mx:
+            self._entries.clear()
+
+    def _entryKey(self, stored_hash: str, credential: str) -> bytes:
+        return hmac.new(
+            self._key,
+            stored_hash.encode("utf-8") + b"\0" + credential.encode("utf-8"),
+            "sha256",
+        ).digest()
+
+    def verify(self, stored_hash: str, credential: str, password: str) -> bool:
+        # credential: The value the password was taken from, eg: the Authorization header
+        if self._ttl < 1:
+            return verify_rfc2440_password(stored_hash, password)
+
+        key = self._entryKey(stored_hash, credential)
+        now = time.monotonic()
+        with self._mx:
+            if stored_hash != self._stored_hash:
+                self._entries.clear()
+                self._stored_hash = stored_hash
+            expire_at = self._entries.get(key, None)
+            if expire_at is not None:
+                if expire_at > now:
+                    return True
+                del self._entries[key]
+
+        if not verify_rfc2440_password(stored_hash, password):
+            return False
+
+        with self._mx:
+            if stored_hash == self._stored_hash:
+                self._entries[key] = now + self._ttl
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+        return True
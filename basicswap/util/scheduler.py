@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2025 The Basicswap developers
+# Distributed under the MIT software license, see the accompanying
+# file LICENSE or http://www.opensource.org/licenses/mit-license.php.
+
+import heapq
+import threading
+
+
+class ExpiryScheduler:
+    # Min-heap of (expire_at, key).
+    # Rescheduling or cancelling a key doesn't touch the heap, superseded
+    # entries are skipped when popped and the heap is rebuilt when they
+    # outnumber the live entries.
+
+    def __init__(self):
+        self._mx = threading.Lock()
+        self._heap = []
+        self._expire_at = {}  # key -> expire_at of the live entry
+
+    def __len__(self) -> int:
+        with self._mx:
+            return len(self._expire_at)
+
+    def __contains__(self, key) -> bool:
+        with self._mx:
+            return key in self._expire_at
+
+    def clear(self) -> None:
+        with self._mx:
+            self._heap.clear()
+            self._expire_at.clear()
+
+    def _compact(self) -> None:
+        # self._mx must be held
+        if len(self._heap) <= 2 * len(self._expire_at) + 1024:
+            return
+        self._heap = [(v, k) for k, v in self._expire_at.items()]
+        heapq.heapify(self._heap)
+
+    def schedule(self, key, expire_at: int) -> None:
+        with self._mx:
+            if self._expire_at.get(key, None) == expire_at:
+                return
+            self._expire_at[key] = expire_at
+            heapq.heappush(self._heap, (expire_at, key))
+            self._compact()
+
+    def cancel(self, key) -> None:
+        with self._mx:
+            if self._expire_at.pop(key, None) is not None:
+                self._compact()
+
+    def nextExpiry(self):
+        # Returns the earliest expire_at or None if empty
+        with self._mx:
+            while len(self._heap) > 0:
+                expire_at, key = self._heap[0]
+                if self._expire_at.get(key, None) == expire_at:
+                    return expire_at
+                heapq.heappop(self._heap)
+        return None
+
+    def popExpired(self, now: int) -> list:
+        # Returns the keys with expire_at <= now, earliest first
+        rv = []
+        with self._mx:
+            heap = self._heap
+            while len(heap) > 0 and heap[0][0] <= now:
+                expire_at, key = heapq.heappop(heap)
+                if self._expire_at.get(key, None) != expire_at:
+                    continue
+                del self._expire_at[key]
+                rv.append(key)
+        return rv
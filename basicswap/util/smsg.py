@@ -5,9 +5,12 @@
 # Distributed under the MIT software license, see the accompanying
 # file LICENSE or http://www.opensource.org/licenses/mit-license.php.
 
+import concurrent.futures
 import hashlib
 import hmac
+import multiprocessing
 import secrets
+import threading
 import time
 
 
@@ -22,7 +25,6 @@ from basicswap.util.crypto import hash160, sha256, ripemd160
 from basicswap.util.ecc import getSecretInt
 from basicswap.contrib.test_framework.messages import (
     uint256_from_compact,
-    uint256_from_str,
 )
 
 
@@ -59,6 +61,7 @@ SMSG_HDR_LEN = (
     108  # Length of unencrypted header, 4 + 4 + 2 + 1 + 8 + 4 + 16 + 33 + 32 + 4
 )
 SMSG_PL_HDR_LEN = 1 + 20 + 65 + 4  # Length of encrypted header in payload
+SMSG_MAX_NONCE = 1000000
 
 
 def smsgGetTimestamp(smsg_message: bytes) -> int:
@@ -88,6 +91,93 @@ def smsgGetID(smsg_message: bytes) -> bytes:
     return smsg_timestamp.to_bytes(8, byteorder="big") + ripemd160(smsg_message[8:])
 
 
+def smsgFindNonce(msg_tail: bytes, target: int, nonce_from: int, nonce_to: int):
+    # Returns the first nonce in [nonce_from, nonce_to) and the pow hash meeting target.
+    # msg_tail is the message after the nonce, the hmac is expanded so only the
+    # key pads and nonce are rebuilt per attempt, see smsgGetPOWHash.
+    ipad = b"\x36" * 32
+    opad = b"\x5c" * 32
+    sha256_new = hashlib.sha256
+    for nonce in range(nonce_from, nonce_to):
+        nonce_bytes: bytes = nonce.to_bytes(4, byteorder="little")
+        h = sha256_new(
+            (nonce ^ 0x36363636).to_bytes(4, byteorder="little") * 8
+            + ipad
+            + nonce_bytes
+        )
+        h.update(msg_tail)
+        pow_hash: bytes = sha256_new(
+            (nonce ^ 0x5C5C5C5C).to_bytes(4, byteorder="little") * 8 + opad + h.digest()
+        ).digest()
+        if int.from_bytes(pow_hash, byteorder="little") <= target:
+            return nonce, pow_hash
+    return None, None
+
+
+class SMSGPowEngine:
+    # Splits the nonce search across a process pool.
+    # Chunks are checked in nonce order so the nonce found is the same as a
+    # serial search would find.
+
+    def __init__(self, num_workers: int = 2, chunk_size: int = 4096):
+        self._num_workers = max(1, num_workers)
+        self._chunk_size = max(1, chunk_size)
+        self._executor = None
+        self._mx = threading.Lock()
+
+    def shutdown(self) -> None:
+        with self._mx:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _getExecutor(self):
+        with self._mx:
+            if self._executor is None:
+                # Spawn, forking a process with running threads is unsafe
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self._num_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def findNonce(self, msg_tail: bytes, target: int, max_nonce: int = SMSG_MAX_NONCE):
+        if self._num_workers < 2:
+            return smsgFindNonce(msg_tail, target, 0, max_nonce)
+
+        executor = self._getExecutor()
+        pending = []
+        nonce_from: int = 0
+
+        def submitChunk():
+            nonlocal nonce_from
+            nonce_to: int = min(nonce_from + self._chunk_size, max_nonce)
+            pending.append(
+                executor.submit(smsgFindNonce, msg_tail, target, nonce_from, nonce_to)
+            )
+            nonce_from = nonce_to
+
+        try:
+            while nonce_from < max_nonce and len(pending) < self._num_workers * 2:
+                submitChunk()
+            while len(pending) > 0:
+                rv = pending.pop(0).result()
+                if rv[0] is not None:
+                    return rv
+                if nonce_from < max_nonce:
+                    submitChunk()
+        except concurrent.futures.process.BrokenProcessPool:
+            with self._mx:
+                if self._executor is executor:
+                    self._executor = None
+            return smsgFindNonce(msg_tail, target, 0, max_nonce)
+        finally:
+            for f in pending:
+                f.cancel()
+        return None, None
+
+
 def smsgEncrypt(
     privkey_from: bytes,
     pubkey_to: bytes,
@@ -97,6 +187,7 @@ def smsgEncrypt(
     payload_format: int = 2,
     smsg_ttl: int = SMSG_MIN_TTL,
     difficulty_target=0x1EFFFFFF,
+    pow_engine: SMSGPowEngine = None,
 ) -> bytes:
     # assert len(payload) < 128  # Requires lz4 if payload > 128 bytes
     # TODO: Add lz4 to match core smsg
@@ -178,24 +269,18 @@ def smsgEncrypt(
     )
 
     target: int = uint256_from_compact(difficulty_target)
-    for i in range(1000000):
-        pow_hash = smsgGetPOWHash(smsg_message)
-        if uint256_from_str(pow_hash) > target:
-            smsg_nonce = (int.from_bytes(smsg_nonce, byteorder="little") + 1).to_bytes(
-                4, byteorder="little"
-            )
-            smsg_message = pow_hash[:4] + smsg_nonce + smsg_message[8:]
-            continue
-        smsg_message = pow_hash[:4] + smsg_message[4:]
-        return smsg_message
-    raise ValueError("Failed to set POW hash.")
+    msg_tail: bytes = smsg_message[8:]
+    if pow_engine is None:
+        nonce, pow_hash = smsgFindNonce(msg_tail, target, 0, SMSG_MAX_NONCE)
+    else:
+        nonce, pow_hash = pow_engine.findNonce(msg_tail, target, SMSG_MAX_NONCE)
+    if nonce is None:
+        raise ValueError("Failed to set POW hash.")
+    return pow_hash[:4] + nonce.to_bytes(4, byteorder="little") + msg_tail
 
 
-def smsgDecrypt(
-    privkey_to: bytes, encrypted_message: bytes, output_dict: bool = False
-) -> Union[bytes, Dict]:
-    # Without lz4
-
+def smsgUnpack(encrypted_message: bytes):
+    # Returns the timestamp, iv, R, mac and ciphertext of a message
     assert len(encrypted_message) > SMSG_HDR_LEN
     smsg_timestamp = int.from_bytes(encrypted_message[11 : 11 + 8], byteorder="little")
     ofs: int = 23
@@ -210,8 +295,17 @@ def smsgDecrypt(
     ofs += 4
     ciphertext = encrypted_message[ofs:]
     assert len(ciphertext) == ciphertextlen
+    return smsg_timestamp, smsg_iv, R, mac, ciphertext
+
 
-    p = PrivateKey(privkey_to).ecdh(R)
+def smsgCalcMAC(
+    privkey_to, smsg_timestamp: int, smsg_iv: bytes, R: bytes, ciphertext: bytes
+):
+    # Returns the mac and encryption key from the ECDH shared point.
+    # privkey_to can be a PrivateKey to skip parsing the key again.
+    if not isinstance(privkey_to, PrivateKey):
+        privkey_to = PrivateKey(privkey_to)
+    p = privkey_to.ecdh(R)
     H = hashlib.sha512(p).digest()
     key_e: bytes = H[:32]
     key_m: bytes = H[32:]
@@ -220,7 +314,25 @@ def smsgDecrypt(
     m.update(smsg_timestamp.to_bytes(8, byteorder="little"))
     m.update(smsg_iv)
     m.update(ciphertext)
-    mac_calculated: bytes = m.digest()
+    return m.digest(), key_e
+
+
+def smsgIsRecipient(privkey_to, encrypted_message: bytes) -> bool:
+    # Checks the mac only, skips the decryption and signature recovery
+    smsg_timestamp, smsg_iv, R, mac, ciphertext = smsgUnpack(encrypted_message)
+    mac_calculated, _ = smsgCalcMAC(privkey_to, smsg_timestamp, smsg_iv, R, ciphertext)
+    return hmac.compare_digest(mac, mac_calculated)
+
+
+def smsgDecrypt(
+    privkey_to: bytes, encrypted_message: bytes, output_dict: bool = False
+) -> Union[bytes, Dict]:
+    # Without lz4
+
+    smsg_timestamp, smsg_iv, R, mac, ciphertext = smsgUnpack(encrypted_message)
+    mac_calculated, key_e = smsgCalcMAC(
+        privkey_to, smsg_timestamp, smsg_iv, R, ciphertext
+    )
 
     assert mac == mac_calculated
 
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2025 The Basicswap developers
+# Distributed under the MIT software license, see the accompanying
+# file LICENSE or http://www.opensource.org/licenses/mit-license.php.
+
+import itertools
+import json
+import re
+import threading
+
+from collections import OrderedDict
+
+
+# offers, offers:<coin_from>-<coin_to>, bids, swap:<bid_id>, wallets
+TOPIC_RE = re.compile(
+    r"^(offers|bids|wallets|offers:\d{1,4}-\d{1,4}|swap:[0-9a-f]{56})$"
+)
+MAX_CLIENT_TOPICS = 64
+
+
+class WSTopicHub:
+    # Topic subscriptions for websocket clients.
+    # Clients send {"action": "subscribe", "topics": [...]} or "unsubscribe".
+    # publish() only queues messages, a sender thread writes them to the clients.
+    # Each client has a bounded queue, messages with the same coalesce key
+    # replace each other while queued. On overflow the queue is replaced with a
+    # resync event listing the client's topics.
+
+    def __init__(self, ws_server, log, max_queued: int = 256):
+        self._ws_server = ws_server
+        self._log = log
+        self._max_queued = max(2, max_queued)
+        self._cv = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self._clients = {}  # client id -> {"client", "topics", "queue"}
+        self._topics = {}  # topic -> set of client ids
+        self._pending = set()  # ids of clients with queued messages
+        self._msg_ids = itertools.count()
+        self._stats = {"published": 0, "sent": 0, "coalesced": 0, "overflows": 0}
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._sendLoop, name="wstopics")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cv:
+            self._stop = True
+            self._cv.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def getStats(self) -> dict:
+        with self._cv:
+            rv = dict(self._stats)
+            rv["clients"] = len(self._clients)
+            rv["topics"] = len(self._topics)
+        return rv
+
+    def hasSubscribers(self, topic: str) -> bool:
+        return topic in self._topics
+
+    def _queueMessage(self, client_id, msg: str, key=None) -> None:
+        # self._cv must be held
+        c = self._clients[client_id]
+        queue = c["queue"]
+        if key is None:
+            key = next(self._msg_ids)
+        elif key in queue:
+            queue[key] = msg
+            self._stats["coalesced"] += 1
+            return
+        if len(queue) >= self._max_queued:
+            self._stats["overflows"] += 1
+            queue.clear()
+            queue[next(self._msg_ids)] = json.dumps(
+                {"event": "resync", "topics": sorted(c["topics"])}
+            )
+        queue[key] = msg
+        self._pending.add(client_id)
+
+    def clientLeft(self, client_id) -> None:
+        with self._cv:
+            c = self._clients.pop(client_id, None)
+            self._pending.discard(client_id)
+            if c is None:
+                return
+            for topic in c["topics"]:
+                client_ids = self._topics.get(topic, None)
+                if client_ids is None:
+                    continue
+                client_ids.discard(client_id)
+                if len(client_ids) == 0:
+                    del self._topics[topic]
+
+    def handleMessage(self, client, message: str) -> bool:
+        # Returns False if message isn't a subscription request
+        try:
+            data = json.loads(message)
+            action = data.get("action", None)
+        except Exception:
+            return False
+        if action not in ("subscribe", "unsubscribe"):
+            return False
+
+        topics = data.get("topics", [])
+        if isinstance(topics, str):
+            topics = [topics]
+        valid_topics = []
+        invalid_topics = []
+        for topic in topics:
+            if isinstance(topic, str) and TOPIC_RE.match(topic):
+                valid_topics.append(topic)
+            else:
+                invalid_topics.append(str(topic)[:80])
+
+        client_id = client["id"]
+        with self._cv:
+            c = self._clients.setdefault(
+                client_id, {"client": client, "topics": set(), "queue": OrderedDict()}
+            )
+            for topic in valid_topics:
+                if action == "subscribe":
+                    if topic in c["topics"]:
+                        continue
+                    if len(c["topics"]) >= MAX_CLIENT_TOPICS:
+                        invalid_topics.append(topic)
+                        continue
+                    c["topics"].add(topic)
+                    self._topics.setdefault(topic, set()).add(client_id)
+                else:
+                    c["topics"].discard(topic)
+                    client_ids = self._topics.get(topic, None)
+                    if client_ids is not None:
+                        client_ids.discard(client_id)
+                        if len(client_ids) == 0:
+                            del self._topics[topic]
+            reply = {"event": action + "d", "topics": sorted(c["topics"])}
+            if len(invalid_topics) > 0:
+                reply["invalid"] = invalid_topics
+            self._queueMessage(client_id, json.dumps(reply))
+            self._cv.notify()
+        return True
+
+    def publish(self, topic: str, data: dict, coalesce_key=None) -> None:
+        # data: The delta, sent as {"event": "delta", "topic": topic, ...data}
+        if topic not in self._topics:
+            return
+        msg = json.dumps({"event": "delta", "topic": topic, **data})
+        key = None if coalesce_key is None else (topic, coalesce_key)
+        with self._cv:
+            client_ids = self._topics.get(topic, None)
+            if not client_ids:
+                return
+            self._stats["published"] += 1
+            for client_id in client_ids:
+                self._queueMessage(client_id, msg, key)
+            self._cv.notify()
+
+    def _sendLoop(self) -> None:
+        while True:
+            with self._cv:
+                while not self._stop and len(self._pending) == 0:
+                    self._cv.wait()
+                if self._stop:
+                    return
+                batch = []
+                for client_id in self._pending:
+                    c = self._clients[client_id]
+                    batch.append((c["client"], list(c["queue"].values())))
+                    c["queue"].clear()
+                self._pending.clear()
+
+            for client, msgs in batch:
+                num_sent: int = 0
+                for msg in msgs:
+                    try:
+                        self._ws_server.send_message(client, msg)
+                        num_sent += 1
+                    except Exception as e:
+                        self._log.debug(f"ws send to client {client['id']}: {e}")
+                        break
+                with self._cv:
+                    self._stats["sent"] += num_sent
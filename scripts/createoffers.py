@@ -950,23 +950,23 @@ def process_offers(args, config, script_state) -> None:
                         f"Fetching offers with coin_from_id: {coin_from_data['id']}, coin_to_id: {coin_to_data['id']}"
                     )
 
-                received_offers = read_json_api(
-                    "offers",
-                    {
-                        "active": "active",
-                        "include_sent": False,
-                        "coin_from": coin_from_data["id"],
-                        "coin_to": coin_to_data["id"],
-                        "with_extra_info": True,
-                    },
+                # Unexpired offers for the pair from others, lowest rate first.
+                # Own offers are filtered before the server's page limit is applied
+                orderbook = read_json_api(
+                    f"orderbook/{coin_from_data['id']}/{coin_to_data['id']}",
+                    {"include_sent": False},
                 )
 
-                if not isinstance(received_offers, list):
+                if not isinstance(orderbook, dict) or not isinstance(
+                    orderbook.get("offers", None), list
+                ):
                     if args.debug:
                         print(
-                            f"Invalid market offers response type: {type(received_offers)}, content: {received_offers}"
+                            f"Invalid market offers response type: {type(orderbook)}, content: {orderbook}"
                         )
                     received_offers = []
+                else:
+                    received_offers = orderbook["offers"]
 
             except Exception as e:
                 if args.debug:
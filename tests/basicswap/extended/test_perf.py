@@ -0,0 +1,1782 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2025 The Basicswap developers
+# Distributed under the MIT software license, see the accompanying
+# file LICENSE or http://www.opensource.org/licenses/mit-license.php.
+
+"""
+Micro-benchmarks, timings are logged.
+
+python -m pytest -v -s tests/basicswap/extended/test_perf.py
+
+"""
+
+import base64
+import concurrent.futures
+import http.client
+import inspect
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from queue import Queue
+from coincurve.keys import PrivateKey
+
+from basicswap.base import BaseApp
+from basicswap.basicswap import BasicSwap
+from basicswap.basicswap_util import ActionTypes, BidStates, SwapTypes
+from basicswap.chainparams import chainparams, Coins
+from basicswap.bidcheck import BidCheckScheduler
+from basicswap.db import (
+    AutomationLink,
+    Bid,
+    Concepts,
+    create_db_,
+    DBMethods,
+    Notification,
+    Offer,
+    XmrOffer,
+    XmrSwap,
+)
+from basicswap.db_upgrades import addBidState
+from basicswap.db_util import NotificationSink
+from basicswap.http_server import HttpThread, static_assets
+from basicswap.interface.xmr import WalletRPCPool, XMRInterface
+from basicswap.js_server import js_bids, js_offers
+from basicswap.messages_npb import (
+    OfferMessage,
+    XmrBidAcceptMessage,
+    XmrSplitMessage,
+)
+from basicswap.network.bsx_network import BSXNetwork
+from basicswap.network.simplex import decryptSimplexMsg, SimplexIngest
+from basicswap.network.util import RecipientKeyIndex
+from basicswap.orderbook import OrderBook
+from basicswap.ui import page_amm
+from basicswap.ui.util import PAGE_LIMIT
+from basicswap.util.address import toWIF
+from basicswap.util.integer import decode_varint, encode_varint
+from basicswap.util.logging import BSXLogger
+from basicswap.util.scheduler import ExpiryScheduler
+from basicswap.util.rfc2440 import (
+    rfc2440_hash_password,
+    verify_rfc2440_password,
+    VerifiedPasswordCache,
+)
+from basicswap.contrib.test_framework.messages import (
+    uint256_from_compact,
+    uint256_from_str,
+)
+from basicswap.ws_topics import WSTopicHub
+from basicswap.util.smsg import (
+    smsgDecrypt,
+    smsgEncrypt,
+    smsgFindNonce,
+    smsgGetPOWHash,
+    SMSGPowEngine,
+)
+
+
+logger = logging.getLogger()
+logger.level = logging.DEBUG
+if not len(logger.handlers):
+    logger.addHandler(logging.StreamHandler(sys.stdout))
+
+
+def make_memory_db():
+    db = DBMethods()
+    db.sqlite_file = ":memory:"
+    db.mxDB = threading.Lock()
+    cursor = db.openDB()
+    try:
+        create_db_(db._db_con, logger)
+    finally:
+        db.closeDB(cursor)
+    return db
+
+
+def make_offer(i: int, now: int) -> Offer:
+    return Offer(
+        offer_id=random.randbytes(28),
+        active_ind=1,
+        protocol_version=1,
+        coin_from=1 + (i % 6),
+        coin_to=6 + (i % 3),
+        amount_from=100000000 + i,
+        amount_to=200000000 + i,
+        rate=50000000 + (i * 7919) % 10000000,
+        min_bid_amount=1000,
+        time_valid=3600,
+        lock_type=1,
+        lock_value=32,
+        swap_type=2,
+        addr_from="pabc",
+        created_at=now - i,
+        expire_at=now + 3600 - (i % 7200),
+        amount_negotiable=True,
+        rate_negotiable=False,
+        was_sent=(i % 10 == 0),
+        state=1,
+    )
+
+
+class MockCI:
+    def __init__(self, coin_type):
+        self.coin_type = coin_type
+
+    def coin_name(self):
+        return f"Coin{self.coin_type}"
+
+    def COIN(self):
+        return 100000000
+
+    def format_amount(self, amount):
+        return str(amount)
+
+
+class MockClient(DBMethods):
+    # BasicSwap methods the json and ui pages use, over an sqlite db
+    listOffers = BasicSwap.listOffers
+    listOffersPage = BasicSwap.listOffersPage
+    queryOffersWithExtraInfo = BasicSwap.queryOffersWithExtraInfo
+    listBids = BasicSwap.listBids
+    listBidsPage = BasicSwap.listBidsPage
+    activeBidsQueryStr = BasicSwap.activeBidsQueryStr
+    getOffer = BasicSwap.getOffer
+    getXmrOffer = BasicSwap.getXmrOffer
+    getXmrOfferFromSession = BasicSwap.getXmrOfferFromSession
+    getLinkedStrategy = BasicSwap.getLinkedStrategy
+
+    def __init__(self, now: int, sqlite_file: str = ":memory:", data_dir=None):
+        self.now = now
+        self.sqlite_file = sqlite_file
+        self.data_dir = data_dir
+        self.log = logger
+        self.debug = False
+        self.network_addr = "pnetwork"
+        self.mxDB = threading.Lock()
+        self._offers_seq = 0
+        self.interfaces = {i: MockCI(i) for i in range(1, 10)}
+        cursor = self.openDB()
+        try:
+            create_db_(self._db_con, logger)
+        finally:
+            self.closeDB(cursor)
+
+    def checkSystemStatus(self):
+        pass
+
+    def getTime(self):
+        return self.now
+
+    def ci(self, coin_type):
+        return self.interfaces[coin_type]
+
+
+class MockHttpClient:
+    get_int_setting = BaseApp.get_int_setting
+
+    def __init__(self, settings=None):
+        self.log = logger
+        self.debug = False
+        self.debug_ui = False
+        self.settings = {} if settings is None else settings
+
+
+class MockServer:
+    def __init__(self, swap_client):
+        self.swap_client = swap_client
+
+
+class MockHandler:
+    def __init__(self, swap_client, path):
+        self.server = MockServer(swap_client)
+        self.path = path
+
+
+def timeit(f, n: int = 1) -> float:
+    t = time.perf_counter()
+    for i in range(n):
+        f()
+    return time.perf_counter() - t
+
+
+def query_reflection(table_class, cursor):
+    # The per call reflection path the schema cache replaced
+    query: str = "SELECT "
+    columns = []
+    for mc_name, mc_obj in inspect.getmembers(table_class):
+        if not hasattr(mc_obj, "__sqlite3_column__"):
+            continue
+        if len(columns) > 0:
+            query += ", "
+        query += mc_name
+        columns.append((mc_name, mc_obj.column_type))
+    query += f" FROM {table_class.__tablename__} WHERE 1=1 "
+    for row in cursor.execute(query):
+        obj = table_class.__new__(table_class)
+        for mc_name, mc_obj in inspect.getmembers(obj):
+            if hasattr(mc_obj, "__sqlite3_column__"):
+                setattr(obj, mc_name, None)
+        for i, (colname, coltype) in enumerate(columns):
+            value = row[i]
+            if coltype == "bool" and value is not None:
+                value = False if value == 0 else True
+            setattr(obj, colname, value)
+        yield obj
+
+
+class NonProtobufReference:
+    # The previous NonProtobufClass codec
+
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def to_bytes(self) -> bytes:
+        rv = bytes()
+        for field_num, v in self._map.items():
+            field_name, wire_type, field_type = v
+            if not hasattr(self, field_name):
+                continue
+            field_value = getattr(self, field_name)
+            tag = (field_num << 3) | wire_type
+            if wire_type == 0:
+                if field_value == 0:
+                    continue
+                rv += encode_varint(tag)
+                rv += encode_varint(field_value)
+            elif wire_type == 2:
+                if len(field_value) == 0:
+                    continue
+                rv += encode_varint(tag)
+                if isinstance(field_value, str):
+                    field_value = field_value.encode("utf-8")
+                rv += encode_varint(len(field_value))
+                rv += field_value
+        return rv
+
+    def from_bytes(self, b: bytes) -> None:
+        max_len: int = len(b)
+        o: int = 0
+        while o < max_len:
+            tag, lv = decode_varint(b, o)
+            o += lv
+            wire_type = tag & 7
+            field_num = tag >> 3
+            field_name, wire_type_expect, field_type = self._map[field_num]
+            if wire_type == 0:
+                field_value, lv = decode_varint(b, o)
+                o += lv
+            elif wire_type == 2:
+                field_len, lv = decode_varint(b, o)
+                o += lv
+                field_value = b[o : o + field_len]
+                o += field_len
+                if field_type == 1:
+                    field_value = field_value.decode("utf-8")
+            setattr(self, field_name, field_value)
+
+
+class Test(unittest.TestCase):
+
+    def test_table_schema_cache(self):
+        num_offers: int = 5000
+        now: int = int(time.time())
+        db = make_memory_db()
+        cursor = db.openDB()
+        try:
+            t_add = timeit(
+                lambda: [db.add(make_offer(i, now), cursor) for i in range(num_offers)]
+            )
+            logger.info(f"add {num_offers} offers: {t_add:.3f}s")
+
+            cached = list(db.query(Offer, cursor))
+            reflected = list(query_reflection(Offer, cursor))
+            assert len(cached) == num_offers
+            for a, b in zip(cached, reflected):
+                assert a.__dict__ == b.__dict__
+            assert cached[0].amount_negotiable is True
+            assert cached[0].rate_negotiable is False
+
+            t_cached = timeit(lambda: list(db.query(Offer, cursor)), 5)
+            t_reflection = timeit(lambda: list(query_reflection(Offer, cursor)), 5)
+            logger.info(
+                f"query {num_offers} offers x5, cached: {t_cached:.3f}s, reflection: {t_reflection:.3f}s, speed-up: {t_reflection / t_cached:.1f}x"
+            )
+            assert t_cached < t_reflection
+        finally:
+            db.closeDB(cursor, commit=False)
+
+    def test_xmr_wallet_rpc_pool(self):
+        # Simulated wallet-rpc latencies, seconds
+        latency = {
+            "generate_from_keys": 0.05,
+            "open_wallet": 0.03,
+            "refresh": 0.01,
+            "incoming_transfers": 0.002,
+        }
+
+        class MockWalletRPC:
+            def __init__(self):
+                self.lock = threading.Lock()  # wallet-rpc handles one request at a time
+                self.counts = {}
+
+            def __call__(self, method, params=None, timeout=None):
+                with self.lock:
+                    self.counts[method] = self.counts.get(method, 0) + 1
+                    time.sleep(latency.get(method, 0))
+                    if method == "incoming_transfers":
+                        return {"transfers": []}
+                    return {}
+
+        coin_settings = {
+            "blocks_confirmed": 1,
+            "rpcport": 1,
+            "walletrpcport": 2,
+            "walletrpcauth": ("u", "p"),
+        }
+        swaps = [(random.randbytes(32), random.randbytes(32)) for i in range(16)]
+
+        def check_swaps(num_workers: int, rounds: int = 4):
+            ci = XMRInterface(coin_settings, "regtest")
+            ci.getPubkey = lambda k: k  # Keys are not checked by the mock wallets
+            ci.rpc_wallet = MockWalletRPC()
+            workers = [MockWalletRPC() for i in range(num_workers)]
+            if num_workers > 0:
+                ci._watch_wallet_pool = WalletRPCPool(workers)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                t = time.perf_counter()
+                for r in range(rounds):
+                    futures = [
+                        executor.submit(ci.findTxB, kbv, Kbs, 1, 1, 0, False)
+                        for kbv, Kbs in swaps
+                    ]
+                    for f in futures:
+                        assert f.result() is None
+                return time.perf_counter() - t
+
+        t_main = check_swaps(0)
+        logger.info(f"findTxB {len(swaps)} swaps x4, main wallet: {t_main:.3f}s")
+        for num_workers in (4, 16):
+            t_pool = check_swaps(num_workers)
+            logger.info(
+                f"findTxB {len(swaps)} swaps x4, {num_workers} workers: {t_pool:.3f}s, speed-up: {t_main / t_pool:.1f}x"
+            )
+            assert t_pool < t_main
+
+    def test_bid_check_scheduler(self):
+        # Simulated checkBidState latency per coin, seconds
+        latency = {1: 0.01, 2: 0.01, 3: 0.02, 6: 0.1}
+
+        class MockOffer:
+            def __init__(self, coin_from, coin_to):
+                self.coin_from = coin_from
+                self.coin_to = coin_to
+
+        def check_func(bid_id, bid, offer):
+            time.sleep(latency[offer.coin_from] + latency[offer.coin_to])
+            return False
+
+        swaps = [
+            (i.to_bytes(4, "big"), None, MockOffer((1, 2, 3)[i % 3], 6 if i % 2 else 1))
+            for i in range(24)
+        ]
+        t_serial = timeit(
+            lambda: BidCheckScheduler(num_workers=1).run(swaps, check_func)
+        )
+        logger.info(f"checkBidState {len(swaps)} swaps, serial: {t_serial:.3f}s")
+        for num_workers, coin_limit in ((4, 2), (8, 4), (16, 16)):
+            scheduler = BidCheckScheduler(num_workers, coin_limit)
+            try:
+                t_pool = timeit(lambda: scheduler.run(swaps, check_func))
+            finally:
+                scheduler.shutdown()
+            logger.info(
+                f"checkBidState {len(swaps)} swaps, {num_workers} workers, coin limit {coin_limit}: {t_pool:.3f}s, speed-up: {t_serial / t_pool:.1f}x"
+            )
+            assert t_pool < t_serial
+
+    def test_xmr_bid_check(self):
+        # Simulated wallet-rpc latencies, seconds
+        latency = {"open_wallet": 0.02, "refresh": 0.02, "incoming_transfers": 0.005}
+
+        class MockWalletRPC:
+            def __init__(self):
+                self.lock = threading.Lock()  # wallet-rpc handles one request at a time
+
+            def __call__(self, method, params=None, timeout=None):
+                with self.lock:
+                    time.sleep(latency.get(method, 0))
+                    if method == "incoming_transfers":
+                        return {"transfers": []}
+                    return {}
+
+        class MockOffer:
+            def __init__(self, offer_id):
+                self.offer_id = offer_id
+                self.coin_from = Coins.PART
+                self.coin_to = Coins.XMR
+                self.swap_type = SwapTypes.XMR_SWAP
+
+        class MockBid:
+            def __init__(self, bid_id):
+                self.bid_id = bid_id
+                self.state = BidStates.XMR_SWAP_SCRIPT_COIN_LOCKED
+                self.was_sent = False
+                self.was_received = True
+                self.txns = {}
+                self.xmr_a_lock_tx = None
+                self.xmr_b_lock_tx = None
+                self.debug_ind = None
+                self.amount_to = 1
+                self.chain_b_height_start = 0
+
+        class BidCheckClient(MockClient):
+            checkBidState = BasicSwap.checkBidState
+            checkXmrBidState = BasicSwap.checkXmrBidState
+            prefetchXmrBidState = BasicSwap.prefetchXmrBidState
+            findTxB = BasicSwap.findTxB
+            lookupTxB = BasicSwap.lookupTxB
+            is_reverse_ads_bid = BasicSwap.is_reverse_ads_bid
+            scriptless_coins = (Coins.XMR,)
+            coins_without_segwit = ()
+
+        class LockedLookupsClient(BidCheckClient):
+            # Lookups are made with mxDB held, as before they were prefetched
+            def prefetchXmrBidState(self, *args):
+                pass
+
+        coin_settings = {
+            "blocks_confirmed": 1,
+            "rpcport": 1,
+            "walletrpcport": 2,
+            "walletrpcauth": ("u", "p"),
+        }
+        offer_id = random.randbytes(28)
+        bid_ids = [random.randbytes(28) for i in range(16)]
+
+        def check_bids(client_class, scheduler, num_wallets: int = 8) -> float:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                client = client_class(
+                    int(time.time()), os.path.join(tmp_dir, "test.sqlite")
+                )
+                client.log = BSXLogger("test_xmr_bid_check")
+                ci = XMRInterface(coin_settings, "regtest")
+                ci.getPubkey = lambda k: k  # Keys are not checked by the mock wallets
+                ci.rpc_wallet = MockWalletRPC()
+                if num_wallets > 0:
+                    ci._watch_wallet_pool = WalletRPCPool(
+                        [MockWalletRPC() for i in range(num_wallets)]
+                    )
+                client.interfaces[Coins.XMR] = ci
+                cursor = client.openDB()
+                try:
+                    client.add(XmrOffer(offer_id=offer_id), cursor)
+                    for bid_id in bid_ids:
+                        client.add(
+                            XmrSwap(
+                                bid_id=bid_id,
+                                vkbv=random.randbytes(32),
+                                pkbs=random.randbytes(32),
+                                al_lock_refund_tx_sig=b"",
+                                af_lock_refund_tx_sig=b"",
+                            ),
+                            cursor,
+                        )
+                finally:
+                    client.closeDB(cursor)
+                offer = MockOffer(offer_id)
+                swaps = [(bid_id, MockBid(bid_id), offer) for bid_id in bid_ids]
+                try:
+                    t = time.perf_counter()
+                    for r in range(2):
+                        for result in scheduler.run(swaps, client.checkBidState):
+                            assert result[3] is False
+                    t = time.perf_counter() - t
+                finally:
+                    scheduler.shutdown()
+                    client.closeDBConnections()
+                return t
+
+        t_serial = check_bids(BidCheckClient, BidCheckScheduler(num_workers=1))
+        logger.info(f"checkXmrBidState {len(bid_ids)} bids x2, serial: {t_serial:.3f}s")
+        t_locked = check_bids(LockedLookupsClient, BidCheckScheduler(8, 8))
+        logger.info(
+            f"checkXmrBidState {len(bid_ids)} bids x2, 8 workers, lookups under mxDB: {t_locked:.3f}s"
+        )
+        t_main = check_bids(BidCheckClient, BidCheckScheduler(8, 8), 0)
+        logger.info(
+            f"checkXmrBidState {len(bid_ids)} bids x2, 8 workers, main wallet: {t_main:.3f}s"
+        )
+        t_pool = check_bids(BidCheckClient, BidCheckScheduler(8, 8))
+        logger.info(
+            f"checkXmrBidState {len(bid_ids)} bids x2, 8 workers: {t_pool:.3f}s, speed-up: {t_serial / t_pool:.1f}x, vs lookups under mxDB: {t_locked / t_pool:.1f}x, vs main wallet: {t_main / t_pool:.1f}x"
+        )
+        assert t_pool < t_locked
+        assert t_pool < t_main
+
+    def test_simplex_decrypt_recipient_index(self):
+        num_addrs: int = 1000
+        rpc_latency: float = 0.0005  # Simulated smsgdumpprivkey round trip, seconds
+        now: int = int(time.time())
+        privkeys = {f"paddr{i}": secrets.token_bytes(32) for i in range(num_addrs)}
+        addrs = list(privkeys.keys())
+
+        class MockPart:
+            def decodeKey(self, k):
+                return k
+
+            def pubkey_to_address(self, pk):
+                return "pfrom"
+
+        class SmsgClient(MockClient):
+            getPrivkeyForAddress = BSXNetwork.getPrivkeyForAddress
+
+            def __init__(self):
+                super().__init__(now)
+                self.rpc_calls = 0
+                self._recipient_keys = RecipientKeyIndex()
+                self.network_key = toWIF(0x2E, secrets.token_bytes(32))
+
+            def ci(self, coin_type):
+                return MockPart()
+
+            def callrpc(self, method, params):
+                self.rpc_calls += 1
+                time.sleep(rpc_latency)
+                return privkeys[params[0]]
+
+        client = SmsgClient()
+        cursor = client.openDB()
+        try:
+            cursor.executemany(
+                "INSERT INTO offers (offer_id, active_ind, addr_from, expire_at) VALUES (?, 1, ?, ?)",
+                [(random.randbytes(28), addr, now + 3600) for addr in addrs],
+            )
+        finally:
+            client.closeDB(cursor)
+
+        # Messages to addresses spread over the active set
+        msgs = []
+        for addr in addrs[num_addrs // 10 :: num_addrs // 5]:
+            pubkey_to = PrivateKey(privkeys[addr]).public_key.format()
+            msgs.append(smsgEncrypt(secrets.token_bytes(32), pubkey_to, b"payload"))
+
+        def decrypt_uncached(msg):
+            # Key lookup and full decryption attempt for every address
+            for addr in addrs:
+                client.rpc_calls += 1
+                time.sleep(rpc_latency)
+                try:
+                    return smsgDecrypt(privkeys[addr], msg, output_dict=True)
+                except Exception:
+                    pass
+
+        t_uncached = timeit(lambda: [decrypt_uncached(m) for m in msgs])
+        rpc_calls_uncached = client.rpc_calls
+        logger.info(
+            f"decrypt {len(msgs)} simplex msgs, {num_addrs} addresses, uncached: {t_uncached:.3f}s, {rpc_calls_uncached} rpc calls"
+        )
+
+        # A message to none of the addresses fills the index
+        pubkey_other = PrivateKey(secrets.token_bytes(32)).public_key.format()
+        msg_other = smsgEncrypt(secrets.token_bytes(32), pubkey_other, b"payload")
+        client.rpc_calls = 0
+        t_cold = timeit(lambda: decryptSimplexMsg(client, msg_other))
+        assert client.rpc_calls == num_addrs
+        client.rpc_calls = 0
+        decrypted = []
+        t_warm = timeit(
+            lambda: [decrypted.append(decryptSimplexMsg(client, m)) for m in msgs]
+        )
+        assert client.rpc_calls == 0
+        assert [d["to"] for d in decrypted] == addrs[num_addrs // 10 :: num_addrs // 5]
+        logger.info(
+            f"decrypt {len(msgs)} simplex msgs, {num_addrs} addresses, index: {t_warm:.3f}s, 0 rpc calls, speed-up: {t_uncached / t_warm:.1f}x, filling the index: {t_cold:.3f}s"
+        )
+        assert t_warm < t_uncached
+
+    def test_simplex_ingest(self):
+        num_msgs: int = 100
+        decode_latency: float = 0.01  # Simulated decrypt and key lookup, seconds
+        process_latency: float = 0.001  # Simulated processMsg, seconds
+
+        class MockWebSocketThread:
+            def __init__(self):
+                self.recv_queue = Queue()
+
+        def decode_func(message):
+            time.sleep(decode_latency)
+            return [("msg", message)]
+
+        def ingest_serial():
+            # The previous readSimplexMsgs loop, decode and process inline with
+            # a 0.05s wait on the queue per message
+            ws_thread = MockWebSocketThread()
+            for i in range(num_msgs):
+                ws_thread.recv_queue.put(i)
+            received = []
+            while len(received) < num_msgs:
+                message = ws_thread.recv_queue.get(timeout=0.05)
+                for item in decode_func(message):
+                    time.sleep(process_latency)
+                    received.append(item[1])
+            return received
+
+        def ingest_pipeline(num_workers):
+            ws_thread = MockWebSocketThread()
+            for i in range(num_msgs):
+                ws_thread.recv_queue.put(i)
+            ingest = SimplexIngest(ws_thread, decode_func, logger, num_workers)
+            ingest.start()
+            received = []
+            try:
+                while len(received) < num_msgs:
+                    item = ingest.getReady()
+                    if item is None:
+                        time.sleep(0.001)
+                        continue
+                    time.sleep(process_latency)
+                    received.append(item[1])
+                    ingest.recordProcessed()
+            finally:
+                ingest.stop()
+                ingest.join()
+            return received
+
+        t_serial = timeit(
+            lambda: self.assertEqual(ingest_serial(), list(range(num_msgs)))
+        )
+        logger.info(f"ingest {num_msgs} simplex msgs, serial: {t_serial:.3f}s")
+        for num_workers in (2, 4, 8):
+            t_pipeline = timeit(
+                lambda: self.assertEqual(
+                    ingest_pipeline(num_workers), list(range(num_msgs))
+                )
+            )
+            logger.info(
+                f"ingest {num_msgs} simplex msgs, {num_workers} workers: {t_pipeline:.3f}s, speed-up: {t_serial / t_pipeline:.1f}x"
+            )
+            assert t_pipeline < t_serial
+
+    def test_smsg_pow(self):
+        num_msgs: int = 10
+        target: int = uint256_from_compact(0x1EFFFFFF)
+        privkey_from = secrets.token_bytes(32)
+        pubkey_to = PrivateKey(secrets.token_bytes(32)).public_key.format()
+        now: int = int(time.time())
+
+        def find_nonce_rebuild(msg_tail, target, nonce_from, nonce_to):
+            # The previous smsgEncrypt loop, rebuilds the message per attempt
+            smsg_nonce = nonce_from.to_bytes(4, "little")
+            smsg_message = bytes(4) + smsg_nonce + msg_tail
+            for i in range(nonce_from, nonce_to):
+                pow_hash = smsgGetPOWHash(smsg_message)
+                if uint256_from_str(pow_hash) > target:
+                    smsg_nonce = (int.from_bytes(smsg_nonce, "little") + 1).to_bytes(
+                        4, "little"
+                    )
+                    smsg_message = pow_hash[:4] + smsg_nonce + smsg_message[8:]
+                    continue
+                return i, pow_hash
+            return None, None
+
+        for payload_len in (100, 2000):
+            payload = secrets.token_bytes(payload_len)
+            # Encrypt once per timestamp and search the same message tails
+            msg_tails = [
+                smsgEncrypt(
+                    privkey_from, pubkey_to, payload, now + i, deterministic=True
+                )[8:]
+                for i in range(num_msgs)
+            ]
+
+            nonces_rebuild = []
+            t_rebuild = timeit(
+                lambda: [
+                    nonces_rebuild.append(find_nonce_rebuild(m, target, 0, 1000000))
+                    for m in msg_tails
+                ]
+            )
+            nonces = []
+            t_serial = timeit(
+                lambda: [
+                    nonces.append(smsgFindNonce(m, target, 0, 1000000))
+                    for m in msg_tails
+                ]
+            )
+            assert nonces == nonces_rebuild
+            logger.info(
+                f"smsg pow {num_msgs} msgs, {payload_len} byte payload, rebuild: {t_rebuild / num_msgs * 1000:.1f}ms per msg, {num_msgs / t_rebuild:.1f} msgs/s"
+            )
+            logger.info(
+                f"smsg pow {num_msgs} msgs, {payload_len} byte payload, serial: {t_serial / num_msgs * 1000:.1f}ms per msg, {num_msgs / t_serial:.1f} msgs/s, speed-up: {t_rebuild / t_serial:.1f}x"
+            )
+            assert t_serial < t_rebuild
+
+            for num_workers in (2, 4):
+                engine = SMSGPowEngine(num_workers)
+                try:
+                    engine.findNonce(msg_tails[0], target)  # Start the workers
+                    nonces_pool = []
+                    t_pool = timeit(
+                        lambda: [
+                            nonces_pool.append(engine.findNonce(m, target))
+                            for m in msg_tails
+                        ]
+                    )
+                finally:
+                    engine.shutdown()
+                assert nonces_pool == nonces
+                logger.info(
+                    f"smsg pow {num_msgs} msgs, {payload_len} byte payload, {num_workers} processes: {t_pool / num_msgs * 1000:.1f}ms per msg, {num_msgs / t_pool:.1f} msgs/s, speed-up: {t_rebuild / t_pool:.1f}x"
+                )
+                if os.cpu_count() >= num_workers:
+                    assert t_pool < t_serial
+
+    def test_messages_npb_codec(self):
+        num_iterations: int = 10000
+        offer_values = {
+            "protocol_version": 6,
+            "coin_from": 1,
+            "coin_to": 6,
+            "amount_from": 100000000,
+            "amount_to": 2500000000000,
+            "min_bid_amount": 1000000,
+            "time_valid": 3600,
+            "lock_type": 2,
+            "lock_value": 3600,
+            "swap_type": 2,
+            "fee_rate_from": 10000,
+            "fee_rate_to": 20000,
+            "amount_negotiable": True,
+            "rate_negotiable": False,
+            "auto_accept_type": 1,
+            "message_nets": "smsg,simplex",
+        }
+        dleag = secrets.token_bytes(48893)
+        split_values = {
+            "msg_id": secrets.token_bytes(28),
+            "msg_type": 1,
+            "sequence": 2,
+            "dleag": dleag[:16000],
+        }
+        accept_values = {
+            "bid_msg_id": secrets.token_bytes(28),
+            "pkal": secrets.token_bytes(33),
+            "kbvl": secrets.token_bytes(32),
+            "kbsl_dleag": dleag,
+            "a_lock_tx": secrets.token_bytes(300),
+            "a_lock_tx_script": secrets.token_bytes(71),
+            "a_lock_refund_tx": secrets.token_bytes(300),
+            "a_lock_refund_tx_script": secrets.token_bytes(80),
+            "a_lock_refund_spend_tx": secrets.token_bytes(250),
+            "al_lock_refund_tx_sig": secrets.token_bytes(72),
+        }
+
+        for msg_class, values, n in (
+            (OfferMessage, offer_values, num_iterations),
+            (XmrSplitMessage, split_values, num_iterations),
+            (XmrBidAcceptMessage, accept_values, num_iterations),
+        ):
+            reference_class = type(
+                "Reference", (NonProtobufReference,), {"_map": msg_class._map}
+            )
+            msg_ref = reference_class(**values)
+            msg = msg_class(init_all=False, **values)
+            encoded = msg.to_bytes()
+            assert encoded == msg_ref.to_bytes()
+
+            t_enc_ref = timeit(msg_ref.to_bytes, n)
+            t_enc = timeit(msg.to_bytes, n)
+
+            def decode_reference():
+                reference_class().from_bytes(encoded)
+
+            def decode():
+                msg_class(init_all=False).from_bytes(encoded, init_all=False)
+
+            def decode_zero_copy():
+                msg_class(init_all=False).from_bytes(
+                    encoded, init_all=False, zero_copy=True
+                )
+
+            t_dec_ref = timeit(decode_reference, n)
+            t_dec = timeit(decode, n)
+            t_dec_zc = timeit(decode_zero_copy, n)
+            mb = len(encoded) * n / 1000000
+            name = f"{msg_class.__name__} {len(encoded)} bytes x{n}"
+            logger.info(
+                f"{name} encode, previous: {t_enc_ref:.3f}s, compiled: {t_enc:.3f}s, {mb / t_enc:.0f}MB/s, speed-up: {t_enc_ref / t_enc:.1f}x"
+            )
+            logger.info(
+                f"{name} decode, previous: {t_dec_ref:.3f}s, compiled: {t_dec:.3f}s, zero copy: {t_dec_zc:.3f}s, {mb / t_dec_zc:.0f}MB/s, speed-up: {t_dec_ref / t_dec:.1f}x, {t_dec_ref / t_dec_zc:.1f}x"
+            )
+            assert t_enc < t_enc_ref
+            assert t_dec < t_dec_ref
+
+    def test_json_offers_bids(self):
+        num_offers: int = 10000
+        now: int = int(time.time())
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            client = MockClient(now, os.path.join(tmp_dir, "test.sqlite"))
+            cursor = client.openDB()
+            try:
+                for i in range(num_offers):
+                    offer = make_offer(i, now)
+                    offer.addr_to = "pnetwork"
+                    offer.expire_at = now + 3600
+                    offer.swap_type = SwapTypes.XMR_SWAP if i % 2 else 1
+                    offer.message_nets = "smsg"
+                    client.add(offer, cursor)
+                    if offer.swap_type == SwapTypes.XMR_SWAP:
+                        client.add(
+                            XmrOffer(
+                                offer_id=offer.offer_id,
+                                a_fee_rate=1000 + i,
+                                b_fee_rate=2000 + i,
+                                lock_time_1=32,
+                                lock_time_2=48,
+                            ),
+                            cursor,
+                        )
+                    if offer.was_sent and i % 20 == 0:
+                        client.add(
+                            AutomationLink(
+                                active_ind=1,
+                                linked_type=Concepts.OFFER,
+                                linked_id=offer.offer_id,
+                                strategy_id=1 + i % 3,
+                            ),
+                            cursor,
+                        )
+                    if i % 5 == 0:
+                        client.add(
+                            Bid(
+                                bid_id=random.randbytes(28),
+                                offer_id=offer.offer_id,
+                                active_ind=1,
+                                created_at=now - i,
+                                expire_at=now + 600,
+                                amount=1000000 + i,
+                                rate=offer.rate,
+                                state=1,
+                                was_received=True,
+                                bid_addr="pbidder",
+                            ),
+                            cursor,
+                        )
+            finally:
+                client.closeDB(cursor)
+
+            post_string = json.dumps({"limit": num_offers, "with_extra_info": True})
+            handler = MockHandler(client, "/json/offers")
+
+            def offers_n_plus_one():
+                # The previous per offer lookups
+                rv = []
+                for o in client.listOffers(False, {"limit": num_offers}):
+                    xmr_offer = None
+                    strategy_id = None
+                    if o.swap_type == SwapTypes.XMR_SWAP:
+                        _, xmr_offer = client.getXmrOffer(o.offer_id)
+                    if o.was_sent:
+                        strategy = client.getLinkedStrategy(Concepts.OFFER, o.offer_id)
+                        strategy_id = strategy[0] if strategy else None
+                    rv.append((o, xmr_offer, strategy_id))
+                return rv
+
+            def offers_joined():
+                return client.listOffers(
+                    False, {"limit": num_offers}, with_extra_info=True
+                )
+
+            expect = []
+            t_n_plus_one = timeit(lambda: expect.extend(offers_n_plus_one()))
+            rv = []
+            t_joined = timeit(lambda: rv.extend(offers_joined()))
+            assert len(rv) == num_offers
+            for (o, xmr_offer, strategy_id), (o2, xmr_offer2, strategy_id2) in zip(
+                rv, expect
+            ):
+                assert o.offer_id == o2.offer_id
+                if xmr_offer2 is None:
+                    assert xmr_offer is None
+                else:
+                    assert xmr_offer.__dict__ == xmr_offer2.__dict__
+                if o.was_sent:
+                    assert strategy_id == strategy_id2
+            logger.info(
+                f"listOffers {num_offers} offers with extra info, per offer lookups: {t_n_plus_one:.3f}s, joined: {t_joined:.3f}s, speed-up: {t_n_plus_one / t_joined:.1f}x"
+            )
+            assert t_joined < t_n_plus_one
+
+            rv = []
+            t_endpoint = timeit(
+                lambda: rv.extend(json.loads(js_offers(handler, [], post_string, True)))
+            )
+            assert len(rv) == num_offers
+            for offer_data, (o, xmr_offer, strategy_id) in zip(rv, expect):
+                assert offer_data["offer_id"] == o.offer_id.hex()
+                if xmr_offer is not None:
+                    assert offer_data["lock_time_1"] == xmr_offer.lock_time_1
+                    assert offer_data["feerate_from"] == xmr_offer.a_fee_rate
+                if o.was_sent:
+                    assert offer_data["local_automation_strat_id"] == (
+                        strategy_id if strategy_id else 0
+                    )
+            logger.info(
+                f"/json/offers {num_offers} offers with_extra_info: {t_endpoint:.3f}s"
+            )
+
+            # Bids are returned in pages of at most PAGE_LIMIT
+            bid_pages = [
+                {"limit": PAGE_LIMIT, "offset": offset}
+                for offset in range(0, num_offers // 5, PAGE_LIMIT)
+            ]
+            handler = MockHandler(client, "/json/bids")
+
+            def bids_n_plus_one():
+                # The previous per bid offer lookup
+                rv = []
+                for bid_filters in bid_pages:
+                    for b in client.listBids(filters=bid_filters):
+                        offer = client.getOffer(b[3])
+                        rv.append(
+                            {
+                                "bid_id": b[2].hex(),
+                                "coin_to": client.ci(offer.coin_to).coin_name(),
+                                "addr_to": offer.addr_to,
+                            }
+                        )
+                return rv
+
+            def bids_joined():
+                rv = []
+                for bid_filters in bid_pages:
+                    rv.extend(
+                        json.loads(js_bids(handler, [], json.dumps(bid_filters), True))
+                    )
+                return rv
+
+            expect = []
+            t_n_plus_one = timeit(lambda: expect.extend(bids_n_plus_one()))
+            rv = []
+            t_joined = timeit(lambda: rv.extend(bids_joined()))
+            assert len(rv) == num_offers // 5
+            expect_by_id = {e["bid_id"]: e for e in expect}
+            for bid_data in rv:
+                for k, v in expect_by_id[bid_data["bid_id"]].items():
+                    assert bid_data[k] == v
+            logger.info(
+                f"/json/bids {len(rv)} bids, per bid lookups: {t_n_plus_one:.3f}s, joined: {t_joined:.3f}s, speed-up: {t_n_plus_one / t_joined:.1f}x"
+            )
+            assert t_joined < t_n_plus_one
+            client.closeDBConnections()
+
+    def test_keyset_pagination(self):
+        num_offers: int = 100000
+        page_size: int = 100
+        now: int = int(time.time())
+        offer_ids = [random.randbytes(28) for i in range(num_offers)]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            client = MockClient(now, os.path.join(tmp_dir, "test.sqlite"))
+            cursor = client.openDB()
+            try:
+                cursor.executemany(
+                    "INSERT INTO offers (offer_id, active_ind, protocol_version, coin_from, coin_to, amount_from, rate, min_bid_amount, swap_type, addr_from, addr_to, created_at, expire_at, was_sent, state) VALUES (?, 1, 1, ?, ?, ?, ?, 1000, 2, 'pabc', 'pnetwork', ?, ?, ?, 1)",
+                    [
+                        (
+                            offer_ids[i],
+                            1 + i % 6,
+                            6 + i % 3,
+                            100000000 + i,
+                            50000000 + (i * 7919) % 10000000,
+                            now - i // 4,
+                            now + 3600,
+                            i % 10 == 0,
+                        )
+                        for i in range(num_offers)
+                    ],
+                )
+                cursor.executemany(
+                    "INSERT INTO bids (bid_id, offer_id, active_ind, created_at, expire_at, amount, rate, state, was_received, was_sent) VALUES (?, ?, 1, ?, ?, 1000, 1, 1, 1, 0)",
+                    [
+                        (random.randbytes(28), offer_ids[i], now - i, now + 600)
+                        for i in range(num_offers)
+                    ],
+                )
+            finally:
+                client.closeDB(cursor)
+
+            for sent, filters in (
+                (False, {"sort_by": "created_at", "sort_dir": "DESC"}),
+                (False, {"sort_by": "rate", "sort_dir": "ASC"}),
+                (True, {"sort_by": "created_at", "sort_dir": "DESC"}),
+            ):
+                num_expect: int = num_offers // 10 if sent else num_offers
+                # Walk every page by cursor
+                page_times = []
+                seen = set()
+                cursors = {}
+                page_filters = dict(filters, limit=page_size, cursor="")
+                while True:
+                    t = time.perf_counter()
+                    offers, next_cursor = client.listOffersPage(sent, page_filters)
+                    page_times.append(time.perf_counter() - t)
+                    seen.update(o.offer_id for o in offers)
+                    if next_cursor is None:
+                        break
+                    cursors[len(seen)] = next_cursor
+                    page_filters["cursor"] = next_cursor
+                assert len(seen) == num_expect
+
+                t_first = sum(page_times[:10]) / 10
+                t_last = sum(page_times[-11:-1]) / 10
+                deep: int = (num_expect * 9 // 10) // page_size * page_size
+                t_offset = (
+                    timeit(
+                        lambda: client.listOffers(
+                            sent, dict(filters, limit=page_size, offset=deep)
+                        ),
+                        5,
+                    )
+                    / 5
+                )
+                t_cursor = (
+                    timeit(
+                        lambda: client.listOffersPage(
+                            sent, dict(filters, limit=page_size, cursor=cursors[deep])
+                        ),
+                        5,
+                    )
+                    / 5
+                )
+                logging.info(
+                    f"{'sent ' if sent else ''}offers by {filters['sort_by']}, {len(page_times)} pages, first pages: {t_first * 1000:.2f}ms, last pages: {t_last * 1000:.2f}ms, page at {deep} by offset: {t_offset * 1000:.2f}ms, by cursor: {t_cursor * 1000:.2f}ms"
+                )
+                assert t_last < t_first * 3
+                if not sent:
+                    assert t_cursor * 5 < t_offset
+
+            # Bids and the json endpoints
+            for endpoint, fn, key in (
+                ("/json/offers", js_offers, "offers"),
+                ("/json/bids", js_bids, "bids"),
+            ):
+                handler = MockHandler(client, endpoint)
+                page_times = []
+                seen = set()
+                post_data = {"limit": page_size * 5, "cursor": ""}
+                while True:
+                    t = time.perf_counter()
+                    rv = json.loads(fn(handler, [], json.dumps(post_data), True))
+                    page_times.append(time.perf_counter() - t)
+                    seen.update(r[key[:-1] + "_id"] for r in rv[key])
+                    if rv["next_cursor"] is None:
+                        break
+                    post_data["cursor"] = rv["next_cursor"]
+                assert len(seen) == num_offers
+                t_first = sum(page_times[:10]) / 10
+                t_last = sum(page_times[-11:-1]) / 10
+                logging.info(
+                    f"{endpoint} {len(page_times)} pages, first pages: {t_first * 1000:.2f}ms, last pages: {t_last * 1000:.2f}ms"
+                )
+                assert t_last < t_first * 3
+            client.closeDBConnections()
+
+    def test_http_basic_auth(self):
+        num_requests: int = 200
+        password: str = "test_password"
+
+        def request(port, method, path, headers, body=None):
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                return response.status, response.read()
+            finally:
+                conn.close()
+
+        basic_header = {
+            "Authorization": "Basic "
+            + base64.b64encode(f"user:{password}".encode("utf-8")).decode("utf-8")
+        }
+
+        def run_requests(auth_cache_seconds):
+            settings = {
+                "client_auth_hash": rfc2440_hash_password(password),
+                "http_auth_cache_seconds": auth_cache_seconds,
+            }
+            server = HttpThread("127.0.0.1", 0, False, MockHttpClient(settings))
+            port: int = server.socket.getsockname()[1]
+            server.start()
+            try:
+                status, _ = request(
+                    port,
+                    "GET",
+                    "/json/help",
+                    {
+                        "Authorization": "Basic "
+                        + base64.b64encode(b"user:wrong").decode("utf-8")
+                    },
+                )
+                assert status == 401
+
+                t = time.perf_counter()
+                for i in range(num_requests):
+                    status, body = request(port, "GET", "/json/help", basic_header)
+                    assert status == 200
+                requests_per_second = num_requests / (time.perf_counter() - t)
+
+                # Exchange Basic Auth for a session token once
+                status, body = request(
+                    port,
+                    "POST",
+                    "/login",
+                    {"Content-Type": "application/json", **basic_header},
+                    b"{}",
+                )
+                assert status == 200
+                session_id = json.loads(body)["session_id"]
+                bearer_header = {"Authorization": f"Bearer {session_id}"}
+                status, _ = request(port, "GET", "/json/help", bearer_header)
+                assert status == 200
+                status, _ = request(
+                    port, "GET", "/json/help", {"Authorization": "Bearer invalid"}
+                )
+                assert status == 401
+
+                t = time.perf_counter()
+                for i in range(num_requests):
+                    status, body = request(port, "GET", "/json/help", bearer_header)
+                    assert status == 200
+                session_requests_per_second = num_requests / (time.perf_counter() - t)
+            finally:
+                server.stop()
+                server.join()
+            return requests_per_second, session_requests_per_second
+
+        rps_verify, _ = run_requests(0)
+        rps_cached, rps_session = run_requests(300)
+        logging.info(
+            f"Basic Auth {num_requests} requests, verified each request: {rps_verify:.1f}/s, cached: {rps_cached:.1f}/s, session token: {rps_session:.1f}/s"
+        )
+
+        # Request rates are dominated by connection setup, compare the auth check
+        password_hash = rfc2440_hash_password(password)
+        cache = VerifiedPasswordCache()
+        credential = basic_header["Authorization"]
+        t_verify = timeit(
+            lambda: verify_rfc2440_password(password_hash, password), num_requests
+        )
+        t_cached = timeit(
+            lambda: cache.verify(password_hash, credential, password), num_requests
+        )
+        logging.info(
+            f"Basic Auth check x{num_requests}, verify: {t_verify:.4f}s, cached: {t_cached:.4f}s"
+        )
+        assert t_cached < t_verify / 10
+
+    def test_amm_active_count(self):
+        num_offers: int = 10000
+        num_renders: int = 50
+        now: int = int(time.time())
+
+        prev_status = page_amm.amm_status
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            client = MockClient(now, os.path.join(tmp_dir, "test.sqlite"), tmp_dir)
+            state_offers = []
+            cursor = client.openDB()
+            try:
+                for i in range(num_offers):
+                    offer = make_offer(i, now)
+                    offer.expire_at = now + 3600
+                    client.add(offer, cursor)
+                    if offer.was_sent:
+                        state_offers.append(
+                            {"offer_id": offer.offer_id.hex(), "time": now - i}
+                        )
+            finally:
+                client.closeDB(cursor)
+
+            with open(page_amm.get_amm_config_path(client), "w") as fp:
+                json.dump({"offers": [{"name": "t1", "enabled": True}]}, fp)
+            with open(page_amm.get_amm_state_path(client), "w") as fp:
+                json.dump({"offers": {"t1": state_offers}}, fp)
+
+            cache = page_amm.AMMActiveCountCache()
+            try:
+                page_amm.amm_status = "running"
+                counts = []
+                t_uncached = timeit(
+                    lambda: counts.append(page_amm.get_amm_active_count(client)),
+                    num_renders,
+                )
+                t_cached = timeit(lambda: counts.append(cache.get(client)), num_renders)
+                client._offers_seq += 1
+                t_changed = timeit(lambda: counts.append(cache.get(client)))
+            finally:
+                page_amm.amm_status = prev_status
+                client.closeDBConnections()
+
+        assert counts == [len(state_offers)] * (num_renders * 2 + 1)
+        assert cache.num_computed == 2
+        logging.info(
+            f"AMM active count for {num_renders} page renders with {num_offers} offers, uncached: {t_uncached:.4f}s, cached: {t_cached:.4f}s, recompute after offers changed: {t_changed:.4f}s"
+        )
+        assert t_cached < t_uncached
+
+    def test_static_page_load(self):
+        # The assets linked from header.html are requested on every page load
+        header_path = os.path.join(
+            os.path.dirname(inspect.getfile(HttpThread)), "templates", "header.html"
+        )
+        with open(header_path) as fp:
+            rel_paths = sorted(set(re.findall(r"static_url\('([^']+)'\)", fp.read())))
+        assert len(rel_paths) > 20
+
+        server = HttpThread("127.0.0.1", 0, False, MockHttpClient())
+        port: int = server.socket.getsockname()[1]
+        server.start()
+
+        def page_load(extra_headers={}, etags=None, collect_etags=None):
+            num_bytes: int = 0
+            num_requests: int = 0
+            statuses = set()
+            t = time.perf_counter()
+            for rel_path in rel_paths:
+                headers = dict(extra_headers)
+                if etags is not None:
+                    headers["If-None-Match"] = etags[rel_path]
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                try:
+                    conn.request("GET", "/static/" + rel_path, headers=headers)
+                    response = conn.getresponse()
+                    num_bytes += len(response.read())
+                    num_requests += 1
+                    statuses.add(response.status)
+                    if collect_etags is not None:
+                        collect_etags[rel_path] = response.getheader("ETag")
+                finally:
+                    conn.close()
+            return num_bytes, num_requests, statuses, time.perf_counter() - t
+
+        def read_files():
+            # Disk reads per request, as before the assets were held in memory
+            for rel_path in rel_paths:
+                with open(
+                    os.path.join(static_assets._static_path, rel_path), "rb"
+                ) as fp:
+                    fp.read()
+
+        try:
+            t_disk = timeit(read_files, 10) / 10
+            t_memory = (
+                timeit(lambda: [static_assets.get(p) for p in rel_paths], 10) / 10
+            )
+
+            etags = {}
+            bytes_plain, _, statuses, t_plain = page_load(collect_etags=etags)
+            assert statuses == {200}
+            bytes_gz, _, statuses, t_gz = page_load({"Accept-Encoding": "gzip"})
+            assert statuses == {200}
+            bytes_304, num_304, statuses, t_304 = page_load(etags=etags)
+            assert statuses == {304}
+            assert bytes_304 == 0
+        finally:
+            server.stop()
+            server.join()
+
+        logging.info(
+            f"Static page load, {len(rel_paths)} files: before {bytes_plain} bytes {t_plain:.4f}s, gzip {bytes_gz} bytes {t_gz:.4f}s, revalidated {bytes_304} bytes in {num_304} requests {t_304:.4f}s, versioned urls 0 requests"
+        )
+        logging.info(
+            f"Static file lookup per page load, disk read: {t_disk:.6f}s, in memory: {t_memory:.6f}s"
+        )
+        assert bytes_gz < bytes_plain / 3
+
+    def test_ws_topics(self):
+        num_clients: int = 50
+        num_deltas: int = 200
+        slow_client_delay: float = 0.005
+
+        class MockWSServer:
+            def __init__(self):
+                self.clients = [{"id": i} for i in range(num_clients)]
+                self.num_received = [0] * num_clients
+
+            def send_message(self, client, msg):
+                if client["id"] == 0:
+                    time.sleep(slow_client_delay)
+                self.num_received[client["id"]] += 1
+
+            def send_message_to_all(self, msg):
+                for client in self.clients:
+                    self.send_message(client, msg)
+
+        deltas = [
+            {"bid": {"bid_id": random.randbytes(28).hex(), "state": i % 30}}
+            for i in range(num_deltas)
+        ]
+
+        # Fan out on the notifying thread, as send_message_to_all does
+        ws_server = MockWSServer()
+        t_sync = timeit(
+            lambda: [
+                ws_server.send_message_to_all(json.dumps({"event": "delta", **d}))
+                for d in deltas
+            ]
+        )
+
+        ws_server = MockWSServer()
+        hub = WSTopicHub(ws_server, logger, max_queued=num_deltas + 1)
+        hub.start()
+        try:
+            for client in ws_server.clients:
+                hub.handleMessage(
+                    client, json.dumps({"action": "subscribe", "topics": ["bids"]})
+                )
+            t_publish = timeit(lambda: [hub.publish("bids", d) for d in deltas])
+            t = time.perf_counter()
+            for i in range(2000):
+                if min(ws_server.num_received) >= num_deltas + 1:
+                    break
+                time.sleep(0.01)
+            t_delivered = t_publish + time.perf_counter() - t
+            assert ws_server.num_received == [num_deltas + 1] * num_clients
+            stats = hub.getStats()
+        finally:
+            hub.stop()
+
+        logging.info(
+            f"{num_deltas} deltas to {num_clients} clients, one slow: synchronous fan-out {t_sync:.4f}s, publish {t_publish:.4f}s, all delivered {t_delivered:.4f}s, {stats}"
+        )
+        assert t_publish < t_sync / 5
+
+    def test_notification_sink(self):
+        num_notifications: int = 2000
+        keep_notifications: int = 50
+        now: int = int(time.time())
+        event_data = json.dumps(
+            {"offer_id": secrets.token_hex(28), "coin_from": 1, "coin_to": 6}
+        ).encode("utf-8")
+
+        class MeasuredDB(DBMethods):
+            # Sums the time mxDB is held
+            def openDB(self, cursor=None):
+                rv = super().openDB(cursor)
+                self.opened_at = time.perf_counter()
+                return rv
+
+            def closeDB(self, cursor, commit=True):
+                super().closeDB(cursor, commit)
+                self.time_locked += time.perf_counter() - self.opened_at
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = MeasuredDB()
+            db.sqlite_file = os.path.join(tmp_dir, "test.sqlite")
+            db.mxDB = threading.Lock()
+            db.time_locked = 0.0
+            cursor = db.openDB()
+            try:
+                create_db_(db._db_con, logger)
+            finally:
+                db.closeDB(cursor)
+
+            def notify_per_row():
+                # The previous insert and NOT IN trim per notification
+                for i in range(num_notifications):
+                    cursor = db.openDB()
+                    try:
+                        db.add(
+                            Notification(
+                                active_ind=1,
+                                created_at=now,
+                                event_type=1,
+                                event_data=event_data,
+                            ),
+                            cursor,
+                        )
+                        cursor.execute(
+                            "DELETE FROM notifications WHERE record_id NOT IN (SELECT record_id FROM notifications WHERE active_ind=1 ORDER BY created_at ASC LIMIT ?)",
+                            (keep_notifications,),
+                        )
+                    finally:
+                        db.closeDB(cursor)
+
+            sink = NotificationSink()
+
+            def notify_sink():
+                for i in range(num_notifications):
+                    sink.add(now, 1, event_data)
+                sink.flush(db, keep_notifications)
+
+            t_per_row = timeit(notify_per_row)
+            locked_per_row = db.time_locked
+            db.time_locked = 0.0
+            t_sink = timeit(notify_sink)
+            locked_sink = db.time_locked
+
+            cursor = db.openDB()
+            try:
+                num_rows = cursor.execute(
+                    "SELECT COUNT(*) FROM notifications"
+                ).fetchone()[0]
+            finally:
+                db.closeDB(cursor)
+            db.closeDBConnections()
+
+        assert num_rows == keep_notifications
+        logging.info(
+            f"{num_notifications} notifications, per row: {t_per_row:.4f}s, mxDB held {locked_per_row:.4f}s, batched: {t_sink:.4f}s, mxDB held {locked_sink:.4f}s"
+        )
+        assert locked_sink < locked_per_row / 10
+
+    def test_expiry_scheduler(self):
+        num_pending: int = 100000
+        num_due: int = 100
+        now: int = int(time.time())
+
+        class ExpiryDB(DBMethods):
+            expireBidsAndOffers = BasicSwap.expireBidsAndOffers
+            loadExpiringBidsAndOffers = BasicSwap.loadExpiringBidsAndOffers
+
+        db = ExpiryDB()
+        db.sqlite_file = ":memory:"
+        db.mxDB = threading.Lock()
+        db.log = logger
+        db._expiry_scheduler = ExpiryScheduler()
+        db._order_book = OrderBook()
+        cursor = db.openDB()
+        try:
+            create_db_(db._db_con, logger)
+            for state in BidStates:
+                addBidState(db, state, now, cursor)
+            cursor.executemany(
+                "INSERT INTO offers (offer_id, active_ind, created_at, expire_at, state) VALUES (?, 1, ?, ?, 2)",
+                [
+                    (i.to_bytes(28, "big"), now, now + 1 + (i % 1000) * 60)
+                    for i in range(num_pending // 2)
+                ],
+            )
+            cursor.executemany(
+                "INSERT INTO bids (bid_id, offer_id, active_ind, created_at, expire_at, state) VALUES (?, ?, 1, ?, ?, ?)",
+                [
+                    (
+                        i.to_bytes(28, "big"),
+                        i.to_bytes(28, "big"),
+                        now,
+                        now + 1 + (i % 1000) * 60,
+                        int(BidStates.BID_RECEIVED),
+                    )
+                    for i in range(num_pending // 2)
+                ],
+            )
+        finally:
+            db.closeDB(cursor)
+
+        def load():
+            cursor = db.openDB()
+            try:
+                db.loadExpiringBidsAndOffers(cursor)
+            finally:
+                db.closeDB(cursor)
+
+        t_load = timeit(load)
+        assert len(db._expiry_scheduler) == num_pending
+
+        # The previous tick scanned lists of pending expiries
+        expiring_list = [
+            (i.to_bytes(28, "big"), now + 1 + i) for i in range(num_pending)
+        ]
+
+        def scan_list():
+            for i, (record_id, expired_at) in enumerate(expiring_list):
+                if expired_at <= now:
+                    pass
+
+        num_ticks: int = 1000
+        t_scan = timeit(scan_list, 10) / 10
+        t_idle = timeit(lambda: db.expireBidsAndOffers(now), num_ticks) / num_ticks
+
+        # num_due / 2 bids and num_due / 2 offers expire at now + 1
+        t_due = timeit(lambda: db.expireBidsAndOffers(now + 1))
+        assert len(db._expiry_scheduler) == num_pending - num_due
+        cursor = db.openDB()
+        try:
+            num_expired = cursor.execute(
+                "SELECT COUNT(*) FROM bids WHERE state = :state",
+                {"state": int(BidStates.BID_EXPIRED)},
+            ).fetchone()[0]
+        finally:
+            db.closeDB(cursor)
+        db.closeDBConnections()
+        assert num_expired == num_due // 2
+
+        logging.info(
+            f"{num_pending} pending expiries, load: {t_load:.4f}s, list scan: {t_scan * 1000:.3f}ms, idle tick: {t_idle * 1000:.4f}ms, tick expiring {num_due}: {t_due * 1000:.3f}ms"
+        )
+        assert t_idle < t_scan / 100
+
+    def test_queued_actions(self):
+        num_pending: int = 10000
+        num_due: int = 100
+        check_actions_seconds: int = 10  # The previous polling interval
+
+        class ActionsDB(DBMethods):
+            createActionInSession = BasicSwap.createActionInSession
+            loadQueuedActions = BasicSwap.loadQueuedActions
+            checkQueuedActions = BasicSwap.checkQueuedActions
+
+            def getTime(self):
+                return self.now
+
+            def sendXmrBidCoinALockTx(self, bid_id, cursor):
+                # Seconds late
+                trigger_at: int = 1000 + int.from_bytes(bid_id, "big") % 10
+                self.ran.append(self.now - trigger_at)
+
+        db = ActionsDB()
+        db.sqlite_file = ":memory:"
+        db.mxDB = threading.Lock()
+        db.log = BSXLogger("test_queued_actions")
+        db.debug = False
+        db._debug_cases = []
+        db._queued_actions = ExpiryScheduler()
+        db.ran = []
+        db.now = 1000
+        cursor = db.openDB()
+        try:
+            create_db_(db._db_con, logger)
+            for i in range(num_pending):
+                # The first num_due actions are due over the first 10 seconds
+                db.now = 1000 + i % 10
+                db.createActionInSession(
+                    0 if i < num_due else 1000,
+                    ActionTypes.SEND_XMR_SWAP_LOCK_TX_A,
+                    i.to_bytes(28, "big"),
+                    cursor,
+                )
+        finally:
+            db.closeDB(cursor)
+
+        # Mean delay with the previous check every check_actions_seconds
+        mean_delay_polled = (
+            sum(check_actions_seconds - i % 10 for i in range(num_due)) / num_due
+        )
+
+        t_check: float = 0.0
+        for now in range(1000, 1010):
+            db.now = now
+            t_check += timeit(db.checkQueuedActions)
+        assert len(db.ran) == num_due
+        mean_delay = sum(db.ran) / num_due
+
+        db.ran.clear()
+        cursor = db.openDB()
+        try:
+            db.loadQueuedActions(cursor)
+        finally:
+            db.closeDB(cursor)
+        num_ticks: int = 1000
+        t_idle = timeit(db.checkQueuedActions, num_ticks) / num_ticks
+        assert db.ran == []
+        db.closeDBConnections()
+
+        logging.info(
+            f"{num_pending} queued actions, idle tick: {t_idle * 1000:.4f}ms, running {num_due} due actions: {t_check * 1000:.3f}ms, mean delay: {mean_delay:.1f}s, polled: {mean_delay_polled:.1f}s"
+        )
+        assert mean_delay == 0
+        assert t_idle < 0.0001
+
+    def test_order_book(self):
+        num_offers: int = 100000
+        depth: int = 20
+        now: int = int(time.time())
+
+        class OrderBookDB(DBMethods):
+            listOffers = BasicSwap.listOffers
+            listOffersPage = BasicSwap.listOffersPage
+            queryOffersWithExtraInfo = BasicSwap.queryOffersWithExtraInfo
+            loadOrderBook = BasicSwap.loadOrderBook
+            addToOrderBook = BasicSwap.addToOrderBook
+            getOrderBook = BasicSwap.getOrderBook
+
+            def getTime(self):
+                return now
+
+            def ci(self, coin_type):
+                return None
+
+        db = OrderBookDB()
+        db.sqlite_file = ":memory:"
+        db.mxDB = threading.Lock()
+        db.log = logger
+        db._order_book = OrderBook()
+        cursor = db.openDB()
+        try:
+            create_db_(db._db_con, logger)
+            cursor.executemany(
+                "INSERT INTO offers (offer_id, active_ind, protocol_version, coin_from, coin_to, amount_from, rate, min_bid_amount, swap_type, addr_from, addr_to, created_at, expire_at, was_sent, state) VALUES (?, 1, 1, ?, ?, ?, ?, 1000, 2, 'pabc', 'pnetwork', ?, ?, 0, 2)",
+                [
+                    (
+                        random.randbytes(28),
+                        1 + i % 6,
+                        7 + i % 3,
+                        100000000 + i,
+                        50000000 + (i * 7919) % 10000000,
+                        now - i // 4,
+                        now + 3600,
+                    )
+                    for i in range(num_offers)
+                ],
+            )
+            t_load = timeit(lambda: db.loadOrderBook(cursor), 1)
+        finally:
+            db.closeDB(cursor)
+        assert len(db._order_book) == num_offers
+
+        filters = {
+            "coin_from": 2,
+            "coin_to": 8,
+            "sort_by": "rate",
+            "sort_dir": "asc",
+            "limit": depth,
+        }
+        expect = [o.offer_id for o in db.listOffers(filters=filters)]
+        assert [o.offer_id for o in db.getOrderBook(2, 8, limit=depth)] == expect
+
+        num_runs: int = 200
+        t_db = timeit(lambda: db.listOffers(filters=filters), num_runs) / num_runs
+        t_book = timeit(lambda: db.getOrderBook(2, 8, limit=depth), num_runs) / num_runs
+        t_best = (
+            timeit(lambda: db._order_book.bestOffer(2, 8, now), num_runs) / num_runs
+        )
+
+        # Offers received and revoked
+        offers = list(db._order_book._offers.values())[:1000]
+        t_churn = timeit(
+            lambda: [db._order_book.remove(o.offer_id) for o in offers]
+            + [db._order_book.add(o) for o in offers],
+            1,
+        ) / (2 * len(offers))
+        assert len(db._order_book) == num_offers
+        db.closeDBConnections()
+
+        logging.info(
+            f"{num_offers} offers, depth {depth} from db: {t_db * 1000:.3f}ms, from order book: {t_book * 1000:.4f}ms, best offer: {t_best * 1000:.4f}ms, add or remove: {t_churn * 1000:.4f}ms, load: {t_load * 1000:.0f}ms"
+        )
+        assert t_book * 10 < t_db
+
+    def test_wallets_info_cache(self):
+        active_coins = [c for c in Coins if c in chainparams][:10]
+        rpc_delay: float = 0.05
+
+        class WalletsInfoDB(DBMethods):
+            loadWalletsInfo = BasicSwap.loadWalletsInfo
+            setCachedWalletInfo = BasicSwap.setCachedWalletInfo
+            flushWalletsInfo = BasicSwap.flushWalletsInfo
+            updateWalletInfo = BasicSwap.updateWalletInfo
+            updateWalletsInfo = BasicSwap.updateWalletsInfo
+            getCachedWalletsInfo = BasicSwap.getCachedWalletsInfo
+
+            def getTime(self):
+                return int(time.time())
+
+            def activeCoins(self):
+                return iter(active_coins)
+
+            def isCoinActive(self, coin):
+                return coin in active_coins
+
+            def getBlockchainInfo(self, coin):
+                time.sleep(rpc_delay)
+                return {"blocks": 100, "synced": "100.00"}
+
+            def getWalletInfo(self, coin):
+                time.sleep(rpc_delay)
+                return {"balance": "1.0", "unconfirmed": "0.0", "deposit_address": "a"}
+
+        db = WalletsInfoDB()
+        db.sqlite_file = ":memory:"
+        db.mxDB = threading.Lock()
+        db.log = logger
+        db.coin_clients = {
+            c: {"connection_type": "rpc" if c in active_coins else "none"}
+            for c in chainparams
+        }
+        db._mx_wallets_info = threading.Lock()
+        db._wallets_info = None
+        db._wallets_info_dirty = set()
+        db._wallets_info_pool = None
+        db._updating_wallets_info = {}
+        db._wallets_info_refresh_at = {}
+        db._wallets_info_errors = {}
+        db._wallet_update_timeout = 10
+        db.wallets_info_refresh_seconds = 30
+        cursor = db.openDB()
+        try:
+            create_db_(db._db_con, logger)
+        finally:
+            db.closeDB(cursor)
+
+        t_refresh = timeit(lambda: db.updateWalletsInfo(True, wait_for_complete=True))
+        db.flushWalletsInfo()
+        # The previous refresh, one job per coin on the shared 4 worker pool
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+            t_refresh_pool = timeit(
+                lambda: list(pool.map(db.updateWalletInfo, active_coins))
+            )
+
+        def read_db():
+            # The previous read, latest rows by GROUP BY and a kv_string lookup per coin
+            rv = {}
+            cursor = db.openDB()
+            try:
+                inner_str = "SELECT coin_id, balance_type, MAX(created_at) as max_created_at FROM wallets GROUP BY coin_id, balance_type"
+                query_str = f"SELECT a.coin_id, a.balance_type, wallet_data, created_at FROM wallets a, ({inner_str}) b WHERE a.coin_id = b.coin_id AND a.balance_type = b.balance_type AND a.created_at = b.max_created_at"
+                for row in cursor.execute(query_str).fetchall():
+                    wallet_data = json.loads(row[2])
+                    if row[1] == 1:
+                        coin_name: str = chainparams[row[0]]["name"]
+                        c2 = cursor.connection.cursor()
+                        for row2 in c2.execute(
+                            "SELECT key, value FROM kv_string WHERE key = ? OR key = ?",
+                            (f"receive_addr_{coin_name}", f"stealth_addr_{coin_name}"),
+                        ):
+                            wallet_data["deposit_address"] = row2[1]
+                        c2.close()
+                    rv.setdefault(row[0], {}).update(wallet_data)
+            finally:
+                db.closeDB(cursor, commit=False)
+            return rv
+
+        assert len(read_db()) == len(active_coins)
+        num_reads: int = 1000
+        t_read_db = timeit(read_db, num_reads) / num_reads
+        t_read = timeit(db.getCachedWalletsInfo, num_reads) / num_reads
+        db._wallets_info_pool.shutdown()
+        db.closeDBConnections()
+
+        logging.info(
+            f"{len(active_coins)} coins, refresh: {t_refresh * 1000:.0f}ms, on a 4 worker pool: {t_refresh_pool * 1000:.0f}ms, read: {t_read * 1000:.4f}ms, from db: {t_read_db * 1000:.4f}ms"
+        )
+        assert t_refresh * 2 < t_refresh_pool
+        assert t_read * 5 < t_read_db
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,11 +7,21 @@
 # file LICENSE or http://www.opensource.org/licenses/mit-license.php.
 
 import hashlib
+import http.server
+import json
 import logging
+import os
 import random
+import re
 import secrets
+import sqlite3
+import tempfile
 import threading
+import time
 import unittest
+import zmq
+
+from queue import Queue
 
 from coincurve.ed25519 import ed25519_get_pubkey
 from coincurve.ecdsaotves import (
@@ -22,22 +32,62 @@ from coincurve.ecdsaotves import (
 )
 from coincurve.keys import PrivateKey
 
+from basicswap.basicswap import BasicSwap
+from basicswap.bidcheck import BidCheckScheduler, PrefetchedLookups
+from basicswap.blockscan import BlockPrefetcher, WatchedIndex
+from basicswap.chainnotify import ChainNotifier
 from basicswap.contrib.mnemonic import Mnemonic
-from basicswap.db import create_db_, DBMethods, KnownIdentity
+from basicswap.db import (
+    Concepts,
+    create_db_,
+    DBMethods,
+    extract_schema,
+    getPageCursorStr,
+    KnownIdentity,
+    makePageCursor,
+    Offer,
+)
+from basicswap.db_upgrades import addBidState, upgradeDatabaseFromSchema
+from basicswap.db_util import NotificationSink, remove_expired_data
 from basicswap.util import h2b
-from basicswap.util.address import decodeAddress
+from basicswap.util.address import decodeAddress, encodeAddress
 from basicswap.util.crypto import ripemd160, hash160, blake256
-from basicswap.util.extkey import ExtKeyPair
+from basicswap.util.extkey import ExtKeyCache, ExtKeyPair
 from basicswap.util.integer import encode_varint, decode_varint
+from basicswap.util.logging import BSXLogger
 from basicswap.util.network import is_private_ip_address
-from basicswap.util.rfc2440 import rfc2440_hash_password
+from basicswap import rpc
+from basicswap.rpc_pool import close_all_pools, get_pool_stats
+from basicswap.static_assets import StaticAssets
+from basicswap.util.scheduler import ExpiryScheduler
+from basicswap.util.rfc2440 import (
+    rfc2440_hash_password,
+    verify_rfc2440_password,
+    VerifiedPasswordCache,
+)
+from basicswap.types import WatchedOutput, WatchedScript, WatchedTransaction
 from basicswap.util_xmr import encode_address as xmr_encode_address
+from basicswap.ws_topics import WSTopicHub
 from basicswap.interface.btc import BTCInterface
-from basicswap.interface.xmr import XMRInterface
+from basicswap.interface.xmr import WalletRPCPool, XMRInterface
+from basicswap.network.simplex import SimplexIngest
+from basicswap.network.util import KeyNotFoundError, RecipientKeyIndex
+from basicswap.orderbook import OrderBook
+from basicswap.ui import page_amm
+from basicswap.ui.util import getCoinName
+from basicswap.util.smsg import (
+    smsgDecrypt,
+    smsgEncrypt,
+    smsgFindNonce,
+    smsgGetPOWHash,
+    smsgIsRecipient,
+    SMSGPowEngine,
+)
 from tests.basicswap.mnemonics import mnemonics
 from tests.basicswap.util import REQUIRED_SETTINGS
 
-from basicswap.basicswap_util import TxLockTypes
+from basicswap.basicswap_util import ActionTypes, BidStates, OfferStates, TxLockTypes
+from basicswap.chainparams import chainparams, Coins
 from basicswap.util import (
     make_int,
     SerialiseNum,
@@ -47,6 +97,8 @@ from basicswap.util import (
 )
 from basicswap.messages_npb import (
     BidMessage,
+    NonProtobufClass,
+    XmrSplitMessage,
 )
 from basicswap.contrib.test_framework.script import (
     hash160 as hash160_btc,
@@ -58,6 +110,7 @@ from basicswap.contrib.test_framework.messages import (
     CTransaction,
     CTxIn,
     CTxOut,
+    uint256_from_compact,
     uint256_from_str,
 )
 
@@ -518,6 +571,76 @@ class Test(unittest.TestCase):
             password_hash
             == "16:B7A94A7E4988630E6095334BA67F06FBA509B2A7136A04C9C1B430F539"
         )
+        assert verify_rfc2440_password(password_hash, password) is True
+        assert verify_rfc2440_password(password_hash, "wrong") is False
+
+        # Salts containing the separator
+        for salt_hex in ("6060606060606060", "A60B000000000000", "0000000000000006"):
+            password_hash = rfc2440_hash_password(
+                password, salt=bytes.fromhex(salt_hex)
+            )
+            assert verify_rfc2440_password(password_hash, password) is True
+            assert verify_rfc2440_password(password_hash, "wrong") is False
+
+    def test_verified_password_cache(self):
+        import basicswap.util.rfc2440 as rfc2440
+
+        password_hash = rfc2440_hash_password("test")
+        num_verified = [0]
+        verify_func = rfc2440.verify_rfc2440_password
+
+        def counting_verify(stored_hash, password):
+            num_verified[0] += 1
+            return verify_func(stored_hash, password)
+
+        rfc2440.verify_rfc2440_password = counting_verify
+        try:
+            cache = VerifiedPasswordCache(ttl_seconds=300, max_entries=4)
+            assert cache.verify(password_hash, "cred_a", "test") is True
+            assert cache.verify(password_hash, "cred_a", "test") is True
+            assert num_verified[0] == 1
+            assert len(cache) == 1
+
+            # Failures are not cached
+            assert cache.verify(password_hash, "cred_b", "wrong") is False
+            assert cache.verify(password_hash, "cred_b", "wrong") is False
+            assert num_verified[0] == 3
+            assert len(cache) == 1
+
+            # Plaintext doesn't appear in the keys
+            for k in cache._entries:
+                assert b"cred_a" not in k and b"test" not in k
+
+            # Bounded
+            for i in range(10):
+                assert cache.verify(password_hash, f"cred_{i}", "test") is True
+            assert len(cache) == 4
+
+            # Expired entries are verified again
+            cache._entries[next(reversed(cache._entries))] = 0
+            num_verified[0] = 0
+            assert cache.verify(password_hash, "cred_9", "test") is True
+            assert num_verified[0] == 1
+
+            # Cleared when the stored hash changes
+            new_hash = rfc2440_hash_password("test2")
+            assert cache.verify(new_hash, "cred_9", "test") is False
+            assert len(cache) == 0
+            assert cache.verify(password_hash, "cred_9", "test") is True
+            assert num_verified[0] == 3
+
+            cache.clear()
+            assert len(cache) == 0
+
+            # ttl_seconds 0 disables the cache
+            cache = VerifiedPasswordCache(ttl_seconds=0)
+            num_verified[0] = 0
+            for i in range(3):
+                assert cache.verify(password_hash, "cred_a", "test") is True
+            assert num_verified[0] == 3
+            assert len(cache) == 0
+        finally:
+            rfc2440.verify_rfc2440_password = verify_func
 
     def test_ripemd160(self):
         input_data = b"hash this"
@@ -558,6 +681,145 @@ class Test(unittest.TestCase):
         else:
             raise ValueError("Should have errored.")
 
+    def test_protobuf_codec(self):
+        rng = random.Random(13)
+
+        def encode_reference(field_map, values):
+            # The previous NonProtobufClass.to_bytes
+            rv = bytes()
+            for field_num, (field_name, wire_type, field_type) in field_map.items():
+                if field_name not in values:
+                    continue
+                field_value = values[field_name]
+                tag = (field_num << 3) | wire_type
+                if wire_type == 0:
+                    if field_value == 0:
+                        continue
+                    rv += encode_varint(tag)
+                    rv += encode_varint(field_value)
+                else:
+                    if len(field_value) == 0:
+                        continue
+                    rv += encode_varint(tag)
+                    if isinstance(field_value, str):
+                        field_value = field_value.encode("utf-8")
+                    rv += encode_varint(len(field_value))
+                    rv += field_value
+            return rv
+
+        def decode_reference(field_map, b):
+            # The previous NonProtobufClass.from_bytes, without init_all
+            values = {}
+            o = 0
+            while o < len(b):
+                tag, lv = decode_varint(b, o)
+                o += lv
+                wire_type = tag & 7
+                field_name, wire_type_expect, field_type = field_map[tag >> 3]
+                if wire_type != wire_type_expect:
+                    raise ValueError("Unexpected wire_type")
+                if wire_type == 0:
+                    field_value, lv = decode_varint(b, o)
+                    o += lv
+                else:
+                    field_len, lv = decode_varint(b, o)
+                    o += lv
+                    field_value = b[o : o + field_len]
+                    o += field_len
+                    if field_type == 1:
+                        field_value = field_value.decode("utf-8")
+                values[field_name] = field_value
+            return values
+
+        def random_value(wire_type, field_type):
+            if wire_type == 0:
+                if field_type == 2:
+                    return rng.choice((True, False))
+                return rng.choice(
+                    (0, 1, 0x7F, 0x80, rng.randint(0, 1 << 16), rng.randint(0, 1 << 62))
+                )
+            length = rng.choice((0, 1, 33, 127, 128, rng.randint(0, 1000)))
+            if field_type == 1:
+                return "".join(rng.choice("abc\u00e9\u20ac") for i in range(length))
+            return rng.randbytes(length)
+
+        def msg_values(msg):
+            return {
+                k: (bytes(v) if isinstance(v, memoryview) else v)
+                for k, v in (
+                    (k, getattr(msg, k))
+                    for k in msg._codec.field_names
+                    if hasattr(msg, k)
+                )
+            }
+
+        def decode_result(msg_class, b, zero_copy=False):
+            msg = msg_class(init_all=False)
+            try:
+                msg.from_bytes(b, init_all=False, zero_copy=zero_copy)
+            except Exception as e:
+                return type(e)
+            return msg_values(msg)
+
+        msg_classes = NonProtobufClass.__subclasses__()
+        assert len(msg_classes) > 15
+        for msg_class in msg_classes:
+            field_map = msg_class._map
+            assert not hasattr(msg_class(), "__dict__")
+            for i in range(50):
+                values = {}
+                for field_name, wire_type, field_type in field_map.values():
+                    if rng.random() < 0.8:
+                        values[field_name] = random_value(wire_type, field_type)
+                msg = msg_class(init_all=False, **values)
+                encoded = msg.to_bytes()
+                assert encoded == encode_reference(field_map, values)
+
+                msg_2 = msg_class(init_all=False)
+                msg_2.from_bytes(encoded, init_all=False)
+                assert msg_values(msg_2) == decode_reference(field_map, encoded)
+                assert msg_values(msg_2) == {
+                    k: v
+                    for k, v in values.items()
+                    if len(encode_reference(field_map, {k: v})) > 0
+                }
+                msg_3 = msg_class(init_all=False)
+                msg_3.from_bytes(encoded, init_all=False, zero_copy=True)
+                assert msg_values(msg_3) == msg_values(msg_2)
+                for field_name, wire_type, field_type in field_map.values():
+                    if (
+                        wire_type == 2
+                        and field_type == 0
+                        and hasattr(msg_3, field_name)
+                    ):
+                        assert isinstance(getattr(msg_3, field_name), memoryview)
+
+                # Corrupted and truncated input fails or decodes the same
+                for j in range(10):
+                    corrupted = bytearray(encoded)
+                    if len(corrupted) > 0:
+                        corrupted[rng.randrange(len(corrupted))] = rng.randrange(256)
+                        del corrupted[rng.randrange(len(corrupted) + 1) :]
+                    corrupted = bytes(corrupted)
+                    try:
+                        expect = decode_reference(field_map, corrupted)
+                    except Exception as e:
+                        expect = type(e)
+                    assert decode_result(msg_class, corrupted) == expect
+                    assert decode_result(msg_class, corrupted, True) == expect
+
+        # Defaults
+        msg = XmrSplitMessage()
+        assert msg.msg_id == bytes() and msg.sequence == 0
+        msg = BidMessage(proof_address="")
+        assert msg.proof_address == str() and msg.amount == 0
+        try:
+            msg.not_a_field = 1
+        except AttributeError:
+            pass
+        else:
+            raise ValueError("Should have errored.")
+
     def test_is_private_ip_address(self):
         test_addresses = [
             ("localhost", True),
@@ -635,6 +897,22 @@ class Test(unittest.TestCase):
         ek_c0h_data = decodeAddress(test_key_c0h)[4:]
         assert m_0h.encode_v() == ek_c0h_data
 
+        # Re-encoded as particld does
+        prefix: bytes = decodeAddress(test_key)[:4]
+        assert encodeAddress(prefix + m_0h.encode_v()) == test_key_c0h
+
+        extkeys = ExtKeyCache(ek, max_entries=8)
+        assert extkeys.derive_path("0h").encode_v() == ek_c0h_data
+        for path in ("44445555h/1h/2/1", "44445555h/999999/1/6/3", "0/1'/2/3h"):
+            expect = ek.derive_path(path).encode_v()
+            assert extkeys.derive_path(path).encode_v() == expect
+            assert extkeys.derive_path(path).encode_v() == expect
+        assert len(extkeys) == 8
+        for nonce in range(1, 20):
+            path = f"44445555h/1h/6/1/{nonce}"
+            assert extkeys.derive_path(path)._key == ek.derive_path(path)._key
+        assert len(extkeys) == 8
+
         ek.neuter()
         assert ek.has_key() is False
         m_0 = ek.derive(0)
@@ -673,6 +951,2187 @@ class Test(unittest.TestCase):
         finally:
             db_test.closeDB(cursor)
 
+    def test_db_read_pool(self):
+        def get_value(cursor):
+            query = "SELECT value FROM kv_int WHERE key = 'test_value'"
+            return cursor.execute(query).fetchone()[0]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_test = DBMethods()
+            db_test.sqlite_file = os.path.join(tmp_dir, "test.sqlite")
+            db_test.mxDB = threading.Lock()
+            db_test._db_num_read_connections = 2
+            cursor = db_test.openDB()
+            try:
+                create_db_(db_test._db_con, logger)
+                db_test.setIntKV("test_value", 1, cursor)
+            finally:
+                db_test.closeDB(cursor)
+            mode = db_test._db_con.execute("PRAGMA journal_mode").fetchone()[0]
+            assert mode.lower() == "wal"
+
+            # Readers don't wait for the writer and see the last committed state
+            cursor = db_test.openDB()
+            try:
+                db_test.setIntKV("test_value", 2, cursor)
+                read_cursors = [db_test.openDBRead() for i in range(2)]
+                for read_cursor in read_cursors:
+                    assert get_value(read_cursor) == 1
+                    try:
+                        read_cursor.execute("DELETE FROM kv_int")
+                    except Exception as e:
+                        assert "readonly" in str(e)
+                    else:
+                        raise ValueError("Should have errored.")
+                for read_cursor in read_cursors:
+                    db_test.closeDBRead(read_cursor)
+            finally:
+                db_test.closeDB(cursor)
+
+            read_cursor = db_test.openDBRead()
+            try:
+                assert get_value(read_cursor) == 2
+            finally:
+                db_test.closeDBRead(read_cursor)
+            assert db_test._db_read_pool.qsize() == 2
+            assert db_test.mxDB.locked() is False
+
+            # Discarded changes are not kept on the persistent connection
+            cursor = db_test.openDB()
+            db_test.setIntKV("test_value", 3, cursor)
+            db_test.closeDB(cursor, commit=False)
+            assert db_test.getIntKV("test_value") == 2
+
+            db_test.closeDBConnections()
+            assert db_test._db_con is None
+
+    def test_db_query_plans(self):
+        # The hot offer and bid queries must not fall back to full table scans
+        class QueryPlanDB(DBMethods):
+            activeBidsQueryStr = BasicSwap.activeBidsQueryStr
+            listOffers = BasicSwap.listOffers
+            listOffersPage = BasicSwap.listOffersPage
+            queryOffersWithExtraInfo = BasicSwap.queryOffersWithExtraInfo
+            listBids = BasicSwap.listBids
+            listBidsPage = BasicSwap.listBidsPage
+            expireBidsAndOffers = BasicSwap.expireBidsAndOffers
+            loadExpiringBidsAndOffers = BasicSwap.loadExpiringBidsAndOffers
+            loadOrderBook = BasicSwap.loadOrderBook
+            addToOrderBook = BasicSwap.addToOrderBook
+
+            def getTime(self):
+                return self.now
+
+            def ci(self, coin_type):
+                return None
+
+        db_test = QueryPlanDB()
+        db_test.sqlite_file = ":memory:"
+        db_test.mxDB = threading.Lock()
+        db_test.log = logger
+        now: int = int(time.time())
+        db_test.now = now
+        db_test._expiry_scheduler = ExpiryScheduler()
+        db_test._order_book = OrderBook()
+
+        num_offers: int = 100000
+        cursor = db_test.openDB()
+        try:
+            create_db_(db_test._db_con, logger)
+            cursor.executemany(
+                "INSERT INTO offers (offer_id, active_ind, coin_from, coin_to, created_at, expire_at, rate, bid_reversed, state, was_sent) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                [
+                    (
+                        i.to_bytes(28, "big"),
+                        1 if i % 4 else 2,
+                        1 + i % 6,
+                        6 + i % 3,
+                        now - i,
+                        now - 100000 if i % 100 == 0 else now + 3600 - i % 3700,
+                        (i * 7919) % 100000,
+                        2 if i % 3 else 1,
+                        i % 10 == 0,
+                    )
+                    for i in range(num_offers)
+                ],
+            )
+            cursor.executemany(
+                "INSERT INTO bids (bid_id, offer_id, active_ind, created_at, expire_at, state, was_sent, was_received) VALUES (?, ?, 1, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        i.to_bytes(32, "big"),
+                        (i * 5).to_bytes(28, "big"),
+                        now - i,
+                        now + 600 - i,
+                        int(BidStates.SWAP_COMPLETED) if i % 20 == 0 else 1 + i % 30,
+                        i % 2,
+                        (i + 1) % 2,
+                    )
+                    for i in range(num_offers // 5)
+                ],
+            )
+        finally:
+            db_test.closeDB(cursor)
+
+        statements = []
+        db_test._db_con.set_trace_callback(statements.append)
+        try:
+            db_test.listOffers()
+            db_test.listOffers(True, {"active": "expired", "coin_from": 2, "limit": 20})
+            db_test.listOffers(filters={"limit": 20}, with_extra_info=True)
+            db_test.listBids()
+            db_test.listBids(filters={"with_available_or_active": True, "limit": 20})
+            db_test.listBids(offer_id=(5).to_bytes(28, "big"))
+            for filters in (
+                {"cursor": "", "limit": 20},
+                {"cursor": "", "limit": 20, "sort_by": "rate", "sort_dir": "asc"},
+            ):
+                _, next_cursor = db_test.listOffersPage(filters=filters)
+                db_test.listOffersPage(filters=dict(filters, cursor=next_cursor))
+            _, next_cursor = db_test.listOffersPage(
+                True, {"cursor": "", "limit": 20, "active": "expired"}
+            )
+            db_test.listOffersPage(
+                True, {"cursor": next_cursor, "limit": 20, "active": "expired"}
+            )
+            _, next_cursor = db_test.listBidsPage(
+                filters={"cursor": "", "limit": 20, "with_expired": False}
+            )
+            db_test.listBidsPage(
+                filters={"cursor": next_cursor, "limit": 20, "with_expired": False}
+            )
+            cursor = db_test.openDB()
+            try:
+                db_test.loadExpiringBidsAndOffers(cursor)
+                db_test.loadOrderBook(cursor)
+            finally:
+                db_test.closeDB(cursor)
+            db_test.expireBidsAndOffers(now)
+            remove_expired_data(db_test)
+        finally:
+            db_test._db_con.set_trace_callback(None)
+
+        cursor = db_test.openDB()
+        try:
+            # Removed offers with ended bids
+            assert (
+                cursor.execute("SELECT COUNT(*) FROM offers").fetchone()[0] < num_offers
+            )
+
+            for query in (
+                f"SELECT action_id, action_type, linked_id FROM actions WHERE active_ind = 1 AND trigger_at <= {now}",
+                "SELECT COUNT(*) FROM checkedblocks WHERE block_hash = x'00'",
+                "SELECT created_at, event_type, event_data FROM notifications WHERE active_ind = 1 ORDER BY created_at ASC LIMIT 10",
+                "DELETE FROM wallets WHERE coin_id = 1 AND balance_type = 1",
+            ):
+                statements.append(query)
+
+            # One plan per distinct query shape
+            queries = {}
+            for statement in statements:
+                if not re.match(r"\s*(SELECT|UPDATE|DELETE)", statement):
+                    continue
+                shape = re.sub(r"x'[0-9a-fA-F]*'|\b\d+\b", "?", statement)
+                queries.setdefault(shape, statement)
+            assert len(queries) > 20
+            for query in queries.values():
+                for row in cursor.execute("EXPLAIN QUERY PLAN " + query):
+                    detail: str = row[3]
+                    # Only the small bidstates table and the temp id tables may be scanned
+                    if (
+                        detail.startswith("SCAN ")
+                        and detail != "SCAN s"
+                        and not detail.startswith("SCAN temp.")
+                    ):
+                        raise AssertionError(f"{detail}: {query}")
+        finally:
+            db_test.closeDB(cursor, commit=False)
+
+        # Indices are added to an existing database and the upgrade can run again
+        expect_schema = extract_schema()
+        cursor = db_test.openDB()
+        try:
+            index_names = [
+                r[0]
+                for r in cursor.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+                )
+            ]
+            for index_name in index_names:
+                cursor.execute(f"DROP INDEX {index_name}")
+            upgradeDatabaseFromSchema(db_test, cursor, expect_schema)
+            upgradeDatabaseFromSchema(db_test, cursor, expect_schema)
+            have_index_names = [
+                r[0]
+                for r in cursor.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+                )
+            ]
+            assert sorted(have_index_names) == sorted(index_names)
+            assert "wallets_coin_index" in have_index_names
+        finally:
+            db_test.closeDB(cursor, commit=False)
+
+    def test_remove_expired_data(self):
+        class PurgeDB(DBMethods):
+            activeBidsQueryStr = BasicSwap.activeBidsQueryStr
+
+            def getTime(self):
+                return self.now
+
+        db_test = PurgeDB()
+        db_test.sqlite_file = ":memory:"
+        db_test.mxDB = threading.Lock()
+        db_test.log = logger
+        now: int = int(time.time())
+        db_test.now = now
+
+        def offer_id(i: int) -> bytes:
+            return i.to_bytes(28, "big")
+
+        def bid_id(i: int) -> bytes:
+            return i.to_bytes(32, "big")
+
+        # Offers 0-4 expired, 0-2 with ended bids, 3 with an active bid, 5 not expired
+        offers = [(offer_id(i), now - 1000 if i < 5 else now + 1000) for i in range(6)]
+        bids = [
+            (bid_id(i), offer_id(i), int(BidStates.SWAP_COMPLETED)) for i in range(3)
+        ]
+        bids.append((bid_id(3), offer_id(3), int(BidStates.BID_ACCEPTED)))
+        bids.append((bid_id(5), offer_id(5), int(BidStates.BID_RECEIVED)))
+        cursor = db_test.openDB()
+        try:
+            create_db_(db_test._db_con, logger)
+            cursor.executemany(
+                "INSERT INTO offers (offer_id, active_ind, expire_at) VALUES (?, 1, ?)",
+                offers,
+            )
+            cursor.executemany(
+                "INSERT INTO bids (bid_id, offer_id, active_ind, expire_at, state) VALUES (?, ?, 1, 0, ?)",
+                bids,
+            )
+            for b in bids:
+                for tx_type in range(2):
+                    cursor.execute(
+                        "INSERT INTO transactions (bid_id, tx_type) VALUES (?, ?)",
+                        (b[0], tx_type),
+                    )
+                cursor.execute("INSERT INTO xmr_swaps (bid_id) VALUES (?)", (b[0],))
+                cursor.execute(
+                    "INSERT INTO eventlog (linked_type, linked_id) VALUES (?, ?)",
+                    (int(Concepts.BID), b[0]),
+                )
+            for o in offers:
+                cursor.execute("INSERT INTO xmr_offers (offer_id) VALUES (?)", (o[0],))
+                cursor.execute("INSERT INTO actions (linked_id) VALUES (?)", (o[0],))
+                cursor.execute(
+                    "INSERT INTO message_links (linked_type, linked_id) VALUES (?, ?)",
+                    (int(Concepts.OFFER), o[0]),
+                )
+            cursor.executemany(
+                "INSERT INTO checkedblocks (created_at) VALUES (?)",
+                [(now - 1000 if i % 2 else now,) for i in range(25)],
+            )
+        finally:
+            db_test.closeDB(cursor)
+
+        removed = remove_expired_data(db_test, 500, chunk_size=1)
+        assert removed == {
+            "offers": 4,
+            "bids": 3,
+            "transactions": 6,
+            "xmr_swaps": 3,
+            "eventlog": 3,
+            "xmr_offers": 4,
+            "actions": 4,
+            "message_links": 4,
+            "checkedblocks": 12,
+        }
+        assert remove_expired_data(db_test, 500) == {}
+
+        cursor = db_test.openDB()
+        try:
+
+            def remaining(query: str):
+                return sorted(r[0] for r in cursor.execute(query))
+
+            assert remaining("SELECT offer_id FROM offers") == [
+                offer_id(3),
+                offer_id(5),
+            ]
+            assert remaining("SELECT bid_id FROM bids") == [bid_id(3), bid_id(5)]
+            assert remaining("SELECT DISTINCT bid_id FROM transactions") == [
+                bid_id(3),
+                bid_id(5),
+            ]
+            assert remaining("SELECT linked_id FROM message_links") == [
+                offer_id(3),
+                offer_id(5),
+            ]
+            assert remaining("SELECT created_at FROM checkedblocks") == [now] * 13
+        finally:
+            db_test.closeDB(cursor, commit=False)
+
+    def test_notification_sink(self):
+        class NotificationsDB(DBMethods):
+            flushNotifications = BasicSwap.flushNotifications
+            buildNotificationsCache = BasicSwap.buildNotificationsCache
+            getNotifications = BasicSwap.getNotifications
+
+        db_test = NotificationsDB()
+        db_test.sqlite_file = ":memory:"
+        db_test.mxDB = threading.Lock()
+        db_test.log = logger
+        db_test._keep_notifications = 50
+        db_test._show_notifications = 10
+        db_test._mx_notifications = threading.Lock()
+        db_test._notifications_cache = {}
+        db_test._notifications_seq = iter(range(1000000))
+        db_test._notification_sink = NotificationSink()
+        sink = db_test._notification_sink
+        cursor = db_test.openDB()
+        try:
+            create_db_(db_test._db_con, logger)
+        finally:
+            db_test.closeDB(cursor)
+
+        def list_notifications():
+            cursor = db_test.openDB()
+            try:
+                return cursor.execute(
+                    "SELECT record_id, created_at, event_type, event_data FROM notifications ORDER BY record_id"
+                ).fetchall()
+            finally:
+                db_test.closeDB(cursor)
+
+        now: int = int(time.time())
+        assert sink.flush(db_test, 50) == 0
+        for i in range(30):
+            sink.add(now, 1, json.dumps({"n": i}).encode("utf-8"))
+        assert sink.numPending() == 30
+        assert list_notifications() == []
+        assert sink.flush(db_test, 50) == 30
+        assert sink.numPending() == 0
+        assert len(list_notifications()) == 30
+
+        # Keeps the newest rows
+        for i in range(30, 120):
+            sink.add(now + i, 1, json.dumps({"n": i}).encode("utf-8"))
+        db_test.flushNotifications()
+        rows = list_notifications()
+        assert len(rows) == 50
+        assert [json.loads(r[3])["n"] for r in rows] == list(range(70, 120))
+        assert rows[-1][0] == 120
+
+        cursor = db_test.openDB()
+        try:
+            db_test.buildNotificationsCache(cursor)
+        finally:
+            db_test.closeDB(cursor)
+        notifications = db_test.getNotifications()
+        assert [n[2]["n"] for n in notifications] == list(range(110, 120))
+        assert notifications[-1][0] == time.strftime(
+            "%d-%m-%y %H:%M:%S", time.localtime(now + 119)
+        )
+
+        # Failed flushes are retried
+        sink.add(now, 2, b"{}")
+
+        class FailingDB:
+            def openDB(self):
+                raise ValueError("Locked")
+
+        try:
+            sink.flush(FailingDB(), 50)
+            raise AssertionError("Expected ValueError")
+        except ValueError:
+            pass
+        assert sink.numPending() == 1
+        assert sink.flush(db_test, 50) == 1
+        rows = list_notifications()
+        assert len(rows) == 50
+        assert rows[-1][2] == 2
+
+        # Inserted rows are rolled back when the trim fails, not written twice
+        cursor = db_test.openDB()
+        try:
+            cursor.execute(
+                "CREATE TEMP TRIGGER fail_trim BEFORE DELETE ON notifications BEGIN SELECT RAISE(ABORT, 'trim failed'); END"
+            )
+        finally:
+            db_test.closeDB(cursor)
+        sink.add(now, 3, b"{}")
+        try:
+            sink.flush(db_test, 50)
+            raise AssertionError("Expected IntegrityError")
+        except sqlite3.IntegrityError:
+            pass
+        assert sink.numPending() == 1
+        assert list_notifications() == rows
+        cursor = db_test.openDB()
+        try:
+            cursor.execute("DROP TRIGGER temp.fail_trim")
+        finally:
+            db_test.closeDB(cursor)
+        assert sink.flush(db_test, 50) == 1
+        assert [r[2] for r in list_notifications()].count(3) == 1
+
+    def test_page_cursor(self):
+        filters = {"sort_by": "rate", "sort_dir": "asc"}
+        token = makePageCursor(filters, 5, bytes(28))
+        assert re.match(r"^[A-Za-z0-9_-]+$", token)
+        query_str, query_data = getPageCursorStr(
+            dict(filters, cursor=token), "offer_id", table_name="offers"
+        )
+        assert (
+            query_str
+            == " AND (offers.rate, offers.offer_id) > (:cursor_sort_value, :cursor_record_id)"
+        )
+        assert query_data == {"cursor_sort_value": 5, "cursor_record_id": bytes(28)}
+        assert getPageCursorStr({"cursor": ""}, "offer_id") == ("", {})
+        for bad_filters in (
+            {"cursor": token},  # Sort order differs
+            {"cursor": token[:-2], "sort_by": "rate", "sort_dir": "asc"},
+            {"cursor": "x" * 10, "sort_by": "rate", "sort_dir": "asc"},
+            {"cursor": makePageCursor({}, [1], b"")},
+        ):
+            try:
+                getPageCursorStr(bad_filters, "offer_id")
+                raise AssertionError("Expected ValueError")
+            except ValueError:
+                pass
+
+        class PagesDB(DBMethods):
+            listOffers = BasicSwap.listOffers
+            listOffersPage = BasicSwap.listOffersPage
+            queryOffersWithExtraInfo = BasicSwap.queryOffersWithExtraInfo
+
+            def getTime(self):
+                return self.now
+
+            def ci(self, coin_type):
+                if coin_type == 9:
+                    raise ValueError("Disabled coin")
+                return None
+
+        db_test = PagesDB()
+        db_test.sqlite_file = ":memory:"
+        db_test.mxDB = threading.Lock()
+        db_test.log = logger
+        now: int = int(time.time())
+        db_test.now = now
+
+        def add_offers(start, end):
+            cursor = db_test.openDB()
+            try:
+                cursor.executemany(
+                    "INSERT INTO offers (offer_id, active_ind, coin_from, coin_to, created_at, expire_at, rate, was_sent) VALUES (?, 1, ?, 2, ?, ?, ?, 0)",
+                    [
+                        (
+                            i.to_bytes(28, "big"),
+                            9 if i % 7 == 0 else 1,
+                            now + i // 10,  # Shared created_at values
+                            now + 3600,
+                            i % 13,
+                        )
+                        for i in range(start, end)
+                    ],
+                )
+            finally:
+                db_test.closeDB(cursor)
+
+        cursor = db_test.openDB()
+        try:
+            create_db_(db_test._db_con, logger)
+        finally:
+            db_test.closeDB(cursor)
+        add_offers(0, 200)
+
+        for filters in (
+            {"limit": 15},
+            {"limit": 15, "sort_by": "rate", "sort_dir": "asc"},
+        ):
+            expect = [
+                o.offer_id
+                for o in db_test.listOffers(filters={"sort_by": "rate", "limit": 1000})
+            ]
+            page_filters = dict(filters, cursor="")
+            seen = []
+            while True:
+                offers, next_cursor = db_test.listOffersPage(filters=page_filters)
+                seen.extend(o.offer_id for o in offers)
+                if next_cursor is None:
+                    break
+                if len(seen) == 60:
+                    # Offers added while paging don't shift the remaining pages
+                    add_offers(1000, 1020)
+                page_filters["cursor"] = next_cursor
+            assert len(seen) == len(set(seen))
+            assert set(expect) <= set(seen)
+            assert len(expect) == 200 - 29
+            assert all(int.from_bytes(i, "big") % 7 != 0 for i in seen)
+
+            # Matches the order without a cursor
+            ordered = [
+                o.offer_id
+                for o in db_test.listOffers(filters=dict(filters, limit=1000))
+            ]
+            assert [i for i in ordered if i in set(seen)] == seen
+
+            cursor = db_test.openDB()
+            try:
+                cursor.execute(
+                    "DELETE FROM offers WHERE created_at >= :t", {"t": now + 100}
+                )
+            finally:
+                db_test.closeDB(cursor)
+
+        try:
+            db_test.listOffersPage(filters={"cursor": "", "offset": 10})
+            raise AssertionError("Expected ValueError")
+        except ValueError:
+            pass
+
+    def test_expiry_scheduler(self):
+        scheduler = ExpiryScheduler()
+        assert scheduler.nextExpiry() is None
+        assert scheduler.popExpired(1000) == []
+        for i in range(10):
+            scheduler.schedule(("bid", i), 100 + i)
+        scheduler.schedule(("offer", 1), 50)
+        assert len(scheduler) == 11
+        assert scheduler.nextExpiry() == 50
+
+        # Rescheduled and cancelled entries are skipped
+        scheduler.schedule(("bid", 0), 200)
+        scheduler.schedule(("bid", 1), 200)
+        scheduler.schedule(("bid", 1), 200)
+        scheduler.cancel(("offer", 1))
+        scheduler.cancel(("offer", 2))
+        assert ("offer", 1) not in scheduler
+        assert scheduler.nextExpiry() == 102
+        assert scheduler.popExpired(104) == [("bid", 2), ("bid", 3), ("bid", 4)]
+        assert scheduler.popExpired(104) == []
+        assert len(scheduler) == 7
+        assert scheduler.popExpired(200) == [("bid", i) for i in range(5, 10)] + [
+            ("bid", 0),
+            ("bid", 1),
+        ]
+        assert len(scheduler) == 0
+
+        # Superseded entries don't accumulate
+        for i in range(10000):
+            scheduler.schedule(("bid", 1), i)
+        assert len(scheduler._heap) < 2 * 1024 + 4
+        assert scheduler.popExpired(20000) == [("bid", 1)]
+        scheduler.schedule(("bid", 1), 10)
+        scheduler.clear()
+        assert scheduler.nextExpiry() is None
+
+        class ExpiryDB(DBMethods):
+            expireBidsAndOffers = BasicSwap.expireBidsAndOffers
+            loadExpiringBidsAndOffers = BasicSwap.loadExpiringBidsAndOffers
+
+        db_test = ExpiryDB()
+        db_test.sqlite_file = ":memory:"
+        db_test.mxDB = threading.Lock()
+        db_test.log = logger
+        db_test._expiry_scheduler = scheduler
+        db_test._order_book = OrderBook()
+        now: int = int(time.time())
+        cursor = db_test.openDB()
+        try:
+            create_db_(db_test._db_con, logger)
+            for state in BidStates:
+                addBidState(db_test, state, now, cursor)
+            cursor.executemany(
+                "INSERT INTO offers (offer_id, active_ind, created_at, expire_at, state) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        bytes((i,)) * 28,
+                        2 if i == 3 else 1,
+                        now,
+                        now + i * 10,
+                        int(OfferStates.OFFER_RECEIVED),
+                    )
+                    for i in range(4)
+                ],
+            )
+            cursor.executemany(
+                "INSERT INTO bids (bid_id, offer_id, active_ind, created_at, expire_at, state) VALUES (?, ?, 1, ?, ?, ?)",
+                [
+                    (
+                        bytes((i,)) * 28,
+                        bytes((0,)) * 28,
+                        now,
+                        now + i * 10,
+                        int(
+                            BidStates.SWAP_COMPLETED
+                            if i == 3
+                            else BidStates.BID_RECEIVED
+                        ),
+                    )
+                    for i in range(4)
+                ],
+            )
+            db_test.loadExpiringBidsAndOffers(cursor)
+        finally:
+            db_test.closeDB(cursor)
+        # Inactive offers and bids in states that can't expire are not loaded
+        assert len(scheduler) == 6
+        assert scheduler.nextExpiry() == now
+
+        # Bid 1 was accepted and offer 2 extended without the scheduler being updated
+        cursor = db_test.openDB()
+        try:
+            cursor.execute(
+                "UPDATE bids SET state = :state WHERE bid_id = :bid_id",
+                {"state": int(BidStates.BID_ACCEPTED), "bid_id": bytes((1,)) * 28},
+            )
+            cursor.execute(
+                "UPDATE offers SET expire_at = :expire_at WHERE offer_id = :offer_id",
+                {"expire_at": now + 1000, "offer_id": bytes((2,)) * 28},
+            )
+        finally:
+            db_test.closeDB(cursor)
+        db_test.expireBidsAndOffers(now + 100)
+        assert len(scheduler) == 0
+
+        cursor = db_test.openDB()
+        try:
+            rows = cursor.execute(
+                "SELECT bid_id, state FROM bids ORDER BY bid_id"
+            ).fetchall()
+            assert [r[1] for r in rows] == [
+                int(BidStates.BID_EXPIRED),
+                int(BidStates.BID_ACCEPTED),
+                int(BidStates.BID_EXPIRED),
+                int(BidStates.SWAP_COMPLETED),
+            ]
+            rows = cursor.execute(
+                "SELECT offer_id, state FROM offers ORDER BY offer_id"
+            ).fetchall()
+            assert [r[1] for r in rows] == [
+                int(OfferStates.OFFER_EXPIRED),
+                int(OfferStates.OFFER_EXPIRED),
+                int(OfferStates.OFFER_RECEIVED),
+                int(OfferStates.OFFER_RECEIVED),
+            ]
+        finally:
+            db_test.closeDB(cursor)
+
+    def test_queued_actions(self):
+        class ActionsDB(DBMethods):
+            createActionInSession = BasicSwap.createActionInSession
+            createAction = BasicSwap.createAction
+            loadQueuedActions = BasicSwap.loadQueuedActions
+            checkQueuedActions = BasicSwap.checkQueuedActions
+
+            def getTime(self):
+                return self.now
+
+            def sendXmrBidCoinALockTx(self, bid_id, cursor):
+                self.ran.append((self.now, ActionTypes.SEND_XMR_SWAP_LOCK_TX_A, bid_id))
+                # Queued while running actions, must not be removed with them
+                self.createActionInSession(
+                    0, ActionTypes.REDEEM_XMR_SWAP_LOCK_TX_A, bid_id, cursor
+                )
+
+            def redeemXmrBidCoinALockTx(self, bid_id, cursor):
+                self.ran.append(
+                    (self.now, ActionTypes.REDEEM_XMR_SWAP_LOCK_TX_A, bid_id)
+                )
+
+        db_test = ActionsDB()
+        db_test.sqlite_file = ":memory:"
+        db_test.mxDB = threading.Lock()
+        db_test.log = BSXLogger("test_queued_actions")
+        db_test.debug = False
+        db_test._debug_cases = []
+        db_test._queued_actions = ExpiryScheduler()
+        db_test.ran = []
+        db_test.now = 1000
+        cursor = db_test.openDB()
+        try:
+            create_db_(db_test._db_con, logger)
+        finally:
+            db_test.closeDB(cursor)
+
+        num_queries: int = 0
+
+        def count_queries(statement):
+            nonlocal num_queries
+            if statement.startswith("SELECT") and "FROM actions" in statement:
+                num_queries += 1
+
+        db_test._db_con.set_trace_callback(count_queries)
+        bid_ids = [bytes((i,)) * 28 for i in range(3)]
+        for bid_id in bid_ids:
+            db_test.createAction(10, ActionTypes.SEND_XMR_SWAP_LOCK_TX_A, bid_id)
+        db_test.createAction(20, ActionTypes.SEND_XMR_SWAP_LOCK_TX_A, bid_ids[0])
+
+        # Nothing due, the table isn't read
+        for now in range(1000, 1010):
+            db_test.now = now
+            db_test.checkQueuedActions()
+        assert num_queries == 0
+        assert db_test.ran == []
+
+        # Actions for different bids due at the same time run in the same check
+        db_test.now = 1010
+        db_test.checkQueuedActions()
+        assert num_queries == 1
+        assert db_test.ran == [
+            (1010, ActionTypes.SEND_XMR_SWAP_LOCK_TX_A, bid_id) for bid_id in bid_ids
+        ]
+        db_test._db_con.set_trace_callback(None)
+        db_test.ran.clear()
+        db_test.checkQueuedActions()
+        assert db_test.ran == [
+            (1010, ActionTypes.REDEEM_XMR_SWAP_LOCK_TX_A, bid_id) for bid_id in bid_ids
+        ]
+        db_test.ran.clear()
+
+        # Reloaded after a restart
+        db_test._queued_actions.clear()
+        cursor = db_test.openDB()
+        try:
+            db_test.loadQueuedActions(cursor)
+        finally:
+            db_test.closeDB(cursor)
+        assert db_test._queued_actions.nextExpiry() == 1020
+        db_test.now = 1025
+        db_test.checkQueuedActions()
+        db_test.checkQueuedActions()
+        assert db_test.ran == [
+            (1025, ActionTypes.SEND_XMR_SWAP_LOCK_TX_A, bid_ids[0]),
+            (1025, ActionTypes.REDEEM_XMR_SWAP_LOCK_TX_A, bid_ids[0]),
+        ]
+        assert len(db_test._queued_actions) == 0
+        cursor = db_test.openDB()
+        try:
+            assert cursor.execute("SELECT COUNT(*) FROM actions").fetchone()[0] == 0
+        finally:
+            db_test.closeDB(cursor)
+
+    def test_order_book(self):
+        def make_offer(i, rate, coin_from=1, coin_to=2, expire_at=2000):
+            offer = Offer()
+            offer.offer_id = i.to_bytes(28, "big")
+            offer.coin_from = coin_from
+            offer.coin_to = coin_to
+            offer.rate = rate
+            offer.amount_from = 100
+            offer.min_bid_amount = 10
+            offer.amount_negotiable = False
+            offer.rate_negotiable = False
+            offer.addr_from = "addr"
+            offer.created_at = 1000
+            offer.expire_at = expire_at
+            offer.was_sent = False
+            offer.active_ind = 1
+            offer.state = OfferStates.OFFER_RECEIVED
+            return offer
+
+        book = OrderBook()
+        assert book.getOffers(1, 2, 1000) == []
+        assert book.bestOffer(1, 2, 1000) is None
+        for i, rate in enumerate((50, 20, 30, 20, 40)):
+            book.add(make_offer(i, rate))
+        book.add(make_offer(10, 10, coin_from=2, coin_to=1))
+        book.add(make_offer(11, 5, expire_at=1500))
+        assert len(book) == 7
+        assert book.getPairs() == {(1, 2): 6, (2, 1): 1}
+
+        def rates(entries):
+            return [(e.rate, int.from_bytes(e.offer_id, "big")) for e in entries]
+
+        assert rates(book.getOffers(1, 2, 1000)) == [
+            (5, 11),
+            (20, 1),
+            (20, 3),
+            (30, 2),
+            (40, 4),
+            (50, 0),
+        ]
+        # Expired offers are skipped
+        assert rates(book.getOffers(1, 2, 1500)) == [
+            (20, 1),
+            (20, 3),
+            (30, 2),
+            (40, 4),
+            (50, 0),
+        ]
+        assert rates(book.getOffers(1, 2, 1500, min_rate=21, max_rate=40)) == [
+            (30, 2),
+            (40, 4),
+        ]
+        assert rates(book.getOffers(1, 2, 1500, min_rate=20, limit=1)) == [(20, 1)]
+        assert rates([book.bestOffer(2, 1, 1000)]) == [(10, 10)]
+
+        # Own offers are skipped before the limit
+        own_offer = make_offer(12, 15)
+        own_offer.was_sent = True
+        book.add(own_offer)
+        assert rates(book.getOffers(1, 2, 1500, limit=2)) == [(15, 12), (20, 1)]
+        assert rates(book.getOffers(1, 2, 1500, limit=2, include_sent=False)) == [
+            (20, 1),
+            (20, 3),
+        ]
+        book.remove(own_offer.offer_id)
+
+        # Re-adding an offer replaces the previous entry
+        book.add(make_offer(0, 1))
+        assert rates([book.bestOffer(1, 2, 1500)]) == [(1, 0)]
+        assert len(book) == 7
+        book.remove(bytes(28))
+        book.remove(bytes(28))
+        book.remove((10).to_bytes(28, "big"))
+        assert bytes(28) not in book
+        assert book.getPairs() == {(1, 2): 5}
+        book.clear()
+        assert len(book) == 0
+
+        class OrderBookDB(DBMethods):
+            offerChanged = BasicSwap.offerChanged
+            loadOrderBook = BasicSwap.loadOrderBook
+            addToOrderBook = BasicSwap.addToOrderBook
+            getOrderBook = BasicSwap.getOrderBook
+            expireBidsAndOffers = BasicSwap.expireBidsAndOffers
+
+            def getTime(self):
+                return self.now
+
+            def ci(self, coin_type):
+                if coin_type == 9:
+                    raise ValueError("Disabled coin")
+                return None
+
+        db_test = OrderBookDB()
+        db_test.sqlite_file = ":memory:"
+        db_test.mxDB = threading.Lock()
+        db_test.log = logger
+        db_test.ws_topics = None
+        db_test._offers_seq = 0
+        db_test._expiry_scheduler = ExpiryScheduler()
+        db_test._order_book = book
+        db_test.now = 1000
+        cursor = db_test.openDB()
+        try:
+            create_db_(db_test._db_con, logger)
+            for i, rate in enumerate((50, 20, 30)):
+                offer = make_offer(i, rate, expire_at=1100 + i * 100)
+                db_test.add(offer, cursor)
+                db_test.offerChanged(offer, "added")
+            offer = make_offer(3, 10)
+            offer.active_ind = 2
+            offer.state = OfferStates.OFFER_RECEIVED
+            db_test.add(offer, cursor)
+            # Disabled coin
+            disabled_offer = make_offer(4, 10, coin_to=9)
+            db_test.add(disabled_offer, cursor)
+            db_test.offerChanged(disabled_offer, "added")
+        finally:
+            db_test.closeDB(cursor)
+        assert rates(db_test.getOrderBook(1, 2)) == [(20, 1), (30, 2), (50, 0)]
+        assert db_test._order_book.getPairs() == {(1, 2): 3}
+
+        # Revoked
+        offer.offer_id = (2).to_bytes(28, "big")
+        db_test.offerChanged(offer, "removed")
+        assert rates(db_test.getOrderBook(1, 2)) == [(20, 1), (50, 0)]
+
+        # Expired
+        db_test.now = 1100
+        db_test.expireBidsAndOffers(db_test.now)
+        assert bytes(28) not in book
+        assert rates(db_test.getOrderBook(1, 2)) == [(20, 1)]
+
+        # Reloaded after a restart, inactive and expired offers are skipped
+        cursor = db_test.openDB()
+        try:
+            db_test.loadOrderBook(cursor)
+        finally:
+            db_test.closeDB(cursor)
+        assert rates(db_test.getOrderBook(1, 2)) == [(20, 1), (30, 2)]
+        assert db_test._order_book.getPairs() == {(1, 2): 2}
+
+    def test_wallets_info_cache(self):
+        active_coins = (Coins.PART, Coins.BTC, Coins.LTC)
+
+        class WalletsInfoDB(DBMethods):
+            loadWalletsInfo = BasicSwap.loadWalletsInfo
+            setCachedWalletInfo = BasicSwap.setCachedWalletInfo
+            updateCachedWalletAddress = BasicSwap.updateCachedWalletAddress
+            flushWalletsInfo = BasicSwap.flushWalletsInfo
+            updateWalletInfo = BasicSwap.updateWalletInfo
+            updateWalletsInfo = BasicSwap.updateWalletsInfo
+            getCachedWalletsInfo = BasicSwap.getCachedWalletsInfo
+
+            def getTime(self):
+                return self.now
+
+            def activeCoins(self):
+                return iter(active_coins)
+
+            def isCoinActive(self, coin):
+                return coin in active_coins
+
+            def getBlockchainInfo(self, coin):
+                return {"blocks": 100}
+
+            def getWalletInfo(self, coin):
+                self.rpc_calls.append(coin)
+                time.sleep(self.rpc_delay)
+                self.rpc_release.wait()
+                return {
+                    "balance": self.balances[coin],
+                    "deposit_address": "addr",
+                }
+
+        db_test = WalletsInfoDB()
+        db_test.sqlite_file = ":memory:"
+        db_test.mxDB = threading.Lock()
+        db_test.log = logger
+        db_test.coin_clients = {
+            c: {"connection_type": "rpc" if c in active_coins else "none"}
+            for c in chainparams
+        }
+        db_test._mx_wallets_info = threading.Lock()
+        db_test._wallets_info = None
+        db_test._wallets_info_dirty = set()
+        db_test._wallets_info_pool = None
+        db_test._updating_wallets_info = {}
+        db_test._wallets_info_refresh_at = {}
+        db_test._wallets_info_errors = {}
+        db_test._wallet_update_timeout = 10
+        db_test.wallets_info_refresh_seconds = 30
+        db_test.now = 1000
+        db_test.balances = {c: "1.0" for c in active_coins}
+        db_test.rpc_calls = []
+        db_test.rpc_delay = 0.2
+        db_test.rpc_release = threading.Event()
+        db_test.rpc_release.set()
+        cursor = db_test.openDB()
+        try:
+            create_db_(db_test._db_con, logger)
+        finally:
+            db_test.closeDB(cursor)
+
+        wallets = db_test.getCachedWalletsInfo()
+        assert sorted(wallets.keys()) == [int(c) for c in active_coins]
+        assert all(w["no_data"] for w in wallets.values())
+
+        # Coins refresh concurrently, not one after another
+        t = time.time()
+        db_test.updateWalletsInfo(wait_for_complete=True)
+        assert time.time() - t < 0.4
+        assert len(db_test.rpc_calls) == len(active_coins)
+        db_test.rpc_calls.clear()
+        db_test.rpc_delay = 0
+
+        num_statements: int = 0
+
+        def count_statements(statement):
+            nonlocal num_statements
+            num_statements += 1
+
+        db_test._db_con.set_trace_callback(count_statements)
+        wallets = db_test.getCachedWalletsInfo()
+        assert wallets[int(Coins.BTC)] == {
+            "blocks": 100,
+            "balance": "1.0",
+            "deposit_address": "addr",
+            "lastupdated": 1000,
+            "updating": False,
+        }
+        assert list(db_test.getCachedWalletsInfo({"coin_id": Coins.LTC}).keys()) == [
+            int(Coins.LTC)
+        ]
+
+        # Before the deadline the snapshot is returned without refreshing
+        db_test.now = 1010
+        db_test.updateWalletsInfo()
+        assert db_test.rpc_calls == []
+
+        # Stale coins are refreshed in the background while the old values are read.
+        # A coin that isn't due doesn't stop the others refreshing
+        db_test.rpc_release.clear()
+        db_test._wallets_info_refresh_at[int(Coins.LTC)] = 0
+        db_test._wallets_info_refresh_at[int(Coins.PART)] = 0
+        db_test.balances[Coins.LTC] = "2.0"
+        db_test.balances[Coins.PART] = "2.0"
+        db_test.updateWalletsInfo()
+        wallets = db_test.getCachedWalletsInfo()
+        assert wallets[int(Coins.LTC)]["balance"] == "1.0"
+        assert wallets[int(Coins.LTC)]["updating"] is True
+        db_test.updateWalletsInfo()
+        db_test.rpc_release.set()
+        db_test._wallets_info_pool.shutdown()
+        assert sorted(db_test.rpc_calls) == [Coins.PART, Coins.LTC]
+        wallets = db_test.getCachedWalletsInfo()
+        assert wallets[int(Coins.LTC)]["balance"] == "2.0"
+        assert wallets[int(Coins.LTC)]["lastupdated"] == 1010
+        assert wallets[int(Coins.LTC)]["updating"] is False
+        assert wallets[int(Coins.BTC)]["lastupdated"] == 1000
+
+        db_test.updateCachedWalletAddress(Coins.BTC, "deposit_address", "addr2")
+        assert db_test.getCachedWalletsInfo()[int(Coins.BTC)]["deposit_address"] == (
+            "addr2"
+        )
+        # Reads and refreshes didn't touch the db
+        assert num_statements == 0
+        db_test._db_con.set_trace_callback(None)
+
+        # Written behind, one row per coin and info type
+        db_test.flushWalletsInfo()
+        db_test.setCachedWalletInfo(Coins.PART, 1, None)
+        db_test.flushWalletsInfo()
+        db_test.flushWalletsInfo()
+        cursor = db_test.openDB()
+        try:
+            assert cursor.execute("SELECT COUNT(*) FROM wallets").fetchone()[0] == 5
+            cursor.execute(
+                "INSERT INTO kv_string (key, value) VALUES (?, ?)",
+                ("receive_addr_bitcoin", "addr3"),
+            )
+        finally:
+            db_test.closeDB(cursor)
+
+        # Loaded after a restart
+        expect = db_test.getCachedWalletsInfo()
+        db_test._wallets_info = None
+        wallets = db_test.getCachedWalletsInfo()
+        assert wallets[int(Coins.BTC)]["deposit_address"] == "addr3"
+        wallets[int(Coins.BTC)]["deposit_address"] = "addr2"
+        assert wallets == expect
+        assert "balance" not in wallets[int(Coins.PART)]
+
+    def test_wallet_info_refresh_error(self):
+        active_coins = (Coins.BTC, Coins.LTC)
+
+        class MockCI:
+            def __init__(self, coin_type):
+                self.coin_type = coin_type
+                self.error = None
+
+            def coin_name(self):
+                return getCoinName(self.coin_type)
+
+            def getBlockchainInfo(self):
+                return {"blocks": 100, "verificationprogress": 1.0}
+
+            def getWalletInfo(self):
+                if self.error is not None:
+                    raise ValueError(self.error)
+                return {
+                    "balance": 100000000,
+                    "unconfirmed_balance": 0,
+                    "encrypted": False,
+                    "locked": False,
+                    "mweb_balance": 0,
+                    "mweb_unconfirmed": 0,
+                    "mweb_immature": 0,
+                }
+
+            def format_amount(self, amount, conv_int=False):
+                return format_amount(amount, 8)
+
+            def knownWalletSeed(self):
+                return True
+
+        class WalletsInfoDB(DBMethods):
+            loadWalletsInfo = BasicSwap.loadWalletsInfo
+            setCachedWalletInfo = BasicSwap.setCachedWalletInfo
+            updateWalletInfo = BasicSwap.updateWalletInfo
+            updateWalletsInfo = BasicSwap.updateWalletsInfo
+            getCachedWalletsInfo = BasicSwap.getCachedWalletsInfo
+            getBlockchainInfo = BasicSwap.getBlockchainInfo
+            getWalletInfo = BasicSwap.getWalletInfo
+
+            def getTime(self):
+                return self.now
+
+            def activeCoins(self):
+                return iter(active_coins)
+
+            def isCoinActive(self, coin):
+                return coin in active_coins
+
+            def ci(self, coin):
+                return self.interfaces[coin]
+
+            def getCachedAddressForCoin(self, coin):
+                return "addr"
+
+            def getCachedStealthAddressForCoin(self, coin):
+                return "mweb_addr"
+
+        db_test = WalletsInfoDB()
+        db_test.sqlite_file = ":memory:"
+        db_test.mxDB = threading.Lock()
+        db_test.log = logger
+        db_test.interfaces = {c: MockCI(c) for c in active_coins}
+        db_test.coin_clients = {
+            c: {
+                "connection_type": "rpc" if c in active_coins else "none",
+                "core_version": 1,
+            }
+            for c in chainparams
+        }
+        db_test._mx_wallets_info = threading.Lock()
+        db_test._wallets_info = None
+        db_test._wallets_info_dirty = set()
+        db_test._wallets_info_pool = None
+        db_test._updating_wallets_info = {}
+        db_test._wallets_info_refresh_at = {}
+        db_test._wallets_info_errors = {}
+        db_test._wallet_update_timeout = 10
+        db_test.wallets_info_refresh_seconds = 30
+        db_test.now = 1000
+        cursor = db_test.openDB()
+        try:
+            create_db_(db_test._db_con, logger)
+        finally:
+            db_test.closeDB(cursor)
+
+        try:
+            db_test.updateWalletsInfo(wait_for_complete=True)
+            wallets = db_test.getCachedWalletsInfo({"with_error": True})
+            assert wallets[int(Coins.LTC)]["balance"] == "1.00000000"
+            assert "error" not in wallets[int(Coins.LTC)]
+
+            # The last refresh error is kept until a refresh succeeds
+            db_test.interfaces[Coins.LTC].error = "RPC error"
+            db_test.updateWalletsInfo(
+                force_update=True, only_coin=Coins.LTC, wait_for_complete=True
+            )
+            assert "error" not in db_test.getCachedWalletsInfo()[int(Coins.LTC)]
+            wallets = db_test.getCachedWalletsInfo({"with_error": True})
+            assert wallets[int(Coins.LTC)]["error"] == "RPC error"
+            assert wallets[int(Coins.LTC)]["balance"] == "1.00000000"
+            assert "error" not in wallets[int(Coins.BTC)]
+            db_test._wallets_info[int(Coins.LTC)].clear()
+            assert db_test.getCachedWalletsInfo(
+                {"coin_id": Coins.LTC, "with_error": True}
+            ) == {
+                int(Coins.LTC): {"name": getCoinName(Coins.LTC), "error": "RPC error"}
+            }
+
+            db_test.interfaces[Coins.LTC].error = None
+            db_test.updateWalletsInfo(
+                force_update=True, only_coin=Coins.LTC, wait_for_complete=True
+            )
+            wallets = db_test.getCachedWalletsInfo({"with_error": True})
+            assert wallets[int(Coins.LTC)]["mweb_address"] == "mweb_addr"
+            assert "error" not in wallets[int(Coins.LTC)]
+        finally:
+            db_test._wallets_info_pool.shutdown()
+
+    def test_block_prefetcher(self):
+        class MockCI:
+            def __init__(self):
+                self.calls = 0
+
+            def getBlockHashes(self, heights):
+                self.calls += 1
+                return [f"{h:064x}" for h in heights]
+
+            def getBlocksWithTxns(self, block_hashes):
+                self.calls += 1
+                return [{"hash": h, "height": int(h, 16)} for h in block_hashes]
+
+        ci = MockCI()
+        with BlockPrefetcher(ci, 5, 104, batch_size=7, max_pending=3) as prefetcher:
+            heights = [b["height"] for blocks in prefetcher.batches() for b in blocks]
+        assert heights == list(range(5, 105))
+        assert ci.calls == 2 * 15
+
+        with BlockPrefetcher(ci, 10, 9) as prefetcher:
+            assert len(list(prefetcher.batches())) == 0
+
+        cc = {
+            "watched_transactions": [
+                WatchedTransaction(b"\x01", 1, "aa" * 32, 1, None),
+            ],
+            "watched_scripts": [
+                WatchedScript(b"\x02", bytes.fromhex("0014aa"), 2, None)
+            ],
+            "watched_outputs": [WatchedOutput(b"\x03", "bb" * 32, 1, 3, None)],
+        }
+        watched = WatchedIndex(cc)
+        assert watched.empty() is False
+        tx = {
+            "txid": "aa" * 32,
+            "vin": [{"coinbase": "00"}, {"txid": "bb" * 32, "vout": 1}],
+            "vout": [
+                {"scriptPubKey": {"hex": "0014bb"}},
+                {"scriptPubKey": {"hex": "0014aa"}},
+            ],
+        }
+        found = watched.matchTx(tx)
+        assert [(m[0], m[1].bid_id, m[2]) for m in found] == [
+            ("tx", b"\x01", None),
+            ("script", b"\x02", 1),
+            ("spend", b"\x03", 1),
+        ]
+        assert len(watched.matchTx({"txid": "cc" * 32, "vin": [], "vout": []})) == 0
+
+        cc["watched_transactions"][0].block_hash = bytes(32)
+        assert len(WatchedIndex(cc).matchTx(tx)) == 2
+
+    def test_check_for_spends_reorg(self):
+        def block_hash(height, fork):
+            return f"{fork:02x}{height:062x}"
+
+        class MockCI:
+            def __init__(self, chain_height, fork_height):
+                self.chain_height = chain_height
+                self.fork_height = fork_height
+                self.single_fetches = []
+                self.batch_starts = []
+
+            def coin_type(self):
+                return Coins.BTC
+
+            def coin_name(self):
+                return "Bitcoin"
+
+            def ticker(self):
+                return "BTC"
+
+            def getChainHeight(self):
+                return self.chain_height
+
+            def makeBlock(self, height):
+                fork = 1 if height > self.fork_height else 0
+                prev_fork = 1 if height - 1 > self.fork_height else 0
+                return {
+                    "hash": block_hash(height, fork),
+                    "previousblockhash": block_hash(height - 1, prev_fork),
+                    "height": height,
+                    "time": 1000 + height,
+                    "tx": [],
+                }
+
+            def rpc(self, method, params):
+                assert method == "getblockhash"
+                return params[0]
+
+            def getBlockWithTxns(self, height):
+                self.single_fetches.append(height)
+                return self.makeBlock(height)
+
+            def getBlockHashes(self, heights):
+                self.batch_starts.append(heights[0])
+                return heights
+
+            def getBlocksWithTxns(self, heights):
+                return [self.makeBlock(h) for h in heights]
+
+        class ScanDB(DBMethods):
+            checkForSpends = BasicSwap.checkForSpends
+            haveCheckedPrevBlock = BasicSwap.haveCheckedPrevBlock
+            updateCheckedBlocks = BasicSwap.updateCheckedBlocks
+            processBlockForWatched = BasicSwap.processBlockForWatched
+
+            def getTime(self):
+                return 1000
+
+            def ci(self, coin_type):
+                return self.mock_ci
+
+        db_test = ScanDB()
+        db_test.sqlite_file = ":memory:"
+        db_test.mxDB = threading.Lock()
+        db_test.log = logger
+        db_test.delay_event = threading.Event()
+        db_test.coin_clients = {Coins.BTC: {}}
+        db_test._max_check_loop_blocks = 1000
+        db_test._block_scan_batch_size = 20
+        db_test._block_scan_workers = 1
+        db_test._block_scan_prefetch = 2
+        # Blocks after 30 were replaced
+        db_test.mock_ci = MockCI(100, 30)
+        cursor = db_test.openDB()
+        try:
+            create_db_(db_test._db_con, logger)
+        finally:
+            db_test.closeDB(cursor)
+        old_chain = MockCI(40, 40)
+        db_test.updateCheckedBlocks(
+            old_chain,
+            {"last_height_checked": 0},
+            [old_chain.makeBlock(h) for h in range(1, 41)],
+        )
+
+        cc = {
+            "last_height_checked": 40,
+            "block_check_min_time": 0,
+            "watched_transactions": [],
+            "watched_scripts": [],
+            "watched_outputs": [],
+        }
+        db_test.checkForSpends(Coins.BTC, cc)
+        ci = db_test.mock_ci
+        # Walks back with single block fetches, then prefetches from the fork point
+        assert ci.single_fetches == list(range(40, 30, -1))
+        assert ci.batch_starts[-4:] == [32, 52, 72, 92]
+        assert cc["last_height_checked"] == 100
+        cursor = db_test.openDB()
+        try:
+            rows = cursor.execute(
+                "SELECT block_height, block_hash FROM checkedblocks WHERE block_height > 30"
+            ).fetchall()
+        finally:
+            db_test.closeDB(cursor, commit=False)
+        new_hashes = {(h, bytes.fromhex(block_hash(h, 1))) for h in range(31, 101)}
+        assert new_hashes.issubset(set(rows))
+
+    def test_wallet_rpc_pool(self):
+        calls = []
+
+        def make_rpc(i):
+            def rpc_wallet(method, params=None):
+                calls.append((i, method))
+
+            return rpc_wallet
+
+        pool = WalletRPCPool([make_rpc(0), make_rpc(1)])
+
+        def use(filename):
+            with pool.acquire(filename) as worker:
+                if worker.open_filename != filename:
+                    worker.rpc_wallet("open_wallet")
+                    worker.open_filename = filename
+                return worker
+
+        w_a = use("a")
+        w_b = use("b")
+        assert w_a is not w_b
+        # Wallets stay open on their worker
+        assert use("a") is w_a
+        assert use("b") is w_b
+        assert len([c for c in calls if c[1] == "open_wallet"]) == 2
+        # Least recently used worker is replaced
+        assert use("c") is w_a
+        assert w_a.open_filename == "c"
+
+        # Worker state is reset on error
+        try:
+            with pool.acquire("b") as worker:
+                raise ValueError("rpc error")
+        except ValueError:
+            pass
+        assert worker is w_b and w_b.open_filename is None
+
+        # A wallet is open on one worker only, second user waits
+        use("d")
+        order = []
+        with pool.acquire("d") as worker:
+            t = threading.Thread(target=lambda: order.append(use("d")))
+            t.start()
+            t.join(0.1)
+            assert t.is_alive()
+            order.append(worker)
+        t.join()
+        assert order[0] is order[1]
+
+        pool.evict("d")
+        assert all(w.open_filename != "d" for w in pool._workers)
+        assert calls[-1][1] == "close_wallet"
+
+    def test_rpc_keepalive_batch(self):
+        connections = set()
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                connections.add(self.client_address)
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+                def result(req):
+                    if req["method"] == "fail":
+                        return {"result": None, "error": {"code": -1}, "id": req["id"]}
+                    return {
+                        "result": req["params"][0] * 2,
+                        "error": None,
+                        "id": req["id"],
+                    }
+
+                if isinstance(body, list):
+                    rv = [result(req) for req in reversed(body)]
+                else:
+                    rv = result(body)
+                data = json.dumps(rv).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        port = server.server_address[1]
+        t = threading.Thread(target=server.serve_forever)
+        t.start()
+        try:
+            rpc.enable_rpc_pooling({"enabled": True, "max_connections_per_daemon": 2})
+            for i in range(5):
+                assert rpc.callrpc(port, "user:pass", "double", [i]) == i * 2
+            calls = [("double", [i]) for i in range(10)]
+            assert rpc.callrpc_batch(port, "user:pass", calls) == [
+                i * 2 for i in range(10)
+            ]
+            assert len(connections) == 1
+
+            calls = [("double", [1]), ("fail", [0]), ("double", [3])]
+            try:
+                rpc.callrpc_batch(port, "user:pass", calls)
+            except ValueError as e:
+                assert "method: fail" in str(e)
+            else:
+                raise ValueError("Should fail")
+            results = rpc.callrpc_batch(port, "user:pass", calls, raise_errors=False)
+            assert results[0] == 2 and results[2] == 6
+            assert isinstance(results[1], ValueError)
+
+            stats = get_pool_stats()
+            assert len(stats) == 1
+            assert stats[0]["url"] == f"127.0.0.1:{port}/"
+            assert stats[0]["requests"] == 5
+            assert stats[0]["batch_requests"] == 3
+            assert stats[0]["hits"] == 7 and stats[0]["misses"] == 1
+        finally:
+            rpc.enable_rpc_pooling({})
+            close_all_pools()
+            server.shutdown()
+            server.server_close()
+            t.join()
+
+    def test_bid_check_scheduler(self):
+        class MockOffer:
+            def __init__(self, coin_from, coin_to):
+                self.coin_from = coin_from
+                self.coin_to = coin_to
+
+        mx = threading.Lock()
+        running = {}
+        max_running = {}
+
+        def check_func(bid_id, bid, offer):
+            coins = {offer.coin_from, offer.coin_to}
+            with mx:
+                for c in coins:
+                    running[c] = running.get(c, 0) + 1
+                    max_running[c] = max(max_running.get(c, 0), running[c])
+            time.sleep(0.02)
+            with mx:
+                for c in coins:
+                    running[c] -= 1
+            if bid == "error":
+                raise ValueError("check failed")
+            return bid == "done"
+
+        swaps = [
+            (
+                bytes((i,)),
+                ("done", "error", None)[i % 3],
+                MockOffer(1 + i % 2, 6 if i < 6 else 2),
+            )
+            for i in range(12)
+        ]
+        scheduler = BidCheckScheduler(num_workers=8, coin_limit=3)
+        try:
+            results = scheduler.run(swaps, check_func)
+        finally:
+            scheduler.shutdown()
+        assert [r[0] for r in results] == [s[0] for s in swaps]
+        for i, r in enumerate(results):
+            if i % 3 == 0:
+                assert r[3] is True
+            elif i % 3 == 1:
+                assert isinstance(r[3], ValueError)
+            else:
+                assert r[3] is False
+        assert max(max_running.values()) <= 3
+        assert max_running[6] > 1
+
+        results = BidCheckScheduler(num_workers=1).run(swaps[:2], check_func)
+        assert results[0][3] is True and isinstance(results[1][3], ValueError)
+
+    def test_prefetched_lookups(self):
+        class MockCI:
+            def __init__(self):
+                self.calls = []
+
+            def getChainHeight(self):
+                self.calls.append("getChainHeight")
+                return 100 + len(self.calls)
+
+            def findTxnByHash(self, txid_hex, vout=None):
+                self.calls.append(txid_hex)
+                if txid_hex == "bad":
+                    raise ValueError("rpc failed")
+                return {"txid": txid_hex, "vout": vout}
+
+        ci, ci_other = MockCI(), MockCI()
+        lookups = PrefetchedLookups()
+        lookups.prefetch(ci.getChainHeight)
+        lookups.prefetch(ci.findTxnByHash, "aa", vout=1)
+        lookups.prefetch(ci.findTxnByHash, "bad")
+        assert len(ci.calls) == 3
+
+        # Prefetched results are returned once, failed lookups raise again
+        assert lookups.call(ci.getChainHeight) == 101
+        assert lookups.call(ci.findTxnByHash, "aa", vout=1)["vout"] == 1
+        try:
+            lookups.call(ci.findTxnByHash, "bad")
+        except ValueError as e:
+            assert "rpc failed" in str(e)
+        else:
+            raise ValueError("Should have errored.")
+        assert len(ci.calls) == 3
+
+        # Other arguments, objects or repeated lookups are made directly
+        assert lookups.call(ci.findTxnByHash, "aa", vout=2)["vout"] == 2
+        assert lookups.call(ci.getChainHeight) == 105
+        assert lookups.call(ci_other.getChainHeight) == 101
+        assert len(ci.calls) == 5
+
+    def test_chain_notifier(self):
+        block_hash = bytes.fromhex("ab" * 32)
+        assert ChainNotifier.parseBitcoinMessage(
+            [b"hashblock", block_hash, b"\x01\x00\x00\x00"]
+        ) == ("block", "ab" * 32)
+        assert ChainNotifier.parseBitcoinMessage([b"rawtx", b"\x02", b""]) == (
+            "tx",
+            None,
+        )
+        assert ChainNotifier.parseBitcoinMessage([b"sequence", b""]) == (None, None)
+        body = json.dumps({"first_height": 100, "ids": ["aa", "bb"]})
+        assert ChainNotifier.parseMoneroMessage(
+            [f"json-minimal-chain_main:{body}".encode("utf-8")]
+        ) == ("block", 101)
+        assert ChainNotifier.parseMoneroMessage([b"json-minimal-txpool_add:[]"]) == (
+            "tx",
+            None,
+        )
+
+        context = zmq.Context()
+        pub_btc = context.socket(zmq.PUB)
+        pub_xmr = context.socket(zmq.PUB)
+        port_btc = pub_btc.bind_to_random_port("tcp://127.0.0.1")
+        port_xmr = pub_xmr.bind_to_random_port("tcp://127.0.0.1")
+
+        events = []
+        received = threading.Event()
+
+        def on_event(coin_type, kind, data, received_at):
+            events.append((coin_type, kind, data))
+            if len(events) >= 3:
+                received.set()
+
+        notifier = ChainNotifier(on_event, logger, poll_timeout_ms=50)
+        notifier.addBitcoinSubscriber(2, f"tcp://127.0.0.1:{port_btc}")
+        notifier.addMoneroSubscriber(6, f"tcp://127.0.0.1:{port_xmr}", True)
+        assert notifier.numSubscribers() == 2
+        notifier.start()
+        try:
+            # Subscriptions propagate asynchronously, publish until received
+            for i in range(100):
+                pub_btc.send_multipart([b"hashtx", block_hash, b""])
+                pub_btc.send_multipart([b"hashblock", block_hash, b""])
+                pub_xmr.send_multipart(
+                    [f"json-minimal-chain_main:{body}".encode("utf-8")]
+                )
+                if received.wait(0.05):
+                    break
+            assert received.is_set()
+            assert (2, "block", "ab" * 32) in events
+            assert (6, "block", 101) in events
+            assert all(e[0] != 2 or e[1] != "tx" for e in events)
+        finally:
+            notifier.stop()
+            notifier.join()
+            pub_btc.close(linger=0)
+            pub_xmr.close(linger=0)
+            context.term()
+        assert not notifier.is_alive()
+
+    def test_smsg_pow(self):
+        target: int = uint256_from_compact(0x1EFFFFFF)
+        msg_tail: bytes = secrets.token_bytes(300)
+
+        # Matches the hmac of smsgGetPOWHash
+        for nonce in (0, 1, 0x01020304, 0xFFFFFFFF):
+            nonce_bytes = nonce.to_bytes(4, "little")
+            _, pow_hash = smsgFindNonce(msg_tail, 1 << 256, nonce, nonce + 1)
+            assert pow_hash == smsgGetPOWHash(bytes(4) + nonce_bytes + msg_tail)
+
+        nonce, pow_hash = smsgFindNonce(msg_tail, target, 0, 1000000)
+        assert uint256_from_str(pow_hash) <= target
+        for i in range(0, nonce, 97):
+            _, pow_hash_i = smsgFindNonce(msg_tail, 1 << 256, i, i + 1)
+            assert uint256_from_str(pow_hash_i) > target
+        assert smsgFindNonce(msg_tail, target, 0, nonce) == (None, None)
+        assert smsgFindNonce(msg_tail, 0, 0, 100) == (None, None)
+
+        privkey_from = secrets.token_bytes(32)
+        privkey_to = secrets.token_bytes(32)
+        pubkey_to = PrivateKey(privkey_to).public_key.format()
+        payload = b"test payload"
+        now: int = int(time.time())
+
+        msg = smsgEncrypt(privkey_from, pubkey_to, payload, now, deterministic=True)
+        assert uint256_from_str(smsgGetPOWHash(msg)) <= target
+        assert msg[:4] == smsgGetPOWHash(msg)[:4]
+        assert smsgDecrypt(privkey_to, msg) == payload
+
+        engine = SMSGPowEngine(num_workers=2, chunk_size=1024)
+        try:
+            # The pool finds the same nonce as the serial search
+            for i in range(2):
+                msg_pool = smsgEncrypt(
+                    privkey_from,
+                    pubkey_to,
+                    payload,
+                    now + i,
+                    deterministic=True,
+                    pow_engine=engine,
+                )
+                msg_serial = smsgEncrypt(
+                    privkey_from, pubkey_to, payload, now + i, deterministic=True
+                )
+                assert msg_pool == msg_serial
+                assert smsgDecrypt(privkey_to, msg_pool) == payload
+            assert engine.findNonce(msg_tail, 0, 3000) == (None, None)
+        finally:
+            engine.shutdown()
+
+    def test_smsg_recipient_index(self):
+        privkeys = [secrets.token_bytes(32) for i in range(8)]
+        addrs = [f"addr{i}" for i in range(8)]
+        pubkey_to = PrivateKey(privkeys[5]).public_key.format()
+        msg = smsgEncrypt(secrets.token_bytes(32), pubkey_to, b"test payload")
+        assert smsgIsRecipient(privkeys[5], msg) is True
+        assert smsgIsRecipient(privkeys[4], msg) is False
+        assert smsgDecrypt(privkeys[5], msg) == b"test payload"
+
+        lookups = []
+
+        def get_privkey(addr):
+            lookups.append(addr)
+            i = addrs.index(addr)
+            if i == 2:
+                raise KeyNotFoundError("key not found")
+            if addr in failing:
+                failing.discard(addr)
+                raise ValueError("RPC server error")
+            return privkeys[i]
+
+        failing = set()
+
+        index = RecipientKeyIndex()
+        assert index.findRecipient(addrs, msg, get_privkey) == (addrs[5], privkeys[5])
+        assert lookups == addrs[:6]
+        assert len(index) == 5
+
+        # Cached keys and missing keys are not looked up again
+        lookups.clear()
+        assert index.findRecipient(addrs, msg, get_privkey) == (addrs[5], privkeys[5])
+        assert lookups == []
+        assert index.findRecipient(addrs[:5], msg, get_privkey) == (None, None)
+        assert lookups == []
+
+        index.retain(set(addrs[3:]))
+        assert len(index) == 3
+        assert index.get(addrs[0]) is None
+        index.remove(addrs[5])
+        assert index.findRecipient(addrs, msg, get_privkey) == (addrs[5], privkeys[5])
+        assert lookups == [addrs[0], addrs[1], addrs[2], addrs[5]]
+
+        index.clear()
+        assert len(index) == 0
+        lookups.clear()
+        index.findRecipient(addrs[:3], msg, get_privkey)
+        assert lookups == addrs[:3]
+
+        # Other lookup errors aren't cached, raised if no recipient was found
+        index.clear()
+        lookups.clear()
+        failing.add(addrs[5])
+        try:
+            index.findRecipient(addrs, msg, get_privkey)
+            raise AssertionError("Expected ValueError")
+        except ValueError as e:
+            assert str(e) == "RPC server error"
+        assert index.findRecipient(addrs, msg, get_privkey) == (addrs[5], privkeys[5])
+        assert lookups == addrs + [addrs[5]]
+        failing.add(addrs[6])
+        assert index.findRecipient(addrs, msg, get_privkey) == (addrs[5], privkeys[5])
+        assert addrs[6] in failing
+
+    def test_simplex_ingest(self):
+        class MockWebSocketThread:
+            def __init__(self):
+                self.recv_queue = Queue()
+
+        def decode_func(message):
+            i = int(message)
+            time.sleep(0.001 * (i % 5))  # Finish out of order
+            if i == 7:
+                raise ValueError("Bad message")
+            if i % 10 == 3:
+                return []
+            return [("msg", i)]
+
+        class StallQueue(Queue):
+            # Signals when the ingest thread waits on a full queue
+            def __init__(self, maxsize):
+                super().__init__(maxsize)
+                self.stalled = threading.Event()
+
+            def put(self, item, block=True, timeout=None):
+                if self.full():
+                    self.stalled.set()
+                super().put(item, block, timeout)
+
+        ws_thread = MockWebSocketThread()
+        ingest = SimplexIngest(ws_thread, decode_func, logger, 4, max_ready=5)
+        ingest.ready_queue = StallQueue(5)
+        for i in range(40):
+            ws_thread.recv_queue.put(str(i))
+        ingest.start()
+        try:
+            # Stalls when the ready queue is full
+            assert ingest.ready_queue.stalled.wait(timeout=10)
+            assert ingest.ready_queue.qsize() == 5
+            assert ws_thread.recv_queue.qsize() > 0
+
+            expect = [i for i in range(40) if i != 7 and i % 10 != 3]
+            received = []
+            while len(received) < len(expect):
+                item = ingest.ready_queue.get(timeout=10)
+                received.append(item[1])
+                ingest.recordProcessed()
+            assert received == expect
+            assert ingest.getReady() is None
+
+            stats = ingest.getStats()
+            assert stats["recv_queue"] == 0
+            assert stats["ready_queue"] == 0
+            assert stats["decoded"] == 39
+            assert stats["errors"] == 1
+            assert stats["processed"] == len(expect)
+            assert stats["processed_per_second"] > 0
+        finally:
+            ingest.stop()
+            ingest.join()
+
+    def test_amm_active_count_cache(self):
+        now: int = int(time.time())
+
+        class MockOffer:
+            def __init__(self, offer_id, expire_at):
+                self.offer_id = offer_id
+                self.expire_at = expire_at
+
+        class MockClient:
+            def __init__(self, data_dir):
+                self.data_dir = data_dir
+                self.log = logging
+                self.debug = False
+                self.time = now
+                self._offers_seq = 0
+                self.offers = [
+                    MockOffer(bytes.fromhex("01" * 28), now + 100),
+                    MockOffer(bytes.fromhex("02" * 28), now + 200),
+                ]
+                self.num_list_offers = 0
+
+            def getTime(self):
+                return self.time
+
+            def listOffers(self):
+                self.num_list_offers += 1
+                return [o for o in self.offers if o.expire_at > self.time]
+
+        def write_json(path, data, mtime_offset):
+            with open(path, "w") as fp:
+                json.dump(data, fp)
+            mtime_ns = (now + mtime_offset) * 1000000000
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+        state_data = {
+            "offers": {
+                "t1": [{"offer_id": "01" * 28}, {"offer_id": "02" * 28}],
+            },
+            "bids": {"b1": [{"bid_id": "03" * 28, "active": True}]},
+        }
+        config_data = {
+            "offers": [{"name": "t1", "enabled": True}],
+            "bids": [{"name": "b1", "enabled": True}],
+        }
+
+        cache = page_amm.AMMActiveCountCache()
+        prev_status = page_amm.amm_status
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            swap_client = MockClient(tmp_dir)
+            state_path = page_amm.get_amm_state_path(swap_client)
+            config_path = page_amm.get_amm_config_path(swap_client)
+            write_json(config_path, config_data, 0)
+            write_json(state_path, state_data, 0)
+            try:
+                page_amm.amm_status = "stopped"
+                assert cache.get(swap_client) == 0
+                assert swap_client.num_list_offers == 0
+
+                page_amm.amm_status = "running"
+                expect = page_amm.get_amm_active_count(swap_client)
+                assert expect == 3
+                swap_client.num_list_offers = 0
+                for i in range(5):
+                    assert cache.get(swap_client) == expect
+                assert swap_client.num_list_offers == 1
+                assert cache.num_computed == 1
+
+                # State file changed
+                state_data["bids"]["b1"][0]["active"] = False
+                write_json(state_path, state_data, 1)
+                assert cache.get(swap_client) == 2
+                assert cache.get(swap_client) == 2
+                assert cache.num_computed == 2
+
+                # Config file changed
+                config_data["bids"][0]["enabled"] = False
+                write_json(config_path, config_data, 1)
+                assert cache.get(swap_client) == 2
+                assert cache.num_computed == 3
+
+                # Offers changed
+                swap_client.offers.pop(1)
+                assert cache.get(swap_client) == 2
+                swap_client._offers_seq += 1
+                assert cache.get(swap_client) == 1
+                assert cache.num_computed == 4
+
+                # Earliest active offer expired
+                swap_client.time = now + 100
+                assert cache.get(swap_client) == 1  # No offers, running with state
+                assert cache.num_computed == 5
+                assert cache.get(swap_client) == 1
+                assert cache.num_computed == 5
+
+                page_amm.amm_status = "stopped"
+                assert cache.get(swap_client) == 0
+            finally:
+                page_amm.amm_status = prev_status
+
+    def test_static_assets(self):
+        import gzip
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            static_path = os.path.join(tmp_dir, "static")
+            for dir_name in ("css", "js", "images"):
+                os.makedirs(os.path.join(static_path, dir_name))
+            css = b"body { color: red; }\n" * 100
+            with open(os.path.join(static_path, "css", "style.css"), "wb") as fp:
+                fp.write(css)
+            png = secrets.token_bytes(100)
+            with open(os.path.join(static_path, "images", "a.png"), "wb") as fp:
+                fp.write(png)
+            with open(os.path.join(static_path, "images", "a.txt"), "wb") as fp:
+                fp.write(b"not served")
+            with open(os.path.join(tmp_dir, "secret.js"), "wb") as fp:
+                fp.write(b"outside")
+
+            assets = StaticAssets(static_path)
+            assets.load()
+
+            status, headers, body = assets.respond("css/style.css", {})
+            headers = dict(headers)
+            assert status == 200
+            assert body == css
+            assert headers["Content-Type"] == "text/css; charset=utf-8"
+            assert headers["Cache-Control"] == "no-cache"
+            assert headers["Vary"] == "Accept-Encoding"
+            assert headers["Content-Length"] == str(len(css))
+            assert "Content-Encoding" not in headers
+            etag = headers["ETag"]
+
+            status, headers, body = assets.respond(
+                "css/style.css", {"Accept-Encoding": "deflate, gzip;q=0.8"}
+            )
+            headers = dict(headers)
+            assert headers["Content-Encoding"] == "gzip"
+            assert gzip.decompress(body) == css
+            assert len(body) < len(css)
+            assert headers["ETag"] != etag
+
+            status, headers, body = assets.respond(
+                "css/style.css", {"Accept-Encoding": "gzip;q=0"}
+            )
+            assert body == css
+
+            # Conditional requests match either variant
+            for tag in (etag, dict(headers)["ETag"], "W/" + etag, '"x", ' + etag):
+                status, headers, body = assets.respond(
+                    "css/style.css", {"If-None-Match": tag}
+                )
+                assert status == 304
+                assert body == b""
+            status, _, _ = assets.respond("css/style.css", {"If-None-Match": '"x"'})
+            assert status == 200
+
+            # Versioned urls are immutable
+            url = assets.url("css/style.css")
+            version = url.split("?v=")[1]
+            assert etag == f'"{version}"'
+            _, headers, _ = assets.respond("css/style.css", {}, version)
+            assert dict(headers)["Cache-Control"] == (
+                "public, max-age=31536000, immutable"
+            )
+            _, headers, _ = assets.respond("css/style.css", {}, "old")
+            assert dict(headers)["Cache-Control"] == "no-cache"
+            assert assets.url("css/missing.css") == "/static/css/missing.css"
+
+            # Images are not compressed
+            status, headers, body = assets.respond(
+                "images/a.png", {"Accept-Encoding": "gzip"}
+            )
+            headers = dict(headers)
+            assert body == png
+            assert headers["Content-Type"] == "image/png"
+            assert "Vary" not in headers
+
+            assert assets.respond("images/a.txt", {}) is None
+            assert assets.respond("css/../../secret.js", {}) is None
+            assert assets.respond("js/../../secret.js", {}) is None
+            assert assets.respond("css/missing.css", {}) is None
+
+            # Served from memory unless check_mtime is set
+            with open(os.path.join(static_path, "css", "style.css"), "wb") as fp:
+                fp.write(b"changed")
+            with open(os.path.join(static_path, "js", "new.js"), "wb") as fp:
+                fp.write(b"new")
+            assert assets.respond("css/style.css", {})[2] == css
+            assert assets.respond("js/new.js", {}) is None
+            assets.check_mtime = True
+            os.utime(
+                os.path.join(static_path, "css", "style.css"),
+                ns=(1000000000, 1000000000),
+            )
+            assert assets.respond("css/style.css", {})[2] == b"changed"
+            assert assets.respond("js/new.js", {})[2] == b"new"
+
+    def test_ws_topics(self):
+        class MockWSServer:
+            def __init__(self):
+                self.received = {}
+                self.blocked = threading.Event()
+                self.blocked.set()
+                self.cv = threading.Condition()
+
+            def send_message(self, client, msg):
+                self.blocked.wait()
+                with self.cv:
+                    self.received.setdefault(client["id"], []).append(json.loads(msg))
+                    self.cv.notify_all()
+
+            def waitFor(self, client_id, num_messages):
+                with self.cv:
+                    self.cv.wait_for(
+                        lambda: len(self.received.get(client_id, [])) >= num_messages,
+                        timeout=10,
+                    )
+                    return self.received.get(client_id, [])
+
+        ws_server = MockWSServer()
+        hub = WSTopicHub(ws_server, logging, max_queued=4)
+        hub.start()
+        try:
+            client_a = {"id": 1}
+            client_b = {"id": 2}
+            assert hub.handleMessage(client_a, "not json") is False
+            assert hub.handleMessage(client_a, json.dumps({"event": "x"})) is False
+            assert hub.handleMessage(
+                client_a,
+                json.dumps(
+                    {"action": "subscribe", "topics": ["offers:1-6", "bids", "x" * 200]}
+                ),
+            )
+            assert hub.handleMessage(
+                client_b, json.dumps({"action": "subscribe", "topics": "offers"})
+            )
+            reply = ws_server.waitFor(1, 1)[0]
+            assert reply["event"] == "subscribed"
+            assert reply["topics"] == ["bids", "offers:1-6"]
+            assert len(reply["invalid"]) == 1
+            assert ws_server.waitFor(2, 1)[0]["topics"] == ["offers"]
+
+            assert hub.hasSubscribers("bids")
+            assert not hub.hasSubscribers("wallets")
+            hub.publish("wallets", {"coin": "BTC"})
+            hub.publish("offers:1-6", {"change": "added", "offer_id": "01"})
+            hub.publish("offers", {"change": "added", "offer_id": "01"})
+            hub.publish("bids", {"bid_id": "02", "state": 1})
+            msgs = ws_server.waitFor(1, 3)
+            assert [m["topic"] for m in msgs[1:]] == ["offers:1-6", "bids"]
+            assert msgs[1] == {
+                "event": "delta",
+                "topic": "offers:1-6",
+                "change": "added",
+                "offer_id": "01",
+            }
+            msgs = ws_server.waitFor(2, 2)
+            assert [m["topic"] for m in msgs[1:]] == ["offers"]
+
+            # Queued deltas for the same key are coalesced
+            ws_server.blocked.clear()
+            hub.publish("bids", {"bid_id": "02", "state": 2}, "02")
+            time.sleep(0.1)  # Sender thread blocks on the first message
+            for state in range(3, 6):
+                hub.publish("bids", {"bid_id": "02", "state": state}, "02")
+            hub.publish("bids", {"bid_id": "03", "state": 1}, "03")
+            ws_server.blocked.set()
+            msgs = ws_server.waitFor(1, 6)
+            assert [(m["bid_id"], m["state"]) for m in msgs[3:]] == [
+                ("02", 2),
+                ("02", 5),
+                ("03", 1),
+            ]
+            assert hub.getStats()["coalesced"] == 2
+
+            # Overflowing a queue replaces it with a resync event
+            ws_server.blocked.clear()
+            hub.publish("bids", {"bid_id": "04"})
+            time.sleep(0.1)
+            for i in range(10):
+                hub.publish("bids", {"bid_id": "05", "n": i})
+            t = time.time()
+            hub.publish("bids", {"bid_id": "06"})
+            assert time.time() - t < 0.1  # publish doesn't wait for the client
+            ws_server.blocked.set()
+            msgs = ws_server.waitFor(1, 9)
+            tail = msgs[6:]
+            assert tail[0]["bid_id"] == "04"
+            assert tail[1] == {"event": "resync", "topics": ["bids", "offers:1-6"]}
+            assert tail[-1]["bid_id"] == "06"
+            assert hub.getStats()["overflows"] > 0
+
+            assert hub.handleMessage(
+                client_a, json.dumps({"action": "unsubscribe", "topics": ["bids"]})
+            )
+            assert ws_server.waitFor(1, len(tail) + 7)[-1] == {
+                "event": "unsubscribed",
+                "topics": ["offers:1-6"],
+            }
+            assert not hub.hasSubscribers("bids")
+            hub.clientLeft(1)
+            hub.clientLeft(1)
+            assert not hub.hasSubscribers("offers:1-6")
+            assert hub.getStats()["clients"] == 1
+        finally:
+            ws_server.blocked.set()
+            hub.stop()
+
+    def test_publish_after_commit(self):
+        class MockHub:
+            def __init__(self):
+                self.published = []
+
+            def hasSubscribers(self, topic):
+                return True
+
+            def publish(self, topic, data, coalesce_key=None):
+                self.published.append((topic, data["change"], coalesce_key))
+
+        class PublishDB(DBMethods):
+            offerChanged = BasicSwap.offerChanged
+            addToOrderBook = BasicSwap.addToOrderBook
+            publishAfterCommit = BasicSwap.publishAfterCommit
+
+            def ci(self, coin_type):
+                return None
+
+        db_test = PublishDB()
+        db_test.sqlite_file = ":memory:"
+        db_test.mxDB = threading.Lock()
+        db_test.log = logger
+        db_test.ws_topics = MockHub()
+        db_test._offers_seq = 0
+        db_test._expiry_scheduler = ExpiryScheduler()
+        db_test._order_book = OrderBook()
+
+        offer = Offer()
+        offer.offer_id = bytes(28)
+        offer.coin_from = 1
+        offer.coin_to = 2
+        offer.rate = 10
+        offer.amount_from = 100
+        offer.amount_to = 1000
+        offer.min_bid_amount = 10
+        offer.amount_negotiable = False
+        offer.rate_negotiable = False
+        offer.addr_from = "addr"
+        offer.created_at = 1000
+        offer.expire_at = 2000
+        offer.was_sent = False
+        offer.active_ind = 1
+        offer.state = OfferStates.OFFER_RECEIVED
+
+        published = db_test.ws_topics.published
+        cursor = db_test.openDB()
+        try:
+            create_db_(db_test._db_con, logger)
+            db_test.add(offer, cursor)
+            db_test.offerChanged(offer, "added")
+            # Nothing is sent before the transaction commits
+            assert published == []
+        finally:
+            db_test.closeDB(cursor)
+        assert published == [
+            ("offers", "added", offer.offer_id),
+            ("offers:1-2", "added", offer.offer_id),
+        ]
+        assert db_test._after_commit is None
+
+        # Rolled back changes are never sent
+        published.clear()
+        cursor = db_test.openDB()
+        try:
+            db_test.offerChanged(offer, "removed")
+        finally:
+            db_test.closeDB(cursor, commit=False)
+        assert published == []
+        cursor = db_test.openDB()
+        db_test.closeDB(cursor)
+        assert published == []
+
+        # commitDB sends the deltas queued so far
+        cursor = db_test.openDB()
+        try:
+            db_test.offerChanged(offer, "removed")
+            db_test.commitDB()
+            assert [p[1] for p in published] == ["removed", "removed"]
+        finally:
+            db_test.closeDB(cursor)
+        assert len(published) == 2
+
+        # A failing callback doesn't stop the others
+        cursor = db_test.openDB()
+        try:
+            db_test.afterCommit(lambda: 1 / 0)
+            db_test.afterCommit(lambda: published.append("ran"))
+        finally:
+            db_test.closeDB(cursor)
+        assert published[-1] == "ran"
+        assert not db_test.mxDB.locked()
+
     def test_tx_hashes(self):
         tx = CTransaction()
         tx.nVersion = 2
@@ -6,6 +6,7 @@
 # Distributed under the MIT software license, see the accompanying
 # file LICENSE or http://www.opensource.org/licenses/mit-license.php.
 
+import datetime
 import json
 import logging
 import os
@@ -39,8 +40,10 @@ from basicswap.basicswap_util import (
 )
 from basicswap.util import COIN, format_amount, make_int, TemporaryError
 from basicswap.util.address import (
+    decodeWif,
     toWIF,
 )
+from basicswap.util.crypto import sha256
 from basicswap.rpc import (
     callrpc,
 )
@@ -1166,6 +1169,61 @@ class Test(BaseTest):
         finally:
             chain_client_settings["manage_wallet_daemon"] = False
 
+    def test_008_local_key_derivation(self):
+        logging.info("---------- Test local key derivation")
+        sc = self.swap_clients[0]
+
+        evkey = sc.callcoinrpc(Coins.PART, "extkey", ["account", "default", "true"])[
+            "evkey"
+        ]
+
+        def rpc_derive(path: str):
+            extkey = sc.callcoinrpc(Coins.PART, "extkey", ["info", evkey, path])[
+                "key_info"
+            ]["result"]
+            key_info = sc.callcoinrpc(Coins.PART, "extkey", ["info", extkey])[
+                "key_info"
+            ]
+            return extkey, decodeWif(key_info["privkey"]), key_info["pubkey"]
+
+        sc.clearAccountExtKeys()
+        _, privkey, _ = rpc_derive("44445555h/1h/{}/{}".format(int(Coins.BTC), 1))
+        assert sc.getWalletKey(Coins.BTC, 1) == privkey
+
+        bid_created_at: int = 1700000123
+        days = bid_created_at // 86400
+        secs = bid_created_at - days * 86400
+        path = "44445555h/999999/{}/{}/{}/{}/{}/{}".format(
+            int(Coins.PART), int(Coins.XMR), days, secs, 7, 3
+        )
+        _, privkey, _ = rpc_derive(path)
+        assert sc.getPathKey(Coins.PART, Coins.XMR, bid_created_at, 7, 3) == privkey
+
+        ci = sc.ci(Coins.XMR)
+        nonce: int = 1
+        while True:
+            _, privkey, _ = rpc_derive(path + f"/{nonce}")
+            if ci.verifyKey(privkey):
+                break
+            nonce += 1
+        assert (
+            sc.getPathKey(Coins.PART, Coins.XMR, bid_created_at, 7, 3, for_ed25519=True)
+            == privkey
+        )
+
+        _, privkey, _ = rpc_derive("44445556h/1h/2")
+        assert sc.getNetworkKey(2) == privkey
+
+        bid_date = datetime.datetime.fromtimestamp(bid_created_at).date()
+        path = f"44445555h/{bid_date.year}/{bid_date.month}/{bid_date.day}/5"
+        _, privkey, pubkey = rpc_derive(path)
+        assert sc.getContractPrivkey(bid_date, 5) == privkey
+        assert sc.getContractPubkey(bid_date, 5).hex() == pubkey
+
+        path = f"44445555h/99999/{bid_date.year}/{bid_date.month}/{bid_date.day}/5"
+        extkey, _, _ = rpc_derive(path)
+        assert sc.getContractSecret(bid_date, 5) == sha256(bytes(extkey, "UTF-8"))
+
     def test_010_txn_size(self):
         logging.info("---------- Test {} txn_size".format(Coins.PART))
 